@@ -7,8 +7,13 @@ import sqlite3
 import aiosqlite
 import logging
 from typing import Optional
+
+from database.connection_pool import db_pool, DEFAULT_DATABASE_PATH
+from database.leaderboards import leaderboards
+from database.user_cache import user_cache
+
 # استخدام قاعدة البيانات المحلية
-DATABASE_URL = "bot_database.db"
+DATABASE_URL = DEFAULT_DATABASE_PATH
 
 # إعداد نظام التسجيل
 logging.basicConfig(level=logging.INFO)
@@ -564,8 +569,13 @@ async def init_database():
             # إنشاء فهارس لتحسين الأداء
             await db.execute('CREATE INDEX IF NOT EXISTS idx_users_user_id ON users(user_id)')
             await db.execute('CREATE INDEX IF NOT EXISTS idx_transactions_user_id ON transactions(user_id)')
+            await db.execute('CREATE INDEX IF NOT EXISTS idx_transactions_created_at ON transactions(created_at)')
             await db.execute('CREATE INDEX IF NOT EXISTS idx_properties_user_id ON user_properties(user_id)')
+            await db.execute('CREATE INDEX IF NOT EXISTS idx_farm_user_harvest ON farm(user_id, harvest_time)')
+            await db.execute('CREATE INDEX IF NOT EXISTS idx_farm_status_harvest ON farm(status, harvest_time)')
             await db.execute('CREATE INDEX IF NOT EXISTS idx_stocks_user_id ON user_stocks(user_id)')
+            await db.execute('CREATE INDEX IF NOT EXISTS idx_stock_prices_symbol ON stock_prices(symbol)')
+            await db.execute('CREATE INDEX IF NOT EXISTS idx_stock_prices_timestamp ON stock_prices(timestamp)')
             await db.execute('CREATE INDEX IF NOT EXISTS idx_investments_user_id ON user_investments(user_id)')
             await db.execute('CREATE INDEX IF NOT EXISTS idx_activity_user_id ON activity_log(user_id)')
             await db.execute('CREATE INDEX IF NOT EXISTS idx_group_ranks_chat_user ON group_ranks(chat_id, user_id)')
@@ -633,6 +643,54 @@ async def init_database():
             await db.execute('CREATE INDEX IF NOT EXISTS idx_daily_stats_chat_date ON daily_stats(chat_id, date)')
             await db.execute('CREATE INDEX IF NOT EXISTS idx_performance_metrics_chat_date ON performance_metrics(chat_id, date_only)')
             
+            # تجميعات التحليلات: النشطون يومياً (صف لكل مستخدم في اليوم بدلاً من فحص السجل لكل رسالة)
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS daily_active_users (
+                    chat_id INTEGER NOT NULL,
+                    date TEXT NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    PRIMARY KEY (chat_id, date, user_id)
+                ) WITHOUT ROWID
+            ''')
+            
+            # عدادات يومية لكل نوع نشاط (مالي، إشراف، عام) تقرأها لوحات التحكم
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS activity_rollups (
+                    chat_id INTEGER NOT NULL,
+                    date TEXT NOT NULL,
+                    activity_type TEXT NOT NULL,
+                    category TEXT NOT NULL DEFAULT 'general',
+                    count INTEGER DEFAULT 0,
+                    total_amount REAL DEFAULT 0,
+                    PRIMARY KEY (chat_id, date, activity_type)
+                )
+            ''')
+            await db.execute('CREATE INDEX IF NOT EXISTS idx_activity_rollups_category ON activity_rollups(chat_id, category, date)')
+            
+            # ملء التجميعات مرة واحدة من سجل الأنشطة القديم
+            async with db.execute("SELECT 1 FROM activity_rollups LIMIT 1") as cursor:
+                rollups_exist = await cursor.fetchone()
+            if not rollups_exist:
+                await db.execute('''
+                    INSERT OR IGNORE INTO daily_active_users (chat_id, date, user_id)
+                    SELECT DISTINCT chat_id, date_only, user_id FROM activity_logs
+                    WHERE activity_type = 'daily_active' AND chat_id IS NOT NULL AND user_id IS NOT NULL
+                ''')
+                await db.execute('''
+                    INSERT OR IGNORE INTO activity_rollups (chat_id, date, activity_type, category, count, total_amount)
+                    SELECT chat_id, date_only, activity_type,
+                           CASE WHEN activity_type LIKE 'financial\\_%' ESCAPE '\\' THEN 'financial'
+                                WHEN activity_type LIKE 'moderation\\_%' ESCAPE '\\' THEN 'moderation'
+                                ELSE 'general' END,
+                           COUNT(*),
+                           COALESCE(SUM(CASE WHEN activity_type LIKE 'financial\\_%' ESCAPE '\\'
+                                             AND json_valid(activity_data)
+                                             THEN json_extract(activity_data, '$.amount') END), 0)
+                    FROM activity_logs
+                    WHERE activity_type != 'daily_active' AND chat_id IS NOT NULL AND date_only IS NOT NULL
+                    GROUP BY chat_id, date_only, activity_type
+                ''')
+            
             # إنشاء فهرس للبحث السريع في المحادثات
             await db.execute('CREATE INDEX IF NOT EXISTS idx_conversation_user_timestamp ON conversation_history (user_id, timestamp DESC)')
             
@@ -650,6 +708,7 @@ async def init_database():
             ''')
             
             await db.execute('CREATE INDEX IF NOT EXISTS idx_user_message_count ON user_message_count(user_id, chat_id)')
+            await db.execute('CREATE INDEX IF NOT EXISTS idx_user_message_count_chat ON user_message_count(chat_id, first_message_date)')
             
             # جداول الذاكرة المشتركة
             await db.execute('''
@@ -719,21 +778,30 @@ async def get_database_connection():
 
 
 async def execute_query(query: str, params: tuple = (), fetch_one: bool = False, fetch_all: bool = False):
-    """تنفيذ استعلام قاعدة البيانات مع معالجة الأخطاء"""
+    """تنفيذ استعلام قاعدة البيانات مع معالجة الأخطاء عبر مجمع الاتصالات"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
-            async with db.execute(query, params) as cursor:
-                if fetch_one:
-                    result = await cursor.fetchone()
-                    await db.commit()
-                    return result
-                elif fetch_all:
-                    result = await cursor.fetchall()
-                    await db.commit()
-                    return result
-                else:
-                    await db.commit()
-                    return cursor.rowcount
+        from database.operations import is_read_query
+        
+        # اتصالات المجمع تعيد aiosqlite.Row - تُحوَّل إلى tuple كما كانت هذه الدالة تعيد سابقاً
+        if is_read_query(query) and (fetch_one or fetch_all):
+            if fetch_one:
+                row = await db_pool.fetch_one(query, params)
+                return tuple(row) if row else None
+            return [tuple(row) for row in await db_pool.fetch_all(query, params)]
+        
+        try:
+            async with db_pool.writer() as db:
+                async with db.execute(query, params) as cursor:
+                    if fetch_one:
+                        row = await cursor.fetchone()
+                        return tuple(row) if row else None
+                    elif fetch_all:
+                        return [tuple(row) for row in await cursor.fetchall()]
+                    else:
+                        return cursor.rowcount
+        finally:
+            user_cache.invalidate_for_query(query, params)
+            leaderboards.invalidate_for_query(query, params)
     except Exception as e:
         logger.error(f"خطأ في تنفيذ الاستعلام: {e}")
         logger.error(f"الاستعلام: {query}")
@@ -744,7 +812,7 @@ async def execute_query(query: str, params: tuple = (), fetch_one: bool = False,
 async def backup_database(backup_path: str):
     """إنشاء نسخة احتياطية من قاعدة البيانات"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as source:
+        async with db_pool.reader() as source:
             async with aiosqlite.connect(backup_path) as backup:
                 await source.backup(backup)
         logger.info(f"✅ تم إنشاء نسخة احتياطية في: {backup_path}")
@@ -759,7 +827,7 @@ async def get_database_stats():
         stats = {}
         
         # عدد المستخدمين
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.reader() as db:
             async with db.execute("SELECT COUNT(*) FROM users") as cursor:
                 users_count = await cursor.fetchone()
                 stats['total_users'] = users_count[0] if users_count else 0
@@ -779,6 +847,10 @@ async def get_database_stats():
                 active_users = await cursor.fetchone()
                 stats['active_users'] = active_users[0] if active_users else 0
         
+        # أداء ذاكرة المستخدمين المؤقتة ومجمع الاتصالات
+        stats['user_cache'] = user_cache.get_stats()
+        stats['connection_pool'] = db_pool.get_stats()
+        
         return stats
         
     except Exception as e:
@@ -213,9 +213,10 @@ async def get_telegram_admin_level(bot: Bot, user_id: int, group_id: int) -> Adm
         if user_id in MASTERS:
             return AdminLevel.MASTER
         
-        # فحص صلاحيات تليجرام الفعلية
+        # فحص صلاحيات تليجرام الفعلية (من ذاكرة الأعضاء المحدثة بأحداث chat_member)
         try:
-            member = await bot.get_chat_member(group_id, user_id)
+            from modules.chat_member_cache import chat_member_cache
+            member = await chat_member_cache.get_member(bot, group_id, user_id)
             
             # مالك المجموعة
             if member.status == ChatMemberStatus.CREATOR:
@@ -260,8 +261,9 @@ async def has_telegram_permission(bot: Bot, user_id: int, required_level: AdminL
             # إذا كان المستخدم ليس أدمن في النظام المحلي، جرب مزامنة الصلاحيات من تليجرام
             if local_level == AdminLevel.MEMBER:
                 try:
-                    # فحص صلاحيات تليجرام مباشرة
-                    member = await bot.get_chat_member(group_id, user_id)
+                    # فحص صلاحيات تليجرام (من ذاكرة الأعضاء)
+                    from modules.chat_member_cache import chat_member_cache
+                    member = await chat_member_cache.get_member(bot, group_id, user_id)
                     if member.status in [ChatMemberStatus.CREATOR, ChatMemberStatus.ADMINISTRATOR]:
                         # المستخدم أدمن في تليجرام لكن ليس في النظام المحلي - نحتاج مزامنة
                         logging.info(f"اكتشاف أدمن جديد في تليجرام - مزامنة المجموعة {group_id}")
@@ -367,7 +369,8 @@ async def get_real_telegram_admins(bot: Bot, group_id: int) -> Dict[str, List[Di
         قاموس يحتوي على المالكين والمشرفين مع تفاصيلهم
     """
     try:
-        admins = await bot.get_chat_administrators(group_id)
+        from modules.chat_member_cache import chat_member_cache
+        admins = await chat_member_cache.get_administrators(bot, group_id)
         
         owners = []
         moderators = []
@@ -409,8 +412,13 @@ async def sync_telegram_admins_to_local(bot: Bot, group_id: int) -> None:
         group_id: معرف المجموعة
     """
     try:
-        # الحصول على قائمة الأدمن من تليجرام
-        admins = await bot.get_chat_administrators(group_id)
+        # الحصول على قائمة الأدمن من تليجرام (من ذاكرة المشرفين)
+        from modules.chat_member_cache import chat_member_cache
+        admins = await chat_member_cache.get_administrators(bot, group_id)
+        
+        # الرتب الحالية لتجنب إعادة كتابة الرتب غير المتغيرة في قاعدة البيانات
+        previous_owners = set(GROUP_OWNERS.get(group_id, []))
+        previous_moderators = set(MODERATORS.get(group_id, []))
         
         # مسح الأدمن السابقين لهذه المجموعة من النظام المحلي
         if group_id in GROUP_OWNERS:
@@ -435,15 +443,17 @@ async def sync_telegram_admins_to_local(bot: Bot, group_id: int) -> None:
                 # مالك المجموعة
                 GROUP_OWNERS[group_id].append(user_id)
                 # حفظ في قاعدة البيانات
-                await sync_rank_to_database(user_id, group_id, "مالك")
-                logging.info(f"تم تحديد مالك المجموعة {group_id}: {user_id}")
+                if user_id not in previous_owners:
+                    await sync_rank_to_database(user_id, group_id, "مالك")
+                    logging.info(f"تم تحديد مالك المجموعة {group_id}: {user_id}")
                 
             elif admin.status == ChatMemberStatus.ADMINISTRATOR:
                 # مشرف
                 MODERATORS[group_id].append(user_id)
                 # حفظ في قاعدة البيانات
-                await sync_rank_to_database(user_id, group_id, "مشرف")
-                logging.info(f"تم تحديد مشرف في المجموعة {group_id}: {user_id}")
+                if user_id not in previous_moderators:
+                    await sync_rank_to_database(user_id, group_id, "مشرف")
+                    logging.info(f"تم تحديد مشرف في المجموعة {group_id}: {user_id}")
         
         logging.info(f"تم تحديث صلاحيات المجموعة {group_id} من تليجرام")
         logging.info(f"المالكون: {GROUP_OWNERS.get(group_id, [])}")
@@ -257,6 +257,17 @@ SECURITY_LIMITS = {
     "auto_ban_threshold": 20
 }
 
+# حدود معدل الاستخدام لكل فئة أوامر (دلو رموز لكل مستخدم في كل مجموعة)
+# capacity: أقصى عدد طلبات متتالية، refill_seconds: ثواني استعادة طلب واحد
+RATE_LIMITS = {
+    "ai": {"capacity": 3, "refill_seconds": 20},
+    "media": {"capacity": 10, "refill_seconds": 6},
+    "download": {"capacity": 2, "refill_seconds": 30},
+    "theft": {"capacity": 3, "refill_seconds": 20},
+    "battle": {"capacity": 2, "refill_seconds": 30},
+    "default": {"capacity": 10, "refill_seconds": 3}
+}
+
 # إعدادات الدفع
 PAYMENT_SETTINGS = {
     "enabled": False,  # تعطيل الدفع حالياً
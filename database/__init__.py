@@ -5,6 +5,10 @@ Database Package
 
 from .models import *
 from .operations import *
+from .connection_pool import db_pool, get_pool, close_all_pools
+from .user_cache import user_cache
+from .retention import retention_engine
+from . import ledger
 
 __all__ = [
     'get_user',
@@ -15,5 +19,11 @@ __all__ = [
     'add_transaction',
     'execute_query',
     'update_user_activity',
-    'is_user_banned'
+    'is_user_banned',
+    'db_pool',
+    'get_pool',
+    'close_all_pools',
+    'user_cache',
+    'retention_engine',
+    'ledger'
 ]
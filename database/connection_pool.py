@@ -0,0 +1,212 @@
+"""
+مجمع اتصالات قاعدة البيانات طويلة العمر
+Pooled, Long-Lived SQLite Connection Manager
+
+يحتفظ بعدد ثابت من اتصالات القراءة واتصال كتابة واحد متسلسل بدلاً من
+فتح اتصال جديد (وخيط جديد) لكل استعلام.
+"""
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+import aiosqlite
+
+# قاعدة البيانات الافتراضية للبوت
+DEFAULT_DATABASE_PATH = "bot_database.db"
+
+# عدد اتصالات القراءة في المجمع
+DEFAULT_READERS = 4
+
+# حجم ذاكرة العبارات المجهزة لكل اتصال (sqlite3 cached_statements)
+STATEMENT_CACHE_SIZE = 256
+
+# إعدادات PRAGMA المطبقة على كل اتصال
+CONNECTION_PRAGMAS = (
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA foreign_keys=OFF",
+)
+
+
+class DatabaseConnectionPool:
+    """مجمع اتصالات: عدة قراء واتصال كتابة واحد محمي بقفل"""
+
+    def __init__(self, database_path: str = DEFAULT_DATABASE_PATH, readers: int = DEFAULT_READERS):
+        self.database_path = database_path
+        self.readers_count = max(1, readers)
+        self._readers: Optional[asyncio.Queue] = None
+        self._all_readers = []
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._init_lock: Optional[asyncio.Lock] = None
+        self._initialized = False
+        self.stats = {
+            'reads': 0,
+            'writes': 0,
+            'write_errors': 0,
+            'reader_waits': 0,
+        }
+
+    async def _open_connection(self, read_only: bool = False) -> aiosqlite.Connection:
+        """فتح اتصال جديد وتطبيق إعدادات الأداء عليه"""
+        db = await aiosqlite.connect(
+            self.database_path,
+            timeout=5,
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        try:
+            db.row_factory = aiosqlite.Row
+            for pragma in CONNECTION_PRAGMAS:
+                await db.execute(pragma)
+            if read_only:
+                await db.execute("PRAGMA query_only=ON")
+        except Exception:
+            await db.close()
+            raise
+        return db
+
+    async def initialize(self):
+        """فتح الاتصالات عند أول استخدام"""
+        if self._initialized:
+            return
+
+        if self._init_lock is None:
+            self._init_lock = asyncio.Lock()
+
+        async with self._init_lock:
+            if self._initialized:
+                return
+
+            try:
+                self._write_lock = asyncio.Lock()
+                self._writer = await self._open_connection()
+
+                self._readers = asyncio.Queue()
+                for _ in range(self.readers_count):
+                    reader = await self._open_connection(read_only=True)
+                    self._all_readers.append(reader)
+                    self._readers.put_nowait(reader)
+            except Exception as e:
+                logging.error(f"خطأ في تهيئة مجمع اتصالات {self.database_path}: {e}")
+                await self._close_connections()
+                raise
+
+            self._initialized = True
+            logging.info(
+                f"✅ تم تهيئة مجمع اتصالات {self.database_path} "
+                f"({self.readers_count} قارئ + كاتب واحد)"
+            )
+
+    @asynccontextmanager
+    async def reader(self):
+        """استعارة اتصال قراءة من المجمع"""
+        await self.initialize()
+        if self._readers.empty():
+            self.stats['reader_waits'] += 1
+        db = await self._readers.get()
+        try:
+            self.stats['reads'] += 1
+            yield db
+        finally:
+            self._readers.put_nowait(db)
+
+    @asynccontextmanager
+    async def writer(self):
+        """الحصول على اتصال الكتابة الحصري - يتم الحفظ تلقائياً عند النجاح"""
+        await self.initialize()
+        async with self._write_lock:
+            self.stats['writes'] += 1
+            try:
+                yield self._writer
+                await self._writer.commit()
+            except Exception:
+                self.stats['write_errors'] += 1
+                try:
+                    await self._writer.rollback()
+                except Exception as rollback_error:
+                    logging.error(f"خطأ في التراجع عن المعاملة: {rollback_error}")
+                raise
+
+    async def fetch_one(self, query: str, params: tuple = ()) -> Optional[aiosqlite.Row]:
+        """تنفيذ استعلام قراءة وإرجاع صف واحد"""
+        async with self.reader() as db:
+            async with db.execute(query, params) as cursor:
+                return await cursor.fetchone()
+
+    async def fetch_all(self, query: str, params: tuple = ()) -> list:
+        """تنفيذ استعلام قراءة وإرجاع جميع الصفوف"""
+        async with self.reader() as db:
+            async with db.execute(query, params) as cursor:
+                return await cursor.fetchall()
+
+    async def execute(self, query: str, params: tuple = ()) -> int:
+        """تنفيذ استعلام كتابة وإرجاع عدد الصفوف المتأثرة"""
+        async with self.writer() as db:
+            async with db.execute(query, params) as cursor:
+                return cursor.rowcount
+
+    async def execute_many(self, query: str, params_list) -> int:
+        """تنفيذ استعلام كتابة لعدة مجموعات معاملات في معاملة واحدة"""
+        async with self.writer() as db:
+            async with db.executemany(query, params_list) as cursor:
+                return cursor.rowcount
+
+    async def close(self):
+        """إغلاق جميع الاتصالات"""
+        if not self._initialized:
+            return
+
+        async with self._write_lock:
+            await self._close_connections()
+            self._initialized = False
+
+        logging.info(f"✅ تم إغلاق مجمع اتصالات {self.database_path}")
+
+    async def _close_connections(self):
+        """إغلاق الاتصالات المفتوحة حالياً"""
+        for reader in self._all_readers:
+            try:
+                await reader.close()
+            except Exception as e:
+                logging.error(f"خطأ في إغلاق اتصال القراءة: {e}")
+        self._all_readers = []
+        self._readers = None
+
+        if self._writer is not None:
+            try:
+                await self._writer.close()
+            except Exception as e:
+                logging.error(f"خطأ في إغلاق اتصال الكتابة: {e}")
+            self._writer = None
+
+    def get_stats(self) -> Dict[str, int]:
+        """إحصائيات استخدام المجمع للمراقبة"""
+        return dict(self.stats, readers=self.readers_count, initialized=self._initialized)
+
+
+# سجل المجمعات حسب مسار قاعدة البيانات
+_pools: Dict[str, DatabaseConnectionPool] = {}
+
+
+def get_pool(database_path: str = DEFAULT_DATABASE_PATH) -> DatabaseConnectionPool:
+    """الحصول على مجمع الاتصالات الخاص بقاعدة بيانات معينة"""
+    pool = _pools.get(database_path)
+    if pool is None:
+        pool = DatabaseConnectionPool(database_path)
+        _pools[database_path] = pool
+    return pool
+
+
+async def close_all_pools():
+    """إغلاق جميع المجمعات عند إيقاف البوت"""
+    for pool in list(_pools.values()):
+        await pool.close()
+
+
+# المجمع الرئيسي للبوت
+db_pool = get_pool(DEFAULT_DATABASE_PATH)
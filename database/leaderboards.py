@@ -0,0 +1,410 @@
+"""
+لوحات الترتيب في الذاكرة
+In-Memory Incrementally-Maintained Leaderboards
+
+لكل تصنيف (الثروة، البنك، النقاط الذهبية، XP) ولكل مجموعة (عدد الرسائل)
+قائمة مرتبة تُحمّل من قاعدة البيانات عند بدء التشغيل وتُحدّث مع كل كتابة
+للرصيد أو XP أو عدد الرسائل، فيصبح استعلام "الأوائل" و"ترتيبي" O(log n)
+بدلاً من ORDER BY أو COUNT(*) على الجدول كاملاً في كل طلب.
+
+إعادة المزامنة تقرأ عبر اتصال قراءة وتبني لوحات جديدة تُستبدل دفعة واحدة،
+بينما تستمر الاستعلامات على اللوحات الحالية. تحديثات الخطافات أثناء التحميل
+تُسجل في سجل وتُعاد على اللوحات الجديدة قبل الاستبدال.
+"""
+
+import asyncio
+import bisect
+import logging
+import re
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from database.connection_pool import db_pool
+
+try:
+    from sortedcontainers import SortedList
+    SORTED_CONTAINERS_AVAILABLE = True
+except ImportError:
+    SORTED_CONTAINERS_AVAILABLE = False
+
+# أسماء التصنيفات
+WEALTH = "wealth"
+BANK = "bank"
+GOLD = "gold"
+XP = "xp"
+MESSAGES = "messages"
+
+# تصنيفات مبنية على أعمدة جدول users
+USER_CATEGORIES = (WEALTH, BANK, GOLD)
+
+# فاصل إعادة المزامنة الكاملة (لتصحيح أي كتابة لم تمر عبر الخطافات)
+RESYNC_INTERVAL = 3600
+
+# أكبر عدد مستخدمين يُحدّث فردياً قبل اللجوء لإعادة تحميل كاملة
+MAX_STALE_USERS = 500
+
+# كتابات على جدول users قد تغير الأرصدة أو النقاط الذهبية
+_USERS_MONEY_WRITE_PATTERN = re.compile(
+    r'^\s*(?:(?:INSERT|REPLACE)\b.*\busers\b|DELETE\s+FROM\s+users\b'
+    r'|UPDATE(?:\s+OR\s+\w+)?\s+users\b.*\b(?:balance|bank_balance|gold_points)\b)',
+    re.IGNORECASE | re.DOTALL
+)
+_USER_ID_FILTER_PATTERN = re.compile(r'\bWHERE\b.*\buser_id\s*(?:=|IN\b)', re.IGNORECASE | re.DOTALL)
+
+Score = Union[float, Tuple[float, ...]]
+
+
+class _SortedKeys:
+    """قائمة مرتبة: SortedList عند توفرها (O(log n)) وإلا قائمة عادية مع bisect"""
+
+    def __init__(self, items: Iterable[tuple] = ()):
+        if SORTED_CONTAINERS_AVAILABLE:
+            self._items = SortedList(items)
+        else:
+            self._items = sorted(items)
+
+    def add(self, key: tuple):
+        if SORTED_CONTAINERS_AVAILABLE:
+            self._items.add(key)
+        else:
+            bisect.insort(self._items, key)
+
+    def remove(self, key: tuple):
+        if SORTED_CONTAINERS_AVAILABLE:
+            self._items.remove(key)
+        else:
+            del self._items[bisect.bisect_left(self._items, key)]
+
+    def bisect_left(self, key: tuple) -> int:
+        if SORTED_CONTAINERS_AVAILABLE:
+            return self._items.bisect_left(key)
+        return bisect.bisect_left(self._items, key)
+
+    def head(self, count: int) -> List[tuple]:
+        return list(self._items[:count])
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+def _sort_key(score: Score, user_id: int) -> tuple:
+    """مفتاح الترتيب التنازلي (النتيجة سالبة ثم المعرّف لكسر التعادل)"""
+    if isinstance(score, tuple):
+        return tuple(-value for value in score) + (user_id,)
+    return (-score, user_id)
+
+
+class Leaderboard:
+    """تصنيف واحد: نتيجة لكل مستخدم مع قائمة مرتبة لاستعلامات الترتيب"""
+
+    def __init__(self, pairs: Iterable[Tuple[int, Score]] = (), include_zero: bool = True):
+        # include_zero=False: من نتيجته صفر غير مصنف (الرسائل، النقاط الذهبية)
+        self.include_zero = include_zero
+        self._scores: Dict[int, Score] = {}
+        keys = []
+        for user_id, score in pairs:
+            if self._ranked(score):
+                self._scores[user_id] = score
+                keys.append(_sort_key(score, user_id))
+        self._sorted = _SortedKeys(keys)
+
+    def _ranked(self, score: Score) -> bool:
+        if self.include_zero:
+            return True
+        return (score[0] if isinstance(score, tuple) else score) > 0
+
+    def set(self, user_id: int, score: Score):
+        """تعيين نتيجة المستخدم (O(log n))"""
+        old = self._scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            self._sorted.remove(_sort_key(old, user_id))
+            del self._scores[user_id]
+        if self._ranked(score):
+            self._scores[user_id] = score
+            self._sorted.add(_sort_key(score, user_id))
+
+    def add(self, user_id: int, delta: float):
+        """زيادة نتيجة رقمية"""
+        self.set(user_id, self._scores.get(user_id, 0) + delta)
+
+    def discard(self, user_id: int):
+        old = self._scores.pop(user_id, None)
+        if old is not None:
+            self._sorted.remove(_sort_key(old, user_id))
+
+    def score(self, user_id: int) -> Optional[Score]:
+        return self._scores.get(user_id)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._scores
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """الترتيب = عدد من نتيجتهم أعلى + 1 (المتعادلون يتشاركون المركز)"""
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return self._sorted.bisect_left(_sort_key(score, user_id)[:-1]) + 1
+
+    def top(self, limit: int) -> List[Tuple[int, Score]]:
+        """أعلى النتائج بالترتيب"""
+        return [(key[-1], self._scores[key[-1]]) for key in self._sorted.head(limit)]
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+
+def _apply_balances(boards: Dict[str, Leaderboard], messages: Dict[int, Leaderboard], user_id: int,
+                    balance: float, bank_balance: float, gold_points: Optional[int]):
+    wealth = (balance or 0) + (bank_balance or 0)
+    boards[WEALTH].set(user_id, wealth)
+    boards[BANK].set(user_id, bank_balance or 0)
+    if gold_points is None:
+        current = boards[GOLD].score(user_id)
+        gold_points = current[0] if current else 0
+    boards[GOLD].set(user_id, (gold_points, wealth))
+
+
+def _apply_xp(boards: Dict[str, Leaderboard], messages: Dict[int, Leaderboard], user_id: int, xp: int):
+    boards[XP].set(user_id, max(0, xp or 0))
+
+
+def _apply_messages(boards: Dict[str, Leaderboard], messages: Dict[int, Leaderboard],
+                    chat_id: int, user_id: int, count: int):
+    board = messages.get(chat_id)
+    if board is None:
+        board = messages[chat_id] = Leaderboard(include_zero=False)
+    board.add(user_id, count)
+
+
+class LeaderboardManager:
+    """لوحات الترتيب العامة ولوحات رسائل المجموعات"""
+
+    def __init__(self):
+        self._boards: Dict[str, Leaderboard] = {}
+        self._messages: Dict[int, Leaderboard] = {}
+        self._stale_users: Set[int] = set()
+        self._resync_needed = False
+        # تحديثات الخطافات منذ بدء لقطة التحميل الجارية (None = لا تحميل جارٍ)
+        self._journal: Optional[List[tuple]] = None
+        self._loaded = False
+        self._lock: Optional[asyncio.Lock] = None
+        self.stats = {'queries': 0, 'updates': 0, 'refreshed_users': 0, 'resyncs': 0}
+
+    # ===== التحميل =====
+
+    async def warm(self):
+        """تحميل جميع التصنيفات من قاعدة البيانات"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            await self._load()
+
+    async def _load(self):
+        """بناء لوحات جديدة من لقطة قراءة ثم استبدالها باللوحات الحالية دفعة واحدة"""
+        started = time.monotonic()
+        stale_before, resync_before = set(), False
+        async with db_pool.reader() as db:
+            try:
+                # بدء اللقطة أثناء حجز قفل الكتابة: كل كتابة سابقة نُفذت خطافاتها
+                # وكل كتابة لاحقة تُسجل في السجل، فلا تُحتسب الرسائل مرتين ولا تضيع
+                async with db_pool.writer():
+                    await db.execute("BEGIN")
+                    async with db.execute("SELECT 1 FROM users LIMIT 1") as cursor:
+                        await cursor.fetchall()
+                    self._journal = []
+                    stale_before, self._stale_users = self._stale_users, set()
+                    resync_before, self._resync_needed = self._resync_needed, False
+
+                async with db.execute("SELECT user_id, balance, bank_balance, gold_points FROM users") as cursor:
+                    users = await cursor.fetchall()
+                async with db.execute("SELECT user_id, xp FROM levels") as cursor:
+                    levels = await cursor.fetchall()
+                async with db.execute(
+                    "SELECT chat_id, user_id, message_count FROM user_message_count WHERE message_count > 0"
+                ) as cursor:
+                    message_rows = await cursor.fetchall()
+            except Exception:
+                self._journal = None
+                self._stale_users |= stale_before
+                self._resync_needed = self._resync_needed or resync_before
+                raise
+            finally:
+                await db.rollback()
+
+        wealth, bank, gold = [], [], []
+        for user_id, balance, bank_balance, gold_points in users:
+            balance, bank_balance, gold_points = balance or 0, bank_balance or 0, gold_points or 0
+            wealth.append((user_id, balance + bank_balance))
+            bank.append((user_id, bank_balance))
+            gold.append((user_id, (gold_points, balance + bank_balance)))
+
+        by_chat: Dict[int, list] = {}
+        for chat_id, user_id, count in message_rows:
+            by_chat.setdefault(chat_id, []).append((user_id, count))
+
+        boards = {
+            WEALTH: Leaderboard(wealth),
+            BANK: Leaderboard(bank),
+            GOLD: Leaderboard(gold, include_zero=False),
+            XP: Leaderboard(((user_id, max(0, xp or 0)) for user_id, xp in levels), include_zero=False),
+        }
+        messages = {chat_id: Leaderboard(pairs, include_zero=False) for chat_id, pairs in by_chat.items()}
+
+        # إعادة التحديثات التي وصلت أثناء التحميل ثم الاستبدال دون أي انتظار بينهما
+        journal, self._journal = self._journal, None
+        for apply, args in journal:
+            apply(boards, messages, *args)
+        self._boards, self._messages = boards, messages
+        self._loaded = True
+        self.stats['resyncs'] += 1
+
+        logging.info(
+            f"✅ تم تحميل لوحات الترتيب ({len(users)} مستخدم، {len(by_chat)} مجموعة) "
+            f"في {(time.monotonic() - started) * 1000:.0f}ms"
+        )
+
+    async def resync(self):
+        """إعادة مزامنة دورية كاملة"""
+        try:
+            await self.warm()
+        except Exception as e:
+            logging.error(f"خطأ في إعادة مزامنة لوحات الترتيب: {e}")
+
+    async def _ensure_ready(self):
+        """تحميل أولي أو تحديث المستخدمين المعلّمين قبل الاستعلام"""
+        if self._loaded and not self._resync_needed and not self._stale_users:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self._loaded or self._resync_needed or len(self._stale_users) > MAX_STALE_USERS:
+                await self._load()
+            elif self._stale_users:
+                await self._refresh_users(self._stale_users)
+
+    async def _refresh_users(self, user_ids: Set[int]):
+        """قراءة أرصدة مستخدمين محددين بعد كتابة عامة لم تمر عبر الخطافات"""
+        ids = list(user_ids)
+        user_ids.difference_update(ids)
+        placeholders = ",".join("?" * len(ids))
+        # القراءة عبر الكاتب عمداً: قفل الكتابة يمنع التزاماً آخر وخطافه من الوقوع بين القراءة
+        # وتطبيق update_balances، وإلا لكتبنا قيمة أقدم فوق قيمة أحدث وصل بها الخطاف
+        async with db_pool.writer() as db:
+            async with db.execute(
+                f"SELECT user_id, balance, bank_balance, gold_points FROM users WHERE user_id IN ({placeholders})",
+                ids
+            ) as cursor:
+                rows = await cursor.fetchall()
+
+        found = set()
+        for user_id, balance, bank_balance, gold_points in rows:
+            found.add(user_id)
+            self.update_balances(user_id, balance or 0, bank_balance or 0, gold_points or 0)
+        for user_id in ids:
+            if user_id not in found:
+                for category in USER_CATEGORIES:
+                    self._boards[category].discard(user_id)
+        self.stats['refreshed_users'] += len(ids)
+
+    # ===== خطافات الكتابة =====
+
+    def _record(self, apply, *args) -> bool:
+        """تسجيل التحديث لإعادته بعد التحميل الجاري، وإرجاع هل تُحدّث اللوحات الحالية"""
+        if self._journal is not None:
+            self._journal.append((apply, args))
+        if not self._loaded:
+            return False
+        apply(self._boards, self._messages, *args)
+        self.stats['updates'] += 1
+        return True
+
+    def update_balances(self, user_id: int, balance: float, bank_balance: float,
+                        gold_points: Optional[int] = None):
+        """تحديث تصنيفات الأموال بالقيم النهائية بعد حفظها"""
+        self._record(_apply_balances, user_id, balance, bank_balance, gold_points)
+
+    def update_xp(self, user_id: int, xp: int):
+        self._record(_apply_xp, user_id, xp)
+
+    def add_messages(self, chat_id: int, user_id: int, count: int = 1):
+        self._record(_apply_messages, chat_id, user_id, count)
+
+    def mark_stale(self, user_ids: Iterable[int]):
+        """تعليم مستخدمين لإعادة قراءة أرصدتهم عند الاستعلام التالي"""
+        if self._loaded or self._journal is not None:
+            self._stale_users.update(user_ids)
+
+    def invalidate_for_query(self, query: str, params=()):
+        """تعليم المستخدمين الذين قد يغير استعلام كتابة عام أرصدتهم"""
+        if (not self._loaded and self._journal is None) or not _USERS_MONEY_WRITE_PATTERN.match(query):
+            return
+        is_insert = query.lstrip()[:7].upper() in ('INSERT ', 'REPLACE')
+        if is_insert or _USER_ID_FILTER_PATTERN.search(query):
+            if isinstance(params, dict):
+                params = params.values()
+            # المعاملات الصحيحة التي ليست معرفات مستخدمين تُتجاهل عند القراءة
+            self.mark_stale(p for p in params if isinstance(p, int) and not isinstance(p, bool))
+        else:
+            self._resync_needed = True
+
+    # ===== الاستعلامات =====
+
+    async def top(self, category: str, limit: int = 10, chat_id: Optional[int] = None,
+                  min_score: Optional[float] = None) -> List[Tuple[int, Score]]:
+        """أعلى النتائج في تصنيف (أو في رسائل مجموعة)"""
+        await self._ensure_ready()
+        self.stats['queries'] += 1
+        board = self._board(category, chat_id)
+        if board is None:
+            return []
+        entries = board.top(limit)
+        if min_score is None:
+            return entries
+        # التصفية بالحد الأدنى (مثل أرصدة البنك الموجبة فقط) - القائمة مرتبة
+        # تنازلياً فالمستبعدون في آخرها فقط
+        return [(user_id, score) for user_id, score in entries if score > min_score]
+
+    async def rank(self, category: str, user_id: int, chat_id: Optional[int] = None) -> Optional[int]:
+        """ترتيب المستخدم في تصنيف (None = غير مصنف)"""
+        await self._ensure_ready()
+        board = self._board(category, chat_id)
+        if board is None:
+            return None
+        if category in (WEALTH, BANK) and user_id not in board:
+            # مستخدم جديد أُنشئ خارج الخطافات
+            self.mark_stale([user_id])
+            await self._ensure_ready()
+            # قد تستبدل إعادة التحميل اللوحات، فنعيد جلبها
+            board = self._board(category, chat_id)
+            if board is None:
+                return None
+        self.stats['queries'] += 1
+        return board.rank(user_id)
+
+    async def score(self, category: str, user_id: int, chat_id: Optional[int] = None) -> Optional[Score]:
+        await self._ensure_ready()
+        board = self._board(category, chat_id)
+        return board.score(user_id) if board is not None else None
+
+    def _board(self, category: str, chat_id: Optional[int]) -> Optional[Leaderboard]:
+        if category == MESSAGES:
+            return self._messages.get(chat_id)
+        return self._boards.get(category)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """إحصائيات اللوحات للمراقبة"""
+        return dict(
+            self.stats,
+            loaded=self._loaded,
+            backend="sortedcontainers" if SORTED_CONTAINERS_AVAILABLE else "bisect",
+            users=len(self._boards.get(WEALTH, ())),
+            xp_ranked=len(self._boards.get(XP, ())),
+            message_chats=len(self._messages),
+            stale_users=len(self._stale_users),
+        )
+
+
+# النسخة العامة من لوحات الترتيب
+leaderboards = LeaderboardManager()
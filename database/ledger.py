@@ -0,0 +1,282 @@
+"""
+دفتر الأستاذ - حركات الأموال الذرية
+Atomic Economy Ledger
+
+كل عملية مالية (تحويل، راتب، سرقة، إيداع، سحب، شراء، استثمار) تُنفذ كمعاملة
+كتابة واحدة: تحديثات نسبية (balance = balance + ?) مشروطة بكفاية الرصيد،
+وسجلات جدول transactions، وتحويل الأموال الزائدة عن الحد إلى نقاط ذهبية.
+أي شرط فاشل يلغي المعاملة كاملة فلا يبقى تحويل نصف منفذ.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from database.connection_pool import db_pool
+from database.leaderboards import leaderboards
+from database.user_cache import user_cache
+
+# أسباب رفض المعاملة
+REASON_INSUFFICIENT = "insufficient"
+REASON_MISSING = "missing"
+REASON_REJECTED = "rejected"
+REASON_ERROR = "error"
+
+# الرصيد النقدي بعد تحويل الأموال إلى نقاط ذهبية
+RESET_BALANCE = 1000
+
+
+@dataclass
+class LedgerEntry:
+    """حركة على حساب مستخدم واحد داخل معاملة الدفتر"""
+    user_id: int
+    balance_delta: float = 0
+    bank_delta: float = 0
+    # نوع سجل المعاملة (None = بدون سجل في جدول transactions)
+    transaction_type: Optional[str] = None
+    description: str = ""
+    # مبلغ السجل (افتراضياً مجموع التغيير)
+    amount: Optional[float] = None
+    from_user_id: Optional[int] = None
+    to_user_id: Optional[int] = None
+    # السماح بأن يصبح الرصيد سالباً (غرامات وما شابه)
+    allow_negative: bool = False
+    # أعمدة إضافية تُحدث في نفس الصف (أسماء أعمدة ثابتة من الكود فقط)
+    set_fields: Dict[str, Any] = field(default_factory=dict)
+    # شرط إضافي على الصف (مثل فترة انتظار الراتب)
+    condition: str = ""
+    condition_params: Tuple = ()
+
+
+@dataclass
+class LedgerStatement:
+    """كتابة مرافقة على جدول آخر ضمن نفس المعاملة (استثمار، ممتلكات...)"""
+    query: str
+    params: Tuple = ()
+    # إلغاء المعاملة إذا لم يتأثر أي صف (مثل استثمار سُحب بالفعل)
+    must_change: bool = False
+
+
+@dataclass
+class LedgerResult:
+    """نتيجة معاملة الدفتر"""
+    ok: bool
+    # user_id -> الأرصدة النهائية بعد المعاملة
+    balances: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+    # المستخدمون الذين حُولت أموالهم إلى نقاط ذهبية
+    converted: List[int] = field(default_factory=list)
+    reason: Optional[str] = None
+    failed_user_id: Optional[int] = None
+
+    def __bool__(self) -> bool:
+        return self.ok
+
+    def balance(self, user_id: int) -> float:
+        return self.balances.get(user_id, {}).get('balance', 0)
+
+    def bank_balance(self, user_id: int) -> float:
+        return self.balances.get(user_id, {}).get('bank_balance', 0)
+
+
+class _LedgerAbort(Exception):
+    """إلغاء المعاملة مع سبب الرفض"""
+
+    def __init__(self, reason: str, user_id: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.user_id = user_id
+
+
+def _money_limit() -> Tuple[float, int]:
+    """الحد الأقصى للأموال ونقاط التحويل من نظام التصنيف"""
+    try:
+        from modules.ranking_system import MAX_MONEY_LIMIT, GOLD_POINTS_PER_RESET
+        return MAX_MONEY_LIMIT, GOLD_POINTS_PER_RESET
+    except Exception:
+        return 9223372036854775800, 50
+
+
+async def convert_over_limit(db, user_ids: Iterable[int], now: str) -> Dict[int, Dict[str, Any]]:
+    """
+    قراءة الأرصدة النهائية وتحويل من تجاوز الحد إلى نقاط ذهبية
+    (يُستدعى داخل معاملة كتابة مفتوحة)
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return {}
+
+    placeholders = ",".join("?" * len(user_ids))
+    async with db.execute(
+        f"SELECT user_id, balance, bank_balance, gold_points FROM users WHERE user_id IN ({placeholders})",
+        user_ids
+    ) as cursor:
+        rows = await cursor.fetchall()
+
+    max_money, gold_per_reset = _money_limit()
+    balances = {}
+    for row in rows:
+        balance, bank_balance = row[1] or 0, row[2] or 0
+        gold_points = row[3] or 0
+        entry = {'balance': balance, 'bank_balance': bank_balance, 'gold_points': gold_points, 'converted': False}
+        if balance + bank_balance >= max_money:
+            await db.execute(
+                """
+                UPDATE users SET balance = ?, bank_balance = 0,
+                    gold_points = COALESCE(gold_points, 0) + ?, updated_at = ?
+                WHERE user_id = ?
+                """,
+                (RESET_BALANCE, gold_per_reset, now, row[0])
+            )
+            entry.update(balance=RESET_BALANCE, bank_balance=0,
+                         gold_points=gold_points + gold_per_reset, converted=True)
+            logging.info(f"🏆 المستخدم {row[0]} وصل للحد الأقصى! تم تحويل أمواله إلى {gold_per_reset} نقطة ذهبية")
+        balances[row[0]] = entry
+    return balances
+
+
+async def _apply_entry(db, entry: LedgerEntry, now: str):
+    """تنفيذ حركة واحدة مع فحص الشروط"""
+    assignments = ["balance = balance + ?", "bank_balance = bank_balance + ?", "updated_at = ?"]
+    params: List[Any] = [entry.balance_delta, entry.bank_delta, now]
+    for column, value in entry.set_fields.items():
+        assignments.append(f"{column} = ?")
+        params.append(value)
+
+    conditions = ["user_id = ?"]
+    params.append(entry.user_id)
+    if not entry.allow_negative:
+        if entry.balance_delta < 0:
+            conditions.append("balance + ? >= 0")
+            params.append(entry.balance_delta)
+        if entry.bank_delta < 0:
+            conditions.append("bank_balance + ? >= 0")
+            params.append(entry.bank_delta)
+    if entry.condition:
+        conditions.append(f"({entry.condition})")
+        params.extend(entry.condition_params)
+
+    async with db.execute(
+        f"UPDATE users SET {', '.join(assignments)} WHERE {' AND '.join(conditions)}",
+        params
+    ) as cursor:
+        updated = cursor.rowcount
+
+    if updated:
+        return
+
+    # تحديد سبب الرفض لرسالة المستخدم
+    async with db.execute("SELECT balance, bank_balance FROM users WHERE user_id = ?", (entry.user_id,)) as cursor:
+        row = await cursor.fetchone()
+    if row is None:
+        raise _LedgerAbort(REASON_MISSING, entry.user_id)
+    if (not entry.allow_negative
+            and ((row[0] or 0) + entry.balance_delta < 0 or (row[1] or 0) + entry.bank_delta < 0)):
+        raise _LedgerAbort(REASON_INSUFFICIENT, entry.user_id)
+    raise _LedgerAbort(REASON_REJECTED, entry.user_id)
+
+
+async def apply(*entries: LedgerEntry, statements: Iterable[LedgerStatement] = ()) -> LedgerResult:
+    """تنفيذ مجموعة حركات في معاملة واحدة (الكل أو لا شيء)"""
+    statements = list(statements)
+    if not entries and not statements:
+        return LedgerResult(ok=True)
+
+    now = datetime.now().isoformat()
+    try:
+        async with db_pool.writer() as db:
+            for statement in statements:
+                async with db.execute(statement.query, statement.params) as cursor:
+                    if statement.must_change and not cursor.rowcount:
+                        raise _LedgerAbort(REASON_REJECTED, entries[0].user_id if entries else 0)
+
+            for entry in entries:
+                await _apply_entry(db, entry, now)
+
+            transactions = [
+                (entry.user_id, entry.transaction_type,
+                 entry.amount if entry.amount is not None else entry.balance_delta + entry.bank_delta,
+                 entry.description or "", entry.from_user_id, entry.to_user_id, now)
+                for entry in entries if entry.transaction_type
+            ]
+            if transactions:
+                await db.executemany(
+                    """
+                    INSERT INTO transactions (user_id, transaction_type, amount, description,
+                                            from_user_id, to_user_id, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    transactions
+                )
+
+            balances = await convert_over_limit(db, (entry.user_id for entry in entries), now)
+
+    except _LedgerAbort as abort:
+        if abort.reason == REASON_MISSING:
+            logging.warning(f"⚠️ رُفضت معاملة الدفتر: المستخدم {abort.user_id} غير موجود")
+        return LedgerResult(ok=False, reason=abort.reason, failed_user_id=abort.user_id)
+    except Exception as e:
+        logging.error(f"خطأ في تنفيذ معاملة الدفتر: {e}")
+        return LedgerResult(ok=False, reason=REASON_ERROR)
+
+    # تحديث الذاكرة المؤقتة ولوحات الترتيب بالقيم النهائية بعد نجاح الحفظ
+    for entry in entries:
+        fields = dict(entry.set_fields)
+        final = balances.get(entry.user_id)
+        if final is not None:
+            fields.update(balance=final['balance'], bank_balance=final['bank_balance'],
+                          gold_points=final['gold_points'])
+            leaderboards.update_balances(entry.user_id, final['balance'], final['bank_balance'],
+                                         final['gold_points'])
+        user_cache.update_fields(entry.user_id, updated_at=now, **fields)
+
+    return LedgerResult(
+        ok=True,
+        balances=balances,
+        converted=[user_id for user_id, final in balances.items() if final['converted']],
+    )
+
+
+# ===== عمليات شائعة =====
+
+async def credit(user_id: int, amount: float, transaction_type: str, description: str = "",
+                 **kwargs) -> LedgerResult:
+    """إضافة مبلغ إلى الرصيد النقدي"""
+    return await apply(LedgerEntry(user_id, balance_delta=amount, transaction_type=transaction_type,
+                                   description=description, **kwargs))
+
+
+async def debit(user_id: int, amount: float, transaction_type: str, description: str = "",
+                **kwargs) -> LedgerResult:
+    """خصم مبلغ من الرصيد النقدي (يُرفض عند عدم كفاية الرصيد)"""
+    return await apply(LedgerEntry(user_id, balance_delta=-amount, transaction_type=transaction_type,
+                                   description=description, **kwargs))
+
+
+async def transfer(sender_id: int, receiver_id: int, amount: float,
+                   sender_description: str = "", receiver_description: str = "",
+                   transaction_type: str = "transfer", receiver_amount: Optional[float] = None) -> LedgerResult:
+    """تحويل مبلغ نقدي بين مستخدمين (receiver_amount للتحويل مع رسوم)"""
+    received = amount if receiver_amount is None else receiver_amount
+    return await apply(
+        LedgerEntry(sender_id, balance_delta=-amount, transaction_type=transaction_type,
+                    description=sender_description, amount=-amount,
+                    from_user_id=sender_id, to_user_id=receiver_id),
+        LedgerEntry(receiver_id, balance_delta=received, transaction_type=transaction_type,
+                    description=receiver_description, amount=received,
+                    from_user_id=sender_id, to_user_id=receiver_id),
+    )
+
+
+async def deposit(user_id: int, amount: float, description: str = "") -> LedgerResult:
+    """نقل مبلغ من الرصيد النقدي إلى البنك"""
+    return await apply(LedgerEntry(user_id, balance_delta=-amount, bank_delta=amount,
+                                   transaction_type="bank_deposit", description=description, amount=amount,
+                                   from_user_id=user_id, to_user_id=user_id))
+
+
+async def withdraw(user_id: int, amount: float, description: str = "") -> LedgerResult:
+    """نقل مبلغ من البنك إلى الرصيد النقدي"""
+    return await apply(LedgerEntry(user_id, balance_delta=amount, bank_delta=-amount,
+                                   transaction_type="bank_withdraw", description=description, amount=amount,
+                                   from_user_id=user_id, to_user_id=user_id))
@@ -6,26 +6,42 @@ Simplified Database Operations
 import logging
 from datetime import datetime
 from typing import Optional, Dict, Any
-import aiosqlite
+
+from database.connection_pool import db_pool, DEFAULT_DATABASE_PATH
+from database.user_cache import user_cache
+from database.ledger import convert_over_limit
+from database.leaderboards import leaderboards, MESSAGES
 
 # استخدام قاعدة البيانات المحلية مباشرة لتجنب المشاكل الدائرية
-DATABASE_URL = "bot_database.db"
+DATABASE_URL = DEFAULT_DATABASE_PATH
+
+# بدايات الاستعلامات التي تُنفذ على اتصالات القراءة
+READ_ONLY_PREFIXES = ("SELECT", "WITH", "EXPLAIN")
+
+
+def is_read_query(query: str) -> bool:
+    """التحقق مما إذا كان الاستعلام للقراءة فقط"""
+    return query.lstrip().upper().startswith(READ_ONLY_PREFIXES)
 
 
 async def get_user(user_id: int) -> Optional[Dict[str, Any]]:
-    """الحصول على بيانات المستخدم"""
+    """الحصول على بيانات المستخدم (عبر ذاكرة المستخدمين المؤقتة)"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute(
-                "SELECT * FROM users WHERE user_id = ?",
-                (user_id,)
-            )
-            result = await cursor.fetchone()
-            
-            if result:
-                return dict(result)
-            return None
+        cached = user_cache.get(user_id)
+        if cached is not None:
+            return cached
+        
+        generation = user_cache.generation
+        result = await db_pool.fetch_one(
+            "SELECT * FROM users WHERE user_id = ?",
+            (user_id,)
+        )
+        
+        if result:
+            user = dict(result)
+            user_cache.put(user_id, user, generation)
+            return dict(user)
+        return None
             
     except Exception as e:
         logging.error(f"خطأ في الحصول على المستخدم {user_id}: {e}")
@@ -35,7 +51,7 @@ async def get_user(user_id: int) -> Optional[Dict[str, Any]]:
 async def create_user(user_id: int, username: str = "", first_name: str = "") -> bool:
     """إنشاء مستخدم جديد"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             await db.execute(
                 """
                 INSERT INTO users (user_id, username, first_name, balance, bank_balance, created_at, updated_at)
@@ -44,10 +60,11 @@ async def create_user(user_id: int, username: str = "", first_name: str = "") ->
                 (user_id, username or "", first_name or "", 1000, 0, 
                  datetime.now().isoformat(), datetime.now().isoformat())
             )
-            await db.commit()
-            
-            logging.info(f"تم إنشاء مستخدم جديد: {user_id} - {username}")
-            return True
+        user_cache.invalidate(user_id)
+        leaderboards.update_balances(user_id, 1000, 0, 0)
+        
+        logging.info(f"تم إنشاء مستخدم جديد: {user_id} - {username}")
+        return True
             
     except Exception as e:
         logging.error(f"خطأ في إنشاء المستخدم {user_id}: {e}")
@@ -90,13 +107,14 @@ async def require_user_registration(user_id: int) -> bool:
 async def update_user_activity(user_id: int) -> bool:
     """تحديث آخر نشاط للمستخدم"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        now = datetime.now().isoformat()
+        async with db_pool.writer() as db:
             await db.execute(
                 "UPDATE users SET updated_at = ? WHERE user_id = ?",
-                (datetime.now().isoformat(), user_id)
+                (now, user_id)
             )
-            await db.commit()
-            return True
+        user_cache.update_fields(user_id, updated_at=now)
+        return True
             
     except Exception as e:
         logging.error(f"خطأ في تحديث نشاط المستخدم {user_id}: {e}")
@@ -104,23 +122,25 @@ async def update_user_activity(user_id: int) -> bool:
 
 
 async def update_user_balance(user_id: int, new_balance: float) -> bool:
-    """تحديث رصيد المستخدم مع فحص الحد الأقصى"""
+    """تحديث رصيد المستخدم (قيمة مطلقة) مع فحص الحد الأقصى - للحركات النسبية استخدم database.ledger"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        now = datetime.now().isoformat()
+        async with db_pool.writer() as db:
             await db.execute(
                 "UPDATE users SET balance = ?, updated_at = ? WHERE user_id = ?",
-                (new_balance, datetime.now().isoformat(), user_id)
+                (new_balance, now, user_id)
             )
-            await db.commit()
+            # فحص الحد الأقصى للأموال ضمن نفس المعاملة
+            final = (await convert_over_limit(db, [user_id], now)).get(user_id)
+        
+        if final is not None:
+            user_cache.update_fields(user_id, balance=final['balance'], bank_balance=final['bank_balance'],
+                                     gold_points=final['gold_points'], updated_at=now)
+            leaderboards.update_balances(user_id, final['balance'], final['bank_balance'], final['gold_points'])
+        else:
+            user_cache.update_fields(user_id, balance=new_balance, updated_at=now)
             
-            # فحص الحد الأقصى للأموال
-            try:
-                from modules.ranking_system import check_money_limit_and_convert
-                await check_money_limit_and_convert(user_id)
-            except Exception as ranking_error:
-                logging.error(f"خطأ في فحص نظام التصنيف: {ranking_error}")
-                
-            return True
+        return True
             
     except Exception as e:
         logging.error(f"خطأ في تحديث رصيد المستخدم {user_id}: {e}")
@@ -130,21 +150,23 @@ async def update_user_balance(user_id: int, new_balance: float) -> bool:
 async def update_user_bank_balance(user_id: int, new_bank_balance: float) -> bool:
     """تحديث رصيد البنك للمستخدم مع فحص الحد الأقصى"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        now = datetime.now().isoformat()
+        async with db_pool.writer() as db:
             await db.execute(
                 "UPDATE users SET bank_balance = ?, updated_at = ? WHERE user_id = ?",
-                (new_bank_balance, datetime.now().isoformat(), user_id)
+                (new_bank_balance, now, user_id)
             )
-            await db.commit()
-            
-            # فحص الحد الأقصى للأموال
-            try:
-                from modules.ranking_system import check_money_limit_and_convert
-                await check_money_limit_and_convert(user_id)
-            except Exception as ranking_error:
-                logging.error(f"خطأ في فحص نظام التصنيف: {ranking_error}")
+            # فحص الحد الأقصى للأموال ضمن نفس المعاملة
+            final = (await convert_over_limit(db, [user_id], now)).get(user_id)
+        
+        if final is not None:
+            user_cache.update_fields(user_id, balance=final['balance'], bank_balance=final['bank_balance'],
+                                     gold_points=final['gold_points'], updated_at=now)
+            leaderboards.update_balances(user_id, final['balance'], final['bank_balance'], final['gold_points'])
+        else:
+            user_cache.update_fields(user_id, bank_balance=new_bank_balance, updated_at=now)
             
-            return True
+        return True
             
     except Exception as e:
         logging.error(f"خطأ في تحديث رصيد البنك للمستخدم {user_id}: {e}")
@@ -156,7 +178,7 @@ async def add_transaction(user_id: int = None, transaction_type: str = "general"
                          to_user_id: Optional[int] = None) -> bool:
     """إضافة معاملة جديدة"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             await db.execute(
                 """
                 INSERT INTO transactions (user_id, transaction_type, amount, description, 
@@ -166,8 +188,7 @@ async def add_transaction(user_id: int = None, transaction_type: str = "general"
                 (user_id, transaction_type, amount, description or "", 
                  from_user_id, to_user_id, datetime.now().isoformat())
             )
-            await db.commit()
-            return True
+        return True
             
     except Exception as e:
         logging.error(f"خطأ في إضافة المعاملة: {e}")
@@ -185,23 +206,31 @@ async def is_user_banned(user_id: int) -> bool:
 
 
 async def execute_query(query: str, params: tuple = (), fetch_one: bool = False, fetch_all: bool = False):
-    """تنفيذ استعلام قاعدة البيانات"""
+    """تنفيذ استعلام قاعدة البيانات عبر مجمع الاتصالات"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
-            db.row_factory = aiosqlite.Row
-            
-            async with db.execute(query, params) as cursor:
-                if fetch_one:
-                    result = await cursor.fetchone()
-                    await db.commit()
-                    return dict(result) if result else None
-                elif fetch_all:
-                    results = await cursor.fetchall()
-                    await db.commit()
-                    return [dict(row) for row in results]
-                else:
-                    await db.commit()
-                    return cursor.rowcount
+        if is_read_query(query):
+            if fetch_one:
+                result = await db_pool.fetch_one(query, params)
+                return dict(result) if result else None
+            elif fetch_all:
+                results = await db_pool.fetch_all(query, params)
+                return [dict(row) for row in results]
+        
+        try:
+            async with db_pool.writer() as db:
+                async with db.execute(query, params) as cursor:
+                    if fetch_one:
+                        result = await cursor.fetchone()
+                        return dict(result) if result else None
+                    elif fetch_all:
+                        results = await cursor.fetchall()
+                        return [dict(row) for row in results]
+                    else:
+                        return cursor.rowcount
+        finally:
+            # أي كتابة على جدول users تلغي الصفوف المخزنة المتأثرة
+            user_cache.invalidate_for_query(query, params)
+            leaderboards.invalidate_for_query(query, params)
                     
     except Exception as e:
         logging.error(f"خطأ في تنفيذ الاستعلام: {e}")
@@ -249,7 +278,7 @@ async def increment_user_message_count(user_id: int, chat_id: int) -> bool:
         
         # إذا لم يتم التحديث (السجل غير موجود)، أنشئ سجل جديد
         if result == 0:
-            await execute_query(
+            result = await execute_query(
                 """
                 INSERT OR IGNORE INTO user_message_count 
                 (user_id, chat_id, message_count, first_message_date, last_message_date)
@@ -258,6 +287,9 @@ async def increment_user_message_count(user_id: int, chat_id: int) -> bool:
                 (user_id, chat_id, current_time, current_time)
             )
         
+        if result:
+            leaderboards.add_messages(chat_id, user_id, 1)
+        
         return True
         
     except Exception as e:
@@ -266,22 +298,19 @@ async def increment_user_message_count(user_id: int, chat_id: int) -> bool:
 
 
 async def get_group_message_ranking(chat_id: int, limit: int = 10) -> list:
-    """الحصول على ترتيب المستخدمين حسب عدد الرسائل في المجموعة"""
+    """الحصول على ترتيب المستخدمين حسب عدد الرسائل في المجموعة (من لوحة الترتيب)"""
     try:
-        result = await execute_query(
-            """
-            SELECT umc.user_id, umc.message_count, u.first_name, u.username
-            FROM user_message_count umc
-            LEFT JOIN users u ON umc.user_id = u.user_id
-            WHERE umc.chat_id = ? AND umc.message_count > 0
-            ORDER BY umc.message_count DESC
-            LIMIT ?
-            """,
-            (chat_id, limit),
-            fetch_all=True
-        )
+        top = await leaderboards.top(MESSAGES, limit, chat_id=chat_id)
+        if not top:
+            return []
         
-        return result if result else []
+        names = await get_users_display_info([user_id for user_id, _ in top])
+        return [
+            dict(user_id=user_id, message_count=count,
+                 first_name=names.get(user_id, {}).get('first_name'),
+                 username=names.get(user_id, {}).get('username'))
+            for user_id, count in top
+        ]
         
     except Exception as e:
         logging.error(f"خطأ في الحصول على ترتيب الرسائل للمجموعة {chat_id}: {e}")
@@ -291,30 +320,13 @@ async def get_group_message_ranking(chat_id: int, limit: int = 10) -> list:
 async def get_user_message_rank(user_id: int, chat_id: int) -> tuple:
     """الحصول على ترتيب المستخدم وعدد رسائله في المجموعة"""
     try:
-        # الحصول على عدد رسائل المستخدم
-        user_count = await get_user_message_count(user_id, chat_id)
-        
-        # الحصول على ترتيب المستخدم
-        rank_result = await execute_query(
-            """
-            SELECT COUNT(*) + 1 as user_rank
-            FROM user_message_count 
-            WHERE chat_id = ? AND message_count > (
-                SELECT COALESCE(message_count, 0)
-                FROM user_message_count 
-                WHERE user_id = ? AND chat_id = ?
-            )
-            """,
-            (chat_id, user_id, chat_id),
-            fetch_one=True
-        )
-        
-        user_rank = rank_result.get('user_rank', 0) if rank_result else 0
+        user_count = await leaderboards.score(MESSAGES, user_id, chat_id=chat_id) or 0
         
         # إذا كان عدد الرسائل 0، الترتيب يكون 0 أيضاً
         if user_count == 0:
-            user_rank = 0
-            
+            return 0, 0
+        
+        user_rank = await leaderboards.rank(MESSAGES, user_id, chat_id=chat_id) or 0
         return user_count, user_rank
         
     except Exception as e:
@@ -322,26 +334,36 @@ async def get_user_message_rank(user_id: int, chat_id: int) -> tuple:
         return 0, 0
 
 
+async def get_users_display_info(user_ids: list) -> Dict[int, Dict[str, Any]]:
+    """أسماء وأرصدة مجموعة مستخدمين باستعلام واحد (لعرض لوحات الترتيب)"""
+    if not user_ids:
+        return {}
+    placeholders = ",".join("?" * len(user_ids))
+    rows = await db_pool.fetch_all(
+        f"SELECT user_id, username, first_name, balance, bank_balance, gold_points FROM users WHERE user_id IN ({placeholders})",
+        tuple(user_ids)
+    )
+    return {row['user_id']: dict(row) for row in rows}
+
+
 async def get_all_group_members(group_id: int) -> list:
     """الحصول على جميع الأعضاء المسجلين في المجموعة"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
-            cursor = await db.execute(
-                """
-                SELECT DISTINCT user_id FROM users 
-                WHERE user_id IS NOT NULL
-                AND user_id NOT IN (SELECT user_id FROM users WHERE is_banned = 1)
-                ORDER BY updated_at DESC
-                LIMIT 500
-                """,
-            )
-            results = await cursor.fetchall()
-            
-            # استخراج معرفات المستخدمين من النتائج
-            member_ids = [row[0] for row in results if row[0] is not None]
-            
-            logging.info(f"تم العثور على {len(member_ids)} عضو مسجل للمجموعة {group_id}")
-            return member_ids
+        results = await db_pool.fetch_all(
+            """
+            SELECT DISTINCT user_id FROM users 
+            WHERE user_id IS NOT NULL
+            AND user_id NOT IN (SELECT user_id FROM users WHERE is_banned = 1)
+            ORDER BY updated_at DESC
+            LIMIT 500
+            """
+        )
+        
+        # استخراج معرفات المستخدمين من النتائج
+        member_ids = [row[0] for row in results if row[0] is not None]
+        
+        logging.info(f"تم العثور على {len(member_ids)} عضو مسجل للمجموعة {group_id}")
+        return member_ids
             
     except Exception as e:
         logging.error(f"خطأ في الحصول على أعضاء المجموعة {group_id}: {e}")
@@ -0,0 +1,328 @@
+"""
+محرك الاحتفاظ بالبيانات لجداول الذاكرة
+Bounded, Indexed Retention Engine for Conversation Memory Tables
+
+يحافظ على حجم ثابت لجداول الذاكرة المتنامية:
+- حلقة دائرية لكل محادثة في shared_conversations و topic_links
+- آخر N محادثات لكل (مستخدم، محادثة) في conversation_history
+- تجميع الرسائل القديمة قبل حذفها في ملخصات مواضيع مدمجة لكل مستخدم
+- فهارس مركبة تغطي استعلامات السياق وتفريغ تدريجي للمساحة المحررة
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, Optional
+
+from database.connection_pool import db_pool
+
+# الحد الأقصى للرسائل المحفوظة لكل مجموعة في الذاكرة المشتركة
+SHARED_CONVERSATIONS_PER_CHAT = 2000
+
+# الحد الأقصى لصفوف روابط المواضيع القديمة لكل مجموعة
+TOPIC_LINKS_PER_CHAT = 500
+
+# عدد المحادثات المحفوظة لكل (مستخدم، محادثة) في ذاكرة المحادثات
+CONVERSATION_HISTORY_PER_USER = 50
+
+# عدد المواضيع المحفوظة لكل مستخدم في كل مجموعة (الأكثر تكراراً)
+TOPICS_PER_USER = 50
+
+# عدد المواضيع في الملخص المدمج
+SUMMARY_TOPICS = 15
+
+# الفاصل بين دورات الصيانة (ثواني)
+RETENTION_INTERVAL = 3600
+
+# تأخير أول دورة بعد التشغيل (ثواني)
+RETENTION_START_DELAY = 120
+
+# عدد الصفحات المحررة التي تُعاد للنظام في كل دورة
+INCREMENTAL_VACUUM_PAGES = 2000
+
+# الفهارس المركبة لاستعلامات السياق
+RETENTION_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_shared_conv_chat_user_ts "
+    "ON shared_conversations(chat_id, user_id, timestamp DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_shared_conv_chat_ts "
+    "ON shared_conversations(chat_id, timestamp DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_conversation_user_chat_ts "
+    "ON conversation_history(user_id, chat_id, timestamp DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_topic_links_chat_ts "
+    "ON topic_links(chat_id, timestamp DESC)",
+)
+
+
+class RetentionEngine:
+    """صيانة دورية لجداول الذاكرة: حذف دائري، تجميع، فهرسة، وتفريغ"""
+
+    def __init__(self, interval: float = RETENTION_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._prepared = False
+        self.stats = {
+            'runs': 0,
+            'shared_rows_deleted': 0,
+            'history_rows_deleted': 0,
+            'topic_links_deleted': 0,
+            'topic_stats_pruned': 0,
+            'summaries_updated': 0,
+            'vacuumed_pages': 0,
+            'last_run_ms': 0.0,
+            'errors': 0,
+        }
+
+    # ===== دورة الحياة =====
+
+    def start(self):
+        """تشغيل حلقة الصيانة في الخلفية"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self):
+        """إيقاف حلقة الصيانة"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _loop(self):
+        """حلقة الصيانة الدورية"""
+        await asyncio.sleep(RETENTION_START_DELAY)
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval)
+
+    # ===== التحضير =====
+
+    async def _existing_tables(self, db) -> set:
+        """أسماء الجداول الموجودة في قاعدة البيانات"""
+        async with db.execute("SELECT name FROM sqlite_master WHERE type = 'table'") as cursor:
+            return {row[0] for row in await cursor.fetchall()}
+
+    async def prepare(self, allow_vacuum: bool = False):
+        """إنشاء الفهارس وجدول الملخصات وتفعيل التفريغ التدريجي (مرة واحدة)
+
+        VACUUM الكامل يقفل قاعدة البيانات طوال مدته، لذلك لا يُنفذ إلا عند بدء
+        التشغيل قبل استقبال التحديثات (allow_vacuum=True)، وتتخطاه الدورات الدورية.
+        """
+        if self._prepared:
+            return
+
+        async with db_pool.writer() as db:
+            tables = await self._existing_tables(db)
+            for statement in RETENTION_INDEXES:
+                table = statement.split(" ON ")[1].split("(")[0]
+                if table in tables:
+                    await db.execute(statement)
+
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS user_topic_summaries (
+                    chat_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    top_topics TEXT,
+                    archived_messages INTEGER DEFAULT 0,
+                    first_seen DATETIME,
+                    last_seen DATETIME,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (chat_id, user_id)
+                )
+            ''')
+            if 'topic_user_stats' in tables:
+                await db.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_topic_user_stats_user "
+                    "ON topic_user_stats(chat_id, user_id, mention_count DESC)"
+                )
+
+        await self._enable_incremental_vacuum(allow_vacuum)
+        self._prepared = True
+
+    async def _enable_incremental_vacuum(self, allow_vacuum: bool):
+        """تحويل قاعدة البيانات إلى وضع التفريغ التدريجي (يتطلب VACUUM كامل لمرة واحدة)"""
+        row = await db_pool.fetch_one("PRAGMA auto_vacuum")
+        if row and row[0] == 2:
+            return
+        if not allow_vacuum:
+            logging.warning("⚠️ التفريغ التدريجي غير مفعل، سيتم تحويل قاعدة البيانات عند بدء التشغيل القادم")
+            return
+
+        async with db_pool.writer() as db:
+            await db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            await db.commit()
+            await db.execute("VACUUM")
+        logging.info("✅ تم تفعيل التفريغ التدريجي لقاعدة البيانات")
+
+    # ===== الصيانة =====
+
+    async def run_once(self) -> Dict:
+        """تنفيذ دورة صيانة كاملة"""
+        started = time.perf_counter()
+        try:
+            await self.prepare()
+
+            async with db_pool.writer() as db:
+                tables = await self._existing_tables(db)
+                if 'shared_conversations' in tables:
+                    await self._trim_shared_conversations(db, tables)
+                if 'topic_user_stats' in tables:
+                    await self._prune_topic_stats(db)
+                if 'topic_links' in tables:
+                    await self._trim_topic_links(db)
+                if 'conversation_history' in tables:
+                    await self._trim_conversation_history(db)
+
+            # إعادة الصفحات المحررة للنظام تدريجياً
+            row = await db_pool.fetch_one("PRAGMA freelist_count")
+            pages = min(row[0] if row else 0, INCREMENTAL_VACUUM_PAGES)
+            if pages:
+                async with db_pool.writer() as db:
+                    await db.execute(f"PRAGMA incremental_vacuum({pages})")
+                self.stats['vacuumed_pages'] += pages
+
+            self.stats['runs'] += 1
+        except Exception as e:
+            self.stats['errors'] += 1
+            logging.error(f"خطأ في دورة صيانة جداول الذاكرة: {e}")
+        finally:
+            self.stats['last_run_ms'] = round((time.perf_counter() - started) * 1000, 2)
+
+        return self.get_stats()
+
+    async def _trim_shared_conversations(self, db, tables: set):
+        """حلقة دائرية لكل مجموعة: تجميع الرسائل الأقدم في الملخصات ثم حذفها"""
+        async with db.execute(
+            "SELECT chat_id FROM shared_conversations GROUP BY chat_id HAVING COUNT(*) > ?",
+            (SHARED_CONVERSATIONS_PER_CHAT,)
+        ) as cursor:
+            chats = [row[0] for row in await cursor.fetchall()]
+
+        for chat_id in chats:
+            async with db.execute(
+                "SELECT timestamp FROM shared_conversations WHERE chat_id = ? "
+                "ORDER BY timestamp DESC LIMIT 1 OFFSET ?",
+                (chat_id, SHARED_CONVERSATIONS_PER_CHAT - 1)
+            ) as cursor:
+                row = await cursor.fetchone()
+            if not row:
+                continue
+            cutoff = row[0]
+
+            # تجميع الرسائل التي ستُحذف لكل مستخدم
+            async with db.execute(
+                "SELECT user_id, COUNT(*), MIN(timestamp), MAX(timestamp) FROM shared_conversations "
+                "WHERE chat_id = ? AND timestamp < ? GROUP BY user_id",
+                (chat_id, cutoff)
+            ) as cursor:
+                archived = await cursor.fetchall()
+
+            for user_id, count, first_seen, last_seen in archived:
+                top_topics = await self._top_topics(db, chat_id, user_id, tables)
+                await db.execute('''
+                    INSERT INTO user_topic_summaries
+                    (chat_id, user_id, top_topics, archived_messages, first_seen, last_seen, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT(chat_id, user_id) DO UPDATE SET
+                        top_topics = excluded.top_topics,
+                        archived_messages = archived_messages + excluded.archived_messages,
+                        first_seen = MIN(COALESCE(first_seen, excluded.first_seen), excluded.first_seen),
+                        last_seen = MAX(COALESCE(last_seen, excluded.last_seen), excluded.last_seen),
+                        updated_at = CURRENT_TIMESTAMP
+                ''', (chat_id, user_id, json.dumps(top_topics, ensure_ascii=False),
+                      count, first_seen, last_seen))
+            self.stats['summaries_updated'] += len(archived)
+
+            async with db.execute(
+                "DELETE FROM shared_conversations WHERE chat_id = ? AND timestamp < ?",
+                (chat_id, cutoff)
+            ) as cursor:
+                self.stats['shared_rows_deleted'] += cursor.rowcount
+
+    async def _top_topics(self, db, chat_id: int, user_id: int, tables: set) -> list:
+        """أكثر مواضيع المستخدم تكراراً من عدادات المواضيع المجمعة"""
+        if 'topic_user_stats' not in tables:
+            return []
+        async with db.execute(
+            "SELECT topic FROM topic_user_stats WHERE chat_id = ? AND user_id = ? "
+            "ORDER BY mention_count DESC LIMIT ?",
+            (chat_id, user_id, SUMMARY_TOPICS)
+        ) as cursor:
+            return [row[0] for row in await cursor.fetchall()]
+
+    async def _prune_topic_stats(self, db):
+        """الإبقاء على أكثر المواضيع تكراراً لكل مستخدم فقط"""
+        async with db.execute('''
+            DELETE FROM topic_user_stats WHERE rowid IN (
+                SELECT rowid FROM (
+                    SELECT rowid, ROW_NUMBER() OVER (
+                        PARTITION BY chat_id, user_id
+                        ORDER BY mention_count DESC, last_seen DESC
+                    ) AS rank
+                    FROM topic_user_stats
+                ) WHERE rank > ?
+            )
+        ''', (TOPICS_PER_USER,)) as cursor:
+            self.stats['topic_stats_pruned'] += cursor.rowcount
+
+    async def _trim_topic_links(self, db):
+        """حلقة دائرية لروابط المواضيع القديمة (تم نقل عداداتها إلى topic_user_stats)"""
+        async with db.execute('''
+            DELETE FROM topic_links WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY chat_id ORDER BY timestamp DESC, id DESC
+                    ) AS rank
+                    FROM topic_links
+                ) WHERE rank > ?
+            )
+        ''', (TOPIC_LINKS_PER_CHAT,)) as cursor:
+            self.stats['topic_links_deleted'] += cursor.rowcount
+
+    async def _trim_conversation_history(self, db):
+        """الإبقاء على آخر N محادثات لكل (مستخدم، محادثة)"""
+        async with db.execute('''
+            DELETE FROM conversation_history WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY user_id, COALESCE(chat_id, 0)
+                        ORDER BY timestamp DESC, id DESC
+                    ) AS rank
+                    FROM conversation_history
+                ) WHERE rank > ?
+            )
+        ''', (CONVERSATION_HISTORY_PER_USER,)) as cursor:
+            self.stats['history_rows_deleted'] += cursor.rowcount
+
+    # ===== القراءة =====
+
+    async def get_user_topic_summary(self, chat_id: int, user_id: int) -> Optional[Dict]:
+        """ملخص المواضيع المؤرشفة لمستخدم في مجموعة (قراءة صف واحد)"""
+        try:
+            row = await db_pool.fetch_one(
+                "SELECT top_topics, archived_messages, first_seen, last_seen "
+                "FROM user_topic_summaries WHERE chat_id = ? AND user_id = ?",
+                (chat_id, user_id)
+            )
+        except Exception:
+            # الجدول لم يُنشأ بعد (قبل أول دورة صيانة)
+            return None
+        if not row:
+            return None
+        return {
+            'top_topics': json.loads(row[0]) if row[0] else [],
+            'archived_messages': row[1],
+            'first_seen': row[2],
+            'last_seen': row[3],
+        }
+
+    def get_stats(self) -> Dict:
+        """إحصائيات محرك الاحتفاظ للمراقبة"""
+        return dict(self.stats, running=bool(self._task and not self._task.done()))
+
+
+# النسخة العامة من المحرك
+retention_engine = RetentionEngine()
@@ -2,12 +2,11 @@
 🧠 عمليات قاعدة البيانات لنظام تحليل المستخدمين
 """
 
-import aiosqlite
 import json
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Tuple
-from config.database import DATABASE_URL
+from database.connection_pool import db_pool
 
 
 class UserAnalysisOperations:
@@ -17,8 +16,7 @@ class UserAnalysisOperations:
     async def get_user_analysis(user_id: int) -> Optional[Dict[str, Any]]:
         """الحصول على تحليل المستخدم"""
         try:
-            async with aiosqlite.connect(DATABASE_URL) as db:
-                db.row_factory = aiosqlite.Row
+            async with db_pool.reader() as db:
                 cursor = await db.execute(
                     "SELECT * FROM user_analysis WHERE user_id = ?",
                     (user_id,)
@@ -43,7 +41,7 @@ class UserAnalysisOperations:
     async def create_user_analysis(user_id: int) -> bool:
         """إنشاء ملف تحليل جديد للمستخدم"""
         try:
-            async with aiosqlite.connect(DATABASE_URL) as db:
+            async with db_pool.writer() as db:
                 # إنشاء تحليل أساسي للمستخدم
                 await db.execute("""
                     INSERT OR IGNORE INTO user_analysis (
@@ -57,7 +55,6 @@ class UserAnalysisOperations:
                     datetime.now().isoformat(),
                     datetime.now().isoformat()
                 ))
-                await db.commit()
                 return True
                 
         except Exception as e:
@@ -68,9 +65,10 @@ class UserAnalysisOperations:
     async def update_user_personality(user_id: int, personality_updates: Dict[str, float]) -> bool:
         """تحديث نقاط الشخصية للمستخدم"""
         try:
-            async with aiosqlite.connect(DATABASE_URL) as db:
-                # التأكد من وجود التحليل
-                await UserAnalysisOperations.create_user_analysis(user_id)
+            # التأكد من وجود التحليل
+            await UserAnalysisOperations.create_user_analysis(user_id)
+            
+            async with db_pool.writer() as db:
                 
                 # تحديث نقاط الشخصية
                 set_clauses = []
@@ -91,7 +89,6 @@ class UserAnalysisOperations:
                         WHERE user_id = ?
                     """
                     await db.execute(query, values)
-                    await db.commit()
                     return True
                 return False
                     
@@ -103,9 +100,10 @@ class UserAnalysisOperations:
     async def update_user_interests(user_id: int, interest_updates: Dict[str, float]) -> bool:
         """تحديث اهتمامات المستخدم"""
         try:
-            async with aiosqlite.connect(DATABASE_URL) as db:
-                # التأكد من وجود التحليل
-                await UserAnalysisOperations.create_user_analysis(user_id)
+            # التأكد من وجود التحليل
+            await UserAnalysisOperations.create_user_analysis(user_id)
+            
+            async with db_pool.writer() as db:
                 
                 # تحديث نقاط الاهتمامات
                 set_clauses = []
@@ -126,7 +124,6 @@ class UserAnalysisOperations:
                         WHERE user_id = ?
                     """
                     await db.execute(query, values)
-                    await db.commit()
                     return True
                 return False
                     
@@ -138,9 +135,10 @@ class UserAnalysisOperations:
     async def update_user_mood(user_id: int, mood: str, sentiment_score: float = 0.0) -> bool:
         """تحديث الحالة المزاجية للمستخدم"""
         try:
-            async with aiosqlite.connect(DATABASE_URL) as db:
-                # التأكد من وجود التحليل
-                await UserAnalysisOperations.create_user_analysis(user_id)
+            # التأكد من وجود التحليل
+            await UserAnalysisOperations.create_user_analysis(user_id)
+            
+            async with db_pool.writer() as db:
                 
                 # الحصول على تاريخ المزاج الحالي
                 cursor = await db.execute(
@@ -172,7 +170,6 @@ class UserAnalysisOperations:
                     WHERE user_id = ?
                 """, (mood, json.dumps(mood_history), datetime.now().isoformat(), user_id))
                 
-                await db.commit()
                 return True
                 
         except Exception as e:
@@ -185,7 +182,7 @@ class UserAnalysisOperations:
                             context_users: Optional[List[int]] = None, context_location: Optional[str] = None) -> bool:
         """إضافة ذكرى جديدة للمستخدم"""
         try:
-            async with aiosqlite.connect(DATABASE_URL) as db:
+            async with db_pool.writer() as db:
                 memory_summary = UserAnalysisOperations._generate_memory_summary(memory_type, memory_data)
                 
                 await db.execute("""
@@ -201,7 +198,6 @@ class UserAnalysisOperations:
                     context_location, datetime.now().isoformat()
                 ))
                 
-                await db.commit()
                 return True
                 
         except Exception as e:
@@ -213,8 +209,7 @@ class UserAnalysisOperations:
                               limit: int = 10, min_importance: float = 0.0) -> List[Dict[str, Any]]:
         """الحصول على ذكريات المستخدم"""
         try:
-            async with aiosqlite.connect(DATABASE_URL) as db:
-                db.row_factory = aiosqlite.Row
+            async with db_pool.reader() as db:
                 
                 query = """
                     SELECT * FROM user_memories 
@@ -255,7 +250,7 @@ class UserAnalysisOperations:
             if user1_id > user2_id:
                 user1_id, user2_id = user2_id, user1_id
             
-            async with aiosqlite.connect(DATABASE_URL) as db:
+            async with db_pool.writer() as db:
                 # البحث عن العلاقة الموجودة
                 cursor = await db.execute("""
                     SELECT * FROM user_relationships 
@@ -286,7 +281,6 @@ class UserAnalysisOperations:
                         datetime.now().isoformat(), datetime.now().isoformat()
                     ))
                 
-                await db.commit()
                 return True
                 
         except Exception as e:
@@ -303,7 +297,7 @@ class UserAnalysisOperations:
             hour_of_day = now.hour
             day_of_week = now.weekday()
             
-            async with aiosqlite.connect(DATABASE_URL) as db:
+            async with db_pool.writer() as db:
                 await db.execute("""
                     INSERT INTO analysis_statistics (
                         user_id, chat_id, activity_type, activity_details,
@@ -317,7 +311,6 @@ class UserAnalysisOperations:
                     now.isoformat()
                 ))
                 
-                await db.commit()
                 return True
                 
         except Exception as e:
@@ -328,7 +321,7 @@ class UserAnalysisOperations:
     async def is_analysis_enabled(chat_id: int) -> bool:
         """التحقق من تفعيل التحليل في المجموعة"""
         try:
-            async with aiosqlite.connect(DATABASE_URL) as db:
+            async with db_pool.reader() as db:
                 cursor = await db.execute(
                     "SELECT analysis_enabled FROM group_analysis_settings WHERE chat_id = ?",
                     (chat_id,)
@@ -347,7 +340,7 @@ class UserAnalysisOperations:
                                reason: Optional[str] = None) -> bool:
         """تفعيل/إيقاف التحليل في المجموعة"""
         try:
-            async with aiosqlite.connect(DATABASE_URL) as db:
+            async with db_pool.writer() as db:
                 await db.execute("""
                     INSERT OR REPLACE INTO group_analysis_settings (
                         chat_id, analysis_enabled, last_modified_by,
@@ -358,7 +351,6 @@ class UserAnalysisOperations:
                     datetime.now().isoformat(), reason, False
                 ))
                 
-                await db.commit()
                 return True
                 
         except Exception as e:
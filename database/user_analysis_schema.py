@@ -2,15 +2,14 @@
 🧠 نظام تحليل المستخدمين المتقدم - جداول قاعدة البيانات
 """
 
-import aiosqlite
 import logging
 from datetime import datetime
-from config.database import DATABASE_URL
+from database.connection_pool import db_pool
 
 async def create_user_analysis_tables():
     """إنشاء جميع جداول نظام تحليل المستخدمين"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             
             # 📊 جدول التحليل الأساسي للمستخدمين
             await db.execute('''
@@ -209,7 +208,6 @@ async def create_user_analysis_tables():
             await db.execute("CREATE INDEX IF NOT EXISTS idx_user_predictions_user_type ON user_predictions(user_id, prediction_type)")
             await db.execute("CREATE INDEX IF NOT EXISTS idx_user_predictions_expires ON user_predictions(expires_at)")
             
-            await db.commit()
             print("✅ تم إنشاء جداول نظام تحليل المستخدمين بنجاح!")
             
             # فحص الجداول المنشأة
@@ -228,14 +226,13 @@ async def create_user_analysis_tables():
 async def drop_analysis_tables():
     """حذف جميع جداول التحليل (للتطوير فقط)"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             await db.execute("DROP TABLE IF EXISTS user_predictions")
             await db.execute("DROP TABLE IF EXISTS analysis_statistics")
             await db.execute("DROP TABLE IF EXISTS group_analysis_settings")
             await db.execute("DROP TABLE IF EXISTS user_relationships")
             await db.execute("DROP TABLE IF EXISTS user_memories")
             await db.execute("DROP TABLE IF EXISTS user_analysis")
-            await db.commit()
             print("🗑️ تم حذف جداول نظام التحليل")
     except Exception as e:
         print(f"❌ خطأ في حذف جداول التحليل: {e}")
@@ -0,0 +1,137 @@
+"""
+ذاكرة التخزين المؤقت لصفوف المستخدمين
+In-Memory Read-Through Cache for User Rows
+
+ذاكرة LRU مع مدة صلاحية (TTL) لكل عملية، مفتاحها user_id، تقرأ من خلالها
+دوال database/operations.py. كل تحديث للرصيد أو البنك أو الحظر يحدّث
+النسخة المخزنة مباشرة أو يلغيها.
+"""
+
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+# الحد الأقصى لعدد المستخدمين المخزنين
+DEFAULT_MAX_SIZE = 5000
+
+# مدة صلاحية الصف المخزن (بالثواني)
+DEFAULT_TTL = 60.0
+
+# استعلامات الكتابة التي تمس جدول المستخدمين
+_USERS_WRITE_PATTERN = re.compile(
+    r'^\s*(?:UPDATE(?:\s+OR\s+\w+)?|INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|DELETE\s+FROM)\s+users\b',
+    re.IGNORECASE
+)
+
+# شرط WHERE يحدد المستخدم بمعرّفه
+_USER_ID_FILTER_PATTERN = re.compile(r'\bWHERE\b.*\buser_id\s*(?:=|IN\b)', re.IGNORECASE | re.DOTALL)
+
+
+class UserCache:
+    """ذاكرة LRU + TTL لصفوف جدول users"""
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, ttl: float = DEFAULT_TTL):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        # يزداد مع كل كتابة لمنع تخزين صف قُرئ قبل تعديل متزامن
+        self.generation = 0
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+            'updates': 0,
+        }
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """إرجاع نسخة من الصف المخزن أو None عند عدم وجوده أو انتهاء صلاحيته"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+
+        row, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[user_id]
+            self.stats['expirations'] += 1
+            self.stats['misses'] += 1
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.stats['hits'] += 1
+        # نسخة حتى لا يعدل المستدعي الصف المخزن
+        return dict(row)
+
+    def put(self, user_id: int, row: Dict[str, Any], generation: Optional[int] = None):
+        """تخزين صف المستخدم مع إخراج الأقدم استخداماً عند الامتلاء"""
+        if generation is not None and generation != self.generation:
+            # حدثت كتابة أثناء القراءة - الصف المقروء قد يكون قديماً
+            return
+        self._entries[user_id] = (dict(row), time.monotonic() + self.ttl)
+        self._entries.move_to_end(user_id)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def update_fields(self, user_id: int, **fields):
+        """تحديث حقول صف مخزن في مكانه (بدون تمديد صلاحيته)"""
+        self.generation += 1
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+        entry[0].update(fields)
+        self.stats['updates'] += 1
+
+    def invalidate(self, user_id: int):
+        """إلغاء الصف المخزن لمستخدم واحد"""
+        self.generation += 1
+        if self._entries.pop(user_id, None) is not None:
+            self.stats['invalidations'] += 1
+
+    def invalidate_many(self, user_ids: Iterable[int]):
+        """إلغاء صفوف عدة مستخدمين"""
+        for user_id in user_ids:
+            self.invalidate(user_id)
+
+    def clear(self):
+        """تفريغ الذاكرة بالكامل"""
+        self.generation += 1
+        if self._entries:
+            self.stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+
+    def invalidate_for_query(self, query: str, params=()):
+        """إلغاء الصفوف التي قد يغيرها استعلام كتابة عام على جدول users"""
+        if not _USERS_WRITE_PATTERN.match(query):
+            return
+
+        self.generation += 1
+        is_insert = query.lstrip()[:7].upper() in ('INSERT ', 'REPLACE')
+        if is_insert or _USER_ID_FILTER_PATTERN.search(query):
+            # المعرّف ضمن المعاملات: إلغاء كل معامل صحيح يطابق مفتاحاً مخزناً
+            if isinstance(params, dict):
+                params = params.values()
+            self.invalidate_many([p for p in params if isinstance(p, int) and p in self._entries])
+        else:
+            # تحديث أو حذف جماعي بدون تحديد مستخدم
+            self.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """إحصائيات الذاكرة للمراقبة"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        hit_ratio = self.stats['hits'] / lookups if lookups else 0.0
+        return dict(
+            self.stats,
+            size=len(self._entries),
+            max_size=self.max_size,
+            ttl=self.ttl,
+            hit_ratio=round(hit_ratio, 4),
+        )
+
+
+# النسخة العامة من الذاكرة
+user_cache = UserCache()
@@ -0,0 +1,421 @@
+"""
+طابور الكتابة المؤجلة للتحديثات المتكررة
+Write-Behind Batching Queue for Per-Message Writes
+
+يجمع تحديثات العدادات والطوابع الزمنية (آخر نشاط، عدد الرسائل، XP الرسائل،
+الإحصائيات اليومية، النشطين اليوميين وتجميعات الأنشطة) في الذاكرة ويكتبها
+دفعة واحدة في معاملة واحدة كل بضع مئات من الميلي ثانية أو عند تجاوز عدد
+معين من الأحداث.
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Set, Tuple
+
+from database.connection_pool import db_pool
+from database.leaderboards import leaderboards
+from database.user_cache import user_cache
+
+# الفاصل الزمني بين عمليات التفريغ (بالثواني)
+FLUSH_INTERVAL = 0.3
+
+# عدد الأحداث المعلقة الذي يفرض تفريغاً فورياً
+MAX_PENDING_EVENTS = 200
+
+# مهلة إعادة المحاولة بعد فشل التفريغ (بالثواني)
+FLUSH_RETRY_DELAY = 5
+
+# محاولات التفريغ النهائي عند الإيقاف
+SHUTDOWN_FLUSH_ATTEMPTS = 3
+
+# أعمدة daily_stats المسموح بزيادتها عبر الطابور
+DAILY_STAT_COLUMNS = {
+    'active_users', 'new_users', 'total_transactions',
+    'total_money_flow', 'messages_count', 'moderation_actions'
+}
+
+
+def activity_category(activity_type: str) -> str:
+    """فئة النشاط في جدول التجميعات (financial_x -> financial)"""
+    prefix, separator, _ = activity_type.partition('_')
+    if separator and prefix in ('financial', 'moderation'):
+        return prefix
+    return 'general'
+
+
+class WriteBehindQueue:
+    """طابور تجميع للكتابات المتكررة مع تفريغ دوري في معاملة واحدة"""
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL, max_pending: int = MAX_PENDING_EVENTS):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        # المخازن المؤقتة
+        self._user_activity: Dict[int, str] = {}
+        self._message_counts: Dict[Tuple[int, int], list] = {}
+        self._message_xp: Dict[int, int] = defaultdict(int)
+        self._daily_stats: Dict[Tuple[int, str, str], float] = defaultdict(float)
+        self._daily_active: Set[Tuple[int, str, int]] = set()
+        self._activity_rollups: Dict[Tuple[int, str, str], list] = {}
+        self._pending_events = 0
+
+        # النشطون المسجلون اليوم (chat_id, user_id) - يمنع تكرار الكتابة لكل رسالة
+        self._active_today: Set[Tuple[int, int]] = set()
+        self._active_date = None
+
+        self._flush_task = None
+        self._wakeup = None
+        self._stop = None
+        self._flush_lock = None
+        self._closed = False
+
+        self.stats = {
+            'events': 0,
+            'flushes': 0,
+            'rows_written': 0,
+            'flush_errors': 0,
+            'requeued_events': 0,
+        }
+
+    # ===== واجهة الإضافة =====
+
+    def touch_user_activity(self, user_id: int):
+        """تسجيل آخر نشاط للمستخدم (يحتفظ بآخر طابع زمني فقط)"""
+        self._user_activity[user_id] = datetime.now().isoformat()
+        self._register_event()
+
+    def increment_message_count(self, user_id: int, chat_id: int, amount: int = 1):
+        """زيادة عداد رسائل المستخدم في المجموعة"""
+        now = datetime.now().isoformat()
+        entry = self._message_counts.get((user_id, chat_id))
+        if entry:
+            entry[0] += amount
+            entry[1] = now
+        else:
+            self._message_counts[(user_id, chat_id)] = [amount, now]
+        self._register_event()
+
+    def add_message_xp(self, user_id: int, actions: int = 1):
+        """تسجيل أفعال مانحة للـ XP ليتم احتسابها حسب عالم المستخدم عند التفريغ"""
+        self._message_xp[user_id] += actions
+        self._register_event()
+
+    def increment_daily_stat(self, chat_id: int, stat_type: str, amount: float = 1):
+        """زيادة عداد في جدول الإحصائيات اليومية"""
+        if stat_type not in DAILY_STAT_COLUMNS:
+            logging.warning(f"عمود إحصائيات غير معروف: {stat_type}")
+            return
+        today = datetime.now().date().isoformat()
+        self._daily_stats[(chat_id, today, stat_type)] += amount
+        self._register_event()
+
+    def mark_daily_active(self, chat_id: int, user_id: int):
+        """تسجيل المستخدم كنشط اليوم في المجموعة (مرة واحدة يومياً)"""
+        today = datetime.now().date().isoformat()
+        if today != self._active_date:
+            self._active_today = set()
+            self._active_date = today
+        if (chat_id, user_id) in self._active_today:
+            return
+        self._active_today.add((chat_id, user_id))
+        self._daily_active.add((chat_id, today, user_id))
+        self._register_event()
+
+    def increment_activity_rollup(self, chat_id: int, activity_type: str, amount: float = 0):
+        """زيادة عداد نوع نشاط (ومجموع مبالغه) في تجميعات اليوم"""
+        today = datetime.now().date().isoformat()
+        entry = self._activity_rollups.get((chat_id, today, activity_type))
+        if entry:
+            entry[0] += 1
+            entry[1] += amount
+        else:
+            self._activity_rollups[(chat_id, today, activity_type)] = [1, amount]
+        self._register_event()
+
+    def _register_event(self):
+        """تسجيل حدث جديد وتشغيل حلقة التفريغ عند الحاجة"""
+        self._pending_events += 1
+        self.stats['events'] += 1
+
+        if self._closed:
+            return
+
+        self._ensure_flush_loop()
+        if self._pending_events >= self.max_pending and self._wakeup:
+            self._wakeup.set()
+
+    def _ensure_flush_loop(self):
+        """تشغيل حلقة التفريغ في الخلفية عند أول حدث"""
+        if self._flush_task and not self._flush_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._wakeup = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = loop.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        """حلقة التفريغ الدوري"""
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            if self._pending_events and not await self.flush():
+                # الدفعة أُعيدت إلى المخازن - مهلة قبل المحاولة التالية (يقطعها الإيقاف)
+                try:
+                    await asyncio.wait_for(self._stop.wait(), timeout=FLUSH_RETRY_DELAY)
+                except asyncio.TimeoutError:
+                    pass
+
+    # ===== التفريغ =====
+
+    async def flush(self) -> bool:
+        """كتابة جميع التحديثات المعلقة في معاملة واحدة (False عند الفشل)"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            if not self._pending_events:
+                return True
+
+            # تبديل المخازن قبل أي انتظار حتى تُجمع الأحداث الجديدة في مخازن جديدة
+            user_activity, self._user_activity = self._user_activity, {}
+            message_counts, self._message_counts = self._message_counts, {}
+            message_xp, self._message_xp = self._message_xp, defaultdict(int)
+            daily_stats, self._daily_stats = self._daily_stats, defaultdict(float)
+            daily_active, self._daily_active = self._daily_active, set()
+            activity_rollups, self._activity_rollups = self._activity_rollups, {}
+            self._pending_events = 0
+
+            rows = 0
+            xp_results = {}
+            try:
+                async with db_pool.writer() as db:
+                    if user_activity:
+                        await db.executemany(
+                            "UPDATE users SET updated_at = ? WHERE user_id = ?",
+                            [(ts, user_id) for user_id, ts in user_activity.items()]
+                        )
+                        rows += len(user_activity)
+
+                    if message_counts:
+                        await db.executemany(
+                            """
+                            INSERT INTO user_message_count
+                            (user_id, chat_id, message_count, first_message_date, last_message_date)
+                            VALUES (?, ?, ?, ?, ?)
+                            ON CONFLICT(user_id, chat_id) DO UPDATE SET
+                                message_count = message_count + excluded.message_count,
+                                last_message_date = excluded.last_message_date
+                            """,
+                            [(user_id, chat_id, count, ts, ts)
+                             for (user_id, chat_id), (count, ts) in message_counts.items()]
+                        )
+                        rows += len(message_counts)
+
+                    if daily_stats:
+                        by_column = defaultdict(list)
+                        for (chat_id, date, column), amount in daily_stats.items():
+                            by_column[column].append((chat_id, date, amount, amount))
+                        for column, params in by_column.items():
+                            await db.executemany(
+                                f"""
+                                INSERT INTO daily_stats (chat_id, date, {column})
+                                VALUES (?, ?, ?)
+                                ON CONFLICT(chat_id, date) DO UPDATE SET
+                                {column} = {column} + ?
+                                """,
+                                params
+                            )
+                        rows += len(daily_stats)
+
+                    if daily_active:
+                        await db.executemany(
+                            "INSERT OR IGNORE INTO daily_active_users (chat_id, date, user_id) VALUES (?, ?, ?)",
+                            list(daily_active)
+                        )
+                        # العدد من الجدول نفسه فلا يُحتسب المستخدم مرتين بعد إعادة التشغيل
+                        await db.executemany(
+                            """
+                            INSERT INTO daily_stats (chat_id, date, active_users)
+                            VALUES (?, ?, (SELECT COUNT(*) FROM daily_active_users WHERE chat_id = ? AND date = ?))
+                            ON CONFLICT(chat_id, date) DO UPDATE SET
+                            active_users = excluded.active_users
+                            """,
+                            [(chat_id, date, chat_id, date)
+                             for chat_id, date in {(chat_id, date) for chat_id, date, _ in daily_active}]
+                        )
+                        rows += len(daily_active)
+
+                    if activity_rollups:
+                        await db.executemany(
+                            """
+                            INSERT INTO activity_rollups (chat_id, date, activity_type, category, count, total_amount)
+                            VALUES (?, ?, ?, ?, ?, ?)
+                            ON CONFLICT(chat_id, date, activity_type) DO UPDATE SET
+                                count = count + excluded.count,
+                                total_amount = total_amount + excluded.total_amount
+                            """,
+                            [(chat_id, date, activity_type, activity_category(activity_type), count, amount)
+                             for (chat_id, date, activity_type), (count, amount) in activity_rollups.items()]
+                        )
+                        rows += len(activity_rollups)
+
+                    if message_xp:
+                        xp_results = await self._apply_message_xp(db, message_xp)
+                        rows += len(message_xp)
+
+            except Exception as e:
+                # المعاملة تراجعت بالكامل - إعادة الدفعة لتُكتب في التفريغ التالي
+                self.stats['flush_errors'] += 1
+                requeued = self._requeue(user_activity, message_counts, message_xp,
+                                         daily_stats, daily_active, activity_rollups)
+                logging.error(f"خطأ في تفريغ طابور الكتابة المؤجلة (أعيد {requeued} تحديث للطابور): {e}")
+                return False
+
+            self.stats['flushes'] += 1
+            self.stats['rows_written'] += rows
+
+            for user_id, ts in user_activity.items():
+                user_cache.update_fields(user_id, updated_at=ts)
+            for (user_id, chat_id), (count, _) in message_counts.items():
+                leaderboards.add_messages(chat_id, user_id, count)
+            for user_id, (new_xp, _, _) in xp_results.items():
+                leaderboards.update_xp(user_id, new_xp)
+
+        # فحص الترقيات بعد تحرير قفل الكتابة
+        if xp_results:
+            await self._check_level_ups(xp_results)
+        return True
+
+    def _requeue(self, user_activity, message_counts, message_xp,
+                 daily_stats, daily_active, activity_rollups) -> int:
+        """دمج دفعة فاشلة مع المخازن الحالية (العدادات تُجمع والطوابع الأحدث تبقى)"""
+        for user_id, ts in user_activity.items():
+            self._user_activity.setdefault(user_id, ts)
+
+        for key, (count, ts) in message_counts.items():
+            entry = self._message_counts.get(key)
+            if entry:
+                entry[0] += count
+            else:
+                self._message_counts[key] = [count, ts]
+
+        for user_id, actions in message_xp.items():
+            self._message_xp[user_id] += actions
+
+        for key, amount in daily_stats.items():
+            self._daily_stats[key] += amount
+
+        self._daily_active |= daily_active
+
+        for key, (count, amount) in activity_rollups.items():
+            entry = self._activity_rollups.get(key)
+            if entry:
+                entry[0] += count
+                entry[1] += amount
+            else:
+                self._activity_rollups[key] = [count, amount]
+
+        requeued = (len(user_activity) + len(message_counts) + len(message_xp)
+                    + len(daily_stats) + len(daily_active) + len(activity_rollups))
+        self._pending_events += requeued
+        self.stats['requeued_events'] += requeued
+        return requeued
+
+    def _pending_summary(self) -> str:
+        """وصف مختصر للتحديثات المعلقة (لسجل الإيقاف)"""
+        return (
+            f"نشاط {len(self._user_activity)} مستخدم، "
+            f"عدادات رسائل {len(self._message_counts)}، "
+            f"XP رسائل {len(self._message_xp)} مستخدم، "
+            f"إحصائيات يومية {len(self._daily_stats)}، "
+            f"نشطون يومياً {len(self._daily_active)}، "
+            f"تجميعات أنشطة {len(self._activity_rollups)}"
+        )
+
+    async def _apply_message_xp(self, db, message_xp: Dict[int, int]) -> Dict[int, tuple]:
+        """تطبيق XP الرسائل المجمعة وإرجاع الحالة الجديدة لكل مستخدم"""
+        from modules.leveling import leveling_system
+
+        now = datetime.now().timestamp()
+        user_ids = list(message_xp.keys())
+
+        await db.executemany(
+            "INSERT OR IGNORE INTO levels (user_id, xp, level_name, world_name, last_xp_gain) VALUES (?, 0, 'نجم 1', 'عالم النجوم', ?)",
+            [(user_id, now) for user_id in user_ids]
+        )
+
+        placeholders = ",".join("?" * len(user_ids))
+        async with db.execute(
+            f"SELECT user_id, world_name, level_name, xp FROM levels WHERE user_id IN ({placeholders})",
+            user_ids
+        ) as cursor:
+            current_rows = await cursor.fetchall()
+
+        updates = []
+        results = {}
+        for row in current_rows:
+            user_id = row[0]
+            world_name = row[1] or "عالم النجوم"
+            level_name = row[2] or "نجم 1"
+            world = leveling_system.get_world(world_name)
+            if not world:
+                continue
+            gain = world["xp_per_action"] * message_xp[user_id]
+            updates.append((gain, now, user_id))
+            results[user_id] = (max(0, row[3] or 0) + gain, world_name, level_name)
+
+        await db.executemany(
+            "UPDATE levels SET xp = xp + ?, last_xp_gain = ? WHERE user_id = ? AND xp >= 0",
+            updates
+        )
+        return results
+
+    async def _check_level_ups(self, xp_results: Dict[int, tuple]):
+        """فحص ترقيات المستوى للمستخدمين الذين تغير رصيد XP لديهم"""
+        from modules.leveling import leveling_system
+
+        for user_id, (new_xp, world_name, level_name) in xp_results.items():
+            try:
+                upgraded, upgrade_message = await leveling_system.check_level_up(
+                    user_id, new_xp, world_name, level_name
+                )
+                if upgraded:
+                    logging.info(f"✨ ترقية للمستخدم {user_id}: {upgrade_message}")
+            except Exception as e:
+                logging.error(f"خطأ في فحص ترقية المستخدم {user_id}: {e}")
+
+    async def close(self):
+        """إيقاف حلقة التفريغ وكتابة ما تبقى (تفريغ نهائي عند الإيقاف)"""
+        self._closed = True
+        if self._flush_task and not self._flush_task.done():
+            # إيقاظ الحلقة لتنهي التفريغ الجاري بدلاً من إلغائها في منتصف الكتابة
+            self._wakeup.set()
+            self._stop.set()
+            await self._flush_task
+
+        for attempt in range(1, SHUTDOWN_FLUSH_ATTEMPTS + 1):
+            if await self.flush():
+                logging.info("✅ تم تفريغ طابور الكتابة المؤجلة")
+                return
+            if attempt < SHUTDOWN_FLUSH_ATTEMPTS:
+                await asyncio.sleep(attempt)
+
+        logging.error(f"❌ فشل التفريغ النهائي لطابور الكتابة المؤجلة، فُقدت التحديثات: {self._pending_summary()}")
+
+    def get_stats(self) -> Dict[str, int]:
+        """إحصائيات الطابور للمراقبة"""
+        return dict(self.stats, pending=self._pending_events)
+
+
+# النسخة العامة من الطابور
+write_behind_queue = WriteBehindQueue()
@@ -0,0 +1,199 @@
+"""
+موجه الأوامر المجمّع
+Compiled Command Router
+
+سجل تصريحي للأوامر النصية يُبنى مرة واحدة عند بدء التشغيل:
+- جدول تجزئة للأوامر المطابقة تماماً
+- شجرة بادئات (trie) لعبارات الأوامر العربية التي تبدأ بها الرسالة
+- تعبير نمطي واحد مجمّع لكل أوامر "يحتوي على" كمرشح أولي
+
+يتم اختيار القاعدة الأعلى أولوية (الأسبق تسجيلاً) من بين القواعد المطابقة،
+مما يحافظ على ترتيب سلسلة الشروط الأصلية.
+"""
+
+import logging
+import re
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from aiogram.types import Message
+
+CommandHandler = Callable[[Message, str], Awaitable[Optional[bool]]]
+
+# أنواع القواعد
+RULE_EXACT = "exact"
+RULE_PREFIX = "prefix"
+RULE_CONTAINS = "contains"
+RULE_PREDICATE = "predicate"
+
+# مفتاح نهاية العبارة داخل شجرة البادئات
+_TRIE_END = "\0"
+
+
+def build_phrase_pattern(phrase: str, word_boundary: bool = True) -> str:
+    """بناء نمط لعبارة قد تتكون من عدة كلمات مفصولة بمسافات"""
+    body = r'\s+'.join(re.escape(word) for word in phrase.split())
+    return rf'\b{body}\b' if word_boundary else body
+
+
+class CommandRule:
+    """قاعدة أمر واحدة في السجل"""
+
+    def __init__(self, name: str, kind: str, handler: CommandHandler, priority: int,
+                 group_only: bool = False, predicate: Callable[[str], bool] = None):
+        self.name = name
+        self.kind = kind
+        self.handler = handler
+        self.priority = priority
+        self.group_only = group_only
+        self.predicate = predicate
+        self.pattern: Optional[re.Pattern] = None
+
+
+class CommandRouter:
+    """سجل أوامر مجمّع مع توجيه الرسالة إلى معالج الوحدة المالكة"""
+
+    def __init__(self):
+        self._rules: List[CommandRule] = []
+        self._exact: Dict[str, List[CommandRule]] = {}
+        self._trie: Dict = {}
+        self._contains_rules: List[CommandRule] = []
+        self._contains_sources: List[str] = []
+        self._predicate_rules: List[CommandRule] = []
+        self._combined: Optional[re.Pattern] = None
+        self._compiled = False
+
+        self.stats = {
+            'dispatched': 0,
+            'misses': 0,
+        }
+        self.command_stats: Dict[str, Dict[str, float]] = {}
+
+    # ===== التسجيل =====
+
+    def _add_rule(self, name: str, kind: str, handler: CommandHandler,
+                  group_only: bool, predicate=None) -> CommandRule:
+        rule = CommandRule(name, kind, handler, len(self._rules), group_only, predicate)
+        self._rules.append(rule)
+        self.command_stats.setdefault(name, {'hits': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        self._compiled = False
+        return rule
+
+    def exact(self, name: str, phrases: List[str], handler: CommandHandler, group_only: bool = False):
+        """أمر يجب أن يطابق نص الرسالة كاملاً"""
+        rule = self._add_rule(name, RULE_EXACT, handler, group_only)
+        for phrase in phrases:
+            self._exact.setdefault(phrase.strip().lower(), []).append(rule)
+
+    def prefix(self, name: str, phrases: List[str], handler: CommandHandler, group_only: bool = False):
+        """أمر تبدأ به الرسالة (متبوعاً بمسافة أو نهاية النص)"""
+        rule = self._add_rule(name, RULE_PREFIX, handler, group_only)
+        for phrase in phrases:
+            node = self._trie
+            for char in phrase.strip().lower():
+                node = node.setdefault(char, {})
+            node.setdefault(_TRIE_END, []).append(rule)
+
+    def contains(self, name: str, phrases: List[str], handler: CommandHandler,
+                 group_only: bool = False, word_boundary: bool = True):
+        """أمر يظهر في أي مكان من الرسالة ككلمة مستقلة (أو كنص فرعي)"""
+        rule = self._add_rule(name, RULE_CONTAINS, handler, group_only)
+        sources = [build_phrase_pattern(phrase.lower(), word_boundary) for phrase in phrases]
+        rule.pattern = re.compile('|'.join(f'(?:{source})' for source in sources))
+        self._contains_rules.append(rule)
+        self._contains_sources.extend(sources)
+
+    def predicate(self, name: str, predicate: Callable[[str], bool], handler: CommandHandler,
+                  group_only: bool = False):
+        """أمر بشرط مخصص لا يمكن التعبير عنه بنمط ثابت"""
+        rule = self._add_rule(name, RULE_PREDICATE, handler, group_only, predicate)
+        self._predicate_rules.append(rule)
+
+    def compile(self):
+        """بناء التعبير المجمّع لأوامر "يحتوي على" مرة واحدة"""
+        if self._contains_sources:
+            self._combined = re.compile('|'.join(f'(?:{source})' for source in self._contains_sources))
+        else:
+            self._combined = None
+        self._compiled = True
+        logging.info(f"✅ تم بناء موجه الأوامر: {len(self._rules)} قاعدة")
+
+    # ===== المطابقة =====
+
+    def _prefix_matches(self, text: str) -> List[CommandRule]:
+        """جمع قواعد البادئات المطابقة ببداية النص في مرور واحد"""
+        matches = []
+        node = self._trie
+        length = len(text)
+        for index, char in enumerate(text):
+            node = node.get(char)
+            if node is None:
+                break
+            if _TRIE_END in node and (index + 1 == length or text[index + 1].isspace()):
+                matches.extend(node[_TRIE_END])
+        return matches
+
+    def match(self, text: str, is_group: bool = True) -> Optional[CommandRule]:
+        """إيجاد القاعدة الأعلى أولوية المطابقة للنص"""
+        if not self._compiled:
+            self.compile()
+
+        text = text.strip().lower()
+        if not text:
+            return None
+
+        candidates: List[CommandRule] = []
+        candidates.extend(self._exact.get(text, ()))
+        candidates.extend(self._prefix_matches(text))
+
+        # المرشح الأولي: مسح واحد للنص بالتعبير المجمّع
+        if self._combined is not None and self._combined.search(text):
+            candidates.extend(rule for rule in self._contains_rules if rule.pattern.search(text))
+
+        for rule in self._predicate_rules:
+            try:
+                if rule.predicate(text):
+                    candidates.append(rule)
+            except Exception as e:
+                logging.error(f"خطأ في شرط الأمر {rule.name}: {e}")
+
+        best = None
+        for rule in candidates:
+            if rule.group_only and not is_group:
+                continue
+            if best is None or rule.priority < best.priority:
+                best = rule
+        return best
+
+    async def dispatch(self, message: Message, text: str) -> bool:
+        """توجيه الرسالة إلى المعالج المناسب - يعيد True إذا تم التعامل معها"""
+        is_group = message.chat.type in ['group', 'supergroup']
+        rule = self.match(text, is_group)
+        if rule is None:
+            self.stats['misses'] += 1
+            return False
+
+        started = time.perf_counter()
+        try:
+            handled = await rule.handler(message, text)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            stats = self.command_stats[rule.name]
+            stats['hits'] += 1
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+
+        self.stats['dispatched'] += 1
+        return handled is not False
+
+    def get_stats(self) -> Dict:
+        """إحصائيات الاستخدام وزمن التوجيه لكل أمر"""
+        commands = {}
+        for name, stats in self.command_stats.items():
+            hits = stats['hits']
+            commands[name] = {
+                'hits': hits,
+                'avg_ms': round(stats['total_ms'] / hits, 2) if hits else 0.0,
+                'max_ms': round(stats['max_ms'], 2),
+            }
+        return dict(self.stats, rules=len(self._rules), commands=commands)
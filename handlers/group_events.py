@@ -21,7 +21,8 @@ router = Router()
 async def get_group_admins_info(bot: Bot, chat_id: int):
     """جلب معلومات مشرفي المجموعة"""
     try:
-        admins = await bot.get_chat_administrators(chat_id)
+        from modules.chat_member_cache import chat_member_cache
+        admins = await chat_member_cache.get_administrators(bot, chat_id)
         admin_list = []
         
         for admin in admins:
@@ -116,6 +117,13 @@ async def handle_my_chat_member_update(update: ChatMemberUpdated, bot: Bot):
         if update.chat.type == ChatType.PRIVATE:
             return
         
+        # تحديث حالة البوت في ذاكرة الأعضاء (أو مسح بيانات المجموعة عند خروجه)
+        from modules.chat_member_cache import chat_member_cache
+        if new_status in [ChatMemberStatus.LEFT, ChatMemberStatus.KICKED]:
+            chat_member_cache.invalidate(update.chat.id)
+        else:
+            chat_member_cache.update_from_event(update.chat.id, update.new_chat_member)
+        
         # التحقق من إضافة البوت للمجموعة لأول مرة
         if (old_status in [ChatMemberStatus.LEFT, ChatMemberStatus.KICKED] and 
             new_status in [ChatMemberStatus.MEMBER, ChatMemberStatus.ADMINISTRATOR]):
@@ -157,6 +165,28 @@ async def handle_my_chat_member_update(update: ChatMemberUpdated, bot: Bot):
         logging.error(f"خطأ في معالج أحداث المجموعات: {e}")
 
 
+@router.chat_member()
+async def handle_chat_member_update(update: ChatMemberUpdated):
+    """تحديث ذاكرة الأعضاء والمشرفين من أحداث تغير العضوية (ترقية، تنزيل، كتم، طرد)"""
+    try:
+        if update.chat.type == ChatType.PRIVATE:
+            return
+        
+        from modules.chat_member_cache import chat_member_cache, ADMIN_STATUSES
+        chat_member_cache.update_from_event(update.chat.id, update.new_chat_member)
+        
+        old_status = update.old_chat_member.status
+        new_status = update.new_chat_member.status
+        if (old_status in ADMIN_STATUSES) != (new_status in ADMIN_STATUSES):
+            # تغير طاقم الإدارة - إلغاء سياق المجموعة المخزن للذكاء الاصطناعي
+            from modules.prompt_context import prompt_context_builder
+            prompt_context_builder.invalidate('group', update.chat.id)
+            logging.info(f"🔄 تغير مشرفي المجموعة {update.chat.id}: {update.new_chat_member.user.id} ({old_status} ← {new_status})")
+            
+    except Exception as e:
+        logging.error(f"خطأ في تحديث ذاكرة الأعضاء: {e}")
+
+
 @router.message(F.content_type.in_({"new_chat_members"}))
 async def handle_new_members(message: Message, bot: Bot):
     """معالج إضافة أعضاء جدد للمجموعة"""
@@ -189,6 +219,11 @@ async def handle_new_members(message: Message, bot: Bot):
             "🎖️ العسكري {name} في الخدمة! \n🛡️ جندي جديد في جيش الاقتصاد! \n⚔️ استعد للمعارك الشرسة! \n👑 القيادة تنتظر أوامرك!"
         ]
         
+        # حالة الأعضاء الجدد تغيرت - إلغاء النسخ المخزنة
+        from modules.chat_member_cache import chat_member_cache
+        for new_member in message.new_chat_members:
+            chat_member_cache.invalidate(message.chat.id, new_member.id)
+        
         # التحقق من إضافة البوت كعضو جديد
         for new_member in message.new_chat_members:
             if new_member and new_member.id == bot.id:
@@ -295,6 +330,10 @@ async def handle_left_member(message: Message, bot: Bot):
             "⚡ القائد {name} غادر الساحة! \n😪 الجيش فقد أحد أقوى جنوده! \n🏆 كنت مثال للقيادة الحكيمة! \n🚀 رحلة موفقة أيها البطل!"
         ]
         
+        # حالة العضو المغادر تغيرت - إلغاء النسخة المخزنة
+        from modules.chat_member_cache import chat_member_cache
+        chat_member_cache.invalidate(message.chat.id, message.left_chat_member.id)
+        
         # التحقق من مغادرة البوت
         if message.left_chat_member.id == bot.id:
             logging.info(f"😢 البوت غادر المجموعة: {message.chat.title}")
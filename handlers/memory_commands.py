@@ -7,6 +7,7 @@ from aiogram import Router, F
 from aiogram.types import Message
 from aiogram.filters import Command
 import logging
+from database.connection_pool import db_pool
 
 router = Router()
 
@@ -90,17 +91,15 @@ async def memory_stats_command(message: Message):
     """عرض إحصائيات الذاكرة المشتركة"""
     try:
         from modules.shared_memory import shared_group_memory
-        from config.settings import DATABASE_URL
-        import aiosqlite
         
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.reader() as db:
             # عدد المحادثات المحفوظة
             cursor = await db.execute('SELECT COUNT(*) FROM shared_conversations WHERE chat_id = ?', (message.chat.id,))
             result = await cursor.fetchone()
             conversations_count = result[0] if result else 0
             
             # عدد المواضيع المختلفة
-            cursor = await db.execute('SELECT COUNT(DISTINCT topic) FROM topic_links WHERE chat_id = ?', (message.chat.id,))
+            cursor = await db.execute('SELECT COUNT(DISTINCT topic) FROM topic_user_stats WHERE chat_id = ?', (message.chat.id,))
             result = await cursor.fetchone()
             topics_count = result[0] if result else 0
             
@@ -108,8 +107,9 @@ async def memory_stats_command(message: Message):
             cursor = await db.execute('SELECT COUNT(DISTINCT user_id) FROM shared_conversations WHERE chat_id = ?', (message.chat.id,))
             result = await cursor.fetchone()
             users_count = result[0] if result else 0
-            
-            stats_text = f"""
+        
+        # الرد بعد إعادة اتصال القراءة للمجمع
+        stats_text = f"""
 📊 **إحصائيات الذاكرة المشتركة**
 
 💬 **المحادثات المحفوظة:** {conversations_count}
@@ -121,9 +121,9 @@ async def memory_stats_command(message: Message):
 ⭐ **المستخدمون المميزون:** ✅ محدّثون
 
 🚀 **النظام يتطور باستمرار!**
-            """
-            
-            await message.reply(stats_text)
+        """
+        
+        await message.reply(stats_text)
         
     except Exception as e:
         logging.error(f"خطأ في إحصائيات الذاكرة: {e}")
@@ -5,6 +5,8 @@ Bot Messages Handler
 
 import logging
 import asyncio
+import re
+import random
 from aiogram import Router, F
 from aiogram.types import Message, FSInputFile
 from aiogram.fsm.context import FSMContext
@@ -32,6 +34,7 @@ from utils.decorators import user_required, group_only
 from config.settings import SYSTEM_MESSAGES
 from config.hierarchy import MASTERS
 from modules.utility_commands import WhisperStates
+from handlers.command_router import CommandRouter, build_phrase_pattern
 # استيراد نظام الذكاء الاصطناعي الشامل
 from modules.ai_integration_handler import ai_integration
 # استيراد نظام مراقبة النشاط للتفاعل التلقائي
@@ -39,7 +42,7 @@ from modules.group_activity_monitor import group_activity_monitor
 # استيراد معالج القوائم الذكية
 from modules.smart_menu_handler import smart_menu_handler
 # استيراد نظام فلتر الألفاظ المسيئة
-from modules.profanity_commands import PROFANITY_COMMANDS
+from modules.profanity_commands import PROFANITY_COMMANDS, PROFANITY_WORD_COMMANDS
 # تم حذف نظام عبيد الذكي غير الضروري
 
 router = Router()
@@ -273,16 +276,16 @@ async def handle_text_messages(message: Message, state: FSMContext):
             try:
                 from modules.profanity_filter import profanity_filter
                 
-                logging.info(f"🔍 FILTER DEBUG: بدء فحص رسالة '{message.text}' في المجموعة {message.chat.id}")
+                logging.debug(f"🔍 FILTER DEBUG: بدء فحص رسالة '{message.text}' في المجموعة {message.chat.id}")
                 
                 # التحقق من تفعيل الفلتر في هذه المجموعة
                 is_enabled = profanity_filter.is_enabled(message.chat.id)
-                logging.info(f"🔍 FILTER DEBUG: حالة الفلتر في المجموعة {message.chat.id}: {is_enabled}")
+                logging.debug(f"🔍 FILTER DEBUG: حالة الفلتر في المجموعة {message.chat.id}: {is_enabled}")
                 
                 if is_enabled:
                     # فحص النص للألفاظ المسيئة
-                    has_profanity, found_words = profanity_filter.contains_profanity(message.text)
-                    logging.info(f"🔍 FILTER DEBUG: نتيجة الفحص: {has_profanity}, كلمات مكتشفة: {found_words}")
+                    has_profanity, found_words = profanity_filter.contains_profanity(message.text, message.chat.id)
+                    logging.debug(f"🔍 FILTER DEBUG: نتيجة الفحص: {has_profanity}, كلمات مكتشفة: {found_words}")
                     
                     if has_profanity:
                         # حذف الرسالة فوراً
@@ -307,7 +310,7 @@ async def handle_text_messages(message: Message, state: FSMContext):
                         
                         return  # توقف عن معالجة الرسالة
                 else:
-                    logging.info(f"🔍 FILTER DEBUG: الفلتر غير مفعل في هذه المجموعة")
+                    logging.debug(f"🔍 FILTER DEBUG: الفلتر غير مفعل في هذه المجموعة")
             except Exception as filter_error:
                 logging.error(f"خطأ في فلتر الألفاظ: {filter_error}")
         
@@ -644,8 +647,8 @@ async def handle_challenge_answer(message: Message, state: FSMContext):
             
             # إضافة المال للرصيد
             try:
-                from database.operations import update_user_balance
-                await update_user_balance(message.from_user.id, money_reward)
+                from database import ledger
+                await ledger.credit(message.from_user.id, money_reward, "challenge_reward", "مكافأة تحدي اقتصادي")
             except Exception as money_error:
                 logging.error(f"خطأ في إضافة المال: {money_error}")
         
@@ -734,34 +737,29 @@ async def handle_transfer_command(message: Message):
             )
             return
         
-        # تنفيذ عملية التحويل
-        from database.operations import update_user_balance, add_transaction
-        
-        new_sender_balance = sender['balance'] - amount
-        new_receiver_balance = receiver['balance'] + amount
-        
-        await update_user_balance(sender_id, new_sender_balance)
-        await update_user_balance(receiver_id, new_receiver_balance)
+        # تنفيذ عملية التحويل وتسجيلها في معاملة واحدة
+        from database import ledger
+        from utils.helpers import format_number
         
-        # تسجيل المعاملات
         receiver_name = message.reply_to_message.from_user.first_name or "مستخدم"
         sender_name = message.from_user.first_name or "مستخدم"
         
-        await add_transaction(
-            sender_id,
-            f"تحويل إلى {receiver_name}",
-            -amount,
-            "transfer"
-        )
-        await add_transaction(
-            receiver_id,
-            f"تحويل من {sender_name}",
-            amount,
-            "transfer"
+        result = await ledger.transfer(
+            sender_id, receiver_id, amount,
+            sender_description=f"تحويل إلى {receiver_name}",
+            receiver_description=f"تحويل من {sender_name}"
         )
+        if not result:
+            if result.reason == ledger.REASON_INSUFFICIENT:
+                await message.reply("❌ رصيدك غير كافٍ لإتمام التحويل!")
+            else:
+                await message.reply("❌ حدث خطأ أثناء التحويل، حاول مرة أخرى")
+            return
+        
+        new_sender_balance = result.balance(sender_id)
+        new_receiver_balance = result.balance(receiver_id)
         
         # رسالة التأكيد
-        from utils.helpers import format_number
         success_msg = f"""
 ✅ **تم التحويل بنجاح!**
 
@@ -783,7 +781,8 @@ async def handle_transfer_command(message: Message):
 async def handle_deposit_with_amount(message: Message, amount_text: str):
     """معالجة أمر الإيداع مع المبلغ مباشرة"""
     try:
-        from database.operations import get_user, update_user_balance, update_user_bank_balance, add_transaction
+        from database.operations import get_user
+        from database import ledger
         from utils.helpers import format_number, is_valid_amount
         
         user = await get_user(message.from_user.id)
@@ -809,20 +808,15 @@ async def handle_deposit_with_amount(message: Message, amount_text: str):
             await message.reply(f"❌ ليس لديك رصيد كافٍ!\n💰 رصيدك الحالي: {format_number(user['balance'])}$")
             return
         
-        # تنفيذ الإيداع
-        new_cash_balance = user['balance'] - amount
-        new_bank_balance = user['bank_balance'] + amount
-        
-        await update_user_balance(message.from_user.id, new_cash_balance)
-        await update_user_bank_balance(message.from_user.id, new_bank_balance)
+        # تنفيذ الإيداع وتسجيله في معاملة واحدة
+        result = await ledger.deposit(message.from_user.id, amount, "إيداع في البنك")
+        if not result:
+            await message.reply("❌ ليس لديك رصيد كافٍ!" if result.reason == ledger.REASON_INSUFFICIENT
+                                else "❌ حدث خطأ في عملية الإيداع")
+            return
         
-        # إضافة معاملة
-        await add_transaction(
-            message.from_user.id,
-            "إيداع في البنك",
-            amount,
-            "bank_deposit"
-        )
+        new_cash_balance = result.balance(message.from_user.id)
+        new_bank_balance = result.bank_balance(message.from_user.id)
         
         await message.reply(
             f"✅ **تم الإيداع بنجاح!**\n\n"
@@ -839,7 +833,8 @@ async def handle_deposit_with_amount(message: Message, amount_text: str):
 async def handle_withdraw_with_amount(message: Message, amount_text: str):
     """معالجة أمر السحب مع المبلغ مباشرة"""
     try:
-        from database.operations import get_user, update_user_balance, update_user_bank_balance, add_transaction
+        from database.operations import get_user
+        from database import ledger
         from utils.helpers import format_number, is_valid_amount
         
         user = await get_user(message.from_user.id)
@@ -865,20 +860,15 @@ async def handle_withdraw_with_amount(message: Message, amount_text: str):
             await message.reply(f"❌ ليس لديك رصيد كافٍ في البنك!\n🏦 رصيد البنك: {format_number(user['bank_balance'])}$")
             return
         
-        # تنفيذ السحب
-        new_cash_balance = user['balance'] + amount
-        new_bank_balance = user['bank_balance'] - amount
-        
-        await update_user_balance(message.from_user.id, new_cash_balance)
-        await update_user_bank_balance(message.from_user.id, new_bank_balance)
+        # تنفيذ السحب وتسجيله في معاملة واحدة
+        result = await ledger.withdraw(message.from_user.id, amount, "سحب من البنك")
+        if not result:
+            await message.reply("❌ ليس لديك رصيد كافٍ في البنك!" if result.reason == ledger.REASON_INSUFFICIENT
+                                else "❌ حدث خطأ في عملية السحب")
+            return
         
-        # إضافة معاملة
-        await add_transaction(
-            message.from_user.id,
-            "سحب من البنك",
-            amount,
-            "bank_withdraw"
-        )
+        new_cash_balance = result.balance(message.from_user.id)
+        new_bank_balance = result.bank_balance(message.from_user.id)
         
         await message.reply(
             f"✅ **تم السحب بنجاح!**\n\n"
@@ -939,7 +929,7 @@ async def handle_theft_command(message: Message):
 async def attempt_theft_on_target(message: Message, thief: dict, target: dict, target_user_id: int, target_name: str):
     """محاولة سرقة المستخدم المستهدف"""
     try:
-        from database.operations import update_user_balance, add_transaction
+        from database import ledger
         from utils.helpers import format_number
         import random
         
@@ -965,26 +955,19 @@ async def attempt_theft_on_target(message: Message, thief: dict, target: dict, t
             stolen_amount = random.randint(int(max_steal_amount * 0.1), int(max_steal_amount * 0.3))
             stolen_amount = max(1, stolen_amount)  # على الأقل 1$
             
-            # تحديث الأرصدة
-            new_thief_balance = thief['balance'] + stolen_amount
-            new_target_balance = target['balance'] - stolen_amount
-            
-            await update_user_balance(message.from_user.id, new_thief_balance)
-            await update_user_balance(target_user_id, new_target_balance)
-            
-            # إضافة المعاملة
-            await add_transaction(
-                target_user_id,
-                f"سرقة بواسطة {message.from_user.first_name or 'لص مجهول'}",
-                -stolen_amount,
-                "theft"
-            )
-            await add_transaction(
-                message.from_user.id,
-                f"سرقة ناجحة من {target_name}",
-                stolen_amount,
-                "theft"
+            # نقل المبلغ وتسجيله في معاملة واحدة (تُرفض إذا صرف الضحية أمواله قبلها)
+            result = await ledger.transfer(
+                target_user_id, message.from_user.id, stolen_amount,
+                sender_description=f"سرقة بواسطة {message.from_user.first_name or 'لص مجهول'}",
+                receiver_description=f"سرقة ناجحة من {target_name}",
+                transaction_type="theft"
             )
+            if not result:
+                await message.reply(f"😅 {target_name} لم يعد يملك أموالاً نقدية كافية للسرقة!")
+                return
+            
+            new_thief_balance = result.balance(message.from_user.id)
+            new_target_balance = result.balance(target_user_id)
             
             # رسائل نجاح متنوعة
             success_messages = [
@@ -1022,20 +1005,11 @@ async def attempt_theft_on_target(message: Message, thief: dict, target: dict, t
             # السرقة فشلت!
             penalty = random.randint(50, 200)  # غرامة الفشل
             
-            if thief['balance'] >= penalty:
-                new_thief_balance = thief['balance'] - penalty
-                await update_user_balance(message.from_user.id, new_thief_balance)
-                
-                await add_transaction(
-                    message.from_user.id,
-                    f"غرامة فشل سرقة {target_name}",
-                    -penalty,
-                    "theft_penalty"
-                )
-                
-                penalty_msg = f"\n💸 غرامة الفشل: {format_number(penalty)}$"
-            else:
-                penalty_msg = ""
+            # الغرامة تُخصم فقط إذا كان الرصيد يغطيها
+            penalty_result = await ledger.debit(
+                message.from_user.id, penalty, "theft_penalty", f"غرامة فشل سرقة {target_name}"
+            )
+            penalty_msg = f"\n💸 غرامة الفشل: {format_number(penalty)}$" if penalty_result else ""
             
             # رسائل فشل متنوعة
             fail_messages = [
@@ -1061,6 +1035,209 @@ async def attempt_theft_on_target(message: Message, thief: dict, target: dict, t
         await message.reply("❌ حدث خطأ أثناء محاولة السرقة")
 
 
+def _module_command(module_name: str, function_name: str, error_log: str, error_reply: str, **kwargs):
+    """إنشاء معالج أمر يستدعي دالة الوحدة المالكة مع استيراد متأخر"""
+    async def handler(message: Message, text: str):
+        try:
+            import importlib
+            module = importlib.import_module(module_name)
+            await getattr(module, function_name)(message, **kwargs)
+        except Exception as e:
+            logging.error(f"{error_log}: {e}")
+            await message.reply(error_reply)
+    return handler
+
+
+async def _islamic_greeting_reply(message: Message, text: str):
+    """الرد الإسلامي - السلام عليكم ووعليكم السلام"""
+    try:
+        islamic_responses = [
+            "وعليكم السلام ورحمة الله وبركاته 🕌",
+            "وعليكم السلام ورحمة الله 🌙",
+            "وعليكم السلام وأهلاً وسهلاً 🤲",
+            "وعليكم السلام، مرحباً بكم 🕌✨",
+            "وعليكم السلام ورحمة الله، حياكم الله 🌙"
+        ]
+        import random
+        await message.reply(random.choice(islamic_responses))
+    except Exception as e:
+        logging.error(f"خطأ في الرد الإسلامي: {e}")
+
+
+async def _show_suggested_games(message: Message, text: str):
+    """عرض الألعاب المقترحة"""
+    try:
+        from modules.suggested_games import get_suggested_games_list
+        await message.reply(get_suggested_games_list())
+    except Exception as e:
+        logging.error(f"خطأ في عرض الألعاب المقترحة: {e}")
+        await message.reply("❌ حدث خطأ في عرض الألعاب المقترحة")
+
+
+def _is_luck_gamble_command(text: str) -> bool:
+    """أوامر المراهنة المحددة أو حظ + مبلغ"""
+    if any(phrase in text for phrase in ['حظ فلوسي', 'حظ كل فلوسي', 'حظ كامل فلوسي']):
+        return True
+    parts = text.split()
+    return text.startswith('حظ ') and len(parts) >= 2 and parts[1].replace('$', '').replace(',', '').isdigit()
+
+
+async def _handle_luck_gamble(message: Message, text: str):
+    """نظام مراهنة الحظ - Luck Gambling System"""
+    try:
+        from modules.luck_gambling import parse_gamble_command, process_luck_gamble
+        amount, bet_all = parse_gamble_command(text)
+        
+        if amount is not None or bet_all:
+            await process_luck_gamble(message, amount, bet_all)
+        else:
+            from modules.luck_gambling import show_gambling_help
+            await show_gambling_help(message)
+    except Exception as e:
+        logging.error(f"خطأ في مراهنة الحظ: {e}")
+        await message.reply("❌ حدث خطأ في مراهنة الحظ")
+
+
+def _is_luck_wheel_word(text: str) -> bool:
+    """فحص خاص لكلمة "حظ" مع شروط خاصة"""
+    return text == 'حظ' or text.endswith(' حظ') or ' حظ ' in text
+
+
+def _register_general_commands(command_router: CommandRouter):
+    """تسجيل أوامر الرسائل العامة بترتيب الأولوية الأصلي"""
+    command_router.contains(
+        "islamic_greeting", ['السلام عليكم'], _islamic_greeting_reply,
+        group_only=True, word_boundary=False
+    )
+    command_router.contains(
+        "royal_game", ['لعبة الحظ', 'رويال', 'royal'],
+        _module_command('modules.royal_game', 'start_royal_game',
+                        "خطأ في بدء لعبة الرويال", "❌ حدث خطأ أثناء بدء لعبة الرويال"),
+        group_only=True
+    )
+    command_router.exact(
+        "word_game", ['الكلمة', 'كلمة', 'word'],
+        _module_command('modules.word_game', 'start_word_game',
+                        "خطأ في بدء لعبة الكلمة", "❌ حدث خطأ أثناء بدء لعبة الكلمة"),
+        group_only=True
+    )
+    command_router.exact(
+        "symbols_game", ['الرموز', 'رموز', 'symbols'],
+        _module_command('modules.symbols_game', 'start_symbols_game',
+                        "خطأ في بدء لعبة الرموز", "❌ حدث خطأ أثناء بدء لعبة الرموز"),
+        group_only=True
+    )
+    command_router.contains(
+        "games_list", ['العاب', 'الالعاب', 'games', 'قائمة الالعاب'],
+        _module_command('modules.games_list', 'show_games_list',
+                        "خطأ في عرض قائمة الألعاب", "❌ حدث خطأ في عرض قائمة الألعاب")
+    )
+    command_router.contains(
+        "suggested_games", ['اقتراحات', 'العاب مقترحة', 'الاقتراحات', 'مقترحة'],
+        _show_suggested_games
+    )
+    command_router.contains(
+        "battle_arena", ['ساحة الموت', 'battle', 'معركة', 'ساحة المعركة'],
+        _module_command('modules.battle_arena_game', 'start_battle_arena',
+                        "خطأ في بدء ساحة الموت", "❌ حدث خطأ أثناء بدء ساحة الموت الأخيرة"),
+        group_only=True
+    )
+    command_router.predicate("luck_gamble", _is_luck_gamble_command, _handle_luck_gamble)
+    
+    luck_wheel = _module_command('modules.luck_wheel_game', 'start_luck_wheel',
+                                 "خطأ في بدء عجلة الحظ", "❌ حدث خطأ في عجلة الحظ")
+    command_router.contains("luck_wheel", ['عجلة الحظ', 'عجلة', 'wheel'], luck_wheel)
+    command_router.predicate("luck_wheel", _is_luck_wheel_word, luck_wheel)
+    
+    command_router.contains(
+        "number_guess", ['خمن الرقم', 'تخمين', 'رقم', 'guess'],
+        _module_command('modules.number_guess_game', 'start_number_guess_game',
+                        "خطأ في بدء لعبة خمن الرقم", "❌ حدث خطأ في لعبة خمن الرقم"),
+        group_only=True
+    )
+    command_router.contains(
+        "quick_quiz", ['سؤال وجواب', 'مسابقة', 'quiz', 'سؤال'],
+        _module_command('modules.quick_quiz_game', 'start_quick_quiz_game',
+                        "خطأ في بدء مسابقة سؤال وجواب", "❌ حدث خطأ في بدء المسابقة"),
+        group_only=True
+    )
+    command_router.contains(
+        "xo_game", ['اكس اوه', 'xo', 'اكس او', 'اكساوه'],
+        _module_command('modules.xo_game', 'start_xo_game',
+                        "خطأ في بدء لعبة اكس اوه", "❌ حدث خطأ أثناء بدء لعبة اكس اوه"),
+        group_only=True
+    )
+    command_router.contains(
+        "rock_paper_scissors", ['حجر ورقة مقص', 'حجر ورقة', 'rps'],
+        _module_command('modules.rock_paper_scissors_game', 'start_rock_paper_scissors_game',
+                        "خطأ في بدء لعبة حجر ورقة مقص", "❌ حدث خطأ أثناء بدء لعبة حجر ورقة مقص"),
+        group_only=True
+    )
+    command_router.contains(
+        "true_false", ['صدق أم كذب', 'صدق كذب', 'true false'],
+        _module_command('modules.true_false_game', 'start_true_false_game',
+                        "خطأ في بدء لعبة صدق أم كذب", "❌ حدث خطأ أثناء بدء لعبة صدق أم كذب",
+                        vs_ai=True),
+        group_only=True
+    )
+    command_router.contains(
+        "math_challenge", ['تحدي رياضي', 'رياضيات', 'math challenge'],
+        _module_command('modules.math_challenge_game', 'start_math_challenge_game',
+                        "خطأ في بدء التحدي الرياضي", "❌ حدث خطأ أثناء بدء التحدي الرياضي",
+                        vs_ai=True, difficulty="easy"),
+        group_only=True
+    )
+    command_router.compile()
+
+
+async def _clear_command(message: Message, text: str):
+    """أوامر المسح (مسح، مسح بالرد، مسح + نوع)"""
+    logging.info(f"تم اكتشاف أمر مسح: '{text}' - سيتم توجيهه للمعالج")
+    from modules.clear_commands import handle_clear_command
+    await handle_clear_command(message, text)
+
+
+def _register_moderation_commands(command_router: CommandRouter):
+    """تسجيل أوامر المسح وقاعدة بيانات المخالفات (أوامر تبدأ بها الرسالة)"""
+    command_router.prefix("clear", ['مسح'], _clear_command)
+    
+    violations_record = _module_command('modules.admin_management', 'handle_violations_record_command',
+                                        "خطأ في عرض سجل السوابق", "❌ حدث خطأ في عرض سجل السوابق")
+    command_router.prefix("violations_record", ['سجل السوابق'], violations_record)
+    command_router.exact("violations_record", ['سجل السبابين'], violations_record)
+    
+    command_router.prefix(
+        "violations_cleanup", ['تنظيف'],
+        _module_command('modules.admin_management', 'handle_violations_cleanup_command',
+                        "خطأ في تنظيف المخالفات", "❌ حدث خطأ في تنظيف المخالفات")
+    )
+    command_router.prefix(
+        "clear_user_record", ['إلغاء سوابق'],
+        _module_command('modules.admin_management', 'handle_clear_user_record_command',
+                        "خطأ في إلغاء السوابق", "❌ حدث خطأ في إلغاء السوابق")
+    )
+    for phrase, handler in PROFANITY_WORD_COMMANDS.items():
+        command_router.prefix(
+            handler.__name__, [phrase],
+            _module_command('modules.profanity_commands', handler.__name__,
+                            "خطأ في أمر فلتر الألفاظ المسيئة", "❌ حدث خطأ أثناء تنفيذ الأمر")
+        )
+    command_router.compile()
+
+
+# نمط أوامر المستوى المجمّع مسبقاً
+LEVEL_COMMAND_PATTERN = re.compile('|'.join(
+    build_phrase_pattern(command) for command in ["مستوايا", "مستوى", "level", "xp"]
+))
+
+# موجه أوامر الرسائل العامة - يُبنى مرة واحدة عند تحميل الوحدة
+general_command_router = CommandRouter()
+_register_general_commands(general_command_router)
+
+moderation_command_router = CommandRouter()
+_register_moderation_commands(moderation_command_router)
+
+
 async def handle_general_message(message: Message, state: FSMContext):
     """معالجة الرسائل العامة - الكلمات المفتاحية فقط"""
     
@@ -1077,381 +1254,9 @@ async def handle_general_message(message: Message, state: FSMContext):
     # نقل فحص الذكاء الاصطناعي لأسفل - بعد الأوامر المطلقة
     # (تم نقل هذا القسم لأسفل لضمان أولوية الأوامر المطلقة)
     
-    # الرد الإسلامي - السلام عليكم ووعليكم السلام
-    if (message.text and message.chat.type in ['group', 'supergroup'] and 
-        any(greeting in message.text for greeting in ['السلام عليكم', 'السلام عليكم ورحمة الله', 'السلام عليكم ورحمة الله وبركاته'])):
-        try:
-            islamic_responses = [
-                "وعليكم السلام ورحمة الله وبركاته 🕌",
-                "وعليكم السلام ورحمة الله 🌙",
-                "وعليكم السلام وأهلاً وسهلاً 🤲",
-                "وعليكم السلام، مرحباً بكم 🕌✨",
-                "وعليكم السلام ورحمة الله، حياكم الله 🌙"
-            ]
-            import random
-            response = random.choice(islamic_responses)
-            await message.reply(response)
-            return
-        except Exception as e:
-            logging.error(f"خطأ في الرد الإسلامي: {e}")
-    
-    # لعبة الرويال - Royal Battle Game
-    if (message.text and message.chat.type in ['group', 'supergroup']):
-        import re
-        royal_commands = ['لعبة الحظ', 'رويال', 'royal']
-        
-        # فحص الأوامر ككلمات مستقلة
-        is_royal_command = False
-        for command in royal_commands:
-            if command == 'لعبة الحظ':
-                # فحص خاص للعبارة المكونة من كلمتين
-                if re.search(r'\bلعبة\s+الحظ\b', text):
-                    is_royal_command = True
-                    break
-            else:
-                if re.search(rf'\b{re.escape(command)}\b', text):
-                    is_royal_command = True
-                    break
-        
-        if is_royal_command:
-            try:
-                from modules.royal_game import start_royal_game
-                await start_royal_game(message)
-                return
-            except Exception as e:
-                logging.error(f"خطأ في بدء لعبة الرويال: {e}")
-                await message.reply("❌ حدث خطأ أثناء بدء لعبة الرويال")
-    
-    # لعبة الكلمة - Word Game
-    if (message.text and message.chat.type in ['group', 'supergroup']):
-        word_commands = ['الكلمة', 'كلمة', 'word']
-        
-        # فحص الأوامر كأوامر منفردة فقط (النص كاملاً يجب أن يكون الأمر)
-        is_word_command = text.strip() in word_commands
-        
-        if is_word_command:
-            try:
-                from modules.word_game import start_word_game
-                await start_word_game(message)
-                return
-            except Exception as e:
-                logging.error(f"خطأ في بدء لعبة الكلمة: {e}")
-                await message.reply("❌ حدث خطأ أثناء بدء لعبة الكلمة")
-    
-    # لعبة الرموز - Symbols Game
-    if (message.text and message.chat.type in ['group', 'supergroup']):
-        symbols_commands = ['الرموز', 'رموز', 'symbols']
-        
-        # فحص الأوامر كأوامر منفردة فقط (النص كاملاً يجب أن يكون الأمر)
-        is_symbols_command = text.strip() in symbols_commands
-        
-        if is_symbols_command:
-            try:
-                from modules.symbols_game import start_symbols_game
-                await start_symbols_game(message)
-                return
-            except Exception as e:
-                logging.error(f"خطأ في بدء لعبة الرموز: {e}")
-                await message.reply("❌ حدث خطأ أثناء بدء لعبة الرموز")
-    
-    # أمر قائمة الألعاب
-    if message.text:
-        import re
-        games_list_commands = ['العاب', 'الالعاب', 'games', 'قائمة الالعاب']
-        
-        # فحص الأوامر ككلمات مستقلة
-        is_games_list_command = False
-        for command in games_list_commands:
-            if command == 'قائمة الالعاب':
-                if re.search(r'\bقائمة\s+الالعاب\b', text):
-                    is_games_list_command = True
-                    break
-            else:
-                if re.search(rf'\b{re.escape(command)}\b', text):
-                    is_games_list_command = True
-                    break
-        
-        if is_games_list_command:
-            try:
-                from modules.games_list import show_games_list
-                await show_games_list(message)
-                return
-            except Exception as e:
-                logging.error(f"خطأ في عرض قائمة الألعاب: {e}")
-                await message.reply("❌ حدث خطأ في عرض قائمة الألعاب")
-
-    # أمر الألعاب المقترحة
-    if message.text:
-        import re
-        suggested_commands = ['اقتراحات', 'العاب مقترحة', 'الاقتراحات', 'مقترحة']
-        
-        # فحص الأوامر ككلمات مستقلة
-        is_suggested_command = False
-        for command in suggested_commands:
-            if command == 'العاب مقترحة':
-                if re.search(r'\bالعاب\s+مقترحة\b', text):
-                    is_suggested_command = True
-                    break
-            else:
-                if re.search(rf'\b{re.escape(command)}\b', text):
-                    is_suggested_command = True
-                    break
-        
-        if is_suggested_command:
-            try:
-                from modules.suggested_games import get_suggested_games_list
-                suggested_text = get_suggested_games_list()
-                await message.reply(suggested_text)
-                return
-            except Exception as e:
-                logging.error(f"خطأ في عرض الألعاب المقترحة: {e}")
-                await message.reply("❌ حدث خطأ في عرض الألعاب المقترحة")
-
-    # لعبة ساحة الموت الأخيرة - Battle Arena Game
-    if (message.text and message.chat.type in ['group', 'supergroup']):
-        import re
-        battle_commands = ['ساحة الموت', 'battle', 'معركة', 'ساحة المعركة']
-        
-        # فحص الأوامر ككلمات مستقلة
-        is_battle_command = False
-        for command in battle_commands:
-            if command in ['ساحة الموت', 'ساحة المعركة']:
-                command_words = command.split()
-                pattern = r'\b' + r'\s+'.join(re.escape(word) for word in command_words) + r'\b'
-                if re.search(pattern, text):
-                    is_battle_command = True
-                    break
-            else:
-                if re.search(rf'\b{re.escape(command)}\b', text):
-                    is_battle_command = True
-                    break
-        
-        if is_battle_command:
-            try:
-                from modules.battle_arena_game import start_battle_arena
-                await start_battle_arena(message)
-                return
-            except Exception as e:
-                logging.error(f"خطأ في بدء ساحة الموت: {e}")
-                await message.reply("❌ حدث خطأ أثناء بدء ساحة الموت الأخيرة")
-    
-    # نظام مراهنة الحظ - Luck Gambling System
-    if (message.text and (
-        # أوامر المراهنة المحددة
-        any(phrase in text for phrase in ['حظ فلوسي', 'حظ كل فلوسي', 'حظ كامل فلوسي']) or
-        # حظ + مبلغ
-        (text.strip().startswith('حظ ') and len(text.split()) >= 2 and text.split()[1].replace('$', '').replace(',', '').isdigit())
-    )):
-        try:
-            from modules.luck_gambling import parse_gamble_command, process_luck_gamble
-            amount, bet_all = parse_gamble_command(text)
-            
-            if amount is not None or bet_all:
-                await process_luck_gamble(message, amount, bet_all)
-            else:
-                from modules.luck_gambling import show_gambling_help
-                await show_gambling_help(message)
-            return
-        except Exception as e:
-            logging.error(f"خطأ في مراهنة الحظ: {e}")
-            await message.reply("❌ حدث خطأ في مراهنة الحظ")
-
-    # لعبة عجلة الحظ - Luck Wheel Game  
-    if message.text:
-        import re
-        wheel_commands = ['عجلة الحظ', 'عجلة', 'wheel']
-        
-        # فحص الأوامر ككلمات مستقلة
-        is_wheel_command = False
-        for command in wheel_commands:
-            if command == 'عجلة الحظ':
-                if re.search(r'\bعجلة\s+الحظ\b', text):
-                    is_wheel_command = True
-                    break
-            else:
-                if re.search(rf'\b{re.escape(command)}\b', text):
-                    is_wheel_command = True
-                    break
-        
-        # فحص خاص لكلمة "حظ" مع شروط خاصة
-        if not is_wheel_command and (text == 'حظ' or text.endswith(' حظ') or ' حظ ' in text):
-            is_wheel_command = True
-        
-        if is_wheel_command:
-            try:
-                from modules.luck_wheel_game import start_luck_wheel
-                await start_luck_wheel(message)
-                return
-            except Exception as e:
-                logging.error(f"خطأ في بدء عجلة الحظ: {e}")
-                await message.reply("❌ حدث خطأ في عجلة الحظ")
-
-    # لعبة خمن الرقم - Number Guess Game
-    if (message.text and message.chat.type in ['group', 'supergroup']):
-        import re
-        number_commands = ['خمن الرقم', 'تخمين', 'رقم', 'guess']
-        
-        # فحص الأوامر ككلمات مستقلة
-        is_number_command = False
-        for command in number_commands:
-            if command == 'خمن الرقم':
-                if re.search(r'\bخمن\s+الرقم\b', text):
-                    is_number_command = True
-                    break
-            else:
-                if re.search(rf'\b{re.escape(command)}\b', text):
-                    is_number_command = True
-                    break
-        
-        if is_number_command:
-            try:
-                from modules.number_guess_game import start_number_guess_game
-                await start_number_guess_game(message)
-                return
-            except Exception as e:
-                logging.error(f"خطأ في بدء لعبة خمن الرقم: {e}")
-                await message.reply("❌ حدث خطأ في لعبة خمن الرقم")
-
-    # لعبة سؤال وجواب سريعة - Quick Quiz Game
-    if (message.text and message.chat.type in ['group', 'supergroup']):
-        # فحص الأوامر ككلمات مستقلة باستخدام word boundaries
-        import re
-        quiz_commands = ['سؤال وجواب', 'مسابقة', 'quiz', 'سؤال']
-        
-        # فحص كل أمر على حدة ككلمة مستقلة
-        is_quiz_command = False
-        for command in quiz_commands:
-            if command == 'سؤال وجواب':
-                # فحص خاص للعبارة المكونة من كلمتين
-                if re.search(r'\bسؤال\s+وجواب\b', text):
-                    is_quiz_command = True
-                    break
-            else:
-                # فحص الكلمات المفردة كأوامر مستقلة
-                if re.search(rf'\b{re.escape(command)}\b', text):
-                    is_quiz_command = True
-                    break
-        
-        if is_quiz_command:
-            try:
-                from modules.quick_quiz_game import start_quick_quiz_game
-                await start_quick_quiz_game(message)
-                return
-            except Exception as e:
-                logging.error(f"خطأ في بدء مسابقة سؤال وجواب: {e}")
-                await message.reply("❌ حدث خطأ في بدء المسابقة")
-    
-    # لعبة اكس اوه - XO/Tic-Tac-Toe Game
-    if (message.text and message.chat.type in ['group', 'supergroup']):
-        import re
-        xo_commands = ['اكس اوه', 'xo', 'اكس او', 'اكساوه']
-        
-        # فحص الأوامر ككلمات مستقلة
-        is_xo_command = False
-        for command in xo_commands:
-            if command in ['اكس اوه', 'اكس او']:
-                command_words = command.split()
-                pattern = r'\b' + r'\s+'.join(re.escape(word) for word in command_words) + r'\b'
-                if re.search(pattern, text):
-                    is_xo_command = True
-                    break
-            else:
-                if re.search(rf'\b{re.escape(command)}\b', text):
-                    is_xo_command = True
-                    break
-        
-        if is_xo_command:
-            try:
-                from modules.xo_game import start_xo_game
-                await start_xo_game(message)
-                return
-            except Exception as e:
-                logging.error(f"خطأ في بدء لعبة اكس اوه: {e}")
-                await message.reply("❌ حدث خطأ أثناء بدء لعبة اكس اوه")
-    
-    # لعبة حجر ورقة مقص - Rock Paper Scissors Game
-    if (message.text and message.chat.type in ['group', 'supergroup']):
-        import re
-        rps_commands = ['حجر ورقة مقص', 'حجر ورقة', 'rps']
-        
-        # فحص الأوامر ككلمات مستقلة
-        is_rps_command = False
-        for command in rps_commands:
-            if command in ['حجر ورقة مقص', 'حجر ورقة']:
-                command_words = command.split()
-                pattern = r'\b' + r'\s+'.join(re.escape(word) for word in command_words) + r'\b'
-                if re.search(pattern, text):
-                    is_rps_command = True
-                    break
-            else:
-                if re.search(rf'\b{re.escape(command)}\b', text):
-                    is_rps_command = True
-                    break
-        
-        if is_rps_command:
-            try:
-                from modules.rock_paper_scissors_game import start_rock_paper_scissors_game
-                await start_rock_paper_scissors_game(message)
-                return
-            except Exception as e:
-                logging.error(f"خطأ في بدء لعبة حجر ورقة مقص: {e}")
-                await message.reply("❌ حدث خطأ أثناء بدء لعبة حجر ورقة مقص")
-    
-    # لعبة صدق أم كذب - True False Game
-    if (message.text and message.chat.type in ['group', 'supergroup']):
-        import re
-        tf_commands = ['صدق أم كذب', 'صدق كذب', 'true false']
-        
-        # فحص الأوامر ككلمات مستقلة
-        is_tf_command = False
-        for command in tf_commands:
-            if command in ['صدق أم كذب', 'صدق كذب']:
-                command_words = command.split()
-                pattern = r'\b' + r'\s+'.join(re.escape(word) for word in command_words) + r'\b'
-                if re.search(pattern, text):
-                    is_tf_command = True
-                    break
-            else:
-                if re.search(rf'\b{re.escape(command)}\b', text):
-                    is_tf_command = True
-                    break
-        
-        if is_tf_command:
-            try:
-                from modules.true_false_game import start_true_false_game
-                await start_true_false_game(message, vs_ai=True)
-                return
-            except Exception as e:
-                logging.error(f"خطأ في بدء لعبة صدق أم كذب: {e}")
-                await message.reply("❌ حدث خطأ أثناء بدء لعبة صدق أم كذب")
-    
-    # لعبة التحدي الرياضي - Math Challenge Game
-    if (message.text and message.chat.type in ['group', 'supergroup']):
-        import re
-        math_commands = ['تحدي رياضي', 'رياضيات', 'math challenge']
-        
-        # فحص الأوامر ككلمات مستقلة
-        is_math_command = False
-        for command in math_commands:
-            if command in ['تحدي رياضي']:
-                command_words = command.split()
-                pattern = r'\b' + r'\s+'.join(re.escape(word) for word in command_words) + r'\b'
-                if re.search(pattern, text):
-                    is_math_command = True
-                    break
-            else:
-                if re.search(rf'\b{re.escape(command)}\b', text):
-                    is_math_command = True
-                    break
-        
-        if is_math_command:
-            try:
-                from modules.math_challenge_game import start_math_challenge_game
-                await start_math_challenge_game(message, vs_ai=True, difficulty="easy")
-                return
-            except Exception as e:
-                logging.error(f"خطأ في بدء التحدي الرياضي: {e}")
-                await message.reply("❌ حدث خطأ أثناء بدء التحدي الرياضي")
+    # أوامر الألعاب والردود السريعة عبر موجه الأوامر المجمّع
+    if message.text and await general_command_router.dispatch(message, text):
+        return
     
     # معالج خاص لحرف "ا" منفرداً في المجموعات - عرض معلومات الملف الشخصي
     if (message.text and message.text.strip() == "ا" and 
@@ -1616,19 +1421,22 @@ async def handle_general_message(message: Message, state: FSMContext):
             await message.reply("❌ حدث خطأ أثناء عرض معلومات المطور")
             return
     
-    # تتبع عدد الرسائل الحقيقي في المجموعات
+    # تتبع عدد الرسائل الحقيقي في المجموعات (عبر طابور الكتابة المؤجلة)
     if message.chat.type in ['group', 'supergroup'] and message.from_user:
         try:
-            from database.operations import increment_user_message_count
-            await increment_user_message_count(message.from_user.id, message.chat.id)
+            from database.write_behind import write_behind_queue
+            from modules.analytics_tracker import AnalyticsTracker
+            write_behind_queue.increment_message_count(message.from_user.id, message.chat.id)
+            # عداد الرسائل اليومية والنشطين اليوم للوحات التحكم
+            await AnalyticsTracker.track_message_activity(message.from_user.id, message.chat.id)
         except Exception as msg_count_error:
             logging.error(f"خطأ في تتبع عدد الرسائل: {msg_count_error}")
     
-    # تحديث نشاط المستخدم وإضافة XP للرسائل
+    # تحديث نشاط المستخدم وإضافة XP للرسائل (تُجمع وتُكتب دفعة واحدة)
     try:
-        await update_user_activity(message.from_user.id)
-        from modules.leveling import add_xp
-        await add_xp(message.from_user.id, 1)
+        from database.write_behind import write_behind_queue
+        write_behind_queue.touch_user_activity(message.from_user.id)
+        write_behind_queue.add_message_xp(message.from_user.id)
     except Exception as activity_error:
         logging.error(f"خطأ في تحديث النشاط أو XP: {activity_error}")
     
@@ -1772,19 +1580,11 @@ async def handle_general_message(message: Message, state: FSMContext):
         return
     
     # فحص أوامر المستوى بدقة - مستواي كلمة مفردة فقط
-    import re
-    level_commands = ["مستوايا", "مستوى", "level", "xp"]
-    is_level_command = False
-    
     # فحص "مستواي" و "تقدمي" كلمات مفردة فقط (مع السماح للمسافات في البداية والنهاية)
-    if text.strip() == "مستواي" or text.strip() == "تقدمي":
-        is_level_command = True
-    else:
-        # فحص الأوامر الأخرى بالطريقة العادية
-        for command in level_commands:
-            if re.search(rf'\b{re.escape(command)}\b', text):
-                is_level_command = True
-                break
+    is_level_command = (
+        text.strip() in ("مستواي", "تقدمي") or
+        LEVEL_COMMAND_PATTERN.search(text) is not None
+    )
     
     if is_level_command:
         try:
@@ -1837,28 +1637,8 @@ async def handle_general_message(message: Message, state: FSMContext):
     if await handle_custom_commands_message(message):
         return
     
-    # فحص أوامر المسح قبل الردود المخصصة
-    if text.startswith('مسح ') or text == 'مسح بالرد' or text == 'مسح':
-        logging.info(f"تم اكتشاف أمر مسح: '{text}' - سيتم توجيهه للمعالج")
-        from modules.clear_commands import handle_clear_command
-        await handle_clear_command(message, text)
-        return
-    
-    # فحص أوامر إدارة قاعدة بيانات المخالفات الجديدة
-    if text in ['سجل السوابق', 'سجل السبابين'] or text.startswith('سجل السوابق '):
-        logging.info(f"تم اكتشاف أمر سجل السوابق: '{text}'")
-        from modules.admin_management import handle_violations_record_command
-        await handle_violations_record_command(message)
-        return
-    elif text == 'تنظيف' or text.startswith('تنظيف '):
-        logging.info(f"تم اكتشاف أمر تنظيف: '{text}'")
-        from modules.admin_management import handle_violations_cleanup_command
-        await handle_violations_cleanup_command(message)
-        return
-    elif text.startswith('إلغاء سوابق ') or text == 'إلغاء سوابق':
-        logging.info(f"تم اكتشاف أمر إلغاء سوابق: '{text}'")
-        from modules.admin_management import handle_clear_user_record_command
-        await handle_clear_user_record_command(message)
+    # أوامر المسح وسجل المخالفات (قبل الردود المخصصة) عبر شجرة البادئات
+    if message.text and await moderation_command_router.dispatch(message, text):
         return
     
     # معالجة أرقام لعبة خمن الرقم
@@ -2803,17 +2583,12 @@ async def handle_general_message(message: Message, state: FSMContext):
     if (message.text and message.chat.type in ['group', 'supergroup'] and 
         message.from_user and not message.from_user.is_bot):
         try:
-            # منح XP للنشاط العادي (الرسائل) باستخدام النظام المباشر
-            from modules.leveling import leveling_system
-            success, xp_message = await leveling_system.add_xp(message.from_user.id, "message")
+            # منح XP للنشاط العادي (الرسائل) عبر طابور الكتابة المؤجلة
+            from database.write_behind import write_behind_queue
+            write_behind_queue.add_message_xp(message.from_user.id)
             
             # تحديث نشاط المستخدم
-            await update_user_activity(message.from_user.id)
-            
-            if success:
-                logging.info(f"✨ تم منح XP للمستخدم {message.from_user.id} من الرسالة العادية - {xp_message}")
-            else:
-                logging.warning(f"⚠️ فشل منح XP للمستخدم {message.from_user.id}: {xp_message}")
+            write_behind_queue.touch_user_activity(message.from_user.id)
             
         except Exception as e:
             logging.error(f"خطأ في منح XP للرسالة العادية: {e}")
@@ -3247,13 +3022,12 @@ async def handle_ai_comprehensive_response(message: Message):
         # فحص فلتر الألفاظ المسيئة قبل كل شيء
         if message.text and message.chat.type in ['group', 'supergroup']:
             try:
-                from modules.profanity_filter import ProfanityFilter
-                profanity_filter = ProfanityFilter()
+                from modules.profanity_filter import profanity_filter
                 
                 # التحقق من تفعيل الفلتر في هذه المجموعة
                 if profanity_filter.is_enabled(message.chat.id):
                     # فحص النص للألفاظ المسيئة
-                    has_profanity, found_words = profanity_filter.contains_profanity(message.text)
+                    has_profanity, found_words = profanity_filter.contains_profanity(message.text, message.chat.id)
                     
                     if has_profanity:
                         # حذف الرسالة فوراً
@@ -51,15 +51,14 @@ class UnifiedMessageProcessor:
                 # فحص فلتر الألفاظ المسيئة للرسائل النصية
                 if message.text or message.caption:
                     try:
-                        # إنشاء مثيل من فلتر الألفاظ
-                        from modules.profanity_filter import ProfanityFilter
-                        profanity_filter = ProfanityFilter()
+                        # استخدام النسخة العامة من فلتر الألفاظ (المحرك مجمّع مسبقاً)
+                        from modules.profanity_filter import profanity_filter
                         
                         # التحقق من تفعيل الفلتر في هذه المجموعة
                         if profanity_filter.is_enabled(message.chat.id):
                             # فحص النص للألفاظ المسيئة
                             text_to_check = message.text or message.caption or ""
-                            has_profanity, found_words = profanity_filter.contains_profanity(text_to_check)
+                            has_profanity, found_words = profanity_filter.contains_profanity(text_to_check, message.chat.id)
                             
                             if has_profanity:
                                 # حذف الرسالة
@@ -122,28 +121,30 @@ class UnifiedMessageProcessor:
         """تحليل محتوى الوسائط"""
         loading_message = None
         try:
-            # إرسال رسالة انتظار
-            loading_message = await message.reply("🔍 **جاري تحليل الملف...**")
-            
             # تحديد نوع الملف وتحميله
             file_id = None
+            file_unique_id = None
             file_name = "unknown"
             media_type = None
             
             if message.photo:
                 file_id = message.photo[-1].file_id
+                file_unique_id = message.photo[-1].file_unique_id
                 file_name = f"photo_{message.message_id}.jpg"
                 media_type = "photo"
             elif message.video:
                 file_id = message.video.file_id
+                file_unique_id = message.video.file_unique_id
                 file_name = f"video_{message.message_id}.mp4"
                 media_type = "video"
             elif message.animation:
                 file_id = message.animation.file_id
+                file_unique_id = message.animation.file_unique_id
                 file_name = f"animation_{message.message_id}.gif"
                 media_type = "animation"
             elif message.sticker:
                 file_id = message.sticker.file_id
+                file_unique_id = message.sticker.file_unique_id
                 # تحديد نوع الملصق بناءً على الخصائص
                 if hasattr(message.sticker, 'is_animated') and message.sticker.is_animated:
                     file_name = f"animated_sticker_{message.message_id}.tgs"
@@ -156,6 +157,7 @@ class UnifiedMessageProcessor:
                     media_type = "sticker"
             elif message.document:
                 file_id = message.document.file_id
+                file_unique_id = message.document.file_unique_id
                 file_name = message.document.file_name or f"document_{message.message_id}"
                 # فحص إذا كان المستند صورة متحركة أو ملصق
                 if file_name and (file_name.lower().endswith(('.gif', '.webp')) or 'gif' in file_name.lower()):
@@ -168,34 +170,65 @@ class UnifiedMessageProcessor:
                     media_type = "document"
             
             if not file_id:
-                await loading_message.delete()
                 return False
             
+            # حكم سابق لنفس الملف (نفس الملصق أو الميم) - بدون تحميل أو رسالة انتظار
+            from modules.media_verdict_cache import media_verdict_cache, compute_phash, PHASH_MEDIA_TYPES
+            cached_verdict = await media_verdict_cache.lookup(file_unique_id)
+            if cached_verdict:
+                return await self._apply_cached_verdict(message, cached_verdict)
+            
             # تحميل الملف
             file_path = await media_analyzer.download_media_file(
                 message.bot, file_id, file_name
             )
             
             if not file_path:
-                await loading_message.edit_text("❌ فشل في تحميل الملف")
+                await message.reply("❌ فشل في تحميل الملف")
                 return False
             
             # تحليل المحتوى
             analysis_result = None
             
-            if media_type == "photo":
-                analysis_result = await media_analyzer.analyze_image_content(file_path)
-            elif media_type == "video":
-                analysis_result = await media_analyzer.analyze_video_content(file_path)
-            elif media_type == "animation":
-                analysis_result = await media_analyzer.analyze_animation_content(file_path)
-            elif media_type in ["sticker", "animated_sticker", "video_sticker"]:
-                analysis_result = await media_analyzer.analyze_sticker_content(file_path, media_type)
-            elif media_type == "document":
-                analysis_result = await media_analyzer.analyze_document_content(file_path)
+            try:
+                # البصمة الإدراكية تلتقط الصور المعاد ضغطها أو تحجيمها
+                phash = None
+                if media_type in PHASH_MEDIA_TYPES:
+                    phash = await asyncio.to_thread(compute_phash, file_path.source)
+                cached_verdict = await media_verdict_cache.lookup_phash(phash)
+                if cached_verdict:
+                    # الحكم المنسوخ يُربط بمعرّف الملف فقط: بصمته لا تصبح هدف مطابقة
+                    # حتى لا تتسلسل المطابقات التقريبية بعيداً عن الصورة التي حللها Gemini
+                    await media_verdict_cache.remember(file_unique_id, media_type, cached_verdict, None)
+                    return await self._apply_cached_verdict(message, cached_verdict)
+                
+                # حد معدل تحليل Gemini: الملف الزائد يُحذف بدلاً من تمريره دون فحص
+                from utils.rate_limiter import check_media_analysis
+                if not check_media_analysis(message.from_user.id, message.chat.id):
+                    return await self._reject_rate_limited_media(message)
+                
+                # إرسال رسالة انتظار (التحليل الفعلي فقط)
+                loading_message = await message.reply("🔍 **جاري تحليل الملف...**")
+                
+                # ربط طلبات Gemini بهذه المحادثة لطوابير العدالة في البوابة
+                from modules.gemini_gateway import gemini_gateway
+                with gemini_gateway.for_chat(message.chat.id):
+                    if media_type == "photo":
+                        analysis_result = await media_analyzer.analyze_image_content(file_path)
+                    elif media_type == "video":
+                        analysis_result = await media_analyzer.analyze_video_content(file_path)
+                    elif media_type == "animation":
+                        analysis_result = await media_analyzer.analyze_animation_content(file_path)
+                    elif media_type in ["sticker", "animated_sticker", "video_sticker"]:
+                        analysis_result = await media_analyzer.analyze_sticker_content(file_path, media_type)
+                    elif media_type == "document":
+                        analysis_result = await media_analyzer.analyze_document_content(file_path)
+            finally:
+                # حذف الملف المؤقت
+                await media_analyzer.cleanup_temp_file(file_path)
             
-            # حذف الملف المؤقت
-            await media_analyzer.cleanup_temp_file(file_path)
+            # حفظ الحكم (الأخطاء لا تُحفظ)
+            await media_verdict_cache.remember(file_unique_id, media_type, analysis_result, phash)
             
             # معالجة نتيجة التحليل
             if analysis_result and not analysis_result.get("error"):
@@ -299,6 +332,51 @@ class UnifiedMessageProcessor:
             except:
                 pass
             return False
+    
+    async def _reject_rate_limited_media(self, message: Message) -> bool:
+        """حذف ملف تجاوز صاحبه حد التحليل مع تنبيه واحد لكل موجة رفض"""
+        from utils.rate_limiter import rate_limiter, format_retry_message
+        user_id, chat_id = message.from_user.id, message.chat.id
+        logging.info(f"🚦 تم حذف ملف من المستخدم {user_id} في {chat_id} (تجاوز حد تحليل الوسائط)")
+        try:
+            await message.delete()
+        except Exception as delete_error:
+            logging.error(f"❌ خطأ في حذف الملف الزائد عن الحد: {delete_error}")
+        
+        if rate_limiter.should_notify(user_id, chat_id, "media"):
+            retry_text = format_retry_message(rate_limiter.retry_after(user_id, chat_id, "media"))
+            try:
+                await message.answer(f"{retry_text}\n🗑️ تم حذف الملف لأنه لم يُفحص بعد")
+            except Exception as warn_error:
+                logging.error(f"❌ خطأ في إرسال تنبيه تجاوز الحد: {warn_error}")
+        return True
+    
+    async def _apply_cached_verdict(self, message: Message, verdict: dict) -> bool:
+        """تطبيق حكم محفوظ مسبقاً: الآمن يمر بصمت والمخالف يُحذف فوراً"""
+        if verdict.get("is_safe", True):
+            return False
+        
+        try:
+            await message.delete()
+        except:
+            pass
+        
+        user_display_name = getattr(message.from_user, 'first_name', None) or "مجهول"
+        violations = verdict.get("violations", [])
+        warning_msg = f"🗑️ **تم حذف محتوى مخالف سبق تحليله**\n\n"
+        warning_msg += f"👤 **المستخدم:** {user_display_name}\n"
+        if violations:
+            warning_msg += f"📋 **المخالفات:** {', '.join(violations)}\n"
+        warning_msg += f"⚖️ **درجة الخطورة:** {verdict.get('severity', 'medium')}"
+        try:
+            await message.answer(warning_msg)
+        except Exception as warn_error:
+            logging.error(f"❌ خطأ في إرسال التحذير: {warn_error}")
+        
+        if message.bot:
+            await self.content_moderator.notify_authorities(message, message.bot, verdict)
+        await self.content_moderator.log_violation(message, verdict)
+        return True
 
 # إنشاء المعالج الموحد
 unified_processor = UnifiedMessageProcessor()
@@ -63,9 +63,17 @@ async def main():
     # إنشاء كائن البوت مع الإعدادات الافتراضية
     bot = Bot(token=BOT_TOKEN)
     
+    # طابور الرسائل الصادرة - حدود تليجرام وأولويات الإرسال ودمج التعديلات
+    from modules.outbound_queue import outbound_dispatcher
+    bot.session.middleware(outbound_dispatcher)
+    
     # إنشاء موزع الأحداث
     dp = Dispatcher()
     
+    # محدد معدل الاستخدام - يرفض الطلبات المكلفة الزائدة قبل وصولها للمعالجات
+    from utils.rate_limiter import RateLimitMiddleware
+    dp.message.outer_middleware(RateLimitMiddleware())
+    
     # تسجيل معالجات الأحداث (بترتيب الأولوية)
     dp.include_router(commands.router)
     
@@ -122,6 +130,27 @@ async def main():
     except Exception as e:
         logging.error(f"❌ خطأ في تهيئة نظام فحص المحتوى: {e}")
     
+    # تهيئة فلتر الألفاظ المسيئة (الإعدادات والكلمات المخصصة)
+    try:
+        from modules.profanity_filter import profanity_filter
+        await profanity_filter.init_database()
+    except Exception as e:
+        logging.error(f"❌ خطأ في تهيئة فلتر الألفاظ المسيئة: {e}")
+    
+    # تحميل ذاكرة معرفات ملفات الأغاني والفيديوهات
+    try:
+        from modules.media_file_cache import media_file_cache
+        await media_file_cache.init_database()
+    except Exception as e:
+        logging.error(f"❌ خطأ في تهيئة ذاكرة ملفات الوسائط: {e}")
+    
+    # تحميل أحكام الإشراف المحفوظة على الوسائط
+    try:
+        from modules.media_verdict_cache import media_verdict_cache
+        await media_verdict_cache.init_database()
+    except Exception as e:
+        logging.error(f"❌ خطأ في تهيئة ذاكرة أحكام الوسائط: {e}")
+    
     # تهيئة نظام التصنيف
     try:
         from modules.ranking_system import init_ranking_system
@@ -129,6 +158,20 @@ async def main():
     except Exception as e:
         logging.error(f"خطأ في تهيئة نظام التصنيف: {e}")
     
+    # تحميل لوحات الترتيب في الذاكرة (الثروة، البنك، النقاط الذهبية، XP، الرسائل)
+    try:
+        from database.leaderboards import leaderboards
+        await leaderboards.warm()
+    except Exception as e:
+        logging.error(f"❌ خطأ في تحميل لوحات الترتيب: {e}")
+    
+    # استعادة أسعار سوق الأسهم المحاكى من آخر اللقطات المحفوظة
+    try:
+        from modules.stocks import stock_market
+        await stock_market.load()
+    except Exception as e:
+        logging.error(f"❌ خطأ في تحميل سوق الأسهم: {e}")
+    
     # تهيئة نظام النقابة المتخصص
     try:
         from handlers.guild_handler import initialize_guild_system, load_existing_players
@@ -146,6 +189,10 @@ async def main():
     from modules.custom_commands import load_custom_commands
     await load_custom_commands()
     
+    # تحميل الردود المخصصة إلى فهرس الكلمات
+    from modules.custom_replies import load_custom_replies
+    await load_custom_replies()
+    
     # تحميل إعدادات التحميل
     from modules.media_download import load_download_settings
     await load_download_settings()
@@ -168,6 +215,35 @@ async def main():
     except Exception as shared_error:
         logging.warning(f"⚠️ تحذير في تهيئة الذاكرة المشتركة: {shared_error}")
     
+    # تشغيل صيانة جداول الذاكرة (حلقة دائرية + ملخصات + تفريغ تدريجي)
+    # التحضير هنا قبل بدء الاستقبال لأن تفعيل التفريغ التدريجي يتطلب VACUUM كامل
+    try:
+        from database.retention import retention_engine
+        try:
+            await retention_engine.prepare(allow_vacuum=True)
+        except Exception as prepare_error:
+            logging.warning(f"⚠️ تحذير في تحضير جداول الذاكرة: {prepare_error}")
+        retention_engine.start()
+    except Exception as retention_error:
+        logging.warning(f"⚠️ تحذير في تشغيل صيانة جداول الذاكرة: {retention_error}")
+    
+    # تشغيل المجدول المركزي (مؤقتات الألعاب والمهام الدورية واسترداد المواعيد المعلقة)
+    try:
+        from modules.scheduler import scheduler
+        from modules.farm import auto_update_crop_status
+        from modules.word_game import cleanup_old_games
+        from database.leaderboards import leaderboards, RESYNC_INTERVAL
+        from modules.stocks import stock_market
+        from modules.stock_market import SNAPSHOT_INTERVAL
+        await scheduler.start(bot)
+        scheduler.every("farm:crop_status", 300, auto_update_crop_status, first_delay=60)
+        scheduler.every("word_game:cleanup", 1800, cleanup_old_games)
+        scheduler.every("leaderboards:resync", RESYNC_INTERVAL, leaderboards.resync)
+        scheduler.every("stocks:tick", stock_market.tick_interval, stock_market.tick)
+        scheduler.every("stocks:snapshot", SNAPSHOT_INTERVAL, stock_market.snapshot)
+    except Exception as scheduler_error:
+        logging.warning(f"⚠️ تحذير في تشغيل المجدول المركزي: {scheduler_error}")
+    
     # تهيئة نظام تحليل المستخدمين المتقدم
     try:
         from modules.user_analysis_integration import initialize_user_analysis_system
@@ -225,11 +301,81 @@ async def main():
         import traceback
         logging.error(f"تفاصيل الخطأ: {traceback.format_exc()}")
     finally:
+        # إيقاف المجدول (المواعيد المحفوظة تبقى لاسترداد الألعاب بعد التشغيل)
+        try:
+            from modules.scheduler import scheduler
+            await scheduler.stop()
+        except Exception as scheduler_error:
+            logging.error(f"خطأ في إيقاف المجدول المركزي: {scheduler_error}")
+        
+        # حفظ آخر أسعار الأسهم قبل الإيقاف
+        try:
+            from modules.stocks import stock_market
+            await stock_market.snapshot()
+        except Exception as stocks_error:
+            logging.error(f"خطأ في حفظ أسعار الأسهم: {stocks_error}")
+        
+        # إرسال ما تبقى في طابور الرسائل الصادرة قبل إغلاق الجلسة
+        try:
+            from modules.outbound_queue import outbound_dispatcher
+            await outbound_dispatcher.close()
+        except Exception as outbound_error:
+            logging.error(f"خطأ في إيقاف طابور الرسائل الصادرة: {outbound_error}")
+        
         try:
             await bot.session.close()
             logging.info("✅ تم إغلاق جلسة البوت بنجاح")
         except Exception as close_error:
             logging.error(f"خطأ في إغلاق الجلسة: {close_error}")
+        
+        # إيقاف عمال التحميل وحذف الملفات المؤقتة
+        try:
+            from modules.download_workers import download_pool
+            await download_pool.shutdown()
+        except Exception as download_error:
+            logging.error(f"خطأ في إيقاف مجمع التحميل: {download_error}")
+        
+        # إيقاف خيوط بوابة Gemini
+        try:
+            from modules.gemini_gateway import gemini_gateway
+            gemini_gateway.shutdown()
+        except Exception as gateway_error:
+            logging.error(f"خطأ في إيقاف بوابة Gemini: {gateway_error}")
+        
+        # إيقاف صيانة جداول الذاكرة
+        try:
+            from database.retention import retention_engine
+            await retention_engine.stop()
+        except Exception as retention_error:
+            logging.error(f"خطأ في إيقاف صيانة جداول الذاكرة: {retention_error}")
+        
+        # تفريغ طابور الذاكرة المشتركة
+        try:
+            from modules.shared_memory_sqlite import shared_group_memory_sqlite
+            await shared_group_memory_sqlite.ingestor.close()
+        except Exception as ingest_error:
+            logging.error(f"خطأ في تفريغ طابور الذاكرة المشتركة: {ingest_error}")
+        
+        # حفظ عدادات أحكام الوسائط المعلقة
+        try:
+            from modules.media_verdict_cache import media_verdict_cache
+            await media_verdict_cache.flush_hits()
+        except Exception as verdict_error:
+            logging.error(f"خطأ في حفظ عدادات أحكام الوسائط: {verdict_error}")
+        
+        # تفريغ الكتابات المؤجلة قبل إغلاق الاتصالات
+        try:
+            from database.write_behind import write_behind_queue
+            await write_behind_queue.close()
+        except Exception as flush_error:
+            logging.error(f"خطأ في تفريغ طابور الكتابة المؤجلة: {flush_error}")
+        
+        # إغلاق مجمع اتصالات قاعدة البيانات
+        try:
+            from database.connection_pool import close_all_pools
+            await close_all_pools()
+        except Exception as pool_error:
+            logging.error(f"خطأ في إغلاق مجمع الاتصالات: {pool_error}")
 
 
 if __name__ == "__main__":
@@ -210,6 +210,10 @@ class AIIntegrationHandler:
     async def get_ai_system_status(self) -> Dict[str, Any]:
         """الحصول على حالة جميع أنظمة الذكاء الاصطناعي"""
         try:
+            from modules.ai_response_cache import ai_response_cache
+            from modules.gemini_gateway import gemini_gateway
+            from modules.prompt_context import prompt_context_builder
+            
             ai_status = self.comprehensive_ai.get_system_status()
             processor_stats = await self.smart_processor.get_processing_stats()
             
@@ -236,7 +240,10 @@ class AIIntegrationHandler:
                     'games_loaded': len(self.intelligent_games.smart_games),
                     'stories_loaded': len(self.intelligent_games.interactive_stories)
                 },
-                'integration_settings': self.integration_settings
+                'integration_settings': self.integration_settings,
+                'response_cache': ai_response_cache.get_stats(),
+                'gemini_gateway': gemini_gateway.get_stats(),
+                'prompt_context': prompt_context_builder.get_stats()
             }
             
             return status
@@ -0,0 +1,211 @@
+"""
+ذاكرة ردود الذكاء الاصطناعي للأسئلة المتكررة
+AI Response Cache for Repeated Questions
+
+تخزن ردود Gemini حسب نص السؤال المطبّع مع بصمة السياق (المحادثة وفئة
+المستخدم)، مع مدة صلاحية وإخراج الأقدم استخداماً. طبقة تشابه اختيارية
+(TF-IDF على مقاطع الحروف عبر scikit-learn) تخدم الأسئلة شبه المتطابقة.
+يُستبدل اسم السائل في الرد المخزن بعلامة ثم يُعاد بالاسم الحالي عند الاستخدام.
+"""
+
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import linear_kernel
+    SIMILARITY_AVAILABLE = True
+except ImportError:
+    SIMILARITY_AVAILABLE = False
+
+# الحد الأقصى لعدد الردود المخزنة
+DEFAULT_MAX_SIZE = 1000
+
+# مدة صلاحية الرد المخزن (ثواني)
+DEFAULT_TTL = 1800.0
+
+# أقل درجة تشابه لاعتبار السؤال مطابقاً
+DEFAULT_SIMILARITY_THRESHOLD = 0.85
+
+# أقل فاصل بين إعادتي بناء فهرس التشابه (ثواني)
+SIMILARITY_REFIT_INTERVAL = 30.0
+
+# أطول سؤال يستحق التخزين (الأسئلة الطويلة نادراً ما تتكرر)
+MAX_CACHEABLE_LENGTH = 200
+
+# علامة اسم السائل داخل الرد المخزن
+NAME_PLACEHOLDER = "{__asker__}"
+
+_PUNCTUATION = re.compile(r'[^\w\s]', re.UNICODE)
+
+
+def normalize_question(text: str) -> str:
+    """تطبيع السؤال: توحيد الحروف العربية وإزالة الترقيم والمسافات الزائدة"""
+    from modules.profanity_engine import normalize_arabic
+    text = _PUNCTUATION.sub(' ', normalize_arabic(text or ""))
+    # تقليص الحروف المكررة (هلااااا -> هلا)
+    text = re.sub(r'(.)\1{2,}', r'\1', text)
+    return " ".join(text.split())
+
+
+class AIResponseCache:
+    """ذاكرة LRU + TTL لردود الذكاء الاصطناعي مع طبقة تشابه اختيارية"""
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, ttl: float = DEFAULT_TTL,
+                 similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+                 use_similarity: bool = True):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.use_similarity = use_similarity and SIMILARITY_AVAILABLE
+
+        # (السؤال المطبّع، البصمة) -> (الرد، وقت الانتهاء)
+        self._entries: "OrderedDict[Tuple[str, str], tuple]" = OrderedDict()
+
+        # فهرس التشابه: المتجهات ومفاتيحها وقت آخر بناء
+        self._vectorizer = None
+        self._matrix = None
+        self._matrix_keys: List[Tuple[str, str]] = []
+        self._dirty = False
+        self._last_fit = 0.0
+
+        self.stats = {
+            'exact_hits': 0,
+            'similar_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'refits': 0,
+        }
+
+    @staticmethod
+    def fingerprint(chat_id: Optional[int], tier: str) -> str:
+        """بصمة السياق: المحادثة وفئة المستخدم"""
+        return f"{chat_id or 0}:{tier}"
+
+    # ===== البحث =====
+
+    def get(self, question: str, fingerprint: str, user_name: str = "") -> Optional[str]:
+        """البحث عن رد مخزن (مطابقة تامة ثم تشابه) مع وضع اسم السائل الحالي"""
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+
+        key = (normalized, fingerprint)
+        response = self._get_entry(key)
+        if response is not None:
+            self.stats['exact_hits'] += 1
+            return response.replace(NAME_PLACEHOLDER, user_name)
+
+        if self.use_similarity:
+            similar_key = self._find_similar(normalized, fingerprint)
+            if similar_key is not None:
+                response = self._get_entry(similar_key)
+                if response is not None:
+                    self.stats['similar_hits'] += 1
+                    return response.replace(NAME_PLACEHOLDER, user_name)
+
+        self.stats['misses'] += 1
+        return None
+
+    def _get_entry(self, key: Tuple[str, str]) -> Optional[str]:
+        """قراءة مدخل مع التحقق من صلاحيته وتحديث ترتيب الاستخدام"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        response, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self._dirty = True
+            self.stats['expirations'] += 1
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def _find_similar(self, normalized: str, fingerprint: str) -> Optional[Tuple[str, str]]:
+        """أقرب سؤال مخزن بنفس البصمة حسب تشابه TF-IDF"""
+        try:
+            self._refit_if_needed()
+            if self._matrix is None:
+                return None
+
+            scores = linear_kernel(self._vectorizer.transform([normalized]), self._matrix).ravel()
+            best_key, best_score = None, self.similarity_threshold
+            for index in scores.argsort()[::-1]:
+                if scores[index] < best_score:
+                    break
+                key = self._matrix_keys[index]
+                if key[1] == fingerprint and key in self._entries:
+                    best_key = key
+                    break
+            return best_key
+        except Exception as e:
+            logging.error(f"خطأ في البحث بالتشابه في ذاكرة الردود: {e}")
+            return None
+
+    def _refit_if_needed(self):
+        """إعادة بناء فهرس التشابه عند التغير (بحد أقصى مرة كل فترة)"""
+        if not self._dirty or time.monotonic() - self._last_fit < SIMILARITY_REFIT_INTERVAL:
+            return
+        self._dirty = False
+        self._last_fit = time.monotonic()
+        self._matrix_keys = list(self._entries)
+        if not self._matrix_keys:
+            self._vectorizer, self._matrix = None, None
+            return
+        self._vectorizer = TfidfVectorizer(analyzer='char_wb', ngram_range=(2, 4))
+        self._matrix = self._vectorizer.fit_transform([question for question, _ in self._matrix_keys])
+        self.stats['refits'] += 1
+
+    # ===== التخزين =====
+
+    def put(self, question: str, fingerprint: str, response: str, user_name: str = ""):
+        """تخزين رد مع استبدال اسم السائل بعلامة قابلة للتعويض"""
+        normalized = normalize_question(question)
+        if not normalized or not response:
+            return
+        if user_name:
+            response = response.replace(user_name, NAME_PLACEHOLDER)
+
+        key = (normalized, fingerprint)
+        self._entries[key] = (response, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        self._dirty = True
+        self.stats['stores'] += 1
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def invalidate_chat(self, chat_id: Optional[int]):
+        """حذف ردود محادثة (عند تغير معلوماتها)"""
+        prefix = f"{chat_id or 0}:"
+        for key in [k for k in self._entries if k[1].startswith(prefix)]:
+            del self._entries[key]
+        self._dirty = True
+
+    def clear(self):
+        """تفريغ الذاكرة بالكامل"""
+        self._entries.clear()
+        self._dirty = True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """إحصائيات الذاكرة (كل إصابة = طلب Gemini تم توفيره)"""
+        hits = self.stats['exact_hits'] + self.stats['similar_hits']
+        lookups = hits + self.stats['misses']
+        return dict(
+            self.stats,
+            saved_requests=hits,
+            size=len(self._entries),
+            max_size=self.max_size,
+            similarity_enabled=self.use_similarity,
+            hit_ratio=round(hits / lookups, 4) if lookups else 0.0,
+        )
+
+
+# النسخة العامة من الذاكرة
+ai_response_cache = AIResponseCache()
@@ -1,23 +1,30 @@
 """
 وحدة تتبع الأنشطة والتحليلات في الوقت الفعلي
 Real-time Analytics Tracking Module
+
+العدادات (الرسائل، النشطون يومياً، الأنشطة المالية والإشرافية) تُجمع في
+الذاكرة عبر طابور الكتابة المؤجلة وتُكتب دورياً في daily_stats و
+daily_active_users و activity_rollups، فتقرأ لوحات التحكم صفاً لكل يوم بدلاً
+من فحص سجل الأنشطة الخام.
 """
 
 import logging
 import asyncio
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import json
 
 from config.database import execute_query
+from database.write_behind import write_behind_queue
 
 
 class AnalyticsTracker:
     """متتبع التحليلات في الوقت الفعلي"""
     
     @staticmethod
-    async def track_user_activity(user_id: int, chat_id: int, activity_type: str, data: Dict[str, Any] = None):
-        """تتبع نشاط المستخدم"""
+    async def track_user_activity(user_id: int, chat_id: int, activity_type: str, data: Dict[str, Any] = None,
+                                  amount: float = 0):
+        """تتبع نشاط المستخدم (سجل تفصيلي + عداد يومي لنوع النشاط)"""
         try:
             activity_data = json.dumps(data) if data else None
             date_only = datetime.now().date().isoformat()
@@ -27,22 +34,17 @@ class AnalyticsTracker:
                 VALUES (?, ?, ?, ?, ?)
             """, (user_id, chat_id, activity_type, activity_data, date_only))
             
+            if chat_id is not None:
+                write_behind_queue.increment_activity_rollup(chat_id, activity_type, amount)
+            
         except Exception as e:
             logging.error(f"خطأ في تتبع النشاط: {e}")
 
     @staticmethod
     async def update_daily_stats(chat_id: int, stat_type: str, increment: int = 1):
-        """تحديث الإحصائيات اليومية"""
+        """تحديث الإحصائيات اليومية (تُجمع وتُكتب دفعة واحدة)"""
         try:
-            today = datetime.now().date().isoformat()
-            
-            # إنشاء أو تحديث الإحصائيات اليومية
-            await execute_query(f"""
-                INSERT INTO daily_stats (chat_id, date, {stat_type})
-                VALUES (?, ?, ?)
-                ON CONFLICT(chat_id, date) DO UPDATE SET
-                {stat_type} = {stat_type} + ?
-            """, (chat_id, today, increment, increment))
+            write_behind_queue.increment_daily_stat(chat_id, stat_type, increment)
             
         except Exception as e:
             logging.error(f"خطأ في تحديث الإحصائيات اليومية: {e}")
@@ -68,7 +70,7 @@ class AnalyticsTracker:
             # تتبع النشاط العام
             await AnalyticsTracker.track_user_activity(
                 user_id, chat_id, f"financial_{activity_type}", 
-                {"amount": amount, "details": details}
+                {"amount": amount, "details": details}, amount=amount
             )
             
             # تحديث الإحصائيات المالية اليومية
@@ -111,29 +113,14 @@ class AnalyticsTracker:
 
     @staticmethod
     async def track_message_activity(user_id: int, chat_id: int):
-        """تتبع نشاط الرسائل"""
+        """تتبع نشاط الرسائل (بدون أي استعلام لكل رسالة)"""
         try:
-            # تحديث آخر نشاط للمستخدم
-            await execute_query("""
-                UPDATE users SET updated_at = CURRENT_TIMESTAMP 
-                WHERE user_id = ? AND chat_id = ?
-            """, (user_id, chat_id))
-            
-            # تحديث عدد الرسائل اليومية
-            await AnalyticsTracker.update_daily_stats(chat_id, "messages_count", 1)
+            # تحديث آخر نشاط للمستخدم وعدد الرسائل اليومية (كتابة مؤجلة مجمعة)
+            write_behind_queue.touch_user_activity(user_id)
+            write_behind_queue.increment_daily_stat(chat_id, "messages_count", 1)
             
-            # تتبع المستخدم النشط
-            today = datetime.now().date().isoformat()
-            
-            # التحقق إذا كان المستخدم نشط اليوم
-            active_today = await execute_query("""
-                SELECT COUNT(*) FROM activity_logs 
-                WHERE user_id = ? AND chat_id = ? AND date_only = ? AND activity_type = 'daily_active'
-            """, (user_id, chat_id, today), fetch_one=True)
-            
-            if not active_today or active_today[0] == 0:
-                await AnalyticsTracker.track_user_activity(user_id, chat_id, "daily_active")
-                await AnalyticsTracker.update_daily_stats(chat_id, "active_users", 1)
+            # تتبع المستخدم النشط (مجموعة في الذاكرة تُكتب مرة واحدة يومياً لكل مستخدم)
+            write_behind_queue.mark_daily_active(chat_id, user_id)
             
         except Exception as e:
             logging.error(f"خطأ في تتبع نشاط الرسالة: {e}")
@@ -146,9 +133,9 @@ class DashboardMetrics:
     async def calculate_engagement_rate(chat_id: int, days: int = 7) -> float:
         """حساب معدل التفاعل"""
         try:
-            # إجمالي الأعضاء
+            # إجمالي الأعضاء (من كتبوا في المجموعة)
             total_members = await execute_query(
-                "SELECT COUNT(*) FROM users WHERE chat_id = ?",
+                "SELECT COUNT(*) FROM user_message_count WHERE chat_id = ?",
                 (chat_id,), fetch_one=True
             )
             total_count = total_members[0] if total_members else 0
@@ -159,8 +146,8 @@ class DashboardMetrics:
             # الأعضاء النشطين في الفترة المحددة
             date_threshold = (datetime.now() - timedelta(days=days)).date().isoformat()
             active_members = await execute_query("""
-                SELECT COUNT(DISTINCT user_id) FROM activity_logs 
-                WHERE chat_id = ? AND date_only >= ?
+                SELECT COUNT(DISTINCT user_id) FROM daily_active_users 
+                WHERE chat_id = ? AND date >= ?
             """, (chat_id, date_threshold), fetch_one=True)
             
             active_count = active_members[0] if active_members else 0
@@ -174,19 +161,19 @@ class DashboardMetrics:
     async def calculate_growth_trend(chat_id: int, days: int = 30) -> Dict[str, float]:
         """حساب اتجاه النمو"""
         try:
-            # المستخدمين الجدد في الفترة الحالية
+            # المستخدمين الجدد في الفترة الحالية (أول رسالة لهم في المجموعة)
             current_period_start = (datetime.now() - timedelta(days=days)).date().isoformat()
             current_new_users = await execute_query("""
-                SELECT COUNT(*) FROM users 
-                WHERE chat_id = ? AND date(created_at) >= ?
+                SELECT COUNT(*) FROM user_message_count 
+                WHERE chat_id = ? AND first_message_date >= ?
             """, (chat_id, current_period_start), fetch_one=True)
             
             # المستخدمين الجدد في الفترة السابقة
             previous_period_start = (datetime.now() - timedelta(days=days*2)).date().isoformat()
             previous_period_end = current_period_start
             previous_new_users = await execute_query("""
-                SELECT COUNT(*) FROM users 
-                WHERE chat_id = ? AND date(created_at) >= ? AND date(created_at) < ?
+                SELECT COUNT(*) FROM user_message_count 
+                WHERE chat_id = ? AND first_message_date >= ? AND first_message_date < ?
             """, (chat_id, previous_period_start, previous_period_end), fetch_one=True)
             
             current_count = current_new_users[0] if current_new_users else 0
@@ -216,16 +203,25 @@ class DashboardMetrics:
             date_threshold = (datetime.now() - timedelta(days=days)).date().isoformat()
             
             activities = await execute_query("""
-                SELECT activity_type, COUNT(*) as count
-                FROM activity_logs 
-                WHERE chat_id = ? AND date_only >= ?
+                SELECT activity_type, SUM(count) as count
+                FROM activity_rollups 
+                WHERE chat_id = ? AND date >= ?
                 GROUP BY activity_type
-                ORDER BY count DESC
-                LIMIT ?
-            """, (chat_id, date_threshold, limit), fetch_all=True)
+            """, (chat_id, date_threshold), fetch_all=True)
+            counts = {activity_type: count for activity_type, count in activities or []}
+            
+            # النشاط اليومي من عداد النشطين في daily_stats
+            daily_active = await execute_query("""
+                SELECT SUM(active_users) FROM daily_stats 
+                WHERE chat_id = ? AND date >= ?
+            """, (chat_id, date_threshold), fetch_one=True)
+            if daily_active and daily_active[0]:
+                counts["daily_active"] = counts.get("daily_active", 0) + daily_active[0]
+            
+            top_activities = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:limit]
             
             result = []
-            for activity_type, count in activities:
+            for activity_type, count in top_activities:
                 # ترجمة أنواع الأنشطة
                 activity_names = {
                     "daily_active": "النشاط اليومي",
@@ -269,21 +265,21 @@ class DashboardMetrics:
             # النشاط المالي (20% من النقاط)
             today = datetime.now().date().isoformat()
             financial_activity = await execute_query("""
-                SELECT COUNT(*) FROM activity_logs 
-                WHERE chat_id = ? AND date_only = ? AND activity_type LIKE 'financial_%'
+                SELECT SUM(count) FROM activity_rollups 
+                WHERE chat_id = ? AND category = 'financial' AND date = ?
             """, (chat_id, today), fetch_one=True)
             
-            financial_score = min((financial_activity[0] if financial_activity else 0) * 10, 100)
+            financial_score = min(((financial_activity[0] or 0) if financial_activity else 0) * 10, 100)
             scores['financial'] = financial_score * 0.2
             
             # جودة الإشراف (10% من النقاط)
             moderation_activity = await execute_query("""
-                SELECT COUNT(*) FROM activity_logs 
-                WHERE chat_id = ? AND date_only >= ? AND activity_type LIKE 'moderation_%'
+                SELECT SUM(count) FROM activity_rollups 
+                WHERE chat_id = ? AND category = 'moderation' AND date >= ?
             """, (chat_id, (datetime.now() - timedelta(days=7)).date().isoformat()), fetch_one=True)
             
             # إشراف معتدل يعني صحة جيدة
-            mod_count = moderation_activity[0] if moderation_activity else 0
+            mod_count = (moderation_activity[0] or 0) if moderation_activity else 0
             moderation_score = 100 - min(mod_count * 5, 50)  # كلما قل الإشراف المطلوب، كانت الصحة أفضل
             scores['moderation'] = moderation_score * 0.1
             
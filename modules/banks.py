@@ -10,6 +10,7 @@ from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 
 from database.operations import get_user, get_or_create_user, update_user_balance, update_user_bank_balance, add_transaction, update_user_activity
+from database import ledger
 from utils.states import BanksStates
 from utils.helpers import format_number, is_valid_amount, parse_user_mention
 from config.settings import GAME_SETTINGS
@@ -248,25 +249,23 @@ async def collect_daily_salary(message: Message):
                 bonus_msg = f"\n🎁 **مكافأة إضافية:** +{format_number(bonus)}$"
         
         total_earned = daily_salary + bonus
-        new_balance = user['balance'] + total_earned
         
-        # تحديث الرصيد ووقت آخر راتب
-        await update_user_balance(message.from_user.id, new_balance)
-        
-        # تحديث وقت آخر راتب في قاعدة البيانات
-        from database.operations import execute_query
-        await execute_query(
-            "UPDATE users SET last_salary_time = ? WHERE user_id = ?",
-            (now.isoformat(), message.from_user.id)
+        # إضافة الراتب ووقت آخر راتب والمعاملة في معاملة واحدة
+        # (الشرط يمنع صرف الراتب مرتين عند رسالتين متزامنتين)
+        result = await ledger.credit(
+            message.from_user.id, total_earned, "salary", f"راتب يومي - {bank_info['name']}",
+            set_fields={'last_salary_time': now.isoformat()},
+            condition="last_salary_time IS NULL OR last_salary_time <= ?",
+            condition_params=((now - timedelta(minutes=3)).isoformat(),)
         )
+        if not result:
+            if result.reason == ledger.REASON_REJECTED:
+                await message.reply("⏰ تم جمع راتبك للتو! الراتب متاح كل 3 دقائق.")
+            else:
+                await message.reply("❌ حدث خطأ أثناء جمع راتبك")
+            return
         
-        # إضافة معاملة
-        await add_transaction(
-            message.from_user.id,
-            f"راتب يومي - {bank_info['name']}",
-            total_earned,
-            "salary"
-        )
+        new_balance = result.balance(message.from_user.id)
         
         # رسالة النجاح مع إضافة امتيازات ملكية
         if is_royal(message.from_user.id):
@@ -404,21 +403,16 @@ async def process_deposit_amount(message: Message, state: FSMContext):
             await message.reply(f"❌ ليس لديك رصيد كافٍ!\nرصيدك الحالي: {format_number(user['balance'])}$")
             return
         
-        # تنفيذ الإيداع
-        new_cash_balance = user['balance'] - amount
-        new_bank_balance = user['bank_balance'] + amount
-        
-        await update_user_balance(message.from_user.id, new_cash_balance)
-        await update_user_bank_balance(message.from_user.id, new_bank_balance)
+        # تنفيذ الإيداع وتسجيله في معاملة واحدة
+        result = await ledger.deposit(message.from_user.id, amount, "إيداع في البنك")
+        if not result:
+            await message.reply("❌ ليس لديك رصيد كافٍ!" if result.reason == ledger.REASON_INSUFFICIENT
+                                else "❌ حدث خطأ في عملية الإيداع")
+            await state.clear()
+            return
         
-        # إضافة معاملة
-        await add_transaction(
-            from_user_id=message.from_user.id,
-            to_user_id=message.from_user.id,
-            transaction_type="bank_deposit",
-            amount=amount,
-            description="إيداع في البنك"
-        )
+        new_cash_balance = result.balance(message.from_user.id)
+        new_bank_balance = result.bank_balance(message.from_user.id)
         
         await message.reply(
             f"✅ **تم الإيداع بنجاح!**\n\n"
@@ -495,21 +489,16 @@ async def process_withdraw_amount(message: Message, state: FSMContext):
             await message.reply(f"❌ ليس لديك رصيد كافٍ في البنك!\nرصيد البنك: {format_number(user['bank_balance'])}$")
             return
         
-        # تنفيذ السحب
-        new_cash_balance = user['balance'] + amount
-        new_bank_balance = user['bank_balance'] - amount
-        
-        await update_user_balance(message.from_user.id, new_cash_balance)
-        await update_user_bank_balance(message.from_user.id, new_bank_balance)
+        # تنفيذ السحب وتسجيله في معاملة واحدة
+        result = await ledger.withdraw(message.from_user.id, amount, "سحب من البنك")
+        if not result:
+            await message.reply("❌ ليس لديك رصيد كافٍ في البنك!" if result.reason == ledger.REASON_INSUFFICIENT
+                                else "❌ حدث خطأ في عملية السحب")
+            await state.clear()
+            return
         
-        # إضافة معاملة
-        await add_transaction(
-            from_user_id=message.from_user.id,
-            to_user_id=message.from_user.id,
-            transaction_type="bank_withdraw",
-            amount=amount,
-            description="سحب من البنك"
-        )
+        new_cash_balance = result.balance(message.from_user.id)
+        new_bank_balance = result.bank_balance(message.from_user.id)
         
         await message.reply(
             f"✅ **تم السحب بنجاح!**\n\n"
@@ -631,21 +620,20 @@ async def process_transfer_amount(message: Message, state: FSMContext):
             await state.clear()
             return
         
-        # تنفيذ التحويل
-        new_sender_balance = user['balance'] - amount
-        new_receiver_balance = target_user['balance'] + amount
-        
-        await update_user_balance(message.from_user.id, new_sender_balance)
-        await update_user_balance(target_user_id, new_receiver_balance)
-        
-        # إضافة معاملة
-        await add_transaction(
-            from_user_id=message.from_user.id,
-            to_user_id=target_user_id,
-            transaction_type="transfer",
-            amount=amount,
-            description=f"تحويل إلى {target_username}"
+        # تنفيذ التحويل وتسجيله في معاملة واحدة
+        result = await ledger.transfer(
+            message.from_user.id, target_user_id, amount,
+            sender_description=f"تحويل إلى {target_username}",
+            receiver_description=f"تحويل من {message.from_user.username or message.from_user.first_name}"
         )
+        if not result:
+            await message.reply("❌ ليس لديك رصيد كافٍ!" if result.reason == ledger.REASON_INSUFFICIENT
+                                else "❌ حدث خطأ في عملية التحويل")
+            await state.clear()
+            return
+        
+        new_sender_balance = result.balance(message.from_user.id)
+        new_receiver_balance = result.balance(target_user_id)
         
         await message.reply(
             f"✅ **تم التحويل بنجاح!**\n\n"
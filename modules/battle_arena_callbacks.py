@@ -7,7 +7,10 @@ import logging
 import random
 from aiogram.types import CallbackQuery
 from database.operations import get_or_create_user, update_user_balance, add_transaction
-from modules.battle_arena_game import ACTIVE_BATTLE_GAMES
+from modules.battle_arena_game import (
+    ACTIVE_BATTLE_GAMES, battle_job_key, battle_recovery_payload, start_shrink_cycle
+)
+from modules.scheduler import scheduler
 from utils.helpers import format_number
 
 async def handle_battle_join(callback: CallbackQuery):
@@ -66,6 +69,8 @@ async def handle_battle_join(callback: CallbackQuery):
         
         # إضافة اللاعب
         if game.add_player(user_id, username, user_name):
+            # حفظ قائمة الدافعين لاسترداد رسومهم إذا توقف البوت
+            scheduler.update_payload(battle_job_key(game), battle_recovery_payload(game))
             await callback.answer(f"✅ انضممت للمعركة! محاربين: {len(game.players)}/15")
             
             # تحديث رسالة اللعبة
@@ -144,10 +149,8 @@ async def handle_battle_start(callback: CallbackQuery):
         await callback.message.edit_text(start_text, reply_markup=game.get_game_keyboard())
         await callback.answer("🔥 بدأت المعركة!")
         
-        # بدء دورة تقليص الساحة
-        from modules.battle_arena_game import arena_shrink_cycle
-        import asyncio
-        asyncio.create_task(arena_shrink_cycle(game, callback.message))
+        # بدء دورة تقليص الساحة (يلغي مؤقت التسجيل)
+        start_shrink_cycle(game, callback.message)
         
     except Exception as e:
         logging.error(f"خطأ في بدء المعركة: {e}")
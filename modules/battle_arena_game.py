@@ -4,14 +4,16 @@
 """
 
 import logging
-import asyncio
 import time
 import random
 from typing import Dict, List, Optional
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from aiogram.fsm.context import FSMContext
+from database import ledger
 from database.operations import get_or_create_user, update_user_balance, add_transaction
 from modules.leveling import LevelingSystem
+from modules.outbound_queue import send_priority, PRIORITY_BACKGROUND
+from modules.scheduler import scheduler
 from utils.helpers import format_number
 
 # قاموس الألعاب النشطة {group_id: game_data}
@@ -246,17 +248,57 @@ async def start_battle_arena(message: Message):
         await message.reply(game_text, reply_markup=game.get_game_keyboard())
         logging.info(f"تم إنشاء ساحة الموت في المجموعة {group_id} بواسطة {creator_name}")
         
-        # بدء عداد التسجيل (3 دقائق)
-        asyncio.create_task(registration_timer(game, message))
+        # بدء عداد التسجيل (3 دقائق) - رسائل الجولات في مسار الأولوية المنخفضة
+        with send_priority(PRIORITY_BACKGROUND):
+            scheduler.call_later(battle_job_key(game), 180, registration_timer, game, message,
+                                 kind="battle_arena", payload=battle_recovery_payload(game))
         
     except Exception as e:
         logging.error(f"خطأ في بدء ساحة الموت: {e}")
         await message.reply("❌ حدث خطأ أثناء إنشاء ساحة الموت")
 
+def battle_job_key(game: BattleArenaGame) -> str:
+    """مفتاح موعد المعركة في المجدول (التسجيل ثم دورة التقليص)"""
+    return f"battle:{game.group_id}:{game.created_at:.3f}"
+
+
+def battle_recovery_payload(game: BattleArenaGame) -> Dict:
+    """بيانات استرداد رسوم الدخول إذا أُعيد تشغيل البوت أثناء المعركة"""
+    return {
+        'chat_id': game.group_id,
+        'fee': game.entry_fee,
+        'players': [player['id'] for player in game.players]
+    }
+
+
+async def recover_battle_arena(bot, payload: Dict):
+    """إرجاع رسوم الدخول لمعركة توقفت بإعادة التشغيل"""
+    for player_id in payload.get('players', []):
+        # إضافة ذرية مع سجل المعاملة (بدلاً من قراءة الرصيد ثم كتابته)
+        result = await ledger.credit(player_id, payload['fee'], "refund", "استرداد رسوم ساحة الموت")
+        if not result:
+            logging.error(f"فشل استرداد رسوم ساحة الموت للاعب {player_id}: {result.reason}")
+    
+    await bot.send_message(
+        payload['chat_id'],
+        "❌ **تم إلغاء المعركة!**\n\n"
+        "⚠️ توقفت ساحة الموت بسبب إعادة تشغيل البوت\n"
+        f"💰 تم استرداد رسوم الدخول لـ {len(payload.get('players', []))} محارب"
+    )
+
+
+scheduler.register_recovery("battle_arena", recover_battle_arena)
+
+
+def start_shrink_cycle(game: BattleArenaGame, message: Message):
+    """جدولة تقليص الساحة كل دقيقة (يستبدل موعد التسجيل بنفس المفتاح)"""
+    with send_priority(PRIORITY_BACKGROUND):
+        scheduler.every(battle_job_key(game), 60, arena_shrink_cycle, game, message,
+                        kind="battle_arena", payload=battle_recovery_payload(game))
+
+
 async def registration_timer(game: BattleArenaGame, message: Message):
     """عداد التسجيل (3 دقائق)"""
-    await asyncio.sleep(180)  # 3 دقائق
-    
     if game.group_id in ACTIVE_BATTLE_GAMES and not game.game_started:
         if len(game.players) < 8:
             # إلغاء اللعبة - عدد لاعبين غير كافٍ
@@ -268,10 +310,9 @@ async def registration_timer(game: BattleArenaGame, message: Message):
             
             # استرداد المال
             for player in game.players:
-                user_data = await get_or_create_user(player['id'])
-                if user_data:
-                    await update_user_balance(player['id'], user_data['balance'] + 100000)
-                    await add_transaction(player['id'], "استرداد رسوم ساحة الموت", 100000, "refund")
+                result = await ledger.credit(player['id'], game.entry_fee, "refund", "استرداد رسوم ساحة الموت")
+                if not result:
+                    logging.error(f"فشل استرداد رسوم ساحة الموت للاعب {player['id']}: {result.reason}")
             
             del ACTIVE_BATTLE_GAMES[game.group_id]
         else:
@@ -297,38 +338,35 @@ async def auto_start_battle(game: BattleArenaGame, message: Message):
                        reply_markup=game.get_game_keyboard())
     
     # بدء دورة تقليص الساحة
-    asyncio.create_task(arena_shrink_cycle(game, message))
+    start_shrink_cycle(game, message)
 
 async def arena_shrink_cycle(game: BattleArenaGame, message: Message):
-    """دورة تقليص الساحة"""
-    while not game.game_ended and game.group_id in ACTIVE_BATTLE_GAMES:
-        await asyncio.sleep(60)  # انتظار دقيقة
-        
-        if game.game_ended:
-            break
-            
-        game.shrink_arena()
-        
-        shrink_text = (
-            f"🔥 **تقلصت الساحة! - الجولة {game.current_round}**\n\n"
-            f"🟦 المنطقة الآمنة: {game.safe_zone_size} مربع\n"
-            f"👥 المحاربين الأحياء: {len([p for p in game.players if p['alive']])}\n\n"
-        )
-        
-        # عرض اللاعبين المتضررين
-        damaged_players = [p for p in game.players if p['position'] >= game.safe_zone_size and p['alive']]
-        if damaged_players:
-            shrink_text += "💥 **متضررين من العاصفة:**\n"
-            for player in damaged_players[:3]:
-                shrink_text += f"🔴 {player['name']} (❤️{player['health']})\n"
-        
-        await message.reply(shrink_text + "\n" + game.get_arena_display(), 
-                           reply_markup=game.get_game_keyboard())
-        
-        # فحص انتهاء اللعبة
-        if game.check_game_end():
-            await handle_battle_end(game, message)
-            break
+    """جولة تقليص واحدة للساحة (تُستدعى كل دقيقة من المجدول)"""
+    if game.game_ended or ACTIVE_BATTLE_GAMES.get(game.group_id) is not game:
+        scheduler.cancel(battle_job_key(game))
+        return
+    
+    game.shrink_arena()
+    
+    shrink_text = (
+        f"🔥 **تقلصت الساحة! - الجولة {game.current_round}**\n\n"
+        f"🟦 المنطقة الآمنة: {game.safe_zone_size} مربع\n"
+        f"👥 المحاربين الأحياء: {len([p for p in game.players if p['alive']])}\n\n"
+    )
+    
+    # عرض اللاعبين المتضررين
+    damaged_players = [p for p in game.players if p['position'] >= game.safe_zone_size and p['alive']]
+    if damaged_players:
+        shrink_text += "💥 **متضررين من العاصفة:**\n"
+        for player in damaged_players[:3]:
+            shrink_text += f"🔴 {player['name']} (❤️{player['health']})\n"
+    
+    await message.reply(shrink_text + "\n" + game.get_arena_display(), 
+                       reply_markup=game.get_game_keyboard())
+    
+    # فحص انتهاء اللعبة
+    if game.check_game_end():
+        await handle_battle_end(game, message)
 
 async def handle_battle_end(game: BattleArenaGame, message: Message):
     """معالجة نهاية المعركة"""
@@ -385,7 +423,8 @@ async def handle_battle_end(game: BattleArenaGame, message: Message):
         
         await message.reply(end_text)
         
-        # إزالة اللعبة من الذاكرة
+        # إزالة اللعبة من الذاكرة وإيقاف مواعيدها
+        scheduler.cancel(battle_job_key(game))
         if game.group_id in ACTIVE_BATTLE_GAMES:
             del ACTIVE_BATTLE_GAMES[game.group_id]
         
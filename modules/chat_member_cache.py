@@ -0,0 +1,163 @@
+"""
+ذاكرة أعضاء ومشرفي المجموعات
+Chat Member / Administrator TTL Cache
+
+تخزن نتائج get_chat_member و get_chat_administrators لمدة محددة حتى لا يكلف
+كل فحص صلاحيات طلباً إلى تليجرام. تُحدّث الذاكرة مباشرة من أحداث chat_member
+(ترقية، تنزيل، كتم، طرد، دخول، خروج) فتبقى صحيحة دون انتظار انتهاء المدة،
+وتُدمج الطلبات المتزامنة لنفس العضو في طلب واحد.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiogram.enums import ChatMemberStatus
+
+# مدة صلاحية حالة العضو (ثواني)
+MEMBER_TTL = 300
+
+# مدة صلاحية قائمة المشرفين (ثواني)
+ADMINS_TTL = 600
+
+# الحد الأقصى لعدد الأعضاء المخزنين
+MAX_CACHED_MEMBERS = 20000
+
+ADMIN_STATUSES = (ChatMemberStatus.CREATOR, ChatMemberStatus.ADMINISTRATOR)
+
+
+class ChatMemberCache:
+    """ذاكرة TTL لحالات الأعضاء وقوائم المشرفين مع تحديث من الأحداث"""
+
+    def __init__(self, member_ttl: float = MEMBER_TTL, admins_ttl: float = ADMINS_TTL,
+                 max_members: int = MAX_CACHED_MEMBERS):
+        self.member_ttl = member_ttl
+        self.admins_ttl = admins_ttl
+        self.max_members = max_members
+
+        # (chat_id, user_id) -> (ChatMember، وقت الانتهاء)
+        self._members: "OrderedDict[Tuple[int, int], tuple]" = OrderedDict()
+        # chat_id -> (قائمة المشرفين، وقت الانتهاء)
+        self._admins: Dict[int, tuple] = {}
+        # الطلبات الجارية لدمج الطلبات المتزامنة
+        self._inflight: Dict[Any, asyncio.Future] = {}
+
+        self.stats = {
+            'member_hits': 0,
+            'member_misses': 0,
+            'admin_hits': 0,
+            'admin_misses': 0,
+            'coalesced': 0,
+            'event_updates': 0,
+        }
+
+    # ===== القراءة =====
+
+    async def get_member(self, bot, chat_id: int, user_id: int):
+        """حالة العضو من الذاكرة أو من تليجرام (أخطاء تليجرام تُمرر للمستدعي)"""
+        key = (chat_id, user_id)
+        entry = self._members.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            self._members.move_to_end(key)
+            self.stats['member_hits'] += 1
+            return entry[0]
+
+        self.stats['member_misses'] += 1
+        member = await self._coalesce(('member', key), lambda: bot.get_chat_member(chat_id, user_id))
+        self.store_member(chat_id, member)
+        return member
+
+    async def get_administrators(self, bot, chat_id: int) -> List[Any]:
+        """قائمة مشرفي المجموعة من الذاكرة أو من تليجرام"""
+        entry = self._admins.get(chat_id)
+        if entry is not None and entry[1] > time.monotonic():
+            self.stats['admin_hits'] += 1
+            return list(entry[0])
+
+        self.stats['admin_misses'] += 1
+        admins = await self._coalesce(('admins', chat_id), lambda: bot.get_chat_administrators(chat_id))
+        admins = list(admins)
+        self._admins[chat_id] = (admins, time.monotonic() + self.admins_ttl)
+        for admin in admins:
+            self._put_member(chat_id, admin)
+        return list(admins)
+
+    async def _coalesce(self, key, request):
+        """تنفيذ طلب واحد فقط لنفس المفتاح وانتظار نتيجته من بقية المستدعين"""
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await request()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # منع تحذير "exception was never retrieved" إن لم ينتظره أحد
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    # ===== التحديث =====
+
+    def _put_member(self, chat_id: int, member):
+        key = (chat_id, member.user.id)
+        self._members[key] = (member, time.monotonic() + self.member_ttl)
+        self._members.move_to_end(key)
+        while len(self._members) > self.max_members:
+            self._members.popitem(last=False)
+
+    def store_member(self, chat_id: int, member):
+        """حفظ حالة عضو وتعديل قائمة المشرفين المخزنة حسب حالته"""
+        self._put_member(chat_id, member)
+
+        entry = self._admins.get(chat_id)
+        if entry is None:
+            return
+        admins, expires_at = entry
+        user_id = member.user.id
+        others = [admin for admin in admins if admin.user.id != user_id]
+        if member.status in ADMIN_STATUSES:
+            others.append(member)
+        if len(others) != len(admins) or member.status in ADMIN_STATUSES:
+            self._admins[chat_id] = (others, expires_at)
+
+    def update_from_event(self, chat_id: int, member):
+        """تحديث الذاكرة من حدث chat_member أو my_chat_member"""
+        self.stats['event_updates'] += 1
+        self.store_member(chat_id, member)
+
+    def invalidate(self, chat_id: int, user_id: Optional[int] = None):
+        """إلغاء عضو محدد أو جميع بيانات المجموعة"""
+        if user_id is not None:
+            self._members.pop((chat_id, user_id), None)
+            entry = self._admins.get(chat_id)
+            if entry is not None and any(admin.user.id == user_id for admin in entry[0]):
+                self._admins.pop(chat_id, None)
+            return
+        self._admins.pop(chat_id, None)
+        for key in [k for k in self._members if k[0] == chat_id]:
+            del self._members[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """إحصائيات الذاكرة للمراقبة"""
+        lookups = self.stats['member_hits'] + self.stats['member_misses']
+        return dict(
+            self.stats,
+            members=len(self._members),
+            admin_lists=len(self._admins),
+            member_hit_ratio=round(self.stats['member_hits'] / lookups, 4) if lookups else 0.0,
+        )
+
+
+# النسخة العامة من الذاكرة
+chat_member_cache = ChatMemberCache()
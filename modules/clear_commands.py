@@ -4,25 +4,23 @@ Clear and Cleanup Commands Module
 """
 
 import logging
-import aiosqlite
 from aiogram.types import Message
-from config.database import DATABASE_URL
 from database.operations import execute_query
 from utils.decorators import admin_required
+from database.connection_pool import db_pool
 
 
 @admin_required
 async def clear_banned(message: Message):
     """مسح قائمة المحظورين"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             # مسح المحظورين من المجموعة
             result = await db.execute("""
                 DELETE FROM banned_users WHERE chat_id = ?
             """, (message.chat.id,))
             
             count = result.rowcount
-            await db.commit()
             
         await message.reply(f"✅ تم مسح {count} محظور من قائمة المحظورين")
         
@@ -35,14 +33,13 @@ async def clear_banned(message: Message):
 async def clear_muted(message: Message):
     """مسح قائمة المكتومين"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             # مسح المكتومين من المجموعة
             result = await db.execute("""
                 DELETE FROM muted_users WHERE chat_id = ?
             """, (message.chat.id,))
             
             count = result.rowcount
-            await db.commit()
             
         await message.reply(f"✅ تم مسح {count} مكتوم من قائمة المكتومين")
         
@@ -55,14 +52,13 @@ async def clear_muted(message: Message):
 async def clear_ban_words(message: Message):
     """مسح قائمة الكلمات المحظورة"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             # مسح الكلمات المحظورة من المجموعة
             result = await db.execute("""
                 DELETE FROM banned_words WHERE chat_id = ?
             """, (message.chat.id,))
             
             count = result.rowcount
-            await db.commit()
             
         await message.reply(f"✅ تم مسح {count} كلمة من قائمة المنع")
         
@@ -75,14 +71,16 @@ async def clear_ban_words(message: Message):
 async def clear_replies(message: Message):
     """مسح الردود المخصصة"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             # مسح الردود المخصصة من المجموعة
             result = await db.execute("""
                 DELETE FROM custom_replies WHERE chat_id = ?
             """, (message.chat.id,))
             
             count = result.rowcount
-            await db.commit()
+        
+        from modules.trigger_index import custom_reply_index
+        custom_reply_index.clear_chat(message.chat.id)
             
         await message.reply(f"✅ تم مسح {count} رد مخصص")
         
@@ -95,14 +93,16 @@ async def clear_replies(message: Message):
 async def clear_custom_commands(message: Message):
     """مسح الأوامر المضافة"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             # مسح الأوامر المخصصة من المجموعة
             result = await db.execute("""
                 DELETE FROM custom_commands WHERE chat_id = ?
             """, (message.chat.id,))
             
             count = result.rowcount
-            await db.commit()
+        
+        from modules.custom_commands import clear_chat_commands
+        clear_chat_commands(message.chat.id)
             
         await message.reply(f"✅ تم مسح {count} أمر مخصص")
         
@@ -115,14 +115,13 @@ async def clear_custom_commands(message: Message):
 async def clear_id_template(message: Message):
     """مسح قالب الايدي"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             # مسح قالب الايدي المخصص
             await db.execute("""
                 DELETE FROM group_settings 
                 WHERE chat_id = ? AND setting_key = 'id_template'
             """, (message.chat.id,))
             
-            await db.commit()
             
         await message.reply("✅ تم مسح قالب الايدي، سيتم استخدام القالب الافتراضي")
         
@@ -135,14 +134,13 @@ async def clear_id_template(message: Message):
 async def clear_welcome(message: Message):
     """مسح رسالة الترحيب"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             # مسح رسالة الترحيب المخصصة
             await db.execute("""
                 DELETE FROM group_settings 
                 WHERE chat_id = ? AND setting_key = 'welcome_message'
             """, (message.chat.id,))
             
-            await db.commit()
             
         await message.reply("✅ تم مسح رسالة الترحيب المخصصة")
         
@@ -155,14 +153,13 @@ async def clear_welcome(message: Message):
 async def clear_link(message: Message):
     """مسح رابط المجموعة المحفوظ"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             # مسح رابط المجموعة المحفوظ
             await db.execute("""
                 DELETE FROM group_settings 
                 WHERE chat_id = ? AND setting_key = 'group_link'
             """, (message.chat.id,))
             
-            await db.commit()
             
         await message.reply("✅ تم مسح رابط المجموعة المحفوظ")
         
@@ -175,7 +172,7 @@ async def clear_link(message: Message):
 async def clear_all_data(message: Message):
     """مسح جميع بيانات المجموعة"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             # مسح جميع البيانات المتعلقة بالمجموعة
             tables_to_clear = [
                 'banned_users',
@@ -196,7 +193,11 @@ async def clear_all_data(message: Message):
                 """, (message.chat.id,))
                 total_cleared += result.rowcount
             
-            await db.commit()
+        
+        from modules.trigger_index import custom_reply_index
+        from modules.custom_commands import clear_chat_commands
+        custom_reply_index.clear_chat(message.chat.id)
+        clear_chat_commands(message.chat.id)
             
         await message.reply(f"""
 🗑️ **تم مسح جميع البيانات!**
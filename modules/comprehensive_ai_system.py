@@ -24,11 +24,8 @@ except ImportError:
     ANTHROPIC_AVAILABLE = False
     logging.warning("Anthropic SDK not available, using fallback AI")
 
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
+from modules.gemini_gateway import gemini_gateway, GEMINI_AVAILABLE
+if not GEMINI_AVAILABLE:
     logging.warning("Google Gemini SDK not available")
 
 # استيراد الوحدات المحلية - نسخة محسنة SQLite
@@ -114,25 +111,15 @@ class ComprehensiveAISystem:
             self.anthropic_client = None
     
     def setup_gemini(self):
-        """إعداد Google Gemini كنظام احتياطي"""
+        """إعداد Google Gemini كنظام احتياطي عبر البوابة المشتركة"""
         try:
-            if not GEMINI_AVAILABLE:
-                logging.error("Google Gemini SDK not available")
-                return
-                
-            api_key = os.getenv('GEMINI_API_KEY')
-            if not api_key:
-                logging.warning("GEMINI_API_KEY not found in environment variables")
-                return
-                
-            try:
-                genai.configure(api_key=api_key)
-                self.gemini_client = genai.GenerativeModel('gemini-pro')
-            except AttributeError:
-                logging.error("Google Generative AI configuration failed")
-                self.gemini_client = None
+            if not gemini_gateway.available:
+                logging.warning("Google Gemini غير متاح (المكتبة أو المفاتيح غير موجودة)")
                 return
             
+            # البوابة تدير المفاتيح وحصصها مع الذكاء الحقيقي ومحلل الوسائط
+            self.gemini_client = gemini_gateway
+            
             # إذا لم يكن Anthropic متاح، استخدم Gemini
             if not self.anthropic_client:
                 self.current_ai_provider = 'gemini'
@@ -379,9 +366,11 @@ class ComprehensiveAISystem:
             
             # توليد الرد باستخدام الذكاء الاصطناعي
             if self.anthropic_client:
-                response = await self._generate_anthropic_response(full_context, conversation_history)
+                with gemini_gateway.for_chat(message.chat.id):
+                    response = await self._generate_anthropic_response(full_context, conversation_history)
             elif self.gemini_client:
-                response = await self._generate_gemini_response(full_context, conversation_history)
+                with gemini_gateway.for_chat(message.chat.id):
+                    response = await self._generate_gemini_response(full_context, conversation_history)
             else:
                 response = await self._generate_fallback_response(user_message, user_name, user_data)
             
@@ -628,7 +617,9 @@ class ComprehensiveAISystem:
             })
             
             # إرسال الطلب إلى Claude
-            response = self.anthropic_client.messages.create(
+            # العميل متزامن - التنفيذ في خيط حتى لا تتوقف حلقة الأحداث
+            response = await asyncio.to_thread(
+                self.anthropic_client.messages.create,
                 model=self.default_model,
                 max_tokens=1500,
                 temperature=0.7,
@@ -663,8 +654,7 @@ class ComprehensiveAISystem:
                     history_context += f"يوكي: {conv['ai_response']}\n"
                 full_context = history_context + "\n" + context
             
-            response = self.gemini_client.generate_content(full_context)
-            return response.text.strip()
+            return await gemini_gateway.generate_text(full_context)
             
         except Exception as e:
             logging.error(f"خطأ في Gemini response: {e}")
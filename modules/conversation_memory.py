@@ -3,10 +3,9 @@
 Conversation Memory System
 """
 
-import aiosqlite
 import logging
 from typing import List, Dict, Optional
-from config.settings import DATABASE_URL
+from database.connection_pool import db_pool
 
 class ConversationMemory:
     """نظام ذاكرة المحادثات لحفظ آخر 10 رسائل لكل مستخدم"""
@@ -14,7 +13,7 @@ class ConversationMemory:
     async def save_conversation(self, user_id: int, user_message: str, ai_response: str):
         """حفظ محادثة جديدة وإدارة الحد الأقصى لعدد المحادثات"""
         try:
-            async with aiosqlite.connect(DATABASE_URL) as db:
+            async with db_pool.writer() as db:
                 # حفظ المحادثة الجديدة
                 await db.execute('''
                     INSERT INTO conversation_history (user_id, user_message, ai_response)
@@ -32,7 +31,6 @@ class ConversationMemory:
                     )
                 ''', (user_id, user_id))
                 
-                await db.commit()
                 logging.info(f"✅ تم حفظ المحادثة للمستخدم {user_id}")
                 
         except Exception as e:
@@ -41,7 +39,7 @@ class ConversationMemory:
     async def get_conversation_history(self, user_id: int, limit: int = 5) -> List[Dict]:
         """جلب آخر محادثات للمستخدم (افتراضياً آخر 5)"""
         try:
-            async with aiosqlite.connect(DATABASE_URL) as db:
+            async with db_pool.reader() as db:
                 cursor = await db.execute('''
                     SELECT user_message, ai_response, timestamp 
                     FROM conversation_history 
@@ -71,12 +69,11 @@ class ConversationMemory:
     async def clear_conversation_history(self, user_id: int):
         """مسح تاريخ المحادثات للمستخدم"""
         try:
-            async with aiosqlite.connect(DATABASE_URL) as db:
+            async with db_pool.writer() as db:
                 await db.execute('''
                     DELETE FROM conversation_history WHERE user_id = ?
                 ''', (user_id,))
                 
-                await db.commit()
                 logging.info(f"✅ تم مسح تاريخ المحادثات للمستخدم {user_id}")
                 
         except Exception as e:
@@ -3,105 +3,106 @@
 Enhanced Conversation Memory System for SQLite
 """
 
-import aiosqlite
 import logging
-from typing import List, Dict, Optional
+import time
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
+
+from database.connection_pool import db_pool
+
+# عدد المحادثات الأخيرة المحفوظة في الذاكرة لكل (مستخدم، محادثة)
+RECENT_HISTORY_SIZE = 15
+
+# الحد الأقصى لعدد المستخدمين في ذاكرة المحادثات الأخيرة
+MAX_CACHED_HISTORIES = 500
 
 class ConversationMemorySQLite:
     """نظام ذاكرة المحادثات لحفظ آخر 50 رسالة لكل مستخدم - SQLite"""
     
     def __init__(self):
-        self.db_path = "bot_database.db"
         self._column_checked = False  # فلاج للتأكد من فحص العمود مرة واحدة فقط
+        # (user_id, chat_id) -> (آخر المحادثات الأقدم أولاً، هل هي كامل التاريخ)
+        self._recent: "OrderedDict[Tuple[int, Optional[int]], tuple]" = OrderedDict()
+    
+    @staticmethod
+    def _history_key(user_id: int, chat_id: Optional[int]) -> Tuple[int, Optional[int]]:
+        """مفتاح ذاكرة المحادثات الأخيرة (المحادثة الخاصة تُحفظ بـ None أو 0)"""
+        return (user_id, chat_id or None)
     
-    async def _ensure_chat_id_column(self, conn):
+    def _cache_history(self, key, conversations: List[Dict], complete: bool):
+        """حفظ آخر المحادثات في الذاكرة مع إخراج الأقدم استخداماً"""
+        self._recent[key] = (conversations[-RECENT_HISTORY_SIZE:], complete and len(conversations) <= RECENT_HISTORY_SIZE)
+        self._recent.move_to_end(key)
+        while len(self._recent) > MAX_CACHED_HISTORIES:
+            self._recent.popitem(last=False)
+    
+    async def _ensure_chat_id_column(self):
         """التأكد من وجود عمود chat_id في جدول conversation_history"""
         if self._column_checked:
             return
         
         try:
-            # التحقق من وجود العمود
-            cursor = await conn.execute("PRAGMA table_info(conversation_history)")
-            columns = await cursor.fetchall()
-            column_names = [col[1] for col in columns]
-            
-            if 'chat_id' not in column_names:
-                # إضافة العمود الجديد
-                await conn.execute("ALTER TABLE conversation_history ADD COLUMN chat_id INTEGER")
-                await conn.commit()
-                logging.info("✅ تم إضافة عمود chat_id إلى جدول conversation_history")
+            async with db_pool.writer() as conn:
+                # التحقق من وجود العمود
+                cursor = await conn.execute("PRAGMA table_info(conversation_history)")
+                columns = await cursor.fetchall()
+                column_names = [col[1] for col in columns]
+                
+                if 'chat_id' not in column_names:
+                    # إضافة العمود الجديد
+                    await conn.execute("ALTER TABLE conversation_history ADD COLUMN chat_id INTEGER")
+                    logging.info("✅ تم إضافة عمود chat_id إلى جدول conversation_history")
             
             self._column_checked = True
                 
         except Exception as e:
             logging.error(f"خطأ في التحقق من عمود chat_id: {e}")
     
-    
-    async def get_db_connection(self):
-        """الحصول على اتصال SQLite مع التأكد من وجود العمود المطلوب"""
-        try:
-            conn = await aiosqlite.connect(self.db_path)
-            # فحص وإضافة عمود chat_id إذا لم يكن موجوداً
-            await self._ensure_chat_id_column(conn)
-            return conn
-        except Exception as e:
-            logging.error(f"خطأ في الاتصال بـ SQLite: {e}")
-            return None
-    
     async def save_conversation(self, user_id: int, user_message: str, ai_response: str, chat_id: Optional[int] = None):
         """حفظ محادثة جديدة وإدارة الحد الأقصى لعدد المحادثات"""
         try:
-            conn = await self.get_db_connection()
-            if not conn:
-                logging.error("لا يمكن الاتصال بقاعدة البيانات لحفظ المحادثة")
-                return
-                
-            try:
+            await self._ensure_chat_id_column()
+            async with db_pool.writer() as conn:
                 # حفظ المحادثة الجديدة
                 await conn.execute('''
                     INSERT INTO conversation_history (user_id, chat_id, user_message, ai_response)
                     VALUES (?, ?, ?, ?)
                 ''', (user_id, chat_id, user_message, ai_response))
                 
-                # حذف المحادثات القديمة (أكثر من 50) - مع مراعاة السياق
-                where_clause = "user_id = ?"
-                params = [user_id]
-                if chat_id is not None:
-                    where_clause += " AND chat_id = ?"
-                    params.append(chat_id)
-                
-                # إنشاء قائمة المعاملات الصحيحة للاستعلام المضاعف
-                query_params = params + params  # نحتاج المعاملات للجزء الخارجي والداخلي من الاستعلام
-                
-                await conn.execute(f'''
-                    DELETE FROM conversation_history 
-                    WHERE {where_clause} AND id NOT IN (
-                        SELECT id FROM conversation_history 
-                        WHERE {where_clause}
-                        ORDER BY timestamp DESC 
-                        LIMIT 50
-                    )
-                ''', query_params)
-                
-                await conn.commit()
-                context_info = f" في المجموعة {chat_id}" if chat_id else " في المحادثة الخاصة"
-                logging.info(f"✅ تم حفظ المحادثة للمستخدم {user_id}{context_info}")
-                
-            finally:
-                await conn.close()
+                # تقليم المحادثات الأقدم من آخر 50 يتم دورياً عبر محرك الاحتفاظ
+                # (database/retention.py) بدلاً من استعلام حذف مع كل رسالة
+            
+            # تحديث ذاكرة المحادثات الأخيرة إن كانت محملة لهذا المستخدم
+            key = self._history_key(user_id, chat_id)
+            cached = self._recent.get(key)
+            if cached is not None:
+                conversations, complete = cached
+                self._cache_history(key, conversations + [{
+                    'user_message': user_message,
+                    'ai_response': ai_response,
+                    'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+                }], complete)
+            
+            context_info = f" في المجموعة {chat_id}" if chat_id else " في المحادثة الخاصة"
+            logging.info(f"✅ تم حفظ المحادثة للمستخدم {user_id}{context_info}")
                 
         except Exception as e:
             logging.error(f"خطأ في حفظ المحادثة: {e}")
 
     async def get_conversation_history(self, user_id: int, limit: int = 15, chat_id: Optional[int] = None) -> List[Dict]:
         """جلب آخر محادثات للمستخدم (افتراضياً آخر 15)"""
+        # خدمة الطلب من ذاكرة المحادثات الأخيرة إن كانت تكفي
+        key = self._history_key(user_id, chat_id)
+        cached = self._recent.get(key)
+        if cached is not None:
+            conversations, complete = cached
+            if complete or limit <= len(conversations):
+                self._recent.move_to_end(key)
+                return conversations[-limit:] if limit > 0 else []
+        
         try:
-            conn = await self.get_db_connection()
-            if not conn:
-                logging.error("لا يمكن الاتصال بقاعدة البيانات لجلب المحادثات")
-                return []
-                
-            try:
+            await self._ensure_chat_id_column()
+            async with db_pool.reader() as conn:
                 # بناء الاستعلام حسب السياق (مجموعة أو محادثة خاصة)
                 if chat_id is not None:
                     # جلب المحادثات الخاصة بهذه المجموعة
@@ -123,19 +124,20 @@ class ConversationMemorySQLite:
                     ''', (user_id, limit))
                 
                 rows = await cursor.fetchall()
-                
-                conversations = []
-                for row in rows:
-                    conversations.append({
-                        'user_message': row[0],
-                        'ai_response': row[1],
-                        'timestamp': row[2]
-                    })
-                
-                return list(reversed(conversations))  # الأقدم أولاً
-                
-            finally:
-                await conn.close()
+            
+            conversations = []
+            for row in rows:
+                conversations.append({
+                    'user_message': row[0],
+                    'ai_response': row[1],
+                    'timestamp': row[2]
+                })
+            
+            conversations.reverse()  # الأقدم أولاً
+            if limit <= RECENT_HISTORY_SIZE:
+                self._cache_history(key, conversations, complete=len(conversations) < limit)
+            
+            return conversations
                 
         except Exception as e:
             logging.error(f"خطأ في جلب المحادثات: {e}")
@@ -144,11 +146,13 @@ class ConversationMemorySQLite:
     async def clear_conversation_history(self, user_id: int, chat_id: Optional[int] = None) -> bool:
         """مسح تاريخ المحادثات لمستخدم معين"""
         try:
-            conn = await self.get_db_connection()
-            if not conn:
-                return False
+            await self._ensure_chat_id_column()
                 
-            try:
+            # إلغاء ذاكرة المحادثات الأخيرة المتأثرة
+            for key in [k for k in self._recent if k[0] == user_id and (chat_id is None or k[1] == (chat_id or None))]:
+                del self._recent[key]
+            
+            async with db_pool.writer() as conn:
                 # حذف بناءً على السياق
                 if chat_id is not None:
                     # حذف محادثات مجموعة محددة
@@ -160,14 +164,10 @@ class ConversationMemorySQLite:
                     await conn.execute('''
                         DELETE FROM conversation_history WHERE user_id = ?
                     ''', (user_id,))
-                
-                await conn.commit()
-                context_info = f" في المجموعة {chat_id}" if chat_id else " (جميع المحادثات)"
-                logging.info(f"✅ تم مسح تاريخ المحادثات للمستخدم {user_id}{context_info}")
-                return True
-                
-            finally:
-                await conn.close()
+            
+            context_info = f" في المجموعة {chat_id}" if chat_id else " (جميع المحادثات)"
+            logging.info(f"✅ تم مسح تاريخ المحادثات للمستخدم {user_id}{context_info}")
+            return True
                 
         except Exception as e:
             logging.error(f"خطأ في مسح المحادثات: {e}")
@@ -12,6 +12,7 @@ from aiogram.fsm.context import FSMContext
 
 from config.hierarchy import has_permission, AdminLevel
 from database.operations import execute_query
+from modules.trigger_index import custom_command_index, normalize_trigger
 from utils.states import CustomCommandsStates
 
 
@@ -42,6 +43,14 @@ async def load_custom_commands():
                 response_list = responses.split('|||') if responses else []
                 CUSTOM_COMMANDS[chat_id][keyword] = response_list
         
+        # بناء فهرس الكلمات (الكلمات بدون ردود لا تطابق شيئاً)
+        custom_command_index.load(
+            (chat_id, keyword, responses)
+            for chat_id, keywords in CUSTOM_COMMANDS.items()
+            for keyword, responses in keywords.items()
+            if responses
+        )
+        
         logging.info("تم تحميل الأوامر المخصصة من قاعدة البيانات بنجاح")
         
     except Exception as e:
@@ -64,6 +73,8 @@ async def save_custom_command(chat_id: int, keyword: str, responses: List[str],
             CUSTOM_COMMANDS[chat_id] = {}
         
         CUSTOM_COMMANDS[chat_id][keyword] = responses
+        if responses:
+            custom_command_index.add(chat_id, keyword, responses)
         
         logging.info(f"تم حفظ أمر مخصص: {keyword} في المجموعة {chat_id}")
         return True
@@ -84,6 +95,7 @@ async def delete_custom_command(chat_id: int, keyword: str) -> bool:
         # تحديث الذاكرة
         if chat_id in CUSTOM_COMMANDS and keyword in CUSTOM_COMMANDS[chat_id]:
             del CUSTOM_COMMANDS[chat_id][keyword]
+        _reindex_keyword(chat_id, keyword)
         
         logging.info(f"تم حذف أمر مخصص: {keyword} من المجموعة {chat_id}")
         return True
@@ -93,25 +105,26 @@ async def delete_custom_command(chat_id: int, keyword: str) -> bool:
         return False
 
 
+def clear_chat_commands(chat_id: int):
+    """إزالة أوامر محادثة من الذاكرة بعد مسحها من قاعدة البيانات"""
+    CUSTOM_COMMANDS.pop(chat_id, None)
+    custom_command_index.clear_chat(chat_id)
+
+
+def _reindex_keyword(chat_id: int, keyword: str):
+    """تحديث الفهرس بعد حذف كلمة (قد تبقى كلمة أخرى بنفس الشكل الموحد)"""
+    custom_command_index.remove(chat_id, keyword)
+    key = normalize_trigger(keyword)
+    for other, responses in CUSTOM_COMMANDS.get(chat_id, {}).items():
+        if responses and normalize_trigger(other) == key:
+            custom_command_index.add(chat_id, other, responses)
+
+
 async def get_custom_response(chat_id: int, message_text: str) -> Optional[str]:
-    """البحث عن رد مخصص للرسالة"""
+    """البحث عن رد مخصص للرسالة (مطابقة تامة أو احتواء عبر الفهرس)"""
     try:
-        if chat_id not in CUSTOM_COMMANDS:
-            return None
-        
-        message_lower = message_text.lower().strip()
-        
-        # البحث عن كلمة مفتاحية مطابقة
-        for keyword, responses in CUSTOM_COMMANDS[chat_id].items():
-            # فحص التطابق الدقيق أو الاحتواء
-            if (message_lower == keyword.lower() or 
-                keyword.lower() in message_lower or
-                any(word.strip() == keyword.lower() for word in message_lower.split())):
-                
-                if responses:
-                    return random.choice(responses)
-        
-        return None
+        responses = custom_command_index.match(chat_id, message_text)
+        return random.choice(responses) if responses else None
         
     except Exception as e:
         logging.error(f"خطأ في البحث عن رد مخصص: {e}")
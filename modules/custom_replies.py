@@ -8,8 +8,25 @@ from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 
 from database.operations import execute_query
+from modules.trigger_index import custom_reply_index
 from utils.states import CustomReplyStates
 from config.hierarchy import MASTERS, is_group_owner, is_moderator
+from database.connection_pool import db_pool
+
+
+async def load_custom_replies():
+    """تحميل الردود المخصصة إلى فهرس الكلمات في الذاكرة"""
+    try:
+        rows = await execute_query(
+            "SELECT chat_id, trigger_word, reply_text FROM custom_replies ORDER BY id",
+            fetch_all=True
+        )
+        custom_reply_index.load(
+            (row['chat_id'], row['trigger_word'], row['reply_text']) for row in (rows or [])
+        )
+        logging.info(f"✅ تم تحميل {len(rows or [])} رد مخصص إلى الفهرس")
+    except Exception as e:
+        logging.error(f"خطأ في تحميل الردود المخصصة: {e}")
 
 
 async def start_add_custom_reply(message: Message, state: FSMContext):
@@ -187,6 +204,8 @@ async def save_custom_reply(keyword, response, user_id, group_id, message):
             await execute_query(insert_query, (keyword, response, group_id, user_id))
             action = "إضافة"
         
+        custom_reply_index.add(group_id, keyword, response)
+        
         scope_text = "كامل البوت" if group_id is None else "هذه المجموعة"
         
         await message.reply(
@@ -202,63 +221,31 @@ async def save_custom_reply(keyword, response, user_id, group_id, message):
 
 
 async def check_for_custom_replies(message: Message):
-    """فحص الرسائل للكلمات المفتاحية المخصصة"""
+    """فحص الرسائل للكلمات المفتاحية المخصصة (من الفهرس في الذاكرة بدون قاعدة البيانات)"""
     try:
         if not message.text or not message.chat:
             return False
         
+        if not custom_reply_index.loaded:
+            await load_custom_replies()
+        
         text = message.text.lower().strip()
         group_id = message.chat.id
         
-        logging.info(f"فحص رد مخصص للنص: '{text}' في المجموعة: {group_id}")
-        
-        # استيراد مباشر لتجنب مشاكل الاستيراد
-        import aiosqlite
+        # ردود المجموعة الحالية أولاً ثم الردود العامة (كامل البوت)
+        reply_text = custom_reply_index.match(group_id, text, normalized=True)
+        if reply_text is None:
+            reply_text = custom_reply_index.match(None, text, normalized=True)
         
-        # البحث في ردود المجموعة الحالية مباشرة
-        try:
-            async with aiosqlite.connect("bot_database.db") as db:
-                db.row_factory = aiosqlite.Row
-                
-                # البحث في ردود المجموعة الحالية
-                async with db.execute(
-                    "SELECT reply_text FROM custom_replies WHERE trigger_word = ? AND chat_id = ?",
-                    (text, group_id)
-                ) as cursor:
-                    group_result = await cursor.fetchone()
-                    
-                logging.info(f"نتيجة البحث في المجموعة: {group_result}")
-                
-                if group_result:
-                    await message.reply(group_result[0])
-                    logging.info(f"تم العثور على رد مخصص في المجموعة: {group_result[0]}")
-                    return True
-                
-                # البحث في الردود العامة (كامل البوت)
-                async with db.execute(
-                    "SELECT reply_text FROM custom_replies WHERE trigger_word = ? AND chat_id IS NULL",
-                    (text,)
-                ) as cursor:
-                    global_result = await cursor.fetchone()
-                    
-                logging.info(f"نتيجة البحث العامة: {global_result}")
-                
-                if global_result:
-                    await message.reply(global_result[0])
-                    logging.info(f"تم العثور على رد مخصص عام: {global_result[0]}")
-                    return True
-                
-                logging.info("لم يتم العثور على رد مخصص")
-                return False
-                
-        except Exception as db_error:
-            logging.error(f"خطأ في قاعدة البيانات: {db_error}")
+        if reply_text is None:
             return False
         
+        await message.reply(reply_text)
+        logging.info(f"تم العثور على رد مخصص للنص: '{text}' في المجموعة: {group_id}")
+        return True
+        
     except Exception as e:
-        logging.error(f"خطأ في فحص الردود المخصصة - النوع: {type(e)}, القيمة: {e}")
-        import traceback
-        logging.error(f"تفاصيل الخطأ الكاملة: {traceback.format_exc()}")
+        logging.error(f"خطأ في فحص الردود المخصصة: {e}")
         return False
 
 
@@ -277,8 +264,7 @@ async def handle_show_custom_replies(message: Message):
             await message.reply("❌ هذا الأمر متاح للمشرفين ومالكي المجموعات والسادة فقط")
             return
 
-        import aiosqlite
-        async with aiosqlite.connect("bot_database.db") as db:
+        async with db_pool.reader() as db:
             if user_id in MASTERS:
                 # السيد يرى جميع الردود
                 async with db.execute(
@@ -302,44 +288,45 @@ async def handle_show_custom_replies(message: Message):
                 ) as cursor:
                     replies = await cursor.fetchall()
 
-            if not replies:
-                await message.reply("📝 **لا توجد ردود مخصصة**")
-                return
+        # بناء الرسائل وإرسالها بعد إعادة اتصال القراءة للمجمع
+        if not replies:
+            await message.reply("📝 **لا توجد ردود مخصصة**")
+            return
 
-            # تنظيم الردود في رسائل
-            replies_text = "📝 **قائمة الردود المخصصة:**\n\n"
+        # تنظيم الردود في رسائل
+        replies_text = "📝 **قائمة الردود المخصصة:**\n\n"
+        
+        for i, reply in enumerate(replies, 1):
+            keyword = reply[0]
+            reply_text = reply[1]
+            chat_id = reply[2]
+            created_by = reply[3]
             
-            for i, reply in enumerate(replies, 1):
-                keyword = reply[0]
-                reply_text = reply[1]
-                chat_id = reply[2]
-                created_by = reply[3]
-                
-                # تحديد نطاق الرد
-                if chat_id is None:
-                    scope = "🌐 كامل البوت"
+            # تحديد نطاق الرد
+            if chat_id is None:
+                scope = "🌐 كامل البوت"
+            else:
+                scope = f"🏠 هذه المجموعة"
+            
+            # معلومات إضافية للسيد
+            creator_info = ""
+            if user_id in MASTERS and created_by:
+                if created_by in MASTERS:
+                    creator_info = f" | 👑 بواسطة سيد"
                 else:
-                    scope = f"🏠 هذه المجموعة"
-                
-                # معلومات إضافية للسيد
-                creator_info = ""
-                if user_id in MASTERS and created_by:
-                    if created_by in MASTERS:
-                        creator_info = f" | 👑 بواسطة سيد"
-                    else:
-                        creator_info = f" | 👤 بواسطة {created_by}"
-                
-                replies_text += f"{i}. **{keyword}**\n"
-                replies_text += f"   📝 {reply_text[:50]}{'...' if len(reply_text) > 50 else ''}\n"
-                replies_text += f"   {scope}{creator_info}\n\n"
-                
-                # تقسيم الرسائل إذا كانت طويلة
-                if len(replies_text) > 3500:
-                    await message.reply(replies_text)
-                    replies_text = ""
+                    creator_info = f" | 👤 بواسطة {created_by}"
+            
+            replies_text += f"{i}. **{keyword}**\n"
+            replies_text += f"   📝 {reply_text[:50]}{'...' if len(reply_text) > 50 else ''}\n"
+            replies_text += f"   {scope}{creator_info}\n\n"
             
-            if replies_text:
+            # تقسيم الرسائل إذا كانت طويلة
+            if len(replies_text) > 3500:
                 await message.reply(replies_text)
+                replies_text = ""
+        
+        if replies_text:
+            await message.reply(replies_text)
                 
     except Exception as e:
         logging.error(f"خطأ في عرض الردود المخصصة: {e}")
@@ -386,8 +373,7 @@ async def handle_delete_custom_reply(message: Message):
             return False
 
         # البحث عن الرد وحذفه
-        import aiosqlite
-        async with aiosqlite.connect("bot_database.db") as db:
+        async with db_pool.writer() as db:
             if user_id in MASTERS:
                 # السيد يستطيع حذف أي رد
                 async with db.execute(
@@ -403,33 +389,39 @@ async def handle_delete_custom_reply(message: Message):
                 ) as cursor:
                     result = await cursor.fetchone()
             
-            if not result:
-                await message.reply(f"❌ لم يتم العثور على رد مخصص للكلمة: **{keyword}** في نطاق صلاحيتك")
-                return False
-            
             # حذف الرد
-            if user_id in MASTERS:
-                await db.execute(
-                    "DELETE FROM custom_replies WHERE trigger_word = ?",
-                    (keyword,)
-                )
-            else:
-                await db.execute(
-                    "DELETE FROM custom_replies WHERE trigger_word = ? AND chat_id = ?",
-                    (keyword, group_id)
-                )
-            await db.commit()
-            
-            scope_text = "كامل البوت" if result[1] is None else f"هذه المجموعة"
-            
-            await message.reply(
-                f"✅ **تم حذف الرد المخصص بنجاح!**\n\n"
-                f"🔤 **الكلمة المفتاحية:** {keyword}\n"
-                f"📝 **الرد المحذوف:** {result[0][:100]}{'...' if len(result[0]) > 100 else ''}\n"
-                f"🎯 **النطاق:** {scope_text}"
-            )
-            logging.info(f"تم حذف رد مخصص: {keyword} بواسطة {user_id}")
-            return True
+            if result:
+                if user_id in MASTERS:
+                    await db.execute(
+                        "DELETE FROM custom_replies WHERE trigger_word = ?",
+                        (keyword,)
+                    )
+                else:
+                    await db.execute(
+                        "DELETE FROM custom_replies WHERE trigger_word = ? AND chat_id = ?",
+                        (keyword, group_id)
+                    )
+        
+        # الرد بعد تحرير قفل الكتابة حتى لا ينتظر كل البوت رحلة تيليجرام
+        if not result:
+            await message.reply(f"❌ لم يتم العثور على رد مخصص للكلمة: **{keyword}** في نطاق صلاحيتك")
+            return False
+        
+        if user_id in MASTERS:
+            custom_reply_index.remove_everywhere(keyword)
+        else:
+            custom_reply_index.remove(group_id, keyword)
+        
+        scope_text = "كامل البوت" if result[1] is None else f"هذه المجموعة"
+        
+        await message.reply(
+            f"✅ **تم حذف الرد المخصص بنجاح!**\n\n"
+            f"🔤 **الكلمة المفتاحية:** {keyword}\n"
+            f"📝 **الرد المحذوف:** {result[0][:100]}{'...' if len(result[0]) > 100 else ''}\n"
+            f"🎯 **النطاق:** {scope_text}"
+        )
+        logging.info(f"تم حذف رد مخصص: {keyword} بواسطة {user_id}")
+        return True
 
     except Exception as e:
         logging.error(f"خطأ في حذف الرد المخصص: {e}")
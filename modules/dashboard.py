@@ -187,27 +187,29 @@ class GroupAnalytics:
         """اتجاهات النشاط"""
         try:
             trends = {}
+            start_date = (datetime.now() - timedelta(days=days - 1)).date().isoformat()
+            
+            # النشطون يومياً من الإحصائيات المجمعة (صف واحد لكل يوم)
+            daily_activity = await execute_query(
+                "SELECT date, active_users FROM daily_stats WHERE chat_id = ? AND date >= ?",
+                (chat_id, start_date),
+                fetch_all=True
+            )
+            active_by_date = {row[0]: row[1] or 0 for row in daily_activity or []}
+            
+            # المعاملات اليومية في استعلام واحد للفترة كاملة
+            daily_transactions = await execute_query(
+                "SELECT date(created_at), COUNT(*) FROM transactions WHERE created_at >= ? GROUP BY date(created_at)",
+                (start_date,),
+                fetch_all=True
+            )
+            transactions_by_date = {row[0]: row[1] for row in daily_transactions or []}
             
             for i in range(days):
                 date = (datetime.now() - timedelta(days=i)).date().isoformat()
-                
-                # نشاط يومي
-                daily_activity = await execute_query(
-                    "SELECT COUNT(*) FROM users WHERE chat_id = ? AND date(updated_at) = ?",
-                    (chat_id, date),
-                    fetch_one=True
-                )
-                
-                # معاملات يومية
-                daily_transactions = await execute_query(
-                    "SELECT COUNT(*) FROM transactions WHERE date(created_at) = ?",
-                    (date,),
-                    fetch_one=True
-                )
-                
                 trends[date] = {
-                    'active_users': daily_activity[0] if daily_activity else 0,
-                    'transactions': daily_transactions[0] if daily_transactions else 0
+                    'active_users': active_by_date.get(date, 0),
+                    'transactions': transactions_by_date.get(date, 0)
                 }
             
             return trends
@@ -0,0 +1,293 @@
+"""
+نظام عمال التحميل غير المعطل
+Non-Blocking Download Worker Pool
+
+ينفذ عمليات yt-dlp المعطلة في مجمع خيوط محدود عبر طابور مهام، بحيث لا
+تتوقف حلقة أحداث البوت أثناء التحميل. يوفر:
+- حداً أقصى للتحميلات المتزامنة لكل محادثة
+- استدعاءات تقدم مخففة الإيقاع لتعديل رسالة الانتظار
+- تتبع المجلدات المؤقتة وتنظيفها بعد الإرسال أو الفشل أو الإيقاف
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+# عدد خيوط التحميل المتزامنة
+DEFAULT_WORKERS = 3
+
+# الحد الأقصى للمهام المنتظرة في الطابور
+DEFAULT_QUEUE_SIZE = 20
+
+# الحد الأقصى للتحميلات النشطة لكل محادثة
+DEFAULT_PER_CHAT_LIMIT = 1
+
+# أقل فاصل زمني بين تحديثين لرسالة التقدم (ثواني) - لتجنب حدود تيليجرام
+PROGRESS_MIN_INTERVAL = 3.0
+
+# أقل تغير في النسبة المئوية يستحق تحديث الرسالة
+PROGRESS_MIN_STEP = 10
+
+# بادئة المجلدات المؤقتة لتمييزها عند التنظيف
+TEMP_DIR_PREFIX = "yukibot_dl_"
+
+# عمر المجلدات المؤقتة المتروكة قبل حذفها عند التشغيل (ثواني)
+STALE_TEMP_DIR_AGE = 3600
+
+ProgressCallback = Callable[[int], Awaitable[None]]
+
+
+class DownloadRejected(Exception):
+    """رفض مهمة تحميل بسبب الحدود (المحادثة مشغولة أو الطابور ممتلئ)"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class DownloadWorkerPool:
+    """مجمع عمال التحميل مع طابور مهام وحدود لكل محادثة"""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 per_chat_limit: int = DEFAULT_PER_CHAT_LIMIT):
+        self.workers_count = max(1, workers)
+        self.queue_size = queue_size
+        self.per_chat_limit = max(1, per_chat_limit)
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks = []
+        self._active_per_chat: Dict[int, int] = {}
+        self._temp_dirs: Set[str] = set()
+        self._started = False
+
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'rejected_chat_busy': 0,
+            'rejected_queue_full': 0,
+            'total_wait_ms': 0.0,
+            'total_run_ms': 0.0,
+            'temp_dirs_cleaned': 0,
+        }
+
+    # ===== دورة الحياة =====
+
+    def _ensure_started(self):
+        """تشغيل العمال عند أول مهمة"""
+        if self._started:
+            return
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers_count,
+            thread_name_prefix="yuki-download"
+        )
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        loop = asyncio.get_running_loop()
+        self._worker_tasks = [
+            loop.create_task(self._worker(index)) for index in range(self.workers_count)
+        ]
+        self._started = True
+        self.cleanup_stale_temp_dirs()
+        logging.info(f"✅ تم تشغيل مجمع التحميل ({self.workers_count} عامل)")
+
+    async def shutdown(self):
+        """إيقاف العمال وحذف جميع المجلدات المؤقتة المتبقية"""
+        if self._started:
+            for task in self._worker_tasks:
+                task.cancel()
+            await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+            self._worker_tasks = []
+
+            # إلغاء المهام التي لم تبدأ بعد
+            while not self._queue.empty():
+                job = self._queue.get_nowait()
+                if not job['future'].done():
+                    job['future'].cancel()
+
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._started = False
+
+        for temp_dir in list(self._temp_dirs):
+            self.remove_temp_dir(temp_dir)
+        logging.info("✅ تم إيقاف مجمع التحميل وتنظيف الملفات المؤقتة")
+
+    # ===== المجلدات المؤقتة =====
+
+    def create_temp_dir(self) -> str:
+        """إنشاء مجلد مؤقت مسجل للتنظيف لاحقاً"""
+        temp_dir = tempfile.mkdtemp(prefix=TEMP_DIR_PREFIX)
+        self._temp_dirs.add(temp_dir)
+        return temp_dir
+
+    def remove_temp_dir(self, temp_dir: str):
+        """حذف مجلد مؤقت وكل محتوياته"""
+        if not temp_dir:
+            return
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        if temp_dir in self._temp_dirs:
+            self._temp_dirs.discard(temp_dir)
+            self.stats['temp_dirs_cleaned'] += 1
+
+    def cleanup(self, file_path: Optional[str]):
+        """حذف الملف المحمل مع مجلده المؤقت بعد الإرسال"""
+        if not file_path or not os.path.isabs(file_path):
+            return
+        self.remove_temp_dir(os.path.dirname(file_path))
+
+    def cleanup_stale_temp_dirs(self):
+        """حذف مجلدات التحميل المتروكة من تشغيل سابق"""
+        root = tempfile.gettempdir()
+        cutoff = time.time() - STALE_TEMP_DIR_AGE
+        try:
+            for name in os.listdir(root):
+                path = os.path.join(root, name)
+                if name.startswith(TEMP_DIR_PREFIX) and path not in self._temp_dirs:
+                    if os.path.getmtime(path) < cutoff:
+                        shutil.rmtree(path, ignore_errors=True)
+                        self.stats['temp_dirs_cleaned'] += 1
+        except Exception as e:
+            logging.error(f"خطأ في تنظيف مجلدات التحميل القديمة: {e}")
+
+    # ===== تنفيذ المهام =====
+
+    def _make_progress_hook(self, callback: Optional[ProgressCallback]):
+        """بناء خطاف تقدم لـ yt-dlp يعمل داخل خيط التحميل ويستدعي callback في الحلقة
+
+        يعيد (الخطاف، settle) - settle توقف التحديثات اللاحقة وتنتظر التحديث الجاري
+        حتى لا يصل تعديل تقدم متأخر بعد التعديل النهائي أو حذف رسالة الانتظار.
+        """
+        pending: Set[asyncio.Task] = set()
+        state = {'percent': -PROGRESS_MIN_STEP, 'last': 0.0, 'closed': False}
+
+        async def settle():
+            state['closed'] = True
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        if callback is None:
+            return None, settle
+
+        loop = asyncio.get_running_loop()
+
+        def _deliver(percent: int):
+            if state['closed']:
+                return
+            task = loop.create_task(callback(percent))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            task.add_done_callback(_log_callback_error)
+
+        def hook(status: Dict):
+            if status.get('status') != 'downloading':
+                return
+            total = status.get('total_bytes') or status.get('total_bytes_estimate')
+            if not total:
+                return
+            percent = int(status.get('downloaded_bytes', 0) * 100 / total)
+            now = time.monotonic()
+            if percent - state['percent'] < PROGRESS_MIN_STEP or now - state['last'] < PROGRESS_MIN_INTERVAL:
+                return
+            state['percent'] = percent
+            state['last'] = now
+            loop.call_soon_threadsafe(_deliver, min(percent, 100))
+
+        return hook, settle
+
+    async def _worker(self, index: int):
+        """عامل يسحب المهام من الطابور وينفذها في مجمع الخيوط"""
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            try:
+                if job['future'].cancelled():
+                    continue
+
+                started = time.perf_counter()
+                self.stats['total_wait_ms'] += (started - job['queued_at']) * 1000
+                try:
+                    result = await loop.run_in_executor(self._executor, job['call'])
+                    if not job['future'].done():
+                        job['future'].set_result(result)
+                    elif isinstance(result, str):
+                        # المستدعي ألغى الانتظار - لا أحد سيرسل الملف
+                        self.cleanup(result)
+                    self.stats['completed'] += 1
+                except Exception as e:
+                    self.stats['failed'] += 1
+                    if not job['future'].done():
+                        job['future'].set_exception(e)
+                finally:
+                    self.stats['total_run_ms'] += (time.perf_counter() - started) * 1000
+            finally:
+                self._queue.task_done()
+
+    async def run(self, chat_id: int, func: Callable, *args,
+                  progress_callback: Optional[ProgressCallback] = None, **kwargs):
+        """تنفيذ دالة معطلة في مجمع التحميل مع احترام حدود المحادثة والطابور
+
+        تستقبل الدالة معامل progress_hook إضافياً لتمريره إلى yt-dlp.
+        """
+        self._ensure_started()
+
+        if self._active_per_chat.get(chat_id, 0) >= self.per_chat_limit:
+            self.stats['rejected_chat_busy'] += 1
+            raise DownloadRejected('chat_busy')
+
+        future = asyncio.get_running_loop().create_future()
+        progress_hook, settle_progress = self._make_progress_hook(progress_callback)
+        job = {
+            'call': partial(func, *args, progress_hook=progress_hook, **kwargs),
+            'future': future,
+            'queued_at': time.perf_counter(),
+        }
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.stats['rejected_queue_full'] += 1
+            raise DownloadRejected('queue_full')
+
+        self.stats['submitted'] += 1
+        self._active_per_chat[chat_id] = self._active_per_chat.get(chat_id, 0) + 1
+        try:
+            return await future
+        finally:
+            try:
+                # لا يعود المستدعي ليعدّل أو يحذف رسالة الانتظار قبل انتهاء آخر تحديث تقدم
+                await settle_progress()
+            finally:
+                remaining = self._active_per_chat.get(chat_id, 1) - 1
+                if remaining > 0:
+                    self._active_per_chat[chat_id] = remaining
+                else:
+                    self._active_per_chat.pop(chat_id, None)
+
+    def get_stats(self) -> Dict:
+        """إحصائيات المجمع للمراقبة"""
+        finished = self.stats['completed'] + self.stats['failed']
+        return dict(
+            self.stats,
+            workers=self.workers_count,
+            queued=self._queue.qsize() if self._queue else 0,
+            active_chats=len(self._active_per_chat),
+            temp_dirs=len(self._temp_dirs),
+            avg_wait_ms=round(self.stats['total_wait_ms'] / finished, 2) if finished else 0.0,
+            avg_run_ms=round(self.stats['total_run_ms'] / finished, 2) if finished else 0.0,
+        )
+
+
+def _log_callback_error(task: asyncio.Task):
+    """تسجيل أخطاء استدعاءات التقدم بدلاً من تجاهلها بصمت"""
+    if not task.cancelled() and task.exception():
+        logging.debug(f"خطأ في تحديث تقدم التحميل: {task.exception()}")
+
+
+# النسخة العامة من مجمع التحميل
+download_pool = DownloadWorkerPool()
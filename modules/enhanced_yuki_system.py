@@ -45,7 +45,7 @@ class EnhancedYukiSystem:
         try:
             # استيراد الوظائف المطلوبة
             from database.operations import get_user
-            from database.config.database import execute_query
+            from database.operations import execute_query
             
             # المعلومات الأساسية
             user = await get_user(user_id)
@@ -5,10 +5,12 @@ Farm Module
 
 import logging
 from datetime import datetime, timedelta
+from typing import Optional
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 
-from database.operations import get_user, update_user_balance, execute_query, add_transaction
+from database.operations import get_user, execute_query
+from database import ledger
 from utils.states import FarmStates
 from utils.helpers import format_number, is_valid_amount
 
@@ -71,6 +73,47 @@ CROP_TYPES = {
 }
 
 
+
+# آخر وقت عالجته مهمة تحديث حالة المحاصيل الدورية
+_last_status_update: Optional[str] = None
+
+
+def _apply_lazy_status(crops: list, now: str) -> list:
+    """اشتقاق حالة النضج من وقت الحصاد عند القراءة بدلاً من تحديث الجدول"""
+    for crop in crops:
+        if crop['status'] == 'growing' and crop['harvest_time'] <= now:
+            crop['status'] = 'ready'
+    return crops
+
+
+def _harvest_statement(crop_id: int, now: str) -> "ledger.LedgerStatement":
+    """تحويل محصول ناضج إلى محصود (تفشل المعاملة إذا حُصد بالفعل)"""
+    return ledger.LedgerStatement(
+        "UPDATE farm SET status = 'harvested' WHERE id = ? AND status IN ('growing', 'ready') AND harvest_time <= ?",
+        (crop_id, now), must_change=True
+    )
+
+
+async def _purchase_crop(message: Message, crop_type: str, quantity: int, total_cost: int, harvest_time: datetime):
+    """خصم تكلفة الزراعة وحفظ المحصول في معاملة واحدة - يرجع الرصيد الجديد أو None"""
+    crop_info = CROP_TYPES[crop_type]
+    result = await ledger.apply(
+        ledger.LedgerEntry(
+            message.from_user.id, balance_delta=-total_cost, amount=total_cost,
+            transaction_type="crop_purchase", description=f"زراعة {quantity} وحدة من {crop_info['name']}",
+            from_user_id=message.from_user.id, to_user_id=0  # النظام
+        ),
+        statements=[ledger.LedgerStatement(
+            "INSERT INTO farm (user_id, crop_type, quantity, plant_time, harvest_time, status) VALUES (?, ?, ?, ?, ?, ?)",
+            (message.from_user.id, crop_type, quantity, datetime.now().isoformat(), harvest_time.isoformat(), 'growing')
+        )]
+    )
+    if not result:
+        await message.reply("❌ رصيد غير كافٍ!" if result.reason == ledger.REASON_INSUFFICIENT
+                            else "❌ حدث خطأ أثناء الزراعة")
+        return None
+    return result.balance(message.from_user.id)
+
 async def show_farm_menu(message: Message):
     """عرض قائمة المزرعة الرئيسية"""
     try:
@@ -79,11 +122,8 @@ async def show_farm_menu(message: Message):
             await message.reply("❌ يرجى التسجيل أولاً باستخدام 'انشاء حساب بنكي'")
             return
         
-        # تحديث حالة المحاصيل أولاً
-        await auto_update_crop_status()
-        
-        # الحصول على محاصيل المستخدم
-        user_crops = await get_user_crops(message.from_user.id)
+        # الحصول على محاصيل المستخدم (الحالة مشتقة من وقت الحصاد)
+        user_crops = await get_user_crops(message.from_user.id, active_only=True)
         growing_crops = [crop for crop in user_crops if crop['status'] == 'growing']
         ready_crops = [crop for crop in user_crops if crop['status'] == 'ready']
         
@@ -209,24 +249,10 @@ async def plant_crop_command(message: Message):
         # حساب وقت الحصاد
         harvest_time = datetime.now() + timedelta(minutes=crop_info['grow_time_minutes'])
         
-        # خصم التكلفة من الرصيد
-        new_balance = user['balance'] - total_cost
-        await update_user_balance(message.from_user.id, new_balance)
-        
-        # حفظ المحصول في قاعدة البيانات
-        await execute_query(
-            "INSERT INTO farm (user_id, crop_type, quantity, plant_time, harvest_time, status) VALUES (?, ?, ?, ?, ?, ?)",
-            (message.from_user.id, crop_type, quantity, datetime.now().isoformat(), harvest_time.isoformat(), 'growing')
-        )
-        
-        # إضافة معاملة
-        await add_transaction(
-            from_user_id=message.from_user.id,
-            to_user_id=0,  # النظام
-            transaction_type="crop_purchase",
-            amount=total_cost,
-            description=f"زراعة {quantity} وحدة من {crop_info['name']}"
-        )
+        # خصم التكلفة وحفظ المحصول وتسجيل المعاملة في معاملة واحدة
+        new_balance = await _purchase_crop(message, crop_type, quantity, total_cost, harvest_time)
+        if new_balance is None:
+            return
         
         expected_yield = crop_info['yield_per_unit'] * quantity
         expected_profit = expected_yield - total_cost
@@ -249,10 +275,7 @@ async def plant_crop_command(message: Message):
 async def harvest_command(message: Message):
     """معالجة أمر الحصاد"""
     try:
-        # تحديث حالة المحاصيل أولاً
-        await auto_update_crop_status()
-        
-        user_crops = await get_user_crops(message.from_user.id)
+        user_crops = await get_user_crops(message.from_user.id, active_only=True)
         
         if not user_crops:
             await message.reply("""
@@ -288,10 +311,7 @@ async def harvest_command(message: Message):
 async def show_farm_status(message: Message):
     """عرض حالة المزرعة"""
     try:
-        # تحديث حالة المحاصيل أولاً
-        await auto_update_crop_status()
-        
-        user_crops = await get_user_crops(message.from_user.id)
+        user_crops = await get_user_crops(message.from_user.id, active_only=True)
         
         if not user_crops:
             await message.reply("""
@@ -488,27 +508,13 @@ async def process_crop_quantity(message: Message, state: FSMContext):
             )
             return
         
-        # تنفيذ الزراعة
-        new_balance = user['balance'] - total_cost
-        await update_user_balance(message.from_user.id, new_balance)
-        
         # حساب وقت الحصاد
         harvest_time = datetime.now() + timedelta(minutes=crop_info['grow_time_minutes'])
         
-        # إضافة المحصول إلى قاعدة البيانات
-        await execute_query(
-            "INSERT INTO farm (user_id, crop_type, quantity, plant_time, harvest_time, status) VALUES (?, ?, ?, ?, ?, ?)",
-            (message.from_user.id, crop_type, quantity, datetime.now().isoformat(), harvest_time.isoformat(), 'growing')
-        )
-        
-        # إضافة معاملة
-        await add_transaction(
-            from_user_id=message.from_user.id,
-            to_user_id=0,  # النظام
-            transaction_type="crop_purchase",
-            amount=total_cost,
-            description=f"زراعة {quantity} وحدة من {crop_info['name']}"
-        )
+        # خصم التكلفة وحفظ المحصول وتسجيل المعاملة في معاملة واحدة
+        new_balance = await _purchase_crop(message, crop_type, quantity, total_cost, harvest_time)
+        if new_balance is None:
+            return
         
         expected_yield = crop_info['yield_per_unit'] * quantity
         expected_profit = expected_yield - total_cost
@@ -541,11 +547,9 @@ async def harvest_all_crops_command(message: Message):
             await message.reply("❌ يرجى التسجيل أولاً باستخدام 'انشاء حساب بنكي'")
             return
         
-        # تحديث حالة المحاصيل أولاً
-        await auto_update_crop_status()
-        
         # الحصول على المحاصيل الجاهزة للحصاد
-        ready_crops = await get_ready_crops(message.from_user.id)
+        now = datetime.now().isoformat()
+        ready_crops = await get_ready_crops(message.from_user.id, now)
         
         if not ready_crops:
             await message.reply(
@@ -582,25 +586,20 @@ async def harvest_all_crops_command(message: Message):
             harvest_summary[crop_name]['yield'] += yield_amount
             harvest_summary[crop_name]['cost'] += cost_amount
             harvest_summary[crop_name]['profit'] += (yield_amount - cost_amount)
-            
-            # تحديث حالة المحصول في قاعدة البيانات
-            await execute_query(
-                "UPDATE farm SET status = 'harvested' WHERE id = ?",
-                (crop['id'],)
-            )
         
-        # إضافة العائد إلى رصيد المستخدم
-        new_balance = user['balance'] + total_yield
-        await update_user_balance(message.from_user.id, new_balance)
-        
-        # إضافة معاملة
-        await add_transaction(
-            from_user_id=0,  # النظام
-            to_user_id=message.from_user.id,
-            transaction_type="crop_harvest",
-            amount=total_yield,
-            description=f"حصاد جميع المحاصيل - {total_crops} وحدة"
+        # تحديث حالة المحاصيل وإضافة العائد في معاملة واحدة (يمنع الحصاد المزدوج)
+        result = await ledger.apply(
+            ledger.LedgerEntry(
+                message.from_user.id, balance_delta=total_yield,
+                transaction_type="crop_harvest", description=f"حصاد جميع المحاصيل - {total_crops} وحدة",
+                from_user_id=0, to_user_id=message.from_user.id  # من النظام
+            ),
+            statements=[_harvest_statement(crop['id'], now) for crop in ready_crops]
         )
+        if not result:
+            await message.reply("❌ تم حصاد هذه المحاصيل بالفعل، تحقق من 'حالة المزرعة'")
+            return
+        new_balance = result.balance(message.from_user.id)
         
         # إعداد نص الحصاد المفصل
         total_profit = total_yield - total_cost
@@ -679,13 +678,14 @@ async def harvest_specific_crop_command(message: Message):
             )
             return
         
-        # تحديث حالة المحاصيل أولاً
-        await auto_update_crop_status()
-        
-        # الحصول على المحاصيل الجاهزة من النوع المحدد
+        # الحصول على المحاصيل الناضجة من النوع المحدد
+        now = datetime.now().isoformat()
         ready_crops = await execute_query(
-            "SELECT * FROM farm WHERE user_id = ? AND crop_type = ? AND status = 'ready' ORDER BY plant_time ASC",
-            (message.from_user.id, crop_type),
+            """
+            SELECT * FROM farm WHERE user_id = ? AND harvest_time <= ? AND crop_type = ?
+            AND status IN ('growing', 'ready') ORDER BY plant_time ASC
+            """,
+            (message.from_user.id, now, crop_type),
             fetch_all=True
         )
         
@@ -710,9 +710,10 @@ async def harvest_specific_crop_command(message: Message):
             )
             return
         
-        # حصاد الكمية المطلوبة
+        # حصاد الكمية المطلوبة (التحديثات تُنفذ مع إضافة العائد في معاملة واحدة)
         remaining_to_harvest = quantity
         harvested_crops = []
+        harvest_statements = []
         
         for crop in ready_crops:
             if remaining_to_harvest <= 0:
@@ -727,10 +728,7 @@ async def harvest_specific_crop_command(message: Message):
                 remaining_to_harvest -= crop['quantity']
                 
                 # تحديث حالة المحصول
-                await execute_query(
-                    "UPDATE farm SET status = 'harvested' WHERE id = ?",
-                    (crop['id'],)
-                )
+                harvest_statements.append(_harvest_statement(crop['id'], now))
             else:
                 # حصاد جزء من المحصول
                 harvested_crops.append({
@@ -740,10 +738,10 @@ async def harvest_specific_crop_command(message: Message):
                 
                 # تحديث كمية المحصول المتبقي
                 new_quantity = crop['quantity'] - remaining_to_harvest
-                await execute_query(
-                    "UPDATE farm SET quantity = ? WHERE id = ?",
-                    (new_quantity, crop['id'])
-                )
+                harvest_statements.append(ledger.LedgerStatement(
+                    "UPDATE farm SET quantity = ? WHERE id = ? AND status IN ('growing', 'ready') AND quantity = ?",
+                    (new_quantity, crop['id'], crop['quantity']), must_change=True
+                ))
                 remaining_to_harvest = 0
         
         # حساب العائد والربح
@@ -753,18 +751,19 @@ async def harvest_specific_crop_command(message: Message):
         profit_amount = yield_amount - cost_amount
         profit_percentage = (profit_amount / cost_amount * 100) if cost_amount > 0 else 0
         
-        # إضافة العائد إلى رصيد المستخدم
-        new_balance = user['balance'] + yield_amount
-        await update_user_balance(message.from_user.id, new_balance)
-        
-        # إضافة معاملة
-        await add_transaction(
-            from_user_id=0,  # النظام
-            to_user_id=message.from_user.id,
-            transaction_type="crop_harvest",
-            amount=yield_amount,
-            description=f"حصاد {quantity} وحدة من {crop_info['name']}"
+        # تحديث المحاصيل وإضافة العائد في معاملة واحدة (يمنع الحصاد المزدوج)
+        result = await ledger.apply(
+            ledger.LedgerEntry(
+                message.from_user.id, balance_delta=yield_amount,
+                transaction_type="crop_harvest", description=f"حصاد {quantity} وحدة من {crop_info['name']}",
+                from_user_id=0, to_user_id=message.from_user.id  # من النظام
+            ),
+            statements=harvest_statements
         )
+        if not result:
+            await message.reply("❌ تغيرت محاصيلك أثناء الحصاد، حاول مرة أخرى")
+            return
+        new_balance = result.balance(message.from_user.id)
         
         # إعداد نص الحصاد المفصل
         harvest_text = f"🎉 **تم الحصاد بنجاح!**\n\n"
@@ -818,18 +817,10 @@ async def show_farm_status(message: Message):
         now = datetime.now()
         
         for crop in user_crops:
-            crop_info = CROP_TYPES.get(crop['crop_type'], {})
-            harvest_time = datetime.fromisoformat(crop['harvest_time'])
-            
             if crop['status'] == 'harvested':
                 harvested_crops.append(crop)
-            elif now >= harvest_time:
+            elif crop['status'] == 'ready':
                 ready_crops.append(crop)
-                # تحديث الحالة إلى جاهز
-                await execute_query(
-                    "UPDATE farm SET status = 'ready' WHERE id = ?",
-                    (crop['id'],)
-                )
             else:
                 growing_crops.append(crop)
         
@@ -888,45 +879,52 @@ async def show_farm_status(message: Message):
         await message.reply("❌ حدث خطأ في عرض حالة المزرعة")
 
 
-async def get_user_crops(user_id: int):
-    """الحصول على محاصيل المستخدم"""
+async def get_user_crops(user_id: int, active_only: bool = False):
+    """الحصول على محاصيل المستخدم (الجاهزة تُحدد من وقت الحصاد عند القراءة)"""
     try:
-        crops = await execute_query(
-            "SELECT * FROM farm WHERE user_id = ? ORDER BY plant_time DESC",
-            (user_id,),
-            fetch_all=True
-        )
-        return crops if crops else []
+        query = "SELECT * FROM farm WHERE user_id = ?"
+        if active_only:
+            query += " AND status IN ('growing', 'ready')"
+        crops = await execute_query(query + " ORDER BY plant_time DESC", (user_id,), fetch_all=True)
+        return _apply_lazy_status(crops, datetime.now().isoformat()) if crops else []
     except Exception as e:
         logging.error(f"خطأ في الحصول على محاصيل المستخدم: {e}")
         return []
 
 
-async def get_ready_crops(user_id: int):
-    """الحصول على المحاصيل الجاهزة للحصاد"""
+async def get_ready_crops(user_id: int, now: Optional[str] = None):
+    """الحصول على المحاصيل الجاهزة للحصاد (فهرس user_id + harvest_time)"""
     try:
-        now = datetime.now().isoformat()
+        now = now or datetime.now().isoformat()
         crops = await execute_query(
-            "SELECT * FROM farm WHERE user_id = ? AND harvest_time <= ? AND status = 'ready'",
+            "SELECT * FROM farm WHERE user_id = ? AND harvest_time <= ? AND status IN ('growing', 'ready')",
             (user_id, now),
             fetch_all=True
         )
-        return crops if crops else []
+        return _apply_lazy_status(crops, now) if crops else []
     except Exception as e:
         logging.error(f"خطأ في الحصول على المحاصيل الجاهزة: {e}")
         return []
 
 
 async def auto_update_crop_status():
-    """تحديث حالة المحاصيل تلقائياً (للتشغيل الدوري)"""
+    """تحديث حالة المحاصيل التي نضجت منذ آخر تشغيل (مهمة المجدول الدورية)"""
+    global _last_status_update
     try:
         now = datetime.now().isoformat()
         
-        # تحديث المحاصيل التي وصلت لوقت الحصاد
-        result = await execute_query(
-            "UPDATE farm SET status = 'ready' WHERE harvest_time <= ? AND status = 'growing'",
-            (now,)
-        )
+        # المحاصيل التي وصل وقت حصادها منذ آخر تشغيل فقط (أول تشغيل يلحق بكل المتأخر)
+        if _last_status_update is None:
+            result = await execute_query(
+                "UPDATE farm SET status = 'ready' WHERE status = 'growing' AND harvest_time <= ?",
+                (now,)
+            )
+        else:
+            result = await execute_query(
+                "UPDATE farm SET status = 'ready' WHERE status = 'growing' AND harvest_time > ? AND harvest_time <= ?",
+                (_last_status_update, now)
+            )
+        _last_status_update = now
         
         if result > 0:
             logging.info(f"تم تحديث {result} محصول إلى حالة جاهز للحصاد")
@@ -944,7 +942,8 @@ async def handle_harvest_callback(callback):
         user_id = callback.from_user.id
         
         # الحصول على المحاصيل الجاهزة
-        ready_crops = await get_ready_crops(user_id)
+        now = datetime.now().isoformat()
+        ready_crops = await get_ready_crops(user_id, now)
         
         if not ready_crops:
             await callback.answer("❌ لا توجد محاصيل جاهزة للحصاد!")
@@ -959,16 +958,19 @@ async def handle_harvest_callback(callback):
             yield_amount = crop_info.get('yield_per_unit', 0) * crop['quantity']
             total_yield += yield_amount
             harvested_count += 1
-            
-            # تحديث حالة المحصول إلى محصود
-            await execute_query(
-                "UPDATE farm SET status = 'harvested' WHERE id = ?",
-                (crop['id'],)
-            )
         
-        # إضافة المال للمستخدم
-        from database.operations import update_user_balance
-        await update_user_balance(user_id, total_yield)
+        # تحديث حالة المحاصيل وإضافة المال للمستخدم في معاملة واحدة
+        result = await ledger.apply(
+            ledger.LedgerEntry(
+                user_id, balance_delta=total_yield,
+                transaction_type="crop_harvest", description=f"حصاد {harvested_count} محصول",
+                from_user_id=0, to_user_id=user_id  # من النظام
+            ),
+            statements=[_harvest_statement(crop['id'], now) for crop in ready_crops]
+        )
+        if not result:
+            await callback.answer("❌ تم حصاد هذه المحاصيل بالفعل!")
+            return
         
         # إضافة XP للمستخدم
         from modules.leveling import add_xp
@@ -7,7 +7,6 @@ import logging
 import random
 from datetime import datetime
 from aiogram.types import Message
-from config.database import get_database_connection
 
 
 # قوائم البيانات للأوامر الترفيهية
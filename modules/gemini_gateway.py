@@ -0,0 +1,378 @@
+"""
+بوابة استدعاءات Gemini المشتركة
+Shared Async Gemini Inference Gateway
+
+نقطة واحدة لجميع استدعاءات Gemini (الذكاء الحقيقي، محلل الوسائط، النظام
+الشامل) بدلاً من استدعاء generate_content المعطل داخل الدوال غير المتزامنة:
+- استدعاء غير متزامن عبر العميل الأصلي client.aio أو مجمع خيوط مخصص
+- حد أقصى عام للطلبات المتزامنة مع طوابير عادلة لكل محادثة (بالتناوب)
+- مهلة زمنية لكل طلب
+- تتبع حصة كل مفتاح API مشترك بين جميع الأنظمة مع التبديل التلقائي
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+from functools import partial
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+try:
+    import google.genai as genai
+    GEMINI_AVAILABLE = True
+except ImportError:
+    genai = None
+    GEMINI_AVAILABLE = False
+
+# الحد الأقصى لطلبات Gemini المتزامنة في البوت كله
+DEFAULT_MAX_CONCURRENCY = 4
+
+# المهلة الافتراضية لكل طلب (ثواني)
+DEFAULT_TIMEOUT = 60.0
+
+# مدة إيقاف المفتاح مؤقتاً عند زحمة الخدمة (ثواني)
+OVERLOAD_COOLDOWN = 60.0
+
+# رموز أخطاء استنزاف الحصة اليومية
+QUOTA_ERROR_CODES = ("429", "RESOURCE_EXHAUSTED")
+
+# رموز أخطاء زحمة الخدمة المؤقتة
+OVERLOAD_ERROR_CODES = ("503", "UNAVAILABLE", "overloaded")
+
+# المحادثة الحالية للطلب (لطوابير العدالة) عند عدم تمريرها صراحة
+_current_chat: contextvars.ContextVar = contextvars.ContextVar('gemini_chat', default=None)
+
+
+def classify_error(error) -> Optional[str]:
+    """تصنيف خطأ Gemini: 'quota' أو 'overloaded' أو None"""
+    error_str = str(error)
+    if any(code in error_str for code in QUOTA_ERROR_CODES):
+        return 'quota'
+    if any(code in error_str for code in OVERLOAD_ERROR_CODES):
+        return 'overloaded'
+    return None
+
+
+class KeyQuotaTracker:
+    """تتبع حالة كل مفتاح Gemini (مستنزف لليوم / متوقف مؤقتاً) مع عميل لكل مفتاح"""
+
+    def __init__(self):
+        self._keys: List[str] = []
+        self._clients: Dict[int, Any] = {}
+        self.current_index = 0
+        self.exhausted: Dict[int, date] = {}
+        self._cooldown_until: Dict[int, float] = {}
+        self.last_reset_date = date.today()
+        self.key_stats: Dict[int, Dict[str, int]] = {}
+        self._loaded = False
+
+    def _load(self):
+        """تحميل المفاتيح من ملف المفاتيح عند أول استخدام"""
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            from utils.api_loader import api_loader
+            self._keys = api_loader.get_all_ai_keys()
+        except Exception as e:
+            logging.error(f"خطأ في تحميل مفاتيح Gemini: {e}")
+            self._keys = []
+        if not self._keys:
+            logging.error("❌ لم يتم العثور على مفاتيح Gemini API")
+
+    def reload(self):
+        """إعادة تحميل المفاتيح (بعد تعديل ملف المفاتيح)"""
+        self._loaded = False
+        self._clients.clear()
+        self._load()
+
+    @property
+    def total(self) -> int:
+        self._load()
+        return len(self._keys)
+
+    def _reset_daily(self):
+        """إعادة تعيين المفاتيح المستنزفة في يوم جديد"""
+        today = date.today()
+        if today != self.last_reset_date:
+            logging.info(f"🔄 يوم جديد ({today}) - إعادة تعيين قائمة مفاتيح Gemini المستنزفة")
+            self.exhausted.clear()
+            self.last_reset_date = today
+
+    def _is_available(self, index: int) -> bool:
+        return index not in self.exhausted and self._cooldown_until.get(index, 0) <= time.monotonic()
+
+    def available_count(self) -> int:
+        """عدد المفاتيح المتاحة الآن"""
+        self._load()
+        self._reset_daily()
+        return sum(1 for i in range(len(self._keys)) if self._is_available(i))
+
+    def client(self, index: Optional[int] = None):
+        """عميل Gemini لمفتاح محدد (أو المفتاح الحالي)"""
+        self._load()
+        if not GEMINI_AVAILABLE or not self._keys:
+            return None
+        index = self.current_index if index is None else index
+        if index not in self._clients:
+            self._clients[index] = genai.Client(api_key=self._keys[index])
+        return self._clients[index]
+
+    def select(self) -> Optional[int]:
+        """اختيار المفتاح الحالي إن كان متاحاً وإلا أول مفتاح متاح"""
+        self._load()
+        if not self._keys:
+            return None
+        self._reset_daily()
+        if self._is_available(self.current_index):
+            return self.current_index
+        for index in range(len(self._keys)):
+            if self._is_available(index):
+                self.current_index = index
+                logging.info(
+                    f"🔄 تم التبديل لمفتاح Gemini {index + 1}/{len(self._keys)} "
+                    f"(متوفر: {self.available_count()}, مستنزف: {len(self.exhausted)})"
+                )
+                return index
+        return None
+
+    def record(self, index: int, outcome: str):
+        """تسجيل نتيجة طلب لمفتاح (success / quota / overloaded / error / timeout)"""
+        stats = self.key_stats.setdefault(index, {})
+        stats[outcome] = stats.get(outcome, 0) + 1
+
+    def mark_exhausted(self, index: int):
+        """تسجيل مفتاح كمستنزف لليوم"""
+        self.exhausted[index] = date.today()
+        self.record(index, 'quota')
+        logging.warning(f"🚫 تم تسجيل مفتاح Gemini {index + 1} كمستنزف لليوم")
+
+    def mark_overloaded(self, index: int):
+        """إيقاف مفتاح مؤقتاً بسبب زحمة الخدمة"""
+        self._cooldown_until[index] = time.monotonic() + OVERLOAD_COOLDOWN
+        self.record(index, 'overloaded')
+        logging.warning(f"⏳ إيقاف مفتاح Gemini {index + 1} مؤقتاً لمدة {int(OVERLOAD_COOLDOWN)} ثانية")
+
+    def switch_to_next_key(self) -> bool:
+        """تسجيل المفتاح الحالي كمستنزف والتبديل للمفتاح التالي المتاح"""
+        self._load()
+        if not self._keys:
+            return False
+        self.mark_exhausted(self.current_index)
+        if self.select() is None:
+            logging.warning("⚠️ تم استنزاف جميع مفاتيح Gemini المتاحة لليوم")
+            return False
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """حالة المفاتيح للمراقبة"""
+        return {
+            'total': self.total,
+            'available': self.available_count(),
+            'exhausted': len(self.exhausted),
+            'current': self.current_index + 1 if self._keys else 0,
+            'per_key': {index + 1: dict(stats) for index, stats in self.key_stats.items()},
+        }
+
+
+class GeminiGateway:
+    """بوابة غير متزامنة لطلبات Gemini مع حد تزامن وعدالة بين المحادثات"""
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, timeout: float = DEFAULT_TIMEOUT):
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.keys = KeyQuotaTracker()
+
+        self._active = 0
+        # محادثة -> طابور الطلبات المنتظرة (OrderedDict للتناوب بين المحادثات)
+        self._waiting: "OrderedDict[Any, Deque[asyncio.Future]]" = OrderedDict()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        self.stats = {
+            'requests': 0,
+            'completed': 0,
+            'failed': 0,
+            'timeouts': 0,
+            'key_switches': 0,
+            'total_wait_ms': 0.0,
+            'total_run_ms': 0.0,
+        }
+
+    @property
+    def available(self) -> bool:
+        """هل يمكن إرسال طلبات (المكتبة متوفرة ويوجد مفاتيح)"""
+        return GEMINI_AVAILABLE and self.keys.total > 0
+
+    @contextmanager
+    def for_chat(self, chat_id: Optional[int]):
+        """ربط طلبات Gemini داخل هذا السياق بمحادثة لطوابير العدالة"""
+        token = _current_chat.set(chat_id)
+        try:
+            yield
+        finally:
+            _current_chat.reset(token)
+
+    # ===== طوابير العدالة =====
+
+    async def _acquire(self, chat_id):
+        """حجز مكان تنفيذ - عند الامتلاء تنتظر الطلبات في طابور محادثتها"""
+        if self._active < self.max_concurrency and not self._waiting:
+            self._active += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(chat_id, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # المكان نُقل لهذا الطلب قبل الإلغاء مباشرة
+                self._release()
+            else:
+                queue = self._waiting.get(chat_id)
+                if queue and future in queue:
+                    queue.remove(future)
+                    if not queue:
+                        del self._waiting[chat_id]
+            raise
+
+    def _release(self):
+        """تسليم المكان لأول طلب في المحادثة التالية بالتناوب"""
+        while self._waiting:
+            chat_id, queue = next(iter(self._waiting.items()))
+            future = queue.popleft()
+            if queue:
+                self._waiting.move_to_end(chat_id)
+            else:
+                del self._waiting[chat_id]
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    # ===== التنفيذ =====
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency,
+                thread_name_prefix="yuki-gemini"
+            )
+        return self._executor
+
+    async def run(self, func: Callable, *args, chat_id: Optional[int] = None,
+                  timeout: Optional[float] = None, **kwargs):
+        """تنفيذ دالة معطلة (مثل عميل SDK متزامن) ضمن حدود البوابة في مجمع خيوط"""
+        loop = asyncio.get_running_loop()
+        return await self._submit(
+            lambda: loop.run_in_executor(self._get_executor(), partial(func, *args, **kwargs)),
+            chat_id, timeout
+        )
+
+    async def _submit(self, make_call: Callable, chat_id, timeout):
+        """حجز مكان ثم تنفيذ الاستدعاء مع المهلة وتحديث الإحصائيات"""
+        if chat_id is None:
+            chat_id = _current_chat.get()
+        self.stats['requests'] += 1
+
+        queued = time.perf_counter()
+        await self._acquire(chat_id)
+        started = time.perf_counter()
+        self.stats['total_wait_ms'] += (started - queued) * 1000
+        try:
+            result = await asyncio.wait_for(make_call(), timeout=timeout or self.timeout)
+            self.stats['completed'] += 1
+            return result
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            self.stats['failed'] += 1
+            logging.warning(f"⏱️ انتهت مهلة طلب Gemini ({timeout or self.timeout} ثانية)")
+            raise
+        except Exception:
+            self.stats['failed'] += 1
+            raise
+        finally:
+            self.stats['total_run_ms'] += (time.perf_counter() - started) * 1000
+            self._release()
+
+    async def _call_model(self, client, model: str, contents, config):
+        """استدعاء generate_content غير المتزامن (أو في مجمع الخيوط كبديل)"""
+        aio = getattr(client, 'aio', None)
+        if aio is not None:
+            return await aio.models.generate_content(model=model, contents=contents, config=config)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(),
+            partial(client.models.generate_content, model=model, contents=contents, config=config)
+        )
+
+    async def generate_content(self, model: str, contents, config=None, chat_id: Optional[int] = None,
+                               timeout: Optional[float] = None):
+        """إرسال طلب generate_content مع التبديل التلقائي بين المفاتيح عند استنزاف الحصة
+
+        يرفع آخر خطأ إذا فشلت جميع المفاتيح، أو asyncio.TimeoutError عند انتهاء المهلة.
+        """
+        if not GEMINI_AVAILABLE:
+            raise RuntimeError("Google Gemini SDK not available")
+
+        async def attempt_all_keys():
+            last_error = None
+            for _ in range(max(1, self.keys.total)):
+                index = self.keys.select()
+                if index is None:
+                    break
+                try:
+                    response = await self._call_model(self.keys.client(index), model, contents, config)
+                    self.keys.record(index, 'success')
+                    return response
+                except Exception as e:
+                    kind = classify_error(e)
+                    if kind is None:
+                        self.keys.record(index, 'error')
+                        raise
+                    last_error = e
+                    if kind == 'quota':
+                        self.keys.mark_exhausted(index)
+                    else:
+                        self.keys.mark_overloaded(index)
+                    self.stats['key_switches'] += 1
+            raise last_error or RuntimeError("RESOURCE_EXHAUSTED: جميع مفاتيح Gemini مستنزفة")
+
+        try:
+            return await self._submit(attempt_all_keys, chat_id, timeout)
+        except asyncio.TimeoutError:
+            self.keys.record(self.keys.current_index, 'timeout')
+            raise
+
+    async def generate_text(self, prompt: str, model: str = "gemini-2.5-flash", config=None,
+                            chat_id: Optional[int] = None, timeout: Optional[float] = None) -> str:
+        """طلب نصي بسيط يعيد نص الرد"""
+        response = await self.generate_content(model, prompt, config=config, chat_id=chat_id, timeout=timeout)
+        return (response.text or "").strip() if response else ""
+
+    def shutdown(self):
+        """إيقاف مجمع الخيوط"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """إحصائيات البوابة للمراقبة"""
+        finished = self.stats['completed'] + self.stats['failed']
+        return dict(
+            self.stats,
+            active=self._active,
+            waiting=sum(len(queue) for queue in self._waiting.values()),
+            waiting_chats=len(self._waiting),
+            avg_wait_ms=round(self.stats['total_wait_ms'] / finished, 2) if finished else 0.0,
+            avg_run_ms=round(self.stats['total_run_ms'] / finished, 2) if finished else 0.0,
+            keys=self.keys.get_stats(),
+        )
+
+
+# النسخة العامة من البوابة
+gemini_gateway = GeminiGateway()
@@ -5,15 +5,14 @@ Guild Game Database Operations
 
 import logging
 import sqlite3
-import aiosqlite
 from datetime import datetime
 from typing import Optional, Dict, Any, List
-from config.database import DATABASE_URL
+from database.connection_pool import db_pool
 
 async def init_guild_database():
     """تهيئة جداول قاعدة بيانات النقابة"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             # جدول لاعبي النقابة
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS guild_players (
@@ -93,7 +92,6 @@ async def init_guild_database():
                 )
             """)
             
-            await db.commit()
             logging.info("✅ تم تهيئة قاعدة بيانات النقابة بنجاح")
             
     except Exception as e:
@@ -102,7 +100,7 @@ async def init_guild_database():
 async def save_guild_player(player_data: Dict[str, Any]) -> bool:
     """حفظ بيانات لاعب النقابة"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             await db.execute("""
                 INSERT OR REPLACE INTO guild_players (
                     user_id, username, name, guild, gender, character_class,
@@ -130,7 +128,6 @@ async def save_guild_player(player_data: Dict[str, Any]) -> bool:
                 player_data['personal_code'],
                 datetime.now().isoformat()
             ))
-            await db.commit()
             return True
             
     except Exception as e:
@@ -140,8 +137,7 @@ async def save_guild_player(player_data: Dict[str, Any]) -> bool:
 async def load_guild_player(user_id: int) -> Optional[Dict[str, Any]]:
     """تحميل بيانات لاعب النقابة"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
-            db.row_factory = aiosqlite.Row
+        async with db_pool.reader() as db:
             cursor = await db.execute(
                 "SELECT * FROM guild_players WHERE user_id = ?",
                 (user_id,)
@@ -159,7 +155,7 @@ async def load_guild_player(user_id: int) -> Optional[Dict[str, Any]]:
 async def save_active_mission(mission_data: Dict[str, Any]) -> bool:
     """حفظ مهمة نشطة"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             await db.execute("""
                 INSERT INTO active_guild_missions (
                     user_id, mission_id, mission_name, mission_type,
@@ -175,7 +171,6 @@ async def save_active_mission(mission_data: Dict[str, Any]) -> bool:
                 mission_data['money_reward'],
                 mission_data['start_time'].isoformat()
             ))
-            await db.commit()
             return True
             
     except Exception as e:
@@ -185,14 +180,13 @@ async def save_active_mission(mission_data: Dict[str, Any]) -> bool:
 async def complete_mission(user_id: int, mission_id: str) -> bool:
     """إنهاء مهمة وتحديث الإحصائيات"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             await db.execute("""
                 UPDATE active_guild_missions 
                 SET completed = TRUE 
                 WHERE user_id = ? AND mission_id = ? AND completed = FALSE
             """, (user_id, mission_id))
             
-            await db.commit()
             return True
             
     except Exception as e:
@@ -202,8 +196,7 @@ async def complete_mission(user_id: int, mission_id: str) -> bool:
 async def get_active_mission(user_id: int) -> Optional[Dict[str, Any]]:
     """الحصول على المهمة النشطة للاعب"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
-            db.row_factory = aiosqlite.Row
+        async with db_pool.reader() as db:
             cursor = await db.execute("""
                 SELECT * FROM active_guild_missions 
                 WHERE user_id = ? AND completed = FALSE 
@@ -222,7 +215,7 @@ async def get_active_mission(user_id: int) -> Optional[Dict[str, Any]]:
 async def update_guild_stats(user_id: int, stat_type: str, value: int) -> bool:
     """تحديث إحصائيات النقابة"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             # إنشاء سجل إحصائيات إذا لم يكن موجود
             await db.execute("""
                 INSERT OR IGNORE INTO guild_stats (user_id) VALUES (?)
@@ -254,7 +247,6 @@ async def update_guild_stats(user_id: int, stat_type: str, value: int) -> bool:
                     WHERE user_id = ?
                 """, (value, user_id))
             
-            await db.commit()
             return True
             
     except Exception as e:
@@ -264,12 +256,11 @@ async def update_guild_stats(user_id: int, stat_type: str, value: int) -> bool:
 async def add_inventory_item(user_id: int, item_type: str, item_id: str, item_name: str) -> bool:
     """إضافة عنصر لمخزون اللاعب"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             await db.execute("""
                 INSERT INTO guild_inventory (user_id, item_type, item_id, item_name)
                 VALUES (?, ?, ?, ?)
             """, (user_id, item_type, item_id, item_name))
-            await db.commit()
             return True
             
     except Exception as e:
@@ -279,8 +270,7 @@ async def add_inventory_item(user_id: int, item_type: str, item_id: str, item_na
 async def get_player_inventory(user_id: int) -> List[Dict[str, Any]]:
     """الحصول على مخزون اللاعب"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
-            db.row_factory = aiosqlite.Row
+        async with db_pool.reader() as db:
             cursor = await db.execute("""
                 SELECT * FROM guild_inventory WHERE user_id = ?
                 ORDER BY purchase_date DESC
@@ -296,7 +286,7 @@ async def get_player_inventory(user_id: int) -> List[Dict[str, Any]]:
 async def equip_item(user_id: int, item_id: str, item_type: str) -> bool:
     """تجهيز عنصر"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             # إلغاء تجهيز العناصر الأخرى من نفس النوع
             await db.execute("""
                 UPDATE guild_inventory 
@@ -311,7 +301,6 @@ async def equip_item(user_id: int, item_id: str, item_type: str) -> bool:
                 WHERE user_id = ? AND item_id = ?
             """, (user_id, item_id))
             
-            await db.commit()
             return True
             
     except Exception as e:
@@ -321,8 +310,7 @@ async def equip_item(user_id: int, item_id: str, item_type: str) -> bool:
 async def get_guild_leaderboard(limit: int = 10) -> List[Dict[str, Any]]:
     """الحصول على ترتيب النقابة"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
-            db.row_factory = aiosqlite.Row
+        async with db_pool.reader() as db:
             cursor = await db.execute("""
                 SELECT p.name, p.level, p.power, p.experience, p.guild,
                        COALESCE(s.total_missions_completed, 0) as missions,
@@ -343,7 +331,7 @@ async def get_guild_leaderboard(limit: int = 10) -> List[Dict[str, Any]]:
 async def delete_guild_player(user_id: int) -> bool:
     """حذف بيانات لاعب النقابة بالكامل"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             # حذف من جدول اللاعبين الرئيسي
             await db.execute("DELETE FROM guild_players WHERE user_id = ?", (user_id,))
             
@@ -356,7 +344,6 @@ async def delete_guild_player(user_id: int) -> bool:
             # حذف من جدول المهام النشطة
             await db.execute("DELETE FROM active_guild_missions WHERE user_id = ?", (user_id,))
             
-            await db.commit()
             logging.info(f"✅ تم حذف بيانات لاعب النقابة {user_id} بنجاح")
             return True
             
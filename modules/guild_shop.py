@@ -10,7 +10,8 @@ from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, C
 
 from modules.guild_game import GUILD_PLAYERS, SHOP_ITEMS
 from modules.guild_database import add_inventory_item, get_player_inventory, equip_item, save_guild_player
-from database.operations import get_or_create_user, update_user_balance, add_transaction
+from database.operations import get_or_create_user
+from database import ledger
 from utils.helpers import format_number
 
 async def show_shop_menu(callback: CallbackQuery):
@@ -412,15 +413,15 @@ async def buy_item(callback: CallbackQuery):
             await callback.answer(f"❌ رصيد غير كافي! تحتاج {format_number(item_data['price'])}$")
             return
         
-        # خصم المبلغ
-        new_balance = balance - item_data["price"]
-        success = await update_user_balance(user_id, new_balance)
-        if not success:
-            await callback.answer("❌ فشل في خصم المبلغ!")
+        # خصم المبلغ وتسجيل المعاملة في معاملة واحدة
+        result = await ledger.debit(user_id, item_data["price"], "guild_shop_purchase", f"شراء {item_data['name']}")
+        if not result:
+            if result.reason == ledger.REASON_INSUFFICIENT:
+                await callback.answer(f"❌ رصيد غير كافي! تحتاج {format_number(item_data['price'])}$")
+            else:
+                await callback.answer("❌ فشل في خصم المبلغ!")
             return
-        
-        # إضافة المعاملة
-        await add_transaction(user_id, -item_data["price"], "شراء عنصر", f"شراء {item_data['name']}")
+        new_balance = result.balance(user_id)
         
         # إضافة العنصر للمخزون
         await add_inventory_item(user_id, item_type, item_id, item_data["name"])
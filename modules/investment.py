@@ -8,7 +8,8 @@ from datetime import datetime, timedelta
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 
-from database.operations import get_user, update_user_balance, execute_query, add_transaction
+from database.operations import get_user, execute_query
+from database import ledger
 from utils.states import InvestmentStates
 from utils.helpers import format_number, is_valid_amount
 from config.settings import GAME_SETTINGS
@@ -239,24 +240,25 @@ async def process_investment_amount(message: Message, state: FSMContext):
         maturity_date = datetime.now() + timedelta(days=inv_info['duration_days'])
         total_return = amount + (amount * expected_return)
         
-        # تنفيذ الاستثمار
-        new_balance = user['balance'] - amount
-        await update_user_balance(message.from_user.id, new_balance)
-        
-        # إضافة الاستثمار إلى قاعدة البيانات
-        await execute_query(
-            "INSERT INTO investments (user_id, investment_type, amount, expected_return, maturity_date) VALUES (?, ?, ?, ?, ?)",
-            (message.from_user.id, investment_type, amount, expected_return, maturity_date)
+        # خصم المبلغ وإنشاء الاستثمار وتسجيل المعاملة في معاملة واحدة
+        result = await ledger.apply(
+            ledger.LedgerEntry(
+                message.from_user.id, balance_delta=-amount, amount=amount,
+                transaction_type="investment", description=f"استثمار في {inv_info['name']}",
+                from_user_id=message.from_user.id, to_user_id=0  # النظام
+            ),
+            statements=[ledger.LedgerStatement(
+                "INSERT INTO investments (user_id, investment_type, amount, expected_return, maturity_date) VALUES (?, ?, ?, ?, ?)",
+                (message.from_user.id, investment_type, amount, expected_return, maturity_date)
+            )]
         )
+        if not result:
+            await message.reply("❌ رصيد غير كافٍ!" if result.reason == ledger.REASON_INSUFFICIENT
+                                else "❌ حدث خطأ في عملية الاستثمار")
+            await state.clear()
+            return
         
-        # إضافة معاملة
-        await add_transaction(
-            from_user_id=message.from_user.id,
-            to_user_id=0,  # النظام
-            transaction_type="investment",
-            amount=amount,
-            description=f"استثمار في {inv_info['name']}"
-        )
+        new_balance = result.balance(message.from_user.id)
         
         await message.reply(
             f"🎉 **تم إنشاء الاستثمار بنجاح!**\n\n"
@@ -393,24 +395,24 @@ async def withdraw_investment(message: Message, investment_id: int):
         total_amount = investment['amount'] + (investment['amount'] * investment['expected_return'])
         profit = total_amount - investment['amount']
         
-        # تحديث الرصيد
-        new_balance = user['balance'] + total_amount
-        await update_user_balance(message.from_user.id, new_balance)
-        
-        # تحديث حالة الاستثمار
-        await execute_query(
-            "UPDATE investments SET status = 'completed' WHERE id = ?",
-            (investment_id,)
+        # إغلاق الاستثمار وإضافة العائد في معاملة واحدة (يمنع السحب المزدوج)
+        result = await ledger.apply(
+            ledger.LedgerEntry(
+                message.from_user.id, balance_delta=total_amount, amount=int(total_amount),
+                transaction_type="investment_return",
+                description=f"عائد استثمار {investment['investment_type']}",
+                from_user_id=0, to_user_id=message.from_user.id  # من النظام
+            ),
+            statements=[ledger.LedgerStatement(
+                "UPDATE investments SET status = 'completed' WHERE id = ? AND status = 'active'",
+                (investment_id,), must_change=True
+            )]
         )
+        if not result:
+            await message.reply("❌ الاستثمار غير موجود أو تم سحبه بالفعل")
+            return
         
-        # إضافة معاملة
-        await add_transaction(
-            from_user_id=0,  # النظام
-            to_user_id=message.from_user.id,
-            transaction_type="investment_return",
-            amount=int(total_amount),
-            description=f"عائد استثمار {investment['investment_type']}"
-        )
+        new_balance = result.balance(message.from_user.id)
         
         inv_info = INVESTMENT_TYPES.get(investment['investment_type'], {})
         
@@ -6,12 +6,12 @@ Letter Shuffle Game Module
 import logging
 import random
 import time
-import asyncio
 from typing import Dict, Optional
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from database.operations import get_or_create_user, update_user_balance, add_transaction
 from utils.helpers import format_number
 from modules.ai_player import word_ai, should_ai_participate
+from modules.scheduler import scheduler, game_payload, GAME_TIMEOUT_KIND
 
 # قاموس الألعاب النشطة {group_id: LetterShuffleGame}
 ACTIVE_SHUFFLE_GAMES: Dict[int, 'LetterShuffleGame'] = {}
@@ -366,7 +366,8 @@ async def start_letter_shuffle_game(message: Message):
             await message.reply(ai_welcome)
         
         # بدء مؤقت انتهاء اللعبة (منع الإزعاج)
-        asyncio.create_task(auto_end_game(group_id, game.game_duration))
+        scheduler.call_later(f"shuffle:{group_id}", game.game_duration, auto_end_game, message.bot, group_id,
+                             kind=GAME_TIMEOUT_KIND, payload=game_payload(group_id, "لعبة خلط الحروف"))
         
         logging.info(f"تم بدء لعبة خلط الحروف في المجموعة {group_id} - AI: {game.ai_enabled}")
         
@@ -374,10 +375,8 @@ async def start_letter_shuffle_game(message: Message):
         logging.error(f"خطأ في بدء لعبة ترتيب الحروف: {e}")
         await message.reply("❌ حدث خطأ في بدء اللعبة")
 
-async def auto_end_game(group_id: int, duration: int):
-    """إنهاء اللعبة تلقائياً بعد انتهاء الوقت (منع الإزعاج)"""
-    await asyncio.sleep(duration)
-    
+async def auto_end_game(bot, group_id: int):
+    """إنهاء اللعبة تلقائياً بعد انتهاء الوقت (منع الإزعاج) - يُستدعى من المجدول"""
     if group_id in ACTIVE_SHUFFLE_GAMES:
         game = ACTIVE_SHUFFLE_GAMES[group_id]
         if not game.game_ended:
@@ -386,16 +385,12 @@ async def auto_end_game(group_id: int, duration: int):
             # حذف رسالة اللعبة القديمة لمنع الازدحام
             try:
                 if game.game_message_id:
-                    from aiogram import Bot
-                    bot = Bot.get_current()
                     await bot.delete_message(group_id, game.game_message_id)
             except Exception as e:
                 logging.error(f"خطأ في حذف رسالة اللعبة: {e}")
             
             # إرسال رسالة إنهاء بسيطة
             try:
-                from aiogram import Bot
-                bot = Bot.get_current()
                 await bot.send_message(
                     group_id,
                     f"⏰ **انتهت لعبة خلط الحروف!**\n\n"
@@ -459,6 +454,7 @@ async def handle_shuffle_guess(message: Message):
                 logging.error(f"خطأ في حذف رسالة اللعبة: {e}")
             
             # إنهاء اللعبة
+            scheduler.cancel(f"shuffle:{group_id}")
             del ACTIVE_SHUFFLE_GAMES[group_id]
         
         # التحقق من استنفاد المحاولات
@@ -478,6 +474,7 @@ async def handle_shuffle_guess(message: Message):
                 f"📊 استنفدت المحاولات المسموحة ({game.max_attempts})"
             )
             
+            scheduler.cancel(f"shuffle:{group_id}")
             del ACTIVE_SHUFFLE_GAMES[group_id]
         
     except Exception as e:
@@ -554,6 +551,7 @@ async def handle_shuffle_close_callback(callback_query):
             logging.error(f"خطأ في حذف رسالة اللعبة: {e}")
         
         # إنهاء اللعبة
+        scheduler.cancel(f"shuffle:{group_id}")
         del ACTIVE_SHUFFLE_GAMES[group_id]
         
         await callback_query.answer("✅ تم إغلاق اللعبة")
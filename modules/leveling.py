@@ -3,6 +3,7 @@ import time
 import json
 import logging
 from database.operations import execute_query
+from database.leaderboards import leaderboards
 from utils.helpers import format_number
 import sys
 import os
@@ -121,6 +122,7 @@ class LevelingSystem:
             
             if updated_data and isinstance(updated_data, dict):
                 new_xp = updated_data.get('xp', current_xp + xp_gain)
+                leaderboards.update_xp(user_id, new_xp)
             else:
                 new_xp = current_xp + xp_gain
                 # التحقق من ترقية المستوى
@@ -107,11 +107,10 @@ async def is_user_registered(user_id: int) -> bool:
 async def create_unregistered_user(user_id: int, username: str = "", first_name: str = "") -> bool:
     """إنشاء مستخدم غير مسجل (للتتبع الأساسي فقط)"""
     try:
-        import aiosqlite
-        # استخدام قاعدة البيانات المحلية مباشرة
-        DATABASE_URL = "bot_database.db"
+        from database.connection_pool import db_pool
+        from database.user_cache import user_cache
         
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             await db.execute(
                 """
                 INSERT OR IGNORE INTO users (user_id, username, first_name, is_registered, created_at, updated_at)
@@ -120,7 +119,7 @@ async def create_unregistered_user(user_id: int, username: str = "", first_name:
                 (user_id, username or "", first_name or "", False, 
                  datetime.now().isoformat(), datetime.now().isoformat())
             )
-            await db.commit()
+        user_cache.invalidate(user_id)
         return True
     except Exception as e:
         logging.error(f"خطأ في إنشاء المستخدم غير المسجل {user_id}: {e}")
@@ -133,11 +132,10 @@ async def complete_user_registration(user_id: int, full_name: str, gender: str,
     try:
         bank_info = BANK_TYPES[bank_type]
         
-        import aiosqlite
-        # استخدام قاعدة البيانات المحلية مباشرة
-        DATABASE_URL = "bot_database.db"
+        from database.connection_pool import db_pool
+        from database.user_cache import user_cache
         
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             await db.execute(
                 """
                 UPDATE users SET 
@@ -150,7 +148,7 @@ async def complete_user_registration(user_id: int, full_name: str, gender: str,
                  bank_info['initial_bonus'], 0, 
                  datetime.now().isoformat(), user_id)
             )
-            await db.commit()
+        user_cache.invalidate(user_id)
         
         # إضافة معاملة المكافأة
         try:
@@ -187,11 +185,10 @@ async def update_user_missing_data(user_id: int, full_name: str = None,
         updated_gender = gender if gender else current_user.get('gender', '')
         updated_country = country if country else current_user.get('country', '')
         
-        import aiosqlite
-        # استخدام قاعدة البيانات المحلية مباشرة
-        DATABASE_URL = "bot_database.db"
+        from database.connection_pool import db_pool
+        from database.user_cache import user_cache
         
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with db_pool.writer() as db:
             await db.execute(
                 """
                 UPDATE users SET 
@@ -201,7 +198,7 @@ async def update_user_missing_data(user_id: int, full_name: str = None,
                 (updated_name, updated_gender, updated_country, True, 
                  datetime.now().isoformat(), user_id)
             )
-            await db.commit()
+        user_cache.invalidate(user_id)
         
         logging.info(f"تم تحديث بيانات المستخدم: {user_id} - {updated_name}")
         return True
@@ -3,6 +3,7 @@
 Media Analysis System using AI
 """
 
+import io
 import logging
 import os
 import json
@@ -12,12 +13,147 @@ import asyncio
 import aiohttp
 import time
 from datetime import datetime, date
-from typing import Dict, Any, Optional, List, Set
+from typing import Dict, Any, Optional, List, Set, Tuple
 from aiogram.types import Message, PhotoSize, Document, Video, Audio
 from google import genai
 from google.genai import types
 from PIL import Image
-import tempfile
+
+from modules.gemini_gateway import gemini_gateway, classify_error
+
+# أكبر حجم ملف يُحمل في الذاكرة - الأكبر منه يُحفظ على القرص
+MEDIA_MEMORY_LIMIT = 10 * 1024 * 1024
+
+# مجلد الملفات الكبيرة التي تتجاوز حد الذاكرة
+TEMP_MEDIA_DIR = "temp_media"
+
+# الحد الأقصى لإطارات الملصق المتحرك المرسلة إلى ffmpeg
+MAX_TGS_FRAMES = 60
+
+# مرشح توحيد أبعاد الفيديو المحول
+SCALE_FILTER = 'scale=512:512:force_original_aspect_ratio=decrease,pad=512:512:-1:-1'
+
+# النموذج الكامل لتحليل الفيديو والنموذج الأرخص لتحليل الإطارات المفتاحية
+FULL_ANALYSIS_MODEL = "gemini-2.5-pro"
+KEYFRAME_MODEL = "gemini-2.5-flash"
+
+# عدد الإطارات المفتاحية المرسلة للنموذج، والحد الأقصى للإطارات المرشحة من ffmpeg
+KEYFRAME_COUNT = 6
+MAX_CANDIDATE_FRAMES = 32
+
+# حساسية اكتشاف تغيّر المشهد (0-1) وإطار دوري احتياطي كل N إطار للمشاهد الطويلة
+# (يُستخدم الإطار الدوري بالإطارات فقط إذا تعذر معرفة مدة الفيديو عبر ffprobe)
+SCENE_THRESHOLD = 0.3
+PERIODIC_FRAME_INTERVAL = 90
+
+# الملفات الأصغر من هذا الحجم تُحلل كاملة مباشرة (التحليل الكامل رخيص أصلاً)
+KEYFRAME_MIN_BYTES = 512 * 1024
+
+# أقل ثقة لقبول حكم الإطارات دون تصعيد للتحليل الكامل
+KEYFRAME_MIN_CONFIDENCE = 0.85
+
+_JPEG_BOUNDARY = b'\xff\xd9\xff\xd8'
+
+
+class MediaPayload:
+    """ملف وسائط محمل في الذاكرة، أو على القرص إذا تجاوز حد الذاكرة"""
+    
+    __slots__ = ('name', 'data', 'path')
+    
+    def __init__(self, name: str, data: Optional[bytes] = None, path: Optional[str] = None):
+        self.name = name
+        self.data = data
+        self.path = path
+    
+    @property
+    def source(self):
+        """البايتات أو مسار الملف (لما يقبل الاثنين مثل PIL)"""
+        return self.data if self.data is not None else self.path
+    
+    async def read(self) -> bytes:
+        """محتوى الملف (قراءة القرص تتم خارج حلقة الأحداث)"""
+        if self.data is not None:
+            return self.data
+        return await asyncio.to_thread(_read_file, self.path)
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+async def _read_media(source) -> bytes:
+    """قراءة ملف وسائط من MediaPayload أو من مسار"""
+    if isinstance(source, MediaPayload):
+        return await source.read()
+    return await asyncio.to_thread(_read_file, source)
+
+
+def _media_name(source) -> str:
+    return source.name if isinstance(source, MediaPayload) else source
+
+
+def _split_jpeg_stream(stream: bytes) -> List[bytes]:
+    """تقسيم مخرجات image2pipe (صور JPEG متتالية) إلى صور منفصلة"""
+    frames = []
+    start = 0
+    while True:
+        boundary = stream.find(_JPEG_BOUNDARY, start)
+        if boundary == -1:
+            break
+        frames.append(stream[start:boundary + 2])
+        start = boundary + 2
+    if stream[start:]:
+        frames.append(stream[start:])
+    return frames
+
+
+def _spread(items: List[Any], count: int) -> List[Any]:
+    """اختيار عدد محدد من العناصر موزعة بالتساوي مع الاحتفاظ بالأول والأخير"""
+    if len(items) <= count:
+        return items
+    step = (len(items) - 1) / (count - 1)
+    return [items[round(i * step)] for i in range(count)]
+
+
+async def _encode_raw_frames(frames, width: int, height: int, fps: int, pix_fmt: str) -> Optional[bytes]:
+    """تمرير إطارات خام إلى ffmpeg عبر stdin وإرجاع MP4 من stdout بدون ملفات مؤقتة"""
+    process = await asyncio.create_subprocess_exec(
+        'ffmpeg', '-y', '-loglevel', 'error',
+        '-f', 'rawvideo', '-pix_fmt', pix_fmt, '-s', f'{width}x{height}',
+        '-framerate', str(fps), '-i', 'pipe:0',
+        '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-crf', '23',
+        '-vf', SCALE_FILTER,
+        '-movflags', 'frag_keyframe+empty_moov', '-f', 'mp4', 'pipe:1',
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    
+    async def feed():
+        try:
+            async for frame in frames:
+                process.stdin.write(frame)
+                await process.stdin.drain()
+        finally:
+            process.stdin.close()
+    
+    feeder = asyncio.create_task(feed())
+    try:
+        stdout, stderr = await asyncio.gather(process.stdout.read(), process.stderr.read())
+        await feeder
+        await process.wait()
+    finally:
+        if not feeder.done():
+            feeder.cancel()
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+    
+    if process.returncode == 0 and stdout:
+        return stdout
+    logging.warning(f"⚠️ فشل ffmpeg: {stderr.decode(errors='ignore') if stderr else 'Unknown error'}")
+    return None
 
 
 class MediaAnalyzer:
@@ -26,132 +162,61 @@ class MediaAnalyzer:
     def __init__(self):
         """تهيئة محلل الوسائط"""
         self.client = None
-        self.current_key_index = 0
-        self.exhausted_keys: Dict[int, date] = {}  # تتبع المفاتيح المستنزفة مع التاريخ
-        self.last_reset_date = date.today()  # آخر يوم تم إعادة تعيين القائمة
+        self.keyframe_stats = {'decided': 0, 'escalated': 0, 'failed': 0}
         self.setup_gemini()
         
     def setup_gemini(self):
-        """إعداد Gemini API مع النظام الذكي لتجنب المفاتيح المستنزفة"""
+        """إعداد Gemini API عبر البوابة المشتركة لتجنب المفاتيح المستنزفة"""
         try:
-            from utils.api_loader import api_loader
-            self.api_loader = api_loader
-            all_keys = self.api_loader.get_all_ai_keys()
-            
-            if not all_keys:
-                logging.error("❌ لم يتم العثور على مفاتيح Gemini API")
-                return
+            if gemini_gateway.keys.select() is None and gemini_gateway.keys.total:
+                logging.warning("⚠️ جميع المفاتيح مستنزفة لليوم - سيتم المحاولة بالمفتاح الحالي")
+            self.client = gemini_gateway.keys.client()
             
-            # إعادة تعيين قائمة المفاتيح المستنزفة في يوم جديد
-            self._reset_daily_exhausted_keys()
-            
-            # اختيار أفضل مفتاح متوفر
-            best_key_index = self._get_best_available_key(all_keys)
-            
-            if best_key_index is not None:
-                self.current_key_index = best_key_index
-                current_key = all_keys[self.current_key_index]
-                self.client = genai.Client(api_key=current_key)
-                
-                exhausted_count = len(self.exhausted_keys)
-                available_count = len(all_keys) - exhausted_count
-                logging.info(f"✅ تم تهيئة Gemini - المفتاح {self.current_key_index + 1}/{len(all_keys)} (متوفر: {available_count}, مستنزف: {exhausted_count})")
-            else:
-                logging.warning("⚠️ جميع المفاتيح مستنزفة لليوم - سيتم المحاولة بالمفتاح الأول")
-                self.current_key_index = 0
-                current_key = all_keys[0]
-                self.client = genai.Client(api_key=current_key)
+            if self.client:
+                keys = gemini_gateway.keys
+                logging.info(f"✅ تم تهيئة Gemini - المفتاح {keys.current_index + 1}/{keys.total} (متوفر: {keys.available_count()}, مستنزف: {len(keys.exhausted)})")
                 
         except Exception as e:
             logging.error(f"❌ خطأ في إعداد Gemini: {e}")
     
-    def _reset_daily_exhausted_keys(self):
-        """إعادة تعيين قائمة المفاتيح المستنزفة في يوم جديد"""
-        today = date.today()
-        if today != self.last_reset_date:
-            logging.info(f"🔄 يوم جديد ({today}) - إعادة تعيين قائمة المفاتيح المستنزفة")
-            self.exhausted_keys.clear()
-            self.last_reset_date = today
+    @property
+    def current_key_index(self) -> int:
+        return gemini_gateway.keys.current_index
     
-    def _get_best_available_key(self, all_keys: List[str]) -> Optional[int]:
-        """اختيار أفضل مفتاح متوفر (غير مستنزف)"""
-        available_keys = []
-        for i in range(len(all_keys)):
-            if i not in self.exhausted_keys:
-                available_keys.append(i)
-        
-        if available_keys:
-            # البدء بأول مفتاح متوفر
-            return available_keys[0]
-        
-        return None  # جميع المفاتيح مستنزفة
-    
-    def _mark_key_exhausted(self, key_index: int):
-        """تسجيل مفتاح كمستنزف لليوم"""
-        self.exhausted_keys[key_index] = date.today()
-        logging.warning(f"🚫 تم تسجيل المفتاح {key_index + 1} كمستنزف لليوم")
+    @property
+    def exhausted_keys(self) -> Dict[int, date]:
+        return gemini_gateway.keys.exhausted
     
     def switch_to_next_key(self):
         """التبديل للمفتاح التالي المتوفر (غير المستنزف)"""
-        try:
-            all_keys = self.api_loader.get_all_ai_keys()
-            
-            # تسجيل المفتاح الحالي كمستنزف
-            self._mark_key_exhausted(self.current_key_index)
-            
-            # البحث عن أفضل مفتاح متوفر
-            best_key_index = self._get_best_available_key(all_keys)
-            
-            if best_key_index is not None:
-                self.current_key_index = best_key_index
-                current_key = all_keys[self.current_key_index]
-                self.client = genai.Client(api_key=current_key)
-                
-                exhausted_count = len(self.exhausted_keys)
-                available_count = len(all_keys) - exhausted_count
-                logging.info(f"🔄 تم التبديل للمفتاح {self.current_key_index + 1}/{len(all_keys)} (متوفر: {available_count}, مستنزف: {exhausted_count})")
-                return True
-            else:
-                logging.warning("⚠️ تم استنزاف جميع مفاتيح Gemini المتاحة لليوم")
-                return False
-                
-        except Exception as e:
-            logging.error(f"❌ خطأ في تبديل المفتاح: {e}")
-            return False
+        switched = gemini_gateway.keys.switch_to_next_key()
+        if switched:
+            self.client = gemini_gateway.keys.client()
+        return switched
     
     def handle_quota_exceeded(self, error_message: str) -> bool:
-        """معالجة خطأ استنزاف الحصة والتبديل للمفتاح التالي"""
-        error_str = str(error_message)
-        # معالجة أخطاء الحصة وزحمة الخدمة
-        if any(code in error_str for code in ["429", "503", "RESOURCE_EXHAUSTED", "UNAVAILABLE", "overloaded"]):
-            logging.warning(f"⚠️ مشكلة في الخدمة: {error_str[:100]}... محاولة التبديل للمفتاح التالي")
-            return self.switch_to_next_key()
-        return False
+        """هل تبقى مفتاح متاح بعد خطأ حصة أو زحمة (البوابة بدّلت المفتاح تلقائياً)"""
+        if classify_error(error_message) is None:
+            return False
+        logging.warning(f"⚠️ مشكلة في الخدمة: {str(error_message)[:100]}...")
+        return gemini_gateway.keys.available_count() > 0
     
-    async def download_media_file(self, bot, file_id: str, file_path: str) -> Optional[str]:
-        """تحميل ملف الوسائط"""
+    async def download_media_file(self, bot, file_id: str, file_path: str) -> Optional[MediaPayload]:
+        """تحميل ملف الوسائط إلى الذاكرة (أو إلى القرص إذا تجاوز حد الذاكرة)"""
         try:
             # الحصول على معلومات الملف
             file_info = await bot.get_file(file_id)
-            file_url = f"https://api.telegram.org/file/bot{bot.token}/{file_info.file_path}"
             
-            # إنشاء مجلد للملفات المؤقتة
-            temp_dir = "temp_media"
-            if not os.path.exists(temp_dir):
-                os.makedirs(temp_dir)
+            if file_info.file_size and file_info.file_size > MEDIA_MEMORY_LIMIT:
+                # ملف كبير - تحميل متدفق إلى القرص
+                os.makedirs(TEMP_MEDIA_DIR, exist_ok=True)
+                local_file_path = os.path.join(TEMP_MEDIA_DIR, f"{file_id}_{file_path}")
+                await bot.download_file(file_info.file_path, destination=local_file_path)
+                return MediaPayload(file_path, path=local_file_path)
             
-            # مسار الملف المحلي
-            local_file_path = os.path.join(temp_dir, f"{file_id}_{file_path}")
-            
-            # تحميل الملف
-            async with aiohttp.ClientSession() as session:
-                async with session.get(file_url) as response:
-                    if response.status == 200:
-                        with open(local_file_path, 'wb') as f:
-                            f.write(await response.read())
-                        return local_file_path
-            
-            return None
+            # تحميل متدفق إلى الذاكرة عبر جلسة البوت
+            buffer = await bot.download_file(file_info.file_path)
+            return MediaPayload(file_path, data=buffer.getvalue())
             
         except Exception as e:
             logging.error(f"❌ خطأ في تحميل الملف: {e}")
@@ -170,8 +235,7 @@ class MediaAnalyzer:
                     if not self.client:
                         return {"error": "فشل في تهيئة Gemini client"}
                 
-                with open(image_path, "rb") as f:
-                    image_bytes = f.read()
+                image_bytes = await _read_media(image_path)
                 
                 # إنشاء prompt مخصص للكشف عن المحتوى المخالف مع التركيز على الإيماءات
                 safety_prompt = """
@@ -214,7 +278,7 @@ class MediaAnalyzer:
                 كن صارماً جداً في التحليل، خاصة مع التقبيل بين الأطفال والإيماءات المخالفة! لا تتساهل مع أي محتوى مشكوك فيه!
                 """
                 
-                response = self.client.models.generate_content(
+                response = await gemini_gateway.generate_content(
                     model="gemini-2.5-pro",
                     contents=[
                         types.Part.from_bytes(
@@ -295,11 +359,171 @@ class MediaAnalyzer:
             logging.error(f"خطأ في تحليل النص: {e}")
             return {"error": str(e)}
     
+    async def _probe_duration(self, source) -> Optional[float]:
+        """مدة الفيديو بالثواني عبر ffprobe (None إن تعذرت معرفتها)"""
+        in_memory = isinstance(source, MediaPayload) and source.data is not None
+        input_arg = 'pipe:0' if in_memory else (source.path if isinstance(source, MediaPayload) else source)
+        try:
+            process = await asyncio.create_subprocess_exec(
+                'ffprobe', '-v', 'error',
+                '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1',
+                input_arg,
+                stdin=asyncio.subprocess.PIPE if in_memory else asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            try:
+                stdout, _ = await process.communicate(source.data if in_memory else None)
+            finally:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+            duration = float(stdout.decode().strip())
+        except (OSError, ValueError):
+            return None
+        return duration if duration > 0 else None
+    
+    async def _extract_keyframes(self, source) -> Tuple[List[bytes], bool]:
+        """استخراج إطارات مفتاحية (تغيّر المشهد + إطار دوري) كصور JPEG في الذاكرة
+        
+        يُرجع (الإطارات، هل غطت الفيديو كاملاً). عند معرفة المدة تُوزع الإطارات
+        الدورية بالتساوي على كامل الفيديو ولا يُسمح لتغيّر المشهد بالاقتراب من
+        الإطار السابق أكثر من نصف الفاصل، فلا يصل العدد لسقف الإطارات المرشحة.
+        """
+        in_memory = isinstance(source, MediaPayload) and source.data is not None
+        input_arg = 'pipe:0' if in_memory else (source.path if isinstance(source, MediaPayload) else source)
+        
+        duration = await self._probe_duration(source)
+        if duration:
+            # عدد الإطارات المختارة ≤ 2 × المدة / الفاصل + 1 = MAX_CANDIDATE_FRAMES + 1
+            gap = max(2 * duration / MAX_CANDIDATE_FRAMES, 0.04)
+            select = (f"select=isnan(prev_selected_t)+gte(t-prev_selected_t\\,{gap:.3f})"
+                      f"+gt(scene\\,{SCENE_THRESHOLD})*gte(t-prev_selected_t\\,{gap / 2:.3f}),scale=512:-2")
+        else:
+            select = (f"select=eq(n\\,0)+gt(scene\\,{SCENE_THRESHOLD})"
+                      f"+not(mod(n\\,{PERIODIC_FRAME_INTERVAL})),scale=512:-2")
+        frame_cap = MAX_CANDIDATE_FRAMES + 1
+        
+        process = await asyncio.create_subprocess_exec(
+            'ffmpeg', '-loglevel', 'error',
+            '-i', input_arg,
+            '-vf', select, '-vsync', 'vfr',
+            '-frames:v', str(frame_cap),
+            '-f', 'image2pipe', '-vcodec', 'mjpeg', '-q:v', '4', 'pipe:1',
+            stdin=asyncio.subprocess.PIPE if in_memory else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await process.communicate(source.data if in_memory else None)
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+        
+        frames = _split_jpeg_stream(stdout) if stdout else []
+        if not frames:
+            logging.warning(f"⚠️ فشل استخراج الإطارات المفتاحية: {stderr.decode(errors='ignore')[:200] if stderr else 'لا إطارات'}")
+        # الوصول لسقف الإطارات يعني أن ffmpeg توقف قبل نهاية الفيديو
+        complete = len(frames) < frame_cap
+        return _spread(frames, KEYFRAME_COUNT), complete
+    
+    def _is_borderline(self, result: Dict[str, Any]) -> bool:
+        """هل حكم الإطارات غير حاسم ويحتاج تحليل الفيديو الكامل"""
+        try:
+            confidence = float(result.get("confidence", 0))
+        except (TypeError, ValueError):
+            confidence = 0.0
+        if confidence < KEYFRAME_MIN_CONFIDENCE:
+            return True
+        # مخالفة غير صريحة من النموذج الأرخص - يؤكدها التحليل الكامل قبل الحذف
+        return not result.get("is_safe", True) and result.get("severity") != "high"
+    
+    async def _analyze_keyframes(self, source, media_label: str) -> Optional[Dict[str, Any]]:
+        """تحليل إطارات مفتاحية بنموذج أرخص - None يعني التصعيد للتحليل الكامل"""
+        try:
+            if isinstance(source, MediaPayload) and source.data is not None:
+                size = len(source.data)
+            else:
+                size = os.path.getsize(source.path if isinstance(source, MediaPayload) else source)
+            if size < KEYFRAME_MIN_BYTES:
+                return None
+            
+            frames, complete = await self._extract_keyframes(source)
+            if not frames:
+                return None
+            
+            safety_prompt = f"""
+            هذه {len(frames)} إطارات مفتاحية مستخرجة بالترتيب من {media_label} عند تغيّر المشاهد.
+            احلل كل إطار بعناية واكتشف ما إذا كان {media_label} يحتوي على أي محتوى مخالف:
+            
+            1. محتوى جنسي أو عري
+            2. عنف أو دماء
+            3. محتوى مخيف أو مرعب
+            4. كراهية أو تمييز
+            5. محتوى غير لائق
+            6. إيماءات مخالفة مثل رفع الإصبع الأوسط أو إيماءات جنسية أو مسيئة
+            
+            إذا لم تكن متأكداً لأن الإطارات لا تكفي للحكم، اجعل الثقة منخفضة.
+            
+            أجب بـ JSON:
+            {{
+                "is_safe": true/false,
+                "violations": ["المخالفات"],
+                "severity": "low/medium/high",
+                "description": "وصف المحتوى",
+                "confidence": 0.95,
+                "gesture_analysis": "تحليل الإيماءات والحركات"
+            }}
+            """
+            
+            contents = [types.Part.from_bytes(data=frame, mime_type="image/jpeg") for frame in frames]
+            contents.append(safety_prompt)
+            response = await gemini_gateway.generate_content(
+                model=KEYFRAME_MODEL,
+                contents=contents,
+                config=types.GenerateContentConfig(
+                    response_mime_type="application/json",
+                )
+            )
+            if not response.text:
+                return None
+            try:
+                result = json.loads(response.text)
+            except json.JSONDecodeError:
+                return None
+            
+            if not isinstance(result, dict) or self._is_borderline(result):
+                self.keyframe_stats['escalated'] += 1
+                logging.info(f"🎞️ حكم الإطارات غير حاسم ({len(frames)} إطار) - تصعيد للتحليل الكامل")
+                return None
+            
+            # إطارات لم تغطِ الفيديو كاملاً لا تثبت سلامته (والحكم يُحفظ دائماً)
+            if not complete and result.get("is_safe", True):
+                self.keyframe_stats['escalated'] += 1
+                logging.info("🎞️ الإطارات لم تغطِ الفيديو كاملاً - تصعيد للتحليل الكامل")
+                return None
+            
+            self.keyframe_stats['decided'] += 1
+            result["analysis_mode"] = "keyframes"
+            result["frames_analyzed"] = len(frames)
+            logging.info(f"🎞️ تم الحكم من {len(frames)} إطار مفتاحي دون رفع الفيديو كاملاً")
+            return result
+            
+        except Exception as e:
+            self.keyframe_stats['failed'] += 1
+            logging.warning(f"⚠️ فشل تحليل الإطارات المفتاحية - التحليل الكامل: {e}")
+            return None
+    
     async def analyze_video_content(self, video_path: str) -> Dict[str, Any]:
-        """تحليل محتوى الفيديو"""
+        """تحليل محتوى الفيديو (إطارات مفتاحية أولاً ثم الفيديو الكامل عند الحاجة)"""
         max_retries = 3
         retry_delay = 2
         
+        keyframe_result = await self._analyze_keyframes(video_path, "الفيديو")
+        if keyframe_result:
+            return keyframe_result
+        
         for attempt in range(max_retries):
             try:
                 if not self.client:
@@ -308,8 +532,7 @@ class MediaAnalyzer:
                     if not self.client:
                         return {"error": "فشل في تهيئة Gemini client"}
                 
-                with open(video_path, "rb") as f:
-                    video_bytes = f.read()
+                video_bytes = await _read_media(video_path)
                 
                 safety_prompt = """
                 احلل هذا الفيديو بعناية فائقة واكتشف ما إذا كان يحتوي على أي محتوى مخالف:
@@ -340,8 +563,8 @@ class MediaAnalyzer:
                 كن صارماً جداً مع الإيماءات المخالفة!
                 """
                 
-                response = self.client.models.generate_content(
-                    model="gemini-2.5-pro",
+                response = await gemini_gateway.generate_content(
+                    model=FULL_ANALYSIS_MODEL,
                     contents=[
                         types.Part.from_bytes(
                             data=video_bytes,
@@ -392,8 +615,11 @@ class MediaAnalyzer:
             if not self.client:
                 return {"error": "Gemini client not initialized"}
             
-            with open(animation_path, "rb") as f:
-                animation_bytes = f.read()
+            keyframe_result = await self._analyze_keyframes(animation_path, "الصورة المتحركة")
+            if keyframe_result:
+                return keyframe_result
+            
+            animation_bytes = await _read_media(animation_path)
             
             # للـ GIF نستخدم mime type خاص أو نتعامل معه كفيديو
             safety_prompt = """
@@ -430,8 +656,8 @@ class MediaAnalyzer:
             
             # نجرب أولاً كـ video
             try:
-                response = self.client.models.generate_content(
-                    model="gemini-2.5-pro",
+                response = await gemini_gateway.generate_content(
+                    model=FULL_ANALYSIS_MODEL,
                     contents=[
                         types.Part.from_bytes(
                             data=animation_bytes,
@@ -445,8 +671,8 @@ class MediaAnalyzer:
                 )
             except:
                 # إذا فشل، نجرب كصورة
-                response = self.client.models.generate_content(
-                    model="gemini-2.5-pro",
+                response = await gemini_gateway.generate_content(
+                    model=FULL_ANALYSIS_MODEL,
                     contents=[
                         types.Part.from_bytes(
                             data=animation_bytes,
@@ -475,27 +701,28 @@ class MediaAnalyzer:
     async def analyze_document_content(self, doc_path: str) -> Dict[str, Any]:
         """تحليل محتوى المستند"""
         try:
+            doc_name = _media_name(doc_path).lower()
+            
             # فحص إذا كان الملف ملصق مرسل كمستند
-            if doc_path.lower().endswith('.tgs') or ('tgs' in doc_path.lower() and not doc_path.lower().endswith(('.mp4', '.webm', '.mov'))):
-                logging.info(f"🎭 اكتشاف ملصق متحرك TGS مرسل كمستند: {doc_path}")
+            if doc_name.endswith('.tgs') or ('tgs' in doc_name and not doc_name.endswith(('.mp4', '.webm', '.mov'))):
+                logging.info(f"🎭 اكتشاف ملصق متحرك TGS مرسل كمستند: {_media_name(doc_path)}")
                 return await self.analyze_sticker_content(doc_path, "animated_sticker")
-            elif doc_path.lower().endswith('.webp') or ('webp' in doc_path.lower() and not doc_path.lower().endswith(('.mp4', '.webm', '.mov'))):
+            elif doc_name.endswith('.webp') or ('webp' in doc_name and not doc_name.endswith(('.mp4', '.webm', '.mov'))):
                 # ملصقات WebP - قد تكون ثابتة أو متحركة
-                logging.info(f"🎭 اكتشاف ملصق WebP مرسل كمستند: {doc_path}")
+                logging.info(f"🎭 اكتشاف ملصق WebP مرسل كمستند: {_media_name(doc_path)}")
                 return await self.analyze_sticker_content(doc_path, "sticker")
-            elif doc_path.lower().endswith(('.gif')) or ('gif' in doc_path.lower() and not doc_path.lower().endswith(('.mp4', '.webm', '.mov'))):
-                logging.info(f"🎬 اكتشاف صورة متحركة مرسلة كمستند: {doc_path}")
+            elif doc_name.endswith(('.gif')) or ('gif' in doc_name and not doc_name.endswith(('.mp4', '.webm', '.mov'))):
+                logging.info(f"🎬 اكتشاف صورة متحركة مرسلة كمستند: {_media_name(doc_path)}")
                 return await self.analyze_animation_content(doc_path)
-            elif doc_path.lower().endswith(('.mp4', '.webm', '.mov', '.avi')):
-                logging.info(f"🎬 اكتشاف ملف فيديو مرسل كمستند: {doc_path}")
+            elif doc_name.endswith(('.mp4', '.webm', '.mov', '.avi')):
+                logging.info(f"🎬 اكتشاف ملف فيديو مرسل كمستند: {_media_name(doc_path)}")
                 return await self.analyze_video_content(doc_path)
             
             # للمستندات النصية، نقرأ المحتوى ونحلله
             content = ""
             
-            if doc_path.endswith('.txt'):
-                with open(doc_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
+            if doc_name.endswith('.txt'):
+                content = (await _read_media(doc_path)).decode('utf-8')
             else:
                 # للملفات الأخرى، نرفضها احتياطياً للأمان
                 return {
@@ -529,7 +756,7 @@ class MediaAnalyzer:
                 }}
                 """
                 
-                response = self.client.models.generate_content(
+                response = await gemini_gateway.generate_content(
                     model="gemini-2.5-pro",
                     contents=safety_prompt,
                     config=types.GenerateContentConfig(
@@ -580,8 +807,7 @@ class MediaAnalyzer:
     async def _analyze_static_sticker(self, sticker_path: str) -> Dict[str, Any]:
         """تحليل الملصقات الثابتة (WebP)"""
         try:
-            with open(sticker_path, "rb") as f:
-                sticker_bytes = f.read()
+            sticker_bytes = await _read_media(sticker_path)
             
             safety_prompt = """
             احلل هذا الملصق بعناية فائقة شديدة واكتشف أي محتوى مخالف وفقاً للمعايير الإسلامية المحافظة:
@@ -634,7 +860,7 @@ class MediaAnalyzer:
             **كن منطقياً ومتوازناً في التقييم. السلوك الطبيعي مقبول.**
             """
             
-            response = self.client.models.generate_content(
+            response = await gemini_gateway.generate_content(
                 model="gemini-2.5-pro",
                 contents=[
                     types.Part.from_bytes(
@@ -663,87 +889,50 @@ class MediaAnalyzer:
             logging.error(f"❌ خطأ في تحليل الملصق الثابت: {e}")
             return {"error": str(e)}
     
-    async def _convert_tgs_to_mp4_or_gif(self, tgs_path: str) -> str:
-        """تحويل ملف TGS إلى MP4 للتحليل باستخدام rlottie-python"""
+    async def _load_lottie_json(self, tgs_source) -> str:
+        """فك ضغط ملف TGS (gzip) إلى نص Lottie JSON في الذاكرة"""
+        tgs_bytes = await _read_media(tgs_source)
+        return (await asyncio.to_thread(gzip.decompress, tgs_bytes)).decode('utf-8')
+    
+    async def _convert_tgs_to_mp4_or_gif(self, tgs_path) -> Optional[bytes]:
+        """تحويل ملف TGS إلى MP4 في الذاكرة (الإطارات تُمرر خاماً إلى ffmpeg)"""
         try:
-            import tempfile
-            
-            mp4_path = tgs_path.replace('.tgs', '_converted.mp4')
+            lottie_json = await self._load_lottie_json(tgs_path)
             
             # طريقة 1: استخدام rlottie-python للتحويل الحقيقي
             try:
                 from rlottie_python import LottieAnimation
                 
-                # تحميل الملصق المتحرك TGS
-                anim = LottieAnimation.from_tgs(tgs_path)
-                
-                # الحصول على خصائص الرسمة المتحركة
-                total_frames = anim.lottie_animation_get_totalframe()
-                width, height = anim.lottie_animation_get_size()
-                duration = anim.lottie_animation_get_duration()
-                
-                logging.info(f"🎬 تحليل ملصق TGS: {total_frames} إطار، {width}x{height}، مدة {duration:.2f}ث")
-                
-                # إنشاء مجلد مؤقت للإطارات
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    frame_pattern = os.path.join(temp_dir, "frame_%04d.png")
-                    
-                    # رسم جميع الإطارات
-                    for frame_num in range(min(total_frames, 60)):  # تحديد بـ 60 إطار للأداء
-                        frame_path = os.path.join(temp_dir, f"frame_{frame_num:04d}.png")
-                        
-                        # حساب الوقت للإطار
-                        frame_time = (frame_num / total_frames) if total_frames > 0 else 0
-                        
-                        # رسم الإطار
-                        success = anim.save_frame(frame_path, frame_num=frame_num)
-                        if not success:
-                            logging.warning(f"⚠️ فشل رسم الإطار {frame_num}")
-                            break
+                with LottieAnimation.from_data(lottie_json) as anim:
+                    # الحصول على خصائص الرسمة المتحركة
+                    total_frames = anim.lottie_animation_get_totalframe()
+                    width, height = anim.lottie_animation_get_size()
+                    duration = anim.lottie_animation_get_duration()
                     
-                    # تحويل الإطارات إلى MP4 باستخدام ffmpeg
-                    input_pattern = os.path.join(temp_dir, "frame_%04d.png")
-                    fps = max(1, min(30, total_frames // max(1, int(duration))))  # حساب FPS مناسب
-                    
-                    cmd = [
-                        'ffmpeg', '-y',
-                        '-framerate', str(fps),
-                        '-i', input_pattern,
-                        '-c:v', 'libx264',
-                        '-pix_fmt', 'yuv420p',
-                        '-crf', '23',
-                        '-vf', 'scale=512:512:force_original_aspect_ratio=decrease,pad=512:512:-1:-1',
-                        mp4_path
-                    ]
-                    
-                    process = await asyncio.create_subprocess_exec(
-                        *cmd,
-                        stdout=asyncio.subprocess.PIPE,
-                        stderr=asyncio.subprocess.PIPE
-                    )
+                    logging.info(f"🎬 تحليل ملصق TGS: {total_frames} إطار، {width}x{height}، مدة {duration:.2f}ث")
                     
-                    stdout, stderr = await process.communicate()
+                    async def render_frames():
+                        # إطار واحد في الذاكرة في كل لحظة
+                        for frame_num in range(min(total_frames, MAX_TGS_FRAMES)):
+                            yield await asyncio.to_thread(anim.lottie_animation_render, frame_num)
                     
-                    if process.returncode == 0 and os.path.exists(mp4_path):
-                        logging.info(f"✅ تم تحويل TGS إلى MP4 بنجاح: {mp4_path}")
-                        return mp4_path
-                    else:
-                        logging.warning(f"⚠️ فشل ffmpeg: {stderr.decode() if stderr else 'Unknown error'}")
+                    fps = max(1, min(30, total_frames // max(1, int(duration))))  # حساب FPS مناسب
+                    video_bytes = await _encode_raw_frames(render_frames(), width, height, fps, 'bgra')
+                
+                if video_bytes:
+                    logging.info(f"✅ تم تحويل TGS إلى MP4 بنجاح ({len(video_bytes)} بايت)")
+                    return video_bytes
                 
             except ImportError:
                 logging.warning("⚠️ rlottie-python غير متوفر، استخدام الطريقة البديلة")
             except Exception as rlottie_error:
                 logging.warning(f"⚠️ فشل rlottie: {rlottie_error}")
             
-            # طريقة 2: استخراج JSON وتحليله يدوياً
+            # طريقة 2: إطارات تمثيلية من بيانات JSON
             try:
-                import gzip
-                import json
-                from PIL import Image, ImageDraw
+                from PIL import ImageDraw
                 
-                # استخراج JSON من TGS
-                with gzip.open(tgs_path, 'rt', encoding='utf-8') as f:
-                    lottie_data = json.load(f)
+                lottie_data = json.loads(lottie_json)
                 
                 # الحصول على معلومات الرسمة المتحركة
                 if 'layers' in lottie_data:
@@ -754,125 +943,71 @@ class MediaAnalyzer:
                     
                     logging.info(f"🎭 JSON تحليل: {frames_count} إطار، {width}x{height}، {fps} FPS")
                     
-                    # إنشاء إطارات تمثيلية بناءً على بيانات JSON
-                    with tempfile.TemporaryDirectory() as temp_dir:
+                    def draw_frame(i: int) -> bytes:
+                        # رسم بسيط يمثل الملصق المتحرك
+                        progress = i / max(1, frames_count - 1)
+                        img = Image.new('RGB', (width, height), color='white')
+                        draw = ImageDraw.Draw(img)
+                        center_x, center_y = width // 2, height // 2
+                        size = int(50 + progress * 100)  # حجم متغير
+                        draw.ellipse([
+                            center_x - size, center_y - size,
+                            center_x + size, center_y + size
+                        ], fill='blue', outline='black', width=3)
+                        return img.tobytes()
+                    
+                    async def json_frames():
                         for i in range(min(frames_count, 30)):  # محدود بـ 30 إطار
-                            img = Image.new('RGBA', (width, height), color=(255, 255, 255, 0))
-                            draw = ImageDraw.Draw(img)
-                            
-                            # رسم بسيط يمثل الملصق المتحرك
-                            progress = i / max(1, frames_count - 1)
-                            
-                            # رسم الشكل الأساسي
-                            center_x, center_y = width // 2, height // 2
-                            size = int(50 + progress * 100)  # حجم متغير
-                            
-                            draw.ellipse([
-                                center_x - size, center_y - size,
-                                center_x + size, center_y + size
-                            ], fill='blue', outline='black', width=3)
-                            
-                            # تحويل RGBA إلى RGB
-                            rgb_img = Image.new('RGB', (width, height), color='white')
-                            rgb_img.paste(img, (0, 0), img)
-                            
-                            frame_path = os.path.join(temp_dir, f"frame_{i:04d}.png")
-                            rgb_img.save(frame_path)
-                        
-                        # تحويل إلى MP4
-                        input_pattern = os.path.join(temp_dir, "frame_%04d.png")
-                        
-                        cmd = [
-                            'ffmpeg', '-y',
-                            '-framerate', str(min(fps, 30)),
-                            '-i', input_pattern,
-                            '-c:v', 'libx264',
-                            '-pix_fmt', 'yuv420p',
-                            '-crf', '23',
-                            '-vf', 'scale=512:512:force_original_aspect_ratio=decrease,pad=512:512:-1:-1',
-                            mp4_path
-                        ]
-                        
-                        process = await asyncio.create_subprocess_exec(
-                            *cmd,
-                            stdout=asyncio.subprocess.PIPE,
-                            stderr=asyncio.subprocess.PIPE
-                        )
-                        
-                        stdout, stderr = await process.communicate()
-                        
-                        if process.returncode == 0 and os.path.exists(mp4_path):
-                            logging.info(f"✅ تم إنشاء MP4 من JSON: {mp4_path}")
-                            return mp4_path
+                            yield await asyncio.to_thread(draw_frame, i)
+                    
+                    video_bytes = await _encode_raw_frames(json_frames(), width, height, int(min(fps, 30)), 'rgb24')
+                    if video_bytes:
+                        logging.info(f"✅ تم إنشاء MP4 من JSON ({len(video_bytes)} بايت)")
+                        return video_bytes
                 
             except Exception as json_error:
                 logging.warning(f"⚠️ فشل تحليل JSON: {json_error}")
             
-            logging.error(f"❌ فشل في تحويل الملصق المتحرك TGS: {tgs_path}")
+            logging.error(f"❌ فشل في تحويل الملصق المتحرك TGS: {_media_name(tgs_path)}")
             return None
                 
         except Exception as e:
             logging.error(f"❌ خطأ شامل في تحويل TGS: {e}")
             return None
 
-    async def _convert_tgs_to_png(self, tgs_path: str) -> str:
-        """تحويل ملف TGS إلى صورة PNG للتحليل - نسخة محسنة"""
+    async def _convert_tgs_to_png(self, tgs_path) -> Optional[bytes]:
+        """رسم الإطار الأول من ملف TGS كصورة PNG في الذاكرة"""
         try:
-            import gzip
-            import json
-            from PIL import Image, ImageDraw
-            
-            png_path = tgs_path.replace('.tgs', '_converted.png')
+            from PIL import ImageDraw
             
-            # محاولة أولاً تحويله إلى فيديو للحصول على إطار حقيقي
-            video_path = await self._convert_tgs_to_mp4_or_gif(tgs_path)
-            
-            if video_path and os.path.exists(video_path):
-                try:
-                    # استخراج إطار من الفيديو
-                    cmd = [
-                        'ffmpeg', '-y',
-                        '-i', video_path,
-                        '-vf', 'select=eq(n\\,0)',
-                        '-frames:v', '1',
-                        png_path
-                    ]
-                    
-                    process = await asyncio.create_subprocess_exec(
-                        *cmd,
-                        stdout=asyncio.subprocess.PIPE,
-                        stderr=asyncio.subprocess.PIPE
-                    )
-                    
-                    stdout, stderr = await process.communicate()
-                    
-                    if process.returncode == 0 and os.path.exists(png_path):
-                        logging.info(f"✅ تم استخراج إطار من TGS: {png_path}")
-                        # حذف الفيديو المؤقت
-                        try:
-                            os.remove(video_path)
-                        except:
-                            pass
-                        return png_path
-                        
-                except Exception as frame_extract_error:
-                    logging.warning(f"⚠️ فشل استخراج إطار من الفيديو: {frame_extract_error}")
-            
-            # إذا فشل التحويل إلى فيديو، نعود للطريقة القديمة
+            # رسم الإطار الأول مباشرة بدون المرور بفيديو
             try:
-                from PIL import Image, ImageDraw
+                from rlottie_python import LottieAnimation
                 
+                lottie_json = await self._load_lottie_json(tgs_path)
+                with LottieAnimation.from_data(lottie_json) as anim:
+                    frame = await asyncio.to_thread(anim.render_pillow_frame, 0)
+                
+                buffer = io.BytesIO()
+                await asyncio.to_thread(frame.save, buffer, "PNG")
+                logging.info(f"✅ تم استخراج إطار من TGS: {_media_name(tgs_path)}")
+                return buffer.getvalue()
+                
+            except Exception as frame_extract_error:
+                logging.warning(f"⚠️ فشل استخراج إطار من TGS: {frame_extract_error}")
+            
+            # إذا فشل الرسم، نعود للصورة البديلة
+            try:
                 img = Image.new('RGB', (512, 512), color='lightgray')
                 draw = ImageDraw.Draw(img)
                 
                 draw.rectangle([50, 50, 462, 462], outline='blue', width=5)
                 draw.text((256, 256), "Animated Sticker", fill='black', anchor='mm')
                 
-                img.save(png_path)
-                
-                if os.path.exists(png_path):
-                    logging.info(f"✅ تم إنشاء صورة بديلة للـ TGS: {png_path}")
-                    return png_path
+                buffer = io.BytesIO()
+                img.save(buffer, "PNG")
+                logging.info(f"✅ تم إنشاء صورة بديلة للـ TGS: {_media_name(tgs_path)}")
+                return buffer.getvalue()
                     
             except Exception as fallback_error:
                 logging.warning(f"⚠️ فشل إنشاء صورة بديلة: {fallback_error}")
@@ -883,55 +1018,37 @@ class MediaAnalyzer:
             logging.error(f"❌ خطأ شامل في تحويل TGS إلى PNG: {e}")
             return None
 
-    async def _analyze_animated_sticker(self, sticker_path: str) -> Dict[str, Any]:
+    async def _analyze_animated_sticker(self, sticker_path) -> Dict[str, Any]:
         """تحليل الملصقات المتحركة (TGS) بعد تحويلها لفيديو أو صورة"""
         try:
-            logging.info(f"🎭 بدء تحليل ملصق متحرك TGS: {sticker_path}")
+            logging.info(f"🎭 بدء تحليل ملصق متحرك TGS: {_media_name(sticker_path)}")
             
             # أولاً، محاولة تحويل TGS إلى فيديو MP4 للتحليل المتحرك
-            video_path = await self._convert_tgs_to_mp4_or_gif(sticker_path)
+            video_bytes = await self._convert_tgs_to_mp4_or_gif(sticker_path)
             
-            if video_path and os.path.exists(video_path):
+            if video_bytes:
                 # تحليل الفيديو المحول
-                logging.info(f"🎬 تحليل الفيديو المحول: {video_path}")
+                logging.info(f"🎬 تحليل الفيديو المحول من الذاكرة")
                 
                 try:
                     # محاولة تحليل الفيديو مباشرة
-                    video_result = await self.analyze_video_content(video_path)
+                    video_result = await self.analyze_video_content(MediaPayload("converted.mp4", data=video_bytes))
                     
                     if video_result and not video_result.get("error"):
-                        # تنظيف الفيديو المؤقت
-                        try:
-                            os.remove(video_path)
-                        except:
-                            pass
-                        
                         video_result["sticker_type"] = "animated_video_analyzed"
                         logging.info(f"✅ تم تحليل TGS كفيديو بنجاح!")
                         return video_result
                     
                 except Exception as video_analysis_error:
                     logging.warning(f"⚠️ فشل تحليل TGS كفيديو: {video_analysis_error}")
-                
-                # تنظيف الفيديو المؤقت
-                try:
-                    os.remove(video_path)
-                except:
-                    pass
             
             # إذا فشل تحليل الفيديو، نحول إلى صورة ثابتة
             logging.info(f"🔄 التحويل إلى صورة ثابتة كبديل...")
-            converted_png = await self._convert_tgs_to_png(sticker_path)
+            image_bytes = await self._convert_tgs_to_png(sticker_path)
             
-            if converted_png and os.path.exists(converted_png):
-                # تحليل الصورة المحولة
-                logging.info(f"🔍 تحليل الصورة المحولة: {converted_png}")
-                
-                with open(converted_png, "rb") as f:
-                    image_bytes = f.read()
-            else:
+            if not image_bytes:
                 # في حالة فشل التحويل، نرفض الملصق احتياطياً للأمان
-                logging.warning(f"⚠️ فشل تحويل الملصق المتحرك TGS نهائياً: {sticker_path}")
+                logging.warning(f"⚠️ فشل تحويل الملصق المتحرك TGS نهائياً: {_media_name(sticker_path)}")
                 return {
                     "is_safe": False,
                     "violations": ["فشل في التحويل - محتوى مشبوه"],
@@ -991,7 +1108,7 @@ class MediaAnalyzer:
             **كن منطقياً ومتوازناً في التقييم. السلوك الطبيعي مقبول.**
             """
             
-            response = self.client.models.generate_content(
+            response = await gemini_gateway.generate_content(
                 model="gemini-2.5-pro",
                 contents=[
                     types.Part.from_bytes(
@@ -1005,13 +1122,6 @@ class MediaAnalyzer:
                 )
             )
             
-            # حذف الصورة المؤقتة
-            try:
-                os.remove(converted_png)
-                logging.info(f"🗑️ تم حذف الصورة المؤقتة: {converted_png}")
-            except:
-                pass
-            
             if response.text:
                 import json
                 try:
@@ -1052,8 +1162,7 @@ class MediaAnalyzer:
                     if not self.client:
                         return {"error": "فشل في تهيئة Gemini client"}
                 
-                with open(sticker_path, "rb") as f:
-                    sticker_bytes = f.read()
+                sticker_bytes = await _read_media(sticker_path)
                 
                 safety_prompt = """
             احلل ملصق الفيديو هذا بعناية فائقة شديدة واكتشف أي محتوى مخالف وفقاً للمعايير الإسلامية المحافظة:
@@ -1120,7 +1229,7 @@ class MediaAnalyzer:
             **اعتبر المحتوى آمناً إلا إذا كان يُظهر الصدر مكشوفاً أو محتوى إباحي صريح أو عنف واضح.**
             """
             
-                response = self.client.models.generate_content(
+                response = await gemini_gateway.generate_content(
                 model="gemini-2.5-pro",
                 contents=[
                     types.Part.from_bytes(
@@ -1169,12 +1278,16 @@ class MediaAnalyzer:
         return {"error": "فشل في جميع المحاولات - خدمة التحليل غير متاحة مؤقتاً"}
 
 
-    async def cleanup_temp_file(self, file_path: str):
-        """تنظيف الملفات المؤقتة"""
+    async def cleanup_temp_file(self, file_path):
+        """تحرير ملف الوسائط: حذف الملف من القرص إن وُجد وتحرير الذاكرة"""
         try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                logging.info(f"🗑️ تم حذف الملف المؤقت: {file_path}")
+            media_path = file_path
+            if isinstance(file_path, MediaPayload):
+                media_path = file_path.path
+                file_path.data = None
+            if media_path and os.path.exists(media_path):
+                os.remove(media_path)
+                logging.info(f"🗑️ تم حذف الملف المؤقت: {media_path}")
         except Exception as e:
             logging.error(f"❌ خطأ في حذف الملف المؤقت: {e}")
 
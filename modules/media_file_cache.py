@@ -0,0 +1,353 @@
+"""
+ذاكرة معرفات ملفات تيليجرام للأغاني والفيديوهات
+Content-Addressed Telegram file_id Cache
+
+تربط معرّف فيديو يوتيوب (ونص البحث المطبّع) بمعرّف الملف file_id الذي أعاده
+تيليجرام عند أول رفع، فتُخدم الطلبات المتكررة بإعادة إرسال file_id دون تحميل
+أو رفع. تحتفظ أيضاً بنسخة محلية من الملفات المحملة مع إخراج الأقل استخداماً
+عند تجاوز الحجم المحدد، لإعادة الرفع إذا أصبح file_id غير صالح.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import shutil
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from database.connection_pool import db_pool
+
+# مجلد التخزين المحلي للملفات المحملة
+LOCAL_STORE_DIR = "media_cache"
+
+# الحجم الأقصى للتخزين المحلي (بايت)
+LOCAL_STORE_MAX_BYTES = 500 * 1024 * 1024
+
+# نصوص أخطاء تيليجرام التي تعني أن file_id نفسه غير صالح
+_INVALID_FILE_ID_MARKERS = (
+    "wrong file identifier",
+    "wrong remote file identifier",
+    "file_id",
+    "file reference",
+    "type of file mismatch",
+)
+
+# أنماط استخراج معرّف فيديو يوتيوب من الروابط
+_YOUTUBE_ID_PATTERN = re.compile(
+    r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/)|youtu\.be/)([A-Za-z0-9_-]{11})'
+)
+
+
+def extract_video_id(url: str) -> Optional[str]:
+    """استخراج معرّف فيديو يوتيوب من الرابط"""
+    if not url:
+        return None
+    match = _YOUTUBE_ID_PATTERN.search(url)
+    return match.group(1) if match else None
+
+
+def is_invalid_file_id_error(error: Exception) -> bool:
+    """هل الخطأ رفض من تيليجرام لمعرّف الملف نفسه؟ (وليس تقييد معدل أو خطأ شبكة)"""
+    from aiogram.exceptions import TelegramBadRequest
+    if not isinstance(error, TelegramBadRequest):
+        return False
+    text = str(error).lower()
+    return any(marker in text for marker in _INVALID_FILE_ID_MARKERS)
+
+
+def normalize_query(query: str) -> str:
+    """تطبيع نص البحث ليطابق الطلبات المتشابهة نفس المفتاح"""
+    from modules.profanity_engine import normalize_arabic
+    return " ".join(normalize_arabic(query.lower()).split())
+
+
+class LocalMediaStore:
+    """تخزين محلي للملفات المحملة مع إخراج الأقل استخداماً حسب الحجم"""
+
+    def __init__(self, root: str = LOCAL_STORE_DIR, max_bytes: int = LOCAL_STORE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._files: "OrderedDict[str, tuple]" = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+        self.stats = {'stored': 0, 'evictions': 0}
+
+    def _load(self):
+        """فهرسة الملفات الموجودة مسبقاً حسب آخر استخدام"""
+        if self._loaded:
+            return
+        self._loaded = True
+        os.makedirs(self.root, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, os.path.splitext(name)[0], path, stat.st_size))
+        for _, key, path, size in sorted(entries):
+            self._files[key] = (path, size)
+            self._total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        """حذف الملفات الأقدم استخداماً حتى يعود الحجم تحت الحد"""
+        while self._total_bytes > self.max_bytes and self._files:
+            _, (path, size) = self._files.popitem(last=False)
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            self._total_bytes -= size
+            self.stats['evictions'] += 1
+
+    def get(self, key: str) -> Optional[str]:
+        """إرجاع مسار الملف المخزن مع تحديث ترتيب الاستخدام"""
+        self._load()
+        entry = self._files.get(key)
+        if entry is None:
+            return None
+        if not os.path.exists(entry[0]):
+            self._files.pop(key)
+            self._total_bytes -= entry[1]
+            return None
+        self._files.move_to_end(key)
+        try:
+            os.utime(entry[0])
+        except OSError:
+            pass
+        return entry[0]
+
+    async def put(self, key: str, file_path: str) -> Optional[str]:
+        """نسخ ملف محمل إلى التخزين المحلي (في خيط منفصل حتى لا تتوقف الحلقة)"""
+        self._load()
+        try:
+            size = os.path.getsize(file_path)
+            if size > self.max_bytes:
+                return None
+            extension = os.path.splitext(file_path)[1]
+            target = os.path.join(self.root, f"{key}{extension}")
+            # إعادة الرفع من النسخة المحلية تمرر الملف نفسه، فلا حاجة للنسخ
+            if os.path.abspath(file_path) != os.path.abspath(target):
+                await asyncio.to_thread(shutil.copyfile, file_path, target)
+        except OSError as e:
+            logging.error(f"خطأ في تخزين الملف محلياً: {e}")
+            return None
+
+        old = self._files.pop(key, None)
+        if old:
+            self._total_bytes -= old[1]
+            if old[0] != target:
+                try:
+                    os.unlink(old[0])
+                except OSError:
+                    pass
+        self._files[key] = (target, size)
+        self._total_bytes += size
+        self.stats['stored'] += 1
+        self._evict()
+        return target
+
+    def remove(self, key: str):
+        """حذف ملف من التخزين المحلي"""
+        entry = self._files.pop(key, None)
+        if entry:
+            self._total_bytes -= entry[1]
+            try:
+                os.unlink(entry[0])
+            except OSError:
+                pass
+
+    def get_stats(self) -> Dict:
+        """إحصائيات التخزين المحلي"""
+        return dict(self.stats, files=len(self._files), total_bytes=self._total_bytes)
+
+
+class MediaFileCache:
+    """ذاكرة دائمة من (معرّف الفيديو / نص البحث) إلى file_id في تيليجرام"""
+
+    def __init__(self):
+        # مفتاح المحتوى -> بيانات الملف
+        self._by_video: Dict[str, Dict] = {}
+        # نص البحث المطبّع -> مفتاح المحتوى
+        self._by_query: Dict[str, str] = {}
+        self._loaded = False
+        self.local_store = LocalMediaStore()
+        self.stats = {'hits': 0, 'misses': 0, 'stored': 0, 'invalidated': 0}
+
+    @staticmethod
+    def _content_key(video_id: str, media_type: str) -> str:
+        """مفتاح المحتوى: نوع الوسائط مع معرّف الفيديو"""
+        return f"{media_type}_{video_id}"
+
+    async def init_database(self):
+        """إنشاء جدول الذاكرة وتحميله إلى الذاكرة"""
+        try:
+            async with db_pool.writer() as db:
+                await db.execute('''
+                    CREATE TABLE IF NOT EXISTS media_file_cache (
+                        content_key TEXT PRIMARY KEY,
+                        video_id TEXT NOT NULL,
+                        media_type TEXT NOT NULL,
+                        file_id TEXT NOT NULL,
+                        title TEXT,
+                        hits INTEGER DEFAULT 0,
+                        created_at REAL,
+                        last_used REAL
+                    )
+                ''')
+                await db.execute('''
+                    CREATE TABLE IF NOT EXISTS media_query_cache (
+                        query TEXT NOT NULL,
+                        media_type TEXT NOT NULL,
+                        content_key TEXT NOT NULL,
+                        PRIMARY KEY (query, media_type)
+                    )
+                ''')
+
+            rows = await db_pool.fetch_all(
+                "SELECT content_key, video_id, media_type, file_id, title FROM media_file_cache"
+            )
+            for row in rows:
+                self._by_video[row['content_key']] = dict(row)
+            query_rows = await db_pool.fetch_all(
+                "SELECT query, media_type, content_key FROM media_query_cache"
+            )
+            for row in query_rows:
+                if row['content_key'] in self._by_video:
+                    self._by_query[f"{row['media_type']}:{row['query']}"] = row['content_key']
+
+            self._loaded = True
+            logging.info(f"✅ تم تحميل ذاكرة ملفات الوسائط ({len(self._by_video)} ملف)")
+        except Exception as e:
+            logging.error(f"خطأ في تهيئة ذاكرة ملفات الوسائط: {e}")
+
+    async def _ensure_loaded(self):
+        """تحميل الذاكرة عند أول استخدام إذا لم تُهيأ عند بدء التشغيل"""
+        if not self._loaded:
+            await self.init_database()
+
+    async def lookup(self, media_type: str, video_id: str = None, query: str = None) -> Optional[Dict]:
+        """البحث عن ملف مرفوع سابقاً حسب معرّف الفيديو أو نص البحث"""
+        await self._ensure_loaded()
+
+        content_key = None
+        if video_id:
+            content_key = self._content_key(video_id, media_type)
+        elif query:
+            content_key = self._by_query.get(f"{media_type}:{normalize_query(query)}")
+
+        entry = self._by_video.get(content_key) if content_key else None
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+
+        self.stats['hits'] += 1
+        try:
+            await db_pool.execute(
+                "UPDATE media_file_cache SET hits = hits + 1, last_used = ? WHERE content_key = ?",
+                (time.time(), content_key)
+            )
+        except Exception as e:
+            logging.error(f"خطأ في تحديث استخدام ملف الوسائط: {e}")
+        return dict(entry)
+
+    async def remember(self, media_type: str, video_id: str, file_id: str,
+                       title: str = "", query: str = None, file_path: str = None):
+        """حفظ file_id بعد أول رفع ناجح (ونسخ الملف إلى التخزين المحلي)"""
+        if not video_id or not file_id:
+            return
+        await self._ensure_loaded()
+
+        content_key = self._content_key(video_id, media_type)
+        entry = {
+            'content_key': content_key,
+            'video_id': video_id,
+            'media_type': media_type,
+            'file_id': file_id,
+            'title': title or "",
+        }
+        self._by_video[content_key] = entry
+        normalized = normalize_query(query) if query else None
+        if normalized:
+            self._by_query[f"{media_type}:{normalized}"] = content_key
+
+        if file_path:
+            await self.local_store.put(content_key, file_path)
+
+        try:
+            now = time.time()
+            async with db_pool.writer() as db:
+                await db.execute(
+                    """
+                    INSERT INTO media_file_cache
+                    (content_key, video_id, media_type, file_id, title, hits, created_at, last_used)
+                    VALUES (?, ?, ?, ?, ?, 0, ?, ?)
+                    ON CONFLICT(content_key) DO UPDATE SET
+                        file_id = excluded.file_id,
+                        title = excluded.title,
+                        last_used = excluded.last_used
+                    """,
+                    (content_key, video_id, media_type, file_id, entry['title'], now, now)
+                )
+                if normalized:
+                    await db.execute(
+                        "INSERT OR REPLACE INTO media_query_cache (query, media_type, content_key) VALUES (?, ?, ?)",
+                        (normalized, media_type, content_key)
+                    )
+            self.stats['stored'] += 1
+        except Exception as e:
+            logging.error(f"خطأ في حفظ ملف الوسائط في الذاكرة: {e}")
+
+    async def remember_query(self, media_type: str, query: str, video_id: str):
+        """ربط نص بحث جديد بمحتوى مخزن مسبقاً"""
+        content_key = self._content_key(video_id, media_type)
+        normalized = normalize_query(query) if query else None
+        if not normalized or content_key not in self._by_video:
+            return
+        if self._by_query.get(f"{media_type}:{normalized}") == content_key:
+            return
+        self._by_query[f"{media_type}:{normalized}"] = content_key
+        try:
+            await db_pool.execute(
+                "INSERT OR REPLACE INTO media_query_cache (query, media_type, content_key) VALUES (?, ?, ?)",
+                (normalized, media_type, content_key)
+            )
+        except Exception as e:
+            logging.error(f"خطأ في ربط نص البحث بملف الوسائط: {e}")
+
+    async def invalidate(self, media_type: str, video_id: str):
+        """إزالة file_id لم يعد صالحاً (مع الإبقاء على النسخة المحلية لإعادة الرفع)"""
+        content_key = self._content_key(video_id, media_type)
+        self._by_video.pop(content_key, None)
+        for key in [k for k, v in self._by_query.items() if v == content_key]:
+            del self._by_query[key]
+        self.stats['invalidated'] += 1
+        try:
+            async with db_pool.writer() as db:
+                await db.execute("DELETE FROM media_file_cache WHERE content_key = ?", (content_key,))
+                await db.execute("DELETE FROM media_query_cache WHERE content_key = ?", (content_key,))
+        except Exception as e:
+            logging.error(f"خطأ في حذف ملف الوسائط من الذاكرة: {e}")
+
+    def get_local_file(self, media_type: str, video_id: str) -> Optional[str]:
+        """إرجاع النسخة المحلية من الملف إن وجدت"""
+        if not video_id:
+            return None
+        return self.local_store.get(self._content_key(video_id, media_type))
+
+    def get_stats(self) -> Dict:
+        """إحصائيات الذاكرة للمراقبة"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return dict(
+            self.stats,
+            entries=len(self._by_video),
+            queries=len(self._by_query),
+            hit_ratio=round(self.stats['hits'] / lookups, 4) if lookups else 0.0,
+            local_store=self.local_store.get_stats(),
+        )
+
+
+# النسخة العامة من الذاكرة
+media_file_cache = MediaFileCache()
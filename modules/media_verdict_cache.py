@@ -0,0 +1,293 @@
+"""
+ذاكرة أحكام الإشراف على الوسائط
+Media Moderation Verdict Cache
+
+تحفظ نتيجة تحليل Gemini لكل ملف وسائط مرتبطة بمعرّف تيليجرام الثابت
+file_unique_id (نفس الملصق أو الميم يُعاد إرساله بنفس المعرّف)، وبالبصمة
+الإدراكية (dHash) للصور والملصقات الثابتة لالتقاط النسخ المعاد ضغطها أو
+تحجيمها. الأحكام دائمة في قاعدة البيانات، ولا يُستدعى النموذج إلا عند عدم
+وجود حكم سابق.
+"""
+
+import asyncio
+import io
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from database.connection_pool import db_pool
+
+try:
+    from PIL import Image
+    PHASH_AVAILABLE = True
+except ImportError:
+    PHASH_AVAILABLE = False
+
+# إصدار سياسة التحليل - تغييره يتجاهل الأحكام القديمة
+VERDICT_VERSION = 1
+
+# الحد الأقصى للأحكام المحملة في الذاكرة (والمحفوظة في الجدول)
+MAX_VERDICTS = 50000
+
+# أكبر مسافة هامينغ بين بصمتين لاعتبارهما نفس الصورة (من 64 بت)
+PHASH_MAX_DISTANCE = 6
+
+# عدد أجزاء البصمة في فهرس التشابه (8 أجزاء × 8 بت تضمن تطابق جزء عند مسافة ≤ 7)
+PHASH_BANDS = 8
+
+# أنواع الوسائط التي تُحسب لها بصمة إدراكية (الصور الثابتة فقط)
+PHASH_MEDIA_TYPES = {"photo", "sticker"}
+
+# عدد الإصابات قبل حفظ عدادات الاستخدام في قاعدة البيانات
+HITS_FLUSH_EVERY = 25
+
+# مهلة إعادة محاولة التحميل بعد فشله (ثواني، تتضاعف حتى الحد الأقصى)
+LOAD_RETRY_DELAY = 30
+LOAD_RETRY_MAX_DELAY = 900
+
+
+def compute_phash(source: Union[str, bytes]) -> Optional[int]:
+    """بصمة dHash من 64 بت لصورة (مسار أو بايتات)، أو None إن تعذر فتحها"""
+    if not PHASH_AVAILABLE:
+        return None
+    try:
+        image_source = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+        with Image.open(image_source) as image:
+            pixels = list(image.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+        value = 0
+        for row in range(8):
+            offset = row * 9
+            for column in range(8):
+                value = (value << 1) | (pixels[offset + column] > pixels[offset + column + 1])
+        return value
+    except Exception as e:
+        logging.debug(f"تعذر حساب البصمة الإدراكية: {e}")
+        return None
+
+
+def _to_signed(phash: Optional[int]) -> Optional[int]:
+    """تحويل البصمة إلى عدد بإشارة يناسب INTEGER في SQLite (64 بت)"""
+    if phash is None:
+        return None
+    return phash - (1 << 64) if phash >= (1 << 63) else phash
+
+
+def _from_signed(value: Optional[int]) -> Optional[int]:
+    if value is None:
+        return None
+    return value + (1 << 64) if value < 0 else value
+
+
+def _bands(phash: int) -> List[Tuple[int, int]]:
+    """أجزاء البصمة (رقم الجزء، قيمته) لفهرس التشابه"""
+    return [(band, (phash >> (band * 8)) & 0xFF) for band in range(PHASH_BANDS)]
+
+
+class MediaVerdictCache:
+    """أحكام إشراف دائمة حسب file_unique_id والبصمة الإدراكية"""
+
+    def __init__(self, max_verdicts: int = MAX_VERDICTS, max_distance: int = PHASH_MAX_DISTANCE):
+        self.max_verdicts = max_verdicts
+        self.max_distance = max_distance
+
+        # file_unique_id -> (الحكم، البصمة أو None)
+        self._by_unique: "OrderedDict[str, tuple]" = OrderedDict()
+        # البصمة -> file_unique_id
+        self._by_phash: Dict[int, str] = {}
+        # (رقم الجزء، قيمته) -> بصمات
+        self._bands: Dict[Tuple[int, int], set] = {}
+        # إصابات بانتظار الحفظ
+        self._pending_hits: Dict[str, int] = {}
+
+        self._loaded = False
+        self._load_lock: Optional[asyncio.Lock] = None
+        # موعد إعادة محاولة التحميل بعد فشله (None = التحميل ناجح)
+        self._retry_at: Optional[float] = None
+        self._retry_delay = LOAD_RETRY_DELAY
+        self.stats = {'unique_hits': 0, 'phash_hits': 0, 'misses': 0, 'stored': 0}
+
+    # ===== التحميل =====
+
+    async def init_database(self):
+        """إنشاء جدول الأحكام وتحميل الأحدث استخداماً إلى الذاكرة"""
+        try:
+            async with db_pool.writer() as db:
+                await db.execute('''
+                    CREATE TABLE IF NOT EXISTS media_verdicts (
+                        file_unique_id TEXT PRIMARY KEY,
+                        phash INTEGER,
+                        media_type TEXT,
+                        verdict TEXT NOT NULL,
+                        version INTEGER NOT NULL,
+                        hits INTEGER DEFAULT 0,
+                        created_at REAL,
+                        last_used REAL
+                    )
+                ''')
+                await db.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_media_verdicts_last_used ON media_verdicts(last_used)"
+                )
+                # حذف أحكام السياسات القديمة وما زاد عن الحد
+                await db.execute("DELETE FROM media_verdicts WHERE version != ?", (VERDICT_VERSION,))
+                await db.execute('''
+                    DELETE FROM media_verdicts WHERE file_unique_id IN (
+                        SELECT file_unique_id FROM media_verdicts
+                        ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                    )
+                ''', (self.max_verdicts,))
+
+            rows = await db_pool.fetch_all(
+                "SELECT file_unique_id, phash, verdict FROM media_verdicts ORDER BY last_used ASC"
+            )
+            for row in rows:
+                # الأحكام المحفوظة أثناء تعطل التحميل أحدث من نسخة الجدول
+                if row['file_unique_id'] in self._by_unique:
+                    continue
+                try:
+                    verdict = json.loads(row['verdict'])
+                except (TypeError, ValueError):
+                    continue
+                self._index(row['file_unique_id'], verdict, _from_signed(row['phash']))
+
+            self._loaded = True
+            self._retry_at = None
+            self._retry_delay = LOAD_RETRY_DELAY
+            logging.info(f"✅ تم تحميل ذاكرة أحكام الوسائط ({len(self._by_unique)} حكم)")
+        except Exception as e:
+            # العمل بذاكرة فارغة بدلاً من إعادة المحاولة مع كل ملف، وإعادة التحميل لاحقاً
+            self._loaded = True
+            self._retry_at = time.monotonic() + self._retry_delay
+            logging.error(f"خطأ في تهيئة ذاكرة أحكام الوسائط، إعادة المحاولة بعد {self._retry_delay} ثانية: {e}")
+            self._retry_delay = min(self._retry_delay * 2, LOAD_RETRY_MAX_DELAY)
+
+    async def _ensure_loaded(self):
+        """تحميل الذاكرة عند أول استخدام إذا لم تُهيأ عند بدء التشغيل (أو بعد مهلة فشل سابق)"""
+        if self._loaded and (self._retry_at is None or time.monotonic() < self._retry_at):
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if not self._loaded or (self._retry_at is not None and time.monotonic() >= self._retry_at):
+                await self.init_database()
+
+    # ===== الفهرسة =====
+
+    def _index(self, unique_id: str, verdict: Dict[str, Any], phash: Optional[int]):
+        if unique_id in self._by_unique:
+            self._unindex(unique_id)
+        self._by_unique[unique_id] = (verdict, phash)
+        if phash is not None:
+            self._by_phash[phash] = unique_id
+            for band in _bands(phash):
+                self._bands.setdefault(band, set()).add(phash)
+        while len(self._by_unique) > self.max_verdicts:
+            self._unindex(next(iter(self._by_unique)))
+
+    def _unindex(self, unique_id: str):
+        _, phash = self._by_unique.pop(unique_id)
+        if phash is not None and self._by_phash.get(phash) == unique_id:
+            del self._by_phash[phash]
+            for band in _bands(phash):
+                members = self._bands.get(band)
+                if members is not None:
+                    members.discard(phash)
+                    if not members:
+                        del self._bands[band]
+
+    def _nearest(self, phash: int) -> Optional[str]:
+        """أقرب بصمة مخزنة ضمن المسافة المسموحة"""
+        if phash in self._by_phash:
+            return self._by_phash[phash]
+        best, best_distance = None, self.max_distance + 1
+        seen = set()
+        for band in _bands(phash):
+            for candidate in self._bands.get(band, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                distance = bin(candidate ^ phash).count("1")
+                if distance < best_distance:
+                    best, best_distance = candidate, distance
+        return self._by_phash.get(best) if best is not None else None
+
+    # ===== البحث والتخزين =====
+
+    async def lookup(self, unique_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """البحث بمعرّف الملف الثابت (لا يحتاج تحميل الملف)"""
+        await self._ensure_loaded()
+        entry = self._by_unique.get(unique_id) if unique_id else None
+        if entry is None:
+            return None
+        self.stats['unique_hits'] += 1
+        await self._touch(unique_id)
+        return dict(entry[0])
+
+    async def lookup_phash(self, phash: Optional[int]) -> Optional[Dict[str, Any]]:
+        """البحث بالبصمة الإدراكية عن صورة مطابقة أو شبه مطابقة"""
+        await self._ensure_loaded()
+        unique_id = self._nearest(phash) if phash is not None else None
+        if unique_id is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['phash_hits'] += 1
+        await self._touch(unique_id)
+        return dict(self._by_unique[unique_id][0])
+
+    async def remember(self, unique_id: Optional[str], media_type: str, verdict: Dict[str, Any],
+                       phash: Optional[int] = None):
+        """حفظ حكم تحليل ناجح (phash فقط لصور حللها Gemini فعلاً، لا للأحكام المنسوخة)"""
+        if not unique_id or not verdict or verdict.get("error"):
+            return
+        await self._ensure_loaded()
+
+        self._index(unique_id, verdict, phash)
+        self.stats['stored'] += 1
+        try:
+            now = time.time()
+            await db_pool.execute('''
+                INSERT OR REPLACE INTO media_verdicts
+                (file_unique_id, phash, media_type, verdict, version, hits, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, 0, ?, ?)
+            ''', (unique_id, _to_signed(phash), media_type, json.dumps(verdict, ensure_ascii=False),
+                  VERDICT_VERSION, now, now))
+        except Exception as e:
+            logging.error(f"خطأ في حفظ حكم الوسائط: {e}")
+
+    async def _touch(self, unique_id: str):
+        """تحديث ترتيب الاستخدام وحفظ العدادات على دفعات"""
+        self._by_unique.move_to_end(unique_id)
+        self._pending_hits[unique_id] = self._pending_hits.get(unique_id, 0) + 1
+        if sum(self._pending_hits.values()) >= HITS_FLUSH_EVERY:
+            await self.flush_hits()
+
+    async def flush_hits(self):
+        """حفظ عدادات الإصابات المعلقة في معاملة واحدة"""
+        if not self._pending_hits:
+            return
+        pending, self._pending_hits = self._pending_hits, {}
+        now = time.time()
+        try:
+            await db_pool.execute_many(
+                "UPDATE media_verdicts SET hits = hits + ?, last_used = ? WHERE file_unique_id = ?",
+                [(count, now, unique_id) for unique_id, count in pending.items()]
+            )
+        except Exception as e:
+            logging.error(f"خطأ في حفظ عدادات أحكام الوسائط: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """إحصائيات الذاكرة (كل إصابة = تحليل Gemini تم توفيره)"""
+        hits = self.stats['unique_hits'] + self.stats['phash_hits']
+        lookups = hits + self.stats['misses']
+        return dict(
+            self.stats,
+            verdicts=len(self._by_unique),
+            hashed=len(self._by_phash),
+            phash_enabled=PHASH_AVAILABLE,
+            hit_ratio=round(hits / lookups, 4) if lookups else 0.0,
+        )
+
+
+# النسخة العامة من الذاكرة
+media_verdict_cache = MediaVerdictCache()
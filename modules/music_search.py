@@ -10,6 +10,9 @@ import os
 from typing import Optional, Dict, Any, List
 from aiogram.types import Message
 
+from modules.download_workers import download_pool, DownloadRejected
+from modules.media_file_cache import media_file_cache, extract_video_id, is_invalid_file_id_error
+
 # قاموس الأغاني والروابط (يمكن توسيعه)
 MUSIC_DATABASE = {
     "جاب العيد": "https://www.youtube.com/watch?v=xRWJAusCpGU",
@@ -177,6 +180,72 @@ async def handle_eid_music_trigger(message: Message) -> bool:
         return False
 
 
+async def _reply_media(message: Message, media_type: str, media, caption: str = None):
+    """إرسال ملف صوتي أو فيديو كرد على الرسالة"""
+    if media_type == 'video':
+        return await message.reply_video(video=media, caption=caption)
+    return await message.reply_audio(audio=media, caption=caption)
+
+
+def _sent_file_id(sent, media_type: str) -> Optional[str]:
+    """استخراج file_id من الرسالة المرسلة"""
+    media = getattr(sent, media_type, None) or getattr(sent, 'document', None)
+    return media.file_id if media else None
+
+
+async def _send_and_remember(message: Message, media_type: str, file_path: str, video_id: str,
+                             title: str, query: str = None, caption: str = None):
+    """رفع الملف المحمل وحفظ file_id الناتج لإعادة استخدامه"""
+    from aiogram.types import FSInputFile
+    sent = await _reply_media(message, media_type, FSInputFile(file_path), caption)
+    await media_file_cache.remember(
+        media_type, video_id, _sent_file_id(sent, media_type),
+        title=title, query=query, file_path=file_path
+    )
+    return sent
+
+
+async def _send_cached_media(message: Message, media_type: str, video_id: str = None,
+                             query: str = None, caption: str = None) -> bool:
+    """خدمة الطلب من الذاكرة (file_id ثم النسخة المحلية) بدون تحميل"""
+    entry = await media_file_cache.lookup(media_type, video_id=video_id, query=query)
+    if entry:
+        video_id = entry['video_id']
+        cached_caption = caption if caption is not None else (
+            f"🎥 **{entry['title']}**" if media_type == 'video' and entry['title'] else None
+        )
+        try:
+            await _reply_media(message, media_type, entry['file_id'], cached_caption)
+            if query:
+                await media_file_cache.remember_query(media_type, query, video_id)
+            return True
+        except Exception as send_error:
+            # تقييد المعدل وأخطاء الشبكة لا تعني أن file_id تالف، فلا نحذفه
+            if not is_invalid_file_id_error(send_error):
+                raise
+            logging.warning(f"معرّف الملف المخزن غير صالح، سيتم حذفه: {send_error}")
+            await media_file_cache.invalidate(media_type, video_id)
+
+    # إعادة الرفع من النسخة المحلية إن وجدت
+    local_path = media_file_cache.get_local_file(media_type, video_id)
+    if local_path:
+        try:
+            title = entry['title'] if entry else ""
+            await _send_and_remember(message, media_type, local_path, video_id, title, query, caption)
+            return True
+        except Exception as send_error:
+            logging.error(f"خطأ في إرسال النسخة المحلية: {send_error}")
+    return False
+
+
+async def _delete_quietly(wait_msg):
+    """حذف رسالة الانتظار مع تجاهل الأخطاء"""
+    try:
+        await wait_msg.delete()
+    except Exception:
+        pass
+
+
 async def handle_music_search(message: Message) -> bool:
     """معالج البحث عن الموسيقى"""
     try:
@@ -221,20 +290,36 @@ async def handle_music_search(message: Message) -> bool:
             )
             return True
         
+        # طلب متكرر: إعادة إرسال الفيديو المرفوع سابقاً بدون بحث أو تحميل
+        if await _send_cached_media(message, 'video', query=query):
+            return True
+        
         # البحث باستخدام YouTube API الحقيقي
         search_results = await search_youtube_api(query)
         
         if search_results and 'results' in search_results:
             # إرسال رسالة انتظار
             wait_msg = await message.reply("🎥 جاري البحث وتحميل الفيديو...")
+            chat_id = message.chat.id
             
             # محاولة تحميل كل فيديو حتى ينجح واحد
             successful_video = None
             successful_file_path = None
             
             for video_info in search_results['results']:
+                # الفيديو مرفوع سابقاً لطلب آخر
+                caption = f"🎥 **{video_info['title']}**\n📺 {video_info['channel']}"
+                if await _send_cached_media(message, 'video', video_id=video_info.get('video_id'),
+                                            caption=caption):
+                    await media_file_cache.remember_query('video', query, video_info.get('video_id'))
+                    await _delete_quietly(wait_msg)
+                    return True
+                
                 # تحميل الفيديو
-                file_path = await download_youtube_video(video_info['url'], video_info['title'])
+                file_path = await download_youtube_video(
+                    video_info['url'], video_info['title'], chat_id,
+                    _progress_editor(wait_msg, f"🎥 جاري تحميل: {video_info['title'][:40]}")
+                )
                 
                 if file_path and os.path.exists(file_path):
                     successful_video = video_info
@@ -243,30 +328,22 @@ async def handle_music_search(message: Message) -> bool:
                     
             if successful_video and successful_file_path:
                 # إرسال الفيديو
-                from aiogram.types import FSInputFile
-                import shutil
-                video_file = FSInputFile(successful_file_path)
-                
                 try:
-                    await message.reply_video(
-                        video=video_file,
+                    await _send_and_remember(
+                        message, 'video', successful_file_path,
+                        successful_video.get('video_id'), successful_video['title'], query,
                         caption=f"🎥 **{successful_video['title']}**\n📺 {successful_video['channel']}"
                     )
                     
-                    # حذف الملف المؤقت
-                    os.unlink(successful_file_path)
-                    shutil.rmtree(os.path.dirname(successful_file_path), ignore_errors=True)
-                    
                 except Exception as send_error:
                     logging.error(f"خطأ في إرسال الفيديو: {send_error}")
-                    # حذف الملف المؤقت
-                    import shutil
-                    os.unlink(successful_file_path)
-                    shutil.rmtree(os.path.dirname(successful_file_path), ignore_errors=True)
                     
                     # إرسال رسالة بعدم إمكانية إرسال الفيديو
                     await wait_msg.edit_text("❌ الفيديو كبير جداً للإرسال")
                     return True
+                finally:
+                    # حذف الملف المؤقت
+                    download_pool.cleanup(successful_file_path)
             else:
                 # فشل تحميل جميع الفيديوهات - محاولة بحث بديل
                 await wait_msg.edit_text("🔍 جاري البحث عن بديل...")
@@ -284,24 +361,20 @@ async def handle_music_search(message: Message) -> bool:
                     alt_results = await search_youtube_api(alt_query)
                     if alt_results and 'results' in alt_results:
                         for video_info in alt_results['results']:
-                            file_path = await download_youtube_video(video_info['url'], video_info['title'])
+                            file_path = await download_youtube_video(video_info['url'], video_info['title'], chat_id)
                             if file_path and os.path.exists(file_path):
                                 try:
-                                    from aiogram.types import FSInputFile
-                                    import shutil
-                                    video_file = FSInputFile(file_path)
-                                    await message.reply_video(
-                                        video=video_file,
+                                    await _send_and_remember(
+                                        message, 'video', file_path,
+                                        video_info.get('video_id'), video_info['title'], query,
                                         caption=f"🎥 **{video_info['title']}**\n📺 {video_info['channel']}"
                                     )
-                                    os.unlink(file_path)
-                                    shutil.rmtree(os.path.dirname(file_path), ignore_errors=True)
                                     await wait_msg.delete()
                                     return True
                                 except Exception:
-                                    os.unlink(file_path)
-                                    shutil.rmtree(os.path.dirname(file_path), ignore_errors=True)
                                     continue
+                                finally:
+                                    download_pool.cleanup(file_path)
                 
                 # إذا فشل في كل شيء
                 await wait_msg.edit_text("❌ عذراً، لم أتمكن من إيجاد فيديو قابل للتحميل. جرب بحث آخر.")
@@ -345,6 +418,9 @@ async def handle_music_search(message: Message) -> bool:
             )
             return True
         
+    except DownloadRejected as rejected:
+        await message.reply(_rejection_text(rejected))
+        return True
     except Exception as e:
         logging.error(f"خطأ في معالج البحث عن الموسيقى: {e}")
         return False
@@ -377,71 +453,128 @@ def is_valid_music_url(url: str) -> bool:
         return False
 
 
-async def download_youtube_audio(url: str, title: str) -> Optional[str]:
-    """تحميل الصوت من يوتيوب وإرجاع مسار الملف"""
+def _safe_file_title(title: str, default: str = "") -> str:
+    """تنظيف عنوان الفيديو لاستخدامه كاسم ملف"""
+    safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()[:50]
+    return safe_title or default
+
+
+def _find_downloaded_file(temp_dir: str, extensions: tuple) -> Optional[str]:
+    """العثور على الملف المحمل داخل المجلد المؤقت"""
+    for file in os.listdir(temp_dir):
+        if file.endswith(extensions):
+            return os.path.join(temp_dir, file)
+    return None
+
+
+def _download_audio_blocking(url: str, title: str, temp_dir: str, progress_hook=None) -> Optional[str]:
+    """تحميل الصوت (يعمل داخل خيط من مجمع التحميل)"""
+    import yt_dlp
+    
+    # خيارات التحميل
+    ydl_opts = {
+        'format': 'bestaudio[ext=m4a]/bestaudio/best',
+        'outtmpl': os.path.join(temp_dir, f'{_safe_file_title(title, "audio_file")}.%(ext)s'),
+        'extractaudio': True,
+        'audioformat': 'mp3',
+        'audioquality': '192K',
+        'quiet': False,  # تغيير إلى False لرؤية الأخطاء
+        'no_warnings': False,  # تغيير إلى False لرؤية التحذيرات
+    }
+    if progress_hook:
+        ydl_opts['progress_hooks'] = [progress_hook]
+    
     try:
-        import yt_dlp
-        import tempfile
-        import os
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            logging.info("بدء استخراج معلومات الفيديو...")
+            ydl.extract_info(url, download=True)
+            logging.info("تم الانتهاء من التحميل")
         
-        logging.info(f"بدء تحميل الصوت: {url}")
+        full_path = _find_downloaded_file(temp_dir, ('.mp3', '.m4a', '.webm', '.ogg'))
+        if full_path:
+            logging.info(f"تم العثور على الملف الصوتي: {full_path} (حجم: {os.path.getsize(full_path)} بايت)")
+            return full_path
         
-        # إنشاء مجلد مؤقت للتحميل
-        temp_dir = tempfile.mkdtemp()
-        logging.info(f"تم إنشاء مجلد مؤقت: {temp_dir}")
-        
-        # تنظيف اسم الملف
-        safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()[:50]
-        if not safe_title:
-            safe_title = "audio_file"
-        
-        # خيارات التحميل
-        ydl_opts = {
-            'format': 'bestaudio[ext=m4a]/bestaudio/best',
-            'outtmpl': os.path.join(temp_dir, f'{safe_title}.%(ext)s'),
-            'extractaudio': True,
-            'audioformat': 'mp3',
-            'audioquality': '192K',
-            'quiet': False,  # تغيير إلى False لرؤية الأخطاء
-            'no_warnings': False,  # تغيير إلى False لرؤية التحذيرات
-        }
+        logging.error("لم يتم العثور على أي ملف صوتي في المجلد المؤقت")
+        return None
+    
+    except yt_dlp.DownloadError as download_error:
+        error_msg = str(download_error)
+        if "not made this video available in your country" in error_msg or "geo" in error_msg.lower():
+            logging.error(f"فيديو محجوب جغرافياً: {download_error}")
+            return "GEO_BLOCKED"  # إرجاع علامة خاصة للحجب الجغرافي
+        logging.error(f"خطأ في تحميل يوتيوب: {download_error}")
+        return None
+    except Exception as ydl_error:
+        logging.error(f"خطأ في yt-dlp: {ydl_error}")
+        return None
+
+
+def _download_video_blocking(url: str, title: str, temp_dir: str, progress_hook=None) -> Optional[str]:
+    """تحميل الفيديو (يعمل داخل خيط من مجمع التحميل)"""
+    import yt_dlp
+    
+    # خيارات التحميل للفيديو
+    ydl_opts = {
+        'format': 'best[height<=720][ext=mp4]/best[ext=mp4]/best',
+        'outtmpl': os.path.join(temp_dir, f'{_safe_file_title(title, "video_file")}.%(ext)s'),
+        'quiet': True,
+        'no_warnings': True,
+        'geo_bypass': True,
+        'geo_bypass_country': 'AE',  # الإمارات العربية المتحدة
+        'geo_bypass_ip_block': None,
+        'prefer_free_formats': True,
+        'youtube_include_dash_manifest': False,
+    }
+    if progress_hook:
+        ydl_opts['progress_hooks'] = [progress_hook]
+    
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        ydl.extract_info(url, download=True)
+    
+    return _find_downloaded_file(temp_dir, ('.mp4', '.mkv', '.webm', '.avi'))
+
+
+def _extract_title_blocking(url: str, progress_hook=None) -> str:
+    """استخراج عنوان الفيديو بدون تحميل (يعمل داخل خيط من مجمع التحميل)"""
+    import yt_dlp
+    with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
+        info = ydl.extract_info(url, download=False)
+        return info.get('title', 'Unknown')
+
+
+async def _run_download(blocking_func, url: str, title: str, chat_id: int,
+                        progress_callback=None) -> Optional[str]:
+    """تشغيل دالة تحميل في مجمع العمال مع مجلد مؤقت يُحذف عند الفشل"""
+    temp_dir = download_pool.create_temp_dir()
+    result = None
+    try:
+        result = await download_pool.run(
+            chat_id, blocking_func, url, title, temp_dir,
+            progress_callback=progress_callback
+        )
+        return result
+    finally:
+        # في حالة الفشل لا يوجد ملف لإرساله، فيُحذف المجلد فوراً
+        if not result or result == "GEO_BLOCKED":
+            download_pool.remove_temp_dir(temp_dir)
+
+
+async def download_youtube_audio(url: str, title: str, chat_id: int = 0,
+                                 progress_callback=None) -> Optional[str]:
+    """تحميل الصوت من يوتيوب وإرجاع مسار الملف (بدون تعطيل حلقة الأحداث)"""
+    try:
+        # التحقق من تثبيت المكتبة قبل حجز عامل تحميل
+        import yt_dlp
         
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # تحميل الفيديو
-                logging.info("بدء استخراج معلومات الفيديو...")
-                info = ydl.extract_info(url, download=True)
-                logging.info("تم الانتهاء من التحميل")
-                
-                # العثور على الملف المحمل
-                files_found = os.listdir(temp_dir)
-                logging.info(f"الملفات الموجودة في المجلد المؤقت: {files_found}")
-                
-                for file in files_found:
-                    if file.endswith(('.mp3', '.m4a', '.webm', '.ogg')):
-                        full_path = os.path.join(temp_dir, file)
-                        file_size = os.path.getsize(full_path)
-                        logging.info(f"تم العثور على الملف الصوتي: {file} (حجم: {file_size} بايت)")
-                        return full_path
-                
-                logging.error("لم يتم العثور على أي ملف صوتي في المجلد المؤقت")
-                return None
-        
-        except yt_dlp.DownloadError as download_error:
-            error_msg = str(download_error)
-            if "not made this video available in your country" in error_msg or "geo" in error_msg.lower():
-                logging.error(f"فيديو محجوب جغرافياً: {download_error}")
-                return "GEO_BLOCKED"  # إرجاع علامة خاصة للحجب الجغرافي
-            else:
-                logging.error(f"خطأ في تحميل يوتيوب: {download_error}")
-                return None
-        except Exception as ydl_error:
-            logging.error(f"خطأ في yt-dlp: {ydl_error}")
-            return None
+        logging.info(f"بدء تحميل الصوت: {url}")
+        return await _run_download(_download_audio_blocking, url, title, chat_id, progress_callback)
         
     except ImportError:
         logging.error("مكتبة yt-dlp غير مثبتة")
         return None
+    except DownloadRejected:
+        raise
     except Exception as e:
         logging.error(f"خطأ عام في تحميل الصوت: {e}")
         import traceback
@@ -449,50 +582,41 @@ async def download_youtube_audio(url: str, title: str) -> Optional[str]:
         return None
 
 
-async def download_youtube_video(url: str, title: str) -> Optional[str]:
-    """تحميل الفيديو من يوتيوب وإرجاع مسار الملف"""
+async def download_youtube_video(url: str, title: str, chat_id: int = 0,
+                                 progress_callback=None) -> Optional[str]:
+    """تحميل الفيديو من يوتيوب وإرجاع مسار الملف (بدون تعطيل حلقة الأحداث)"""
     try:
-        import yt_dlp
-        import tempfile
-        import os
-        
-        # إنشاء مجلد مؤقت للتحميل
-        temp_dir = tempfile.mkdtemp()
-        
-        # تنظيف اسم الملف
-        safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()[:50]
-        
-        # خيارات التحميل للفيديو
-        ydl_opts = {
-            'format': 'best[height<=720][ext=mp4]/best[ext=mp4]/best',
-            'outtmpl': os.path.join(temp_dir, f'{safe_title}.%(ext)s'),
-            'quiet': True,
-            'no_warnings': True,
-            'geo_bypass': True,
-            'geo_bypass_country': 'AE',  # الإمارات العربية المتحدة
-            'geo_bypass_ip_block': None,
-            'prefer_free_formats': True,
-            'youtube_include_dash_manifest': False,
-        }
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            # تحميل الفيديو
-            info = ydl.extract_info(url, download=True)
-            
-            # العثور على الملف المحمل
-            for file in os.listdir(temp_dir):
-                if file.endswith(('.mp4', '.mkv', '.webm', '.avi')):
-                    return os.path.join(temp_dir, file)
-        
-        return None
+        return await _run_download(_download_video_blocking, url, title, chat_id, progress_callback)
         
+    except DownloadRejected:
+        raise
     except Exception as e:
         logging.error(f"خطأ في تحميل الفيديو: {e}")
         return None
 
 
+def _progress_editor(wait_msg: Message, label: str):
+    """استدعاء تقدم يحدّث رسالة الانتظار بنسبة التحميل"""
+    async def update(percent: int):
+        filled = percent // 10
+        bar = "▰" * filled + "▱" * (10 - filled)
+        try:
+            await wait_msg.edit_text(f"{label}\n{bar} {percent}%")
+        except Exception:
+            pass
+    return update
+
+
+def _rejection_text(rejected: DownloadRejected) -> str:
+    """رسالة رفض التحميل حسب السبب"""
+    if rejected.reason == 'chat_busy':
+        return "⏳ يوجد تحميل جارٍ في هذه المجموعة\n💡 انتظر حتى ينتهي ثم أعد المحاولة"
+    return "⏳ خدمة التحميل مشغولة حالياً\n💡 حاول مرة أخرى بعد قليل"
+
+
 async def handle_music_download(message: Message) -> bool:
     """معالج تحميل الموسيقى"""
+    wait_msg = None
     try:
         if not message.text:
             return False
@@ -518,39 +642,44 @@ async def handle_music_download(message: Message) -> bool:
         
         # إرسال رسالة انتظار
         wait_msg = await message.reply("🎵 جاري البحث والتحميل...")
+        chat_id = message.chat.id
         
         # التحقق إذا كان المستخدم أرسل رابط يوتيوب مباشرة
         if 'youtube.com/watch' in query or 'youtu.be/' in query:
             logging.info(f"تم اكتشاف رابط يوتيوب مباشر: {query}")
+            video_id = extract_video_id(query)
+            if await _send_cached_media(message, 'audio', video_id=video_id):
+                await _delete_quietly(wait_msg)
+                return True
+            
             try:
                 # استخراج عنوان الفيديو من الرابط
-                import yt_dlp
-                with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
-                    info = ydl.extract_info(query, download=False)
-                    video_title = info.get('title', 'Unknown')
+                video_title = await download_pool.run(chat_id, _extract_title_blocking, query)
                 
-                await wait_msg.edit_text(f"🎵 تم اكتشاف الرابط!\n🔽 جاري تحميل: {video_title[:50]}...")
+                label = f"🎵 تم اكتشاف الرابط!\n🔽 جاري تحميل: {video_title[:50]}..."
+                await wait_msg.edit_text(label)
                 
                 # تحميل الملف الصوتي مباشرة
-                file_path = await download_youtube_audio(query, video_title)
+                file_path = await download_youtube_audio(
+                    query, video_title, chat_id, _progress_editor(wait_msg, label)
+                )
                 
                 if file_path and os.path.exists(file_path):
                     await wait_msg.edit_text("📤 جاري إرسال الملف الصوتي...")
                     
-                    from aiogram.types import FSInputFile
-                    audio_file = FSInputFile(file_path)
-                    await message.reply_audio(audio=audio_file)
-                    
-                    # حذف الملف المؤقت
-                    os.unlink(file_path)
-                    import shutil
-                    shutil.rmtree(os.path.dirname(file_path), ignore_errors=True)
+                    try:
+                        await _send_and_remember(message, 'audio', file_path, video_id, video_title)
+                    finally:
+                        # حذف الملف المؤقت
+                        download_pool.cleanup(file_path)
                     
                     await wait_msg.delete()
                     return True
                 else:
                     await wait_msg.edit_text("❌ فشل في تحميل الملف من الرابط")
                     return True
+            except DownloadRejected:
+                raise
             except Exception as link_error:
                 logging.error(f"خطأ في معالجة الرابط المباشر: {link_error}")
                 await wait_msg.edit_text("❌ خطأ في معالجة الرابط\n💡 تأكد من صحة الرابط")
@@ -564,20 +693,24 @@ async def handle_music_download(message: Message) -> bool:
                 break
         
         if local_result:
+            video_id = extract_video_id(local_result['url'])
+            if await _send_cached_media(message, 'audio', video_id=video_id):
+                await _delete_quietly(wait_msg)
+                return True
+            
             # تحميل من قاعدة البيانات المحلية
-            file_path = await download_youtube_audio(local_result['url'], local_result['title'])
+            file_path = await download_youtube_audio(
+                local_result['url'], local_result['title'], chat_id,
+                _progress_editor(wait_msg, f"🔽 جاري تحميل: {local_result['title'][:40]}")
+            )
             
             if file_path and os.path.exists(file_path):
                 # إرسال الملف الصوتي
-                from aiogram.types import FSInputFile
-                audio_file = FSInputFile(file_path)
-                await message.reply_audio(audio=audio_file)
-                
-                # حذف الملف المؤقت
-                os.unlink(file_path)
-                # حذف المجلد المؤقت
-                import shutil
-                shutil.rmtree(os.path.dirname(file_path), ignore_errors=True)
+                try:
+                    await _send_and_remember(message, 'audio', file_path, video_id, local_result['title'])
+                finally:
+                    # حذف الملف والمجلد المؤقت
+                    download_pool.cleanup(file_path)
             else:
                 await wait_msg.edit_text("❌ فشل في تحميل الملف الصوتي")
             
@@ -589,23 +722,40 @@ async def handle_music_download(message: Message) -> bool:
             
             return True
         
+        # طلب متكرر: إعادة إرسال الملف المرفوع سابقاً بدون بحث أو تحميل
+        if await _send_cached_media(message, 'audio', query=query):
+            await _delete_quietly(wait_msg)
+            return True
+        
         # البحث باستخدام YouTube API
         search_results = await search_youtube_api(query)
         
         if search_results and 'results' in search_results and len(search_results['results']) > 0:
             # محاولة تحميل كل فيديو حتى ينجح واحد (لتجنب الفيديوهات المحجوبة)
             successful_download = None
+            successful_video = None
+            served_from_cache = False
             geo_blocked_count = 0
             
             for i, video_info in enumerate(search_results['results']):
                 logging.info(f"تجربة الفيديو {i+1}: {video_info['title']} - {video_info['url']}")
                 
+                # الأغنية مرفوعة سابقاً لطلب آخر
+                if await _send_cached_media(message, 'audio', video_id=video_info.get('video_id')):
+                    await media_file_cache.remember_query('audio', query, video_info.get('video_id'))
+                    served_from_cache = True
+                    break
+                
                 try:
                     # تحديث رسالة الانتظار لإظهار التقدم
-                    await wait_msg.edit_text(f"🎵 تجربة الفيديو {i+1} من {len(search_results['results'])}\n🔽 جاري تحميل: {video_info['title'][:40]}...")
+                    label = f"🎵 تجربة الفيديو {i+1} من {len(search_results['results'])}\n🔽 جاري تحميل: {video_info['title'][:40]}..."
+                    await wait_msg.edit_text(label)
                     
                     # تحميل الملف الصوتي
-                    file_path = await download_youtube_audio(video_info['url'], video_info['title'])
+                    file_path = await download_youtube_audio(
+                        video_info['url'], video_info['title'], chat_id,
+                        _progress_editor(wait_msg, label)
+                    )
                     
                     if file_path == "GEO_BLOCKED":
                         geo_blocked_count += 1
@@ -614,28 +764,33 @@ async def handle_music_download(message: Message) -> bool:
                     elif file_path and os.path.exists(file_path):
                         logging.info(f"تم تحميل الملف بنجاح: {file_path}")
                         successful_download = file_path
+                        successful_video = video_info
                         break
                     else:
                         logging.warning(f"فشل تحميل الفيديو {i+1}، جاري المحاولة مع التالي...")
                         continue
                         
+                except DownloadRejected:
+                    raise
                 except Exception as download_error:
                     logging.error(f"خطأ في تحميل الفيديو {i+1}: {download_error}")
                     continue
             
-            if successful_download:
+            if served_from_cache:
+                pass
+            elif successful_download:
                 # تحديث الرسالة لإظهار أنه يتم الإرسال
                 await wait_msg.edit_text("📤 جاري إرسال الملف الصوتي...")
                 
                 # إرسال الملف الصوتي
-                from aiogram.types import FSInputFile
-                audio_file = FSInputFile(successful_download)
-                await message.reply_audio(audio=audio_file)
-                
-                # حذف الملف المؤقت
-                os.unlink(successful_download)
-                import shutil
-                shutil.rmtree(os.path.dirname(successful_download), ignore_errors=True)
+                try:
+                    await _send_and_remember(
+                        message, 'audio', successful_download,
+                        successful_video.get('video_id'), successful_video['title'], query
+                    )
+                finally:
+                    # حذف الملف المؤقت
+                    download_pool.cleanup(successful_download)
                 
                 logging.info("تم إرسال الملف الصوتي بنجاح")
             else:
@@ -659,17 +814,17 @@ async def handle_music_download(message: Message) -> bool:
                         alt_results = await search_youtube_api(alt_query)
                         if alt_results and 'results' in alt_results:
                             for alt_video in alt_results['results'][:3]:  # جرب أول 3 فقط
-                                file_path = await download_youtube_audio(alt_video['url'], alt_video['title'])
+                                file_path = await download_youtube_audio(alt_video['url'], alt_video['title'], chat_id)
                                 if file_path and file_path != "GEO_BLOCKED" and os.path.exists(file_path):
                                     await wait_msg.edit_text("📤 تم العثور على بديل! جاري الإرسال...")
                                     
-                                    from aiogram.types import FSInputFile
-                                    audio_file = FSInputFile(file_path)
-                                    await message.reply_audio(audio=audio_file)
-                                    
-                                    os.unlink(file_path)
-                                    import shutil
-                                    shutil.rmtree(os.path.dirname(file_path), ignore_errors=True)
+                                    try:
+                                        await _send_and_remember(
+                                            message, 'audio', file_path,
+                                            alt_video.get('video_id'), alt_video['title'], query
+                                        )
+                                    finally:
+                                        download_pool.cleanup(file_path)
                                     
                                     found_alternative = True
                                     break
@@ -705,6 +860,15 @@ async def handle_music_download(message: Message) -> bool:
                 await wait_msg.edit_text(f"❌ لم أتمكن من العثور على: `{query}`\n💡 جرب كتابة اسم الأغنية بطريقة مختلفة")
             return True
         
+    except DownloadRejected as rejected:
+        try:
+            if wait_msg:
+                await wait_msg.edit_text(_rejection_text(rejected))
+            else:
+                await message.reply(_rejection_text(rejected))
+        except Exception:
+            pass
+        return True
     except Exception as e:
         logging.error(f"خطأ في معالج تحميل الموسيقى: {e}")
         return False
@@ -11,6 +11,7 @@ from aiogram import Bot
 from aiogram.exceptions import TelegramForbiddenError, TelegramBadRequest
 
 from config.settings import NOTIFICATION_CHANNEL, ADMINS
+from modules.outbound_queue import send_priority, PRIORITY_BACKGROUND
 
 
 class NotificationManager:
@@ -223,8 +224,9 @@ class NotificationManager:
                 parse_mode="HTML"
             )
             
-            # بدء العداد التصاعدي في الخلفية
-            asyncio.create_task(self._update_startup_timer(startup_msg, startup_time, version))
+            # بدء العداد التصاعدي في الخلفية (تعديلاته في مسار الأولوية المنخفضة)
+            with send_priority(PRIORITY_BACKGROUND):
+                asyncio.create_task(self._update_startup_timer(startup_msg, startup_time, version))
             
             logging.info("✅ تم إرسال الإشعار إلى القناة الفرعية وبدء العداد التصاعدي")
             return True
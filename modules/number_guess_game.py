@@ -12,6 +12,7 @@ from database.operations import get_or_create_user, update_user_balance, add_tra
 from modules.leveling import LevelingSystem
 from utils.helpers import format_number
 from modules.ai_player import number_ai, should_ai_participate
+from modules.scheduler import scheduler, game_payload, GAME_TIMEOUT_KIND
 
 # الألعاب النشطة {group_id: game_data}
 ACTIVE_GUESS_GAMES: Dict[int, dict] = {}
@@ -176,8 +177,8 @@ async def start_number_guess_game(message: Message):
         logging.info(f"تم بدء لعبة خمن الرقم في المجموعة {group_id} بواسطة {creator_name} - AI: {game.ai_enabled}")
         
         # إعداد مؤقت انتهاء اللعبة (3 دقائق)
-        import asyncio
-        asyncio.create_task(game_timeout(game, message, 180))
+        scheduler.call_later(f"guess:{group_id}", 180, game_timeout, game, message,
+                             kind=GAME_TIMEOUT_KIND, payload=game_payload(group_id, "لعبة خمن الرقم"))
         
     except Exception as e:
         logging.error(f"خطأ في بدء لعبة خمن الرقم: {e}")
@@ -270,7 +271,8 @@ async def handle_game_end(game: NumberGuessGame, message: Message):
         
         await message.reply(end_text)
         
-        # إزالة اللعبة من الذاكرة
+        # إزالة اللعبة من الذاكرة وإلغاء مؤقتها
+        scheduler.cancel(f"guess:{game.group_id}")
         if game.group_id in ACTIVE_GUESS_GAMES:
             del ACTIVE_GUESS_GAMES[game.group_id]
         
@@ -279,12 +281,9 @@ async def handle_game_end(game: NumberGuessGame, message: Message):
     except Exception as e:
         logging.error(f"خطأ في نهاية لعبة خمن الرقم: {e}")
 
-async def game_timeout(game: NumberGuessGame, message: Message, timeout: int):
-    """مؤقت انتهاء اللعبة"""
-    import asyncio
-    await asyncio.sleep(timeout)
-    
-    if game.group_id in ACTIVE_GUESS_GAMES and not game.game_ended:
+async def game_timeout(game: NumberGuessGame, message: Message):
+    """مؤقت انتهاء اللعبة - يُستدعى من المجدول"""
+    if ACTIVE_GUESS_GAMES.get(game.group_id) is game and not game.game_ended:
         game.game_ended = True
         await handle_game_end(game, message)
 
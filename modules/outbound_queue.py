@@ -0,0 +1,322 @@
+"""
+طابور الرسائل الصادرة إلى تليجرام
+Centralized Outbound Telegram Send Queue
+
+وسيط طلبات لجلسة البوت يمر عبره كل إرسال أو تعديل أو حذف، فلا تحتاج الوحدات
+لتغيير طريقة استدعائها (message.reply و bot.send_message و edit_text):
+- دلو رموز عام ودلو لكل محادثة وفق حدود تليجرام (30/ثانية، 20/دقيقة للمجموعة)
+- مسارات أولوية: الحذف والإشراف قبل الردود العادية قبل رسائل الألعاب الدورية
+- عند RetryAfter تُوقف المحادثة (أو الكل) للمدة المطلوبة ثم يُعاد الطلب
+- التعديلات المتتالية لنفس الرسالة تُدمج فيُرسل آخر تعديل فقط
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+# مسارات الأولوية (الأقل يُرسل أولاً)
+PRIORITY_MODERATION = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2
+
+# الحد العام لتليجرام (رسالة/ثانية)
+GLOBAL_RATE = 30.0
+GLOBAL_BURST = 30.0
+
+# حد المجموعات: 20 رسالة في الدقيقة مع دفعة أولى بنفس الحجم
+GROUP_RATE = 20.0 / 60.0
+GROUP_BURST = 20.0
+
+# حد المحادثات الخاصة: رسالة في الثانية مع دفعة صغيرة
+PRIVATE_RATE = 1.0
+PRIVATE_BURST = 3.0
+
+# عدد مرات إعادة المحاولة بعد RetryAfter
+MAX_RETRIES = 3
+
+# الطرق التي تُعتبر إشرافاً وتأخذ الأولوية
+MODERATION_METHODS = {"deleteMessage", "deleteMessages"}
+
+# طرق التعديل القابلة للدمج
+COALESCED_METHODS = {"editMessageText", "editMessageCaption", "editMessageReplyMarkup", "editMessageMedia"}
+
+# طرق لا تمر بالطابور رغم بادئتها
+BYPASS_METHODS = {"sendChatAction"}
+
+# عدد دلاء المحادثات قبل حذف الخاملة منها
+MAX_CHAT_BUCKETS = 5000
+
+_priority_override: ContextVar[Optional[int]] = ContextVar("outbound_priority", default=None)
+
+
+@contextmanager
+def send_priority(priority: int):
+    """تحديد أولوية كل ما يُرسل داخل هذا السياق (مثل عدادات الألعاب الدورية)"""
+    token = _priority_override.set(priority)
+    try:
+        yield
+    finally:
+        _priority_override.reset(token)
+
+
+class _Bucket:
+    """دلو رموز لمحادثة أو للحد العام مع إيقاف مؤقت عند RetryAfter"""
+
+    __slots__ = ('tokens', 'updated', 'rate', 'capacity', 'blocked_until')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def wait_time(self, now: float) -> float:
+        """الثواني المتبقية حتى يتوفر رمز (0 = متاح الآن)"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class _Outbound:
+    """طلب صادر ينتظر دوره"""
+
+    __slots__ = ('priority', 'seq', 'chat_id', 'chat_limited', 'method', 'make_request', 'bot',
+                 'coalesce_key', 'result', 'attempts', 'enqueued_at')
+
+    def __init__(self, priority, seq, chat_id, chat_limited, method, make_request, bot, coalesce_key):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        # الحذف لا يُحسب من حد رسائل المحادثة (الحد العام فقط)
+        self.chat_limited = chat_limited
+        self.method = method
+        self.make_request = make_request
+        self.bot = bot
+        self.coalesce_key = coalesce_key
+        self.result: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+
+
+class OutboundDispatcher(BaseRequestMiddleware):
+    """وسيط طلبات يجدول كل رسالة صادرة حسب الأولوية وحدود تليجرام"""
+
+    def __init__(self):
+        self._global = _Bucket(GLOBAL_RATE, GLOBAL_BURST)
+        self._chats: Dict[Any, _Bucket] = {}
+        self._pending: List[_Outbound] = []
+        self._coalescing: Dict[tuple, _Outbound] = {}
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # مراجع قوية لمهام الإرسال الجارية حتى لا يجمعها جامع القمامة قبل انتهائها
+        self._running: set = set()
+        self._closed = False
+        self.stats = {
+            'sent': 0,
+            'coalesced': 0,
+            'retry_after': 0,
+            'failed': 0,
+            'max_queue': 0,
+            'total_wait_ms': 0.0,
+        }
+
+    # ===== نقطة الدخول من جلسة البوت =====
+
+    async def __call__(self, make_request, bot, method):
+        api_method = getattr(method, '__api_method__', '')
+        if (self._closed or api_method in BYPASS_METHODS or
+                not (api_method.startswith(('send', 'edit', 'copy', 'forward')) or api_method in MODERATION_METHODS)):
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, 'chat_id', None)
+        coalesce_key = None
+        if api_method in COALESCED_METHODS:
+            coalesce_key = (api_method, chat_id, getattr(method, 'message_id', None),
+                            getattr(method, 'inline_message_id', None))
+            waiting = self._coalescing.get(coalesce_key)
+            if waiting is not None:
+                # تعديل أحدث لنفس الرسالة قبل إرسال السابق - يُرسل الأحدث فقط
+                waiting.method = method
+                waiting.make_request = make_request
+                self.stats['coalesced'] += 1
+                return await asyncio.shield(waiting.result)
+
+        priority = _priority_override.get()
+        if priority is None:
+            priority = PRIORITY_MODERATION if api_method in MODERATION_METHODS else PRIORITY_NORMAL
+
+        item = _Outbound(priority, next(self._seq), chat_id, api_method not in MODERATION_METHODS,
+                         method, make_request, bot, coalesce_key)
+        self._enqueue(item)
+        return await asyncio.shield(item.result)
+
+    def _enqueue(self, item: _Outbound):
+        self._ensure_worker()
+        self._pending.append(item)
+        if item.coalesce_key is not None:
+            self._coalescing[item.coalesce_key] = item
+        self.stats['max_queue'] = max(self.stats['max_queue'], len(self._pending))
+        self._wakeup.set()
+
+    # ===== الجدولة =====
+
+    def _chat_bucket(self, chat_id) -> Optional[_Bucket]:
+        if chat_id is None:
+            return None
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_CHAT_BUCKETS:
+                self._evict_idle_buckets()
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            bucket = _Bucket(GROUP_RATE, GROUP_BURST) if is_group else _Bucket(PRIVATE_RATE, PRIVATE_BURST)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _evict_idle_buckets(self):
+        """حذف دلاء المحادثات الممتلئة غير الموقوفة (تساوي دلواً جديداً)"""
+        now = time.monotonic()
+        busy = {item.chat_id for item in self._pending}
+        for chat_id in [c for c, b in self._chats.items()
+                        if c not in busy and b.wait_time(now) <= 0 and b.tokens >= b.capacity]:
+            del self._chats[chat_id]
+
+    def _ensure_worker(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        """اختيار الطلب الأعلى أولوية الذي تسمح محادثته بالإرسال الآن"""
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            global_wait = self._global.wait_time(now)
+            next_wait = global_wait if global_wait > 0 else None
+            chosen = None
+
+            if global_wait <= 0:
+                checked = {}
+                for item in sorted(self._pending, key=lambda i: (i.priority, i.seq)):
+                    key = (item.chat_id, item.chat_limited)
+                    wait = checked.get(key)
+                    if wait is None:
+                        bucket = self._chat_bucket(item.chat_id)
+                        if bucket is None:
+                            wait = 0.0
+                        elif item.chat_limited:
+                            wait = bucket.wait_time(now)
+                        else:
+                            # الحذف يحترم إيقاف RetryAfter فقط
+                            wait = max(0.0, bucket.blocked_until - now)
+                        checked[key] = wait
+                    if wait <= 0:
+                        chosen = item
+                        break
+                    next_wait = wait if next_wait is None else min(next_wait, wait)
+
+            if chosen is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=next_wait or 0.05)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._pending.remove(chosen)
+            if chosen.coalesce_key is not None and self._coalescing.get(chosen.coalesce_key) is chosen:
+                del self._coalescing[chosen.coalesce_key]
+            self._global.tokens -= 1
+            bucket = self._chat_bucket(chosen.chat_id)
+            if bucket is not None and chosen.chat_limited:
+                bucket.tokens -= 1
+            self._spawn(self._send(chosen))
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+        return task
+
+    async def _send(self, item: _Outbound):
+        """تنفيذ الطلب مع الإيقاف وإعادة المحاولة عند RetryAfter"""
+        item.attempts += 1
+        try:
+            response = await item.make_request(item.bot, item.method)
+        except TelegramRetryAfter as e:
+            self.stats['retry_after'] += 1
+            blocked_until = time.monotonic() + e.retry_after
+            bucket = self._chat_bucket(item.chat_id) or self._global
+            bucket.blocked_until = max(bucket.blocked_until, blocked_until)
+            logging.warning(f"🚦 RetryAfter {e.retry_after}ث للمحادثة {item.chat_id} (محاولة {item.attempts})")
+            if item.attempts <= MAX_RETRIES and not self._closed:
+                self._enqueue(item)
+                return
+            self._finish(item, error=e)
+            return
+        except BaseException as e:
+            self._finish(item, error=e)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return
+        self._finish(item, response=response)
+
+    def _finish(self, item: _Outbound, response=None, error: Optional[BaseException] = None):
+        if item.result.done():
+            return
+        if error is not None:
+            self.stats['failed'] += 1
+            item.result.set_exception(error)
+            # منع تحذير "exception was never retrieved" إن ألغى المستدعي الانتظار
+            item.result.exception()
+        else:
+            self.stats['sent'] += 1
+            self.stats['total_wait_ms'] += (time.monotonic() - item.enqueued_at) * 1000
+            item.result.set_result(response)
+
+    # ===== الإيقاف والمراقبة =====
+
+    async def close(self, timeout: float = 5.0):
+        """إرسال ما تبقى في الطابور خلال المهلة ثم إيقاف الجدولة"""
+        deadline = time.monotonic() + timeout
+        while (self._pending or self._running) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        for item in self._pending:
+            self._finish(item, error=RuntimeError("outbound queue closed"))
+        self._pending.clear()
+        self._coalescing.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """إحصائيات الطابور للمراقبة"""
+        sent = self.stats['sent']
+        return dict(
+            self.stats,
+            queued=len(self._pending),
+            chats=len(self._chats),
+            avg_wait_ms=round(self.stats['total_wait_ms'] / sent, 2) if sent else 0.0,
+        )
+
+
+# النسخة العامة من الطابور
+outbound_dispatcher = OutboundDispatcher()
@@ -227,12 +227,119 @@ async def clear_user_warnings(message: Message):
         await message.reply("❌ حدث خطأ أثناء مسح التحذيرات")
 
 
+def _custom_word_argument(message: Message) -> str:
+    """استخراج الكلمة بعد أمر من ثلاث كلمات (اضف/حذف كلمة مسيئة ...)"""
+    parts = (message.text or "").split(maxsplit=3)
+    return parts[3].strip() if len(parts) > 3 else ""
+
+
+@group_only
+async def add_custom_bad_word(message: Message):
+    """إضافة كلمة مسيئة مخصصة للمجموعة - أمر: اضف كلمة مسيئة [الكلمة]"""
+    try:
+        user_id = message.from_user.id
+        chat_id = message.chat.id
+        
+        # التحقق من الصلاحيات - مالكين ومشرفين وأسياد فقط
+        user_level = get_user_admin_level(user_id, chat_id)
+        if user_level.value < AdminLevel.MODERATOR.value:
+            await message.reply("❌ هذا الأمر متاح فقط للمشرفين ومالكي المجموعة والأسياد")
+            return
+        
+        word = _custom_word_argument(message)
+        if not word:
+            await message.reply("❌ **طريقة الاستخدام:** `اضف كلمة مسيئة [الكلمة]`")
+            return
+        
+        if word.lower() in profanity_filter.get_custom_words(chat_id):
+            await message.reply(f"ℹ️ الكلمة «{word}» مضافة بالفعل لقائمة المجموعة")
+            return
+        
+        if await profanity_filter.add_custom_word(chat_id, word, added_by=user_id):
+            await message.reply(f"✅ تمت إضافة «{word}» إلى الكلمات المسيئة في هذه المجموعة")
+            logging.info(f"تمت إضافة كلمة مسيئة مخصصة في المجموعة {chat_id} بواسطة {user_id}")
+        else:
+            await message.reply("❌ حدث خطأ أثناء إضافة الكلمة")
+            
+    except Exception as e:
+        logging.error(f"خطأ في إضافة كلمة مسيئة مخصصة: {e}")
+        await message.reply("❌ حدث خطأ أثناء إضافة الكلمة")
+
+
+@group_only
+async def remove_custom_bad_word(message: Message):
+    """حذف كلمة مسيئة مخصصة من المجموعة - أمر: حذف كلمة مسيئة [الكلمة]"""
+    try:
+        user_id = message.from_user.id
+        chat_id = message.chat.id
+        
+        # التحقق من الصلاحيات - مالكين ومشرفين وأسياد فقط
+        user_level = get_user_admin_level(user_id, chat_id)
+        if user_level.value < AdminLevel.MODERATOR.value:
+            await message.reply("❌ هذا الأمر متاح فقط للمشرفين ومالكي المجموعة والأسياد")
+            return
+        
+        word = _custom_word_argument(message)
+        if not word:
+            await message.reply("❌ **طريقة الاستخدام:** `حذف كلمة مسيئة [الكلمة]`")
+            return
+        
+        if word.lower() not in profanity_filter.get_custom_words(chat_id):
+            await message.reply(f"ℹ️ الكلمة «{word}» ليست في قائمة المجموعة")
+            return
+        
+        if await profanity_filter.remove_custom_word(chat_id, word):
+            await message.reply(f"✅ تم حذف «{word}» من الكلمات المسيئة في هذه المجموعة")
+            logging.info(f"تم حذف كلمة مسيئة مخصصة في المجموعة {chat_id} بواسطة {user_id}")
+        else:
+            await message.reply("❌ حدث خطأ أثناء حذف الكلمة")
+            
+    except Exception as e:
+        logging.error(f"خطأ في حذف كلمة مسيئة مخصصة: {e}")
+        await message.reply("❌ حدث خطأ أثناء حذف الكلمة")
+
+
+@group_only
+async def list_custom_bad_words(message: Message):
+    """عرض الكلمات المسيئة المخصصة للمجموعة - أمر: الكلمات المسيئة"""
+    try:
+        user_id = message.from_user.id
+        chat_id = message.chat.id
+        
+        # التحقق من الصلاحيات - مالكين ومشرفين وأسياد فقط
+        user_level = get_user_admin_level(user_id, chat_id)
+        if user_level.value < AdminLevel.MODERATOR.value:
+            await message.reply("❌ هذا الأمر متاح فقط للمشرفين ومالكي المجموعة والأسياد")
+            return
+        
+        words = profanity_filter.get_custom_words(chat_id)
+        if not words:
+            await message.reply("ℹ️ لا توجد كلمات مسيئة مخصصة في هذه المجموعة\n\n💡 للإضافة: `اضف كلمة مسيئة [الكلمة]`")
+            return
+        
+        words_list = "\n".join(f"• {word}" for word in words)
+        await message.reply(f"🚫 **الكلمات المسيئة المخصصة ({len(words)}):**\n\n{words_list}")
+        
+    except Exception as e:
+        logging.error(f"خطأ في عرض الكلمات المسيئة المخصصة: {e}")
+        await message.reply("❌ حدث خطأ أثناء عرض الكلمات")
+
+
+# أوامر الكلمات المخصصة التي تتبعها الكلمة المطلوبة (تُسجل كبادئات في موجه الأوامر)
+PROFANITY_WORD_COMMANDS = {
+    "اضف كلمة مسيئة": add_custom_bad_word,
+    "إضافة كلمة مسيئة": add_custom_bad_word,
+    "حذف كلمة مسيئة": remove_custom_bad_word,
+}
+
+
 # قاموس الأوامر لسهولة التكامل
 PROFANITY_COMMANDS = {
     "فعل الفلتر": enable_profanity_filter,
     "عطل الفلتر": disable_profanity_filter,
     "احصائيات الفلتر": profanity_filter_stats,
     "امسح تحذيرات": clear_user_warnings,
+    "الكلمات المسيئة": list_custom_bad_words,
     
     # أوامر بديلة
     "تفعيل الفلتر": enable_profanity_filter,
@@ -254,6 +361,9 @@ def get_profanity_help() -> str:
 
 🛠️ **أوامر التحكم:**
 • `امسح تحذيرات` (بالرد على رسالة) - مسح تحذيرات عضو
+• `اضف كلمة مسيئة [الكلمة]` - إضافة كلمة لفلتر المجموعة
+• `حذف كلمة مسيئة [الكلمة]` - حذف كلمة من فلتر المجموعة
+• `الكلمات المسيئة` - عرض الكلمات المضافة للمجموعة
 
 ⚡ **ميزات النظام:**
 • حذف تلقائي للرسائل المسيئة
@@ -0,0 +1,260 @@
+"""
+محرك فحص الألفاظ المسيئة المجمّع مسبقاً
+Precompiled Profanity Matching Engine
+
+يجمع الكلمات الأساسية والأنماط المنتظمة والكلمات المخصصة لكل مجموعة في
+تعابير مجمّعة تُبنى مرة واحدة، ويعيد بناءها فقط عند تغير الكلمات.
+الرسائل النظيفة (الغالبية) تكلف مسحاً واحداً للنص لكل مرحلة.
+
+تشغيل قياس الأداء:
+    python modules/profanity_engine.py
+"""
+
+import logging
+import re
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# تعابير منتظمة لاكتشاف الاختلافات في الكتابة
+DEFAULT_BAD_PATTERNS = [
+    # الكلمات الأكثر شيوعاً والأكثر إساءة
+    r'(?i)كس\s*(ام|امك|امها|اختك|اخوك)',  # كس امك، كس اختك، إلخ
+    r'(?i)(انيك|نيك|ناك)\s*(ام|امك|امها|اختك|اخوك)',  # انيك امك، نيك اختك، إلخ
+    r'(?i)(زب|عير)\s*(ابوك|اباك|امك)',  # زب ابوك، عير امك، إلخ
+    r'(?i)ابن\s*(الشرموط[هة]|القحب[هة]|الكلب[هة]|الزان[ي])',  # ابن الشرموطة، ابن القحبة، إلخ
+
+    # كلمات عامة مع تنويع الأحرف
+    r'(?i)\b(س[ب٨])\b', r'(?i)\b(ش[ت٥]م)\b', r'(?i)\b(ق[ذ٨]ف)\b',
+    r'(?i)\b(ط[ع٥]ن)\b', r'(?i)\b(ك[ل٤]ب)\b',
+
+    # كلمات مسيئة مع تهجئات مختلفة
+    r'(?i)\b(ع[اٲ]ه[ر٤])\b', r'(?i)\b(ز[اٲ]ن[ي٨])\b',
+    r'(?i)\b(ف[ح٨]ل)\b', r'(?i)\b(ش[ر٤]م[و٦]ط[هة]?)\b',
+    r'(?i)\b(ق[ح٨]ب[هة])\b', r'(?i)\b(م[ن٥][ي٨][و٦]ك[هة]?)\b',
+
+    # كلمات أخرى
+    r'(?i)\b(خ[و٦]ل)\b', r'(?i)\b(خ[ن٥]ي[ث٨])\b',
+    r'(?i)\b(ن[ذ٨]ل)\b', r'(?i)\b(ل[ع٥]ي[ن٥])\b',
+    r'(?i)\b(ح[ق٥]ي[ر٤])\b', r'(?i)\b(و[س٥]خ)\b',
+    r'(?i)\b(ح[ث٨]ال[هة])\b', r'(?i)\b(ب[و٦]ي)\b',
+    r'(?i)\b(م[اٲ]د[ر٤])\b',
+
+    # اختصارات وكتابات بديلة
+    r'(?i)\b(كسم)\b', r'(?i)\b(كسختك)\b', r'(?i)\b(عير)\b',
+    r'(?i)\b(ابن?\s*ال?\w{2,4})\b',  # لاكتشاف "ابن..." مع اختلافات
+]
+
+# قائمة الكلمات المسيئة الأساسية
+DEFAULT_BAD_WORDS = {
+    'كس', 'انيك', 'نيك', 'ناك', 'زب', 'عير', 'كسم', 'كسمك',
+    'سب', 'شتم', 'قذف', 'طعن', 'كلب', 'عاهر', 'زاني', 'فحل', 'شرموط',
+    'قحبه', 'منيوك', 'منيوكه', 'زباله', 'خول', 'خنيث', 'داعر', 'داعره',
+    'سافل', 'سافله', 'وسخ', 'قذر', 'حقير', 'حثاله', 'نذل', 'لعين'
+}
+
+# توحيد أشكال الحروف العربية المتشابهة
+ARABIC_NORMALIZATION = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا', 'ٲ': 'ا',
+    'ة': 'ه',
+    'ى': 'ي', 'ئ': 'ي',
+    'ؤ': 'و',
+    # أرقام تُستخدم بدل الحروف للتحايل على الفلتر
+    '٦': 'و',
+    '3': 'ع', '7': 'ح', '5': 'خ', '6': 'ط',
+})
+
+# التشكيل والتطويل وعلامات الاتجاه
+_DIACRITICS = re.compile(r'[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640\u200C-\u200F]')
+
+
+def normalize_arabic(text: str) -> str:
+    """توحيد النص العربي: إزالة التشكيل والتطويل وتوحيد الهمزات والتاء المربوطة"""
+    return _DIACRITICS.sub('', text.lower()).translate(ARABIC_NORMALIZATION)
+
+
+def _strip_inline_flags(pattern: str) -> str:
+    """إزالة (?i) من بداية النمط لأن التعبير المجمّع يستخدم IGNORECASE"""
+    return pattern[4:] if pattern.startswith('(?i)') else pattern
+
+
+class ProfanityEngine:
+    """محرك مطابقة مجمّع للكلمات الأساسية والأنماط والكلمات المخصصة"""
+
+    def __init__(self, base_words: Iterable[str], patterns: Iterable[str]):
+        self._base_words: Set[str] = set()
+        self._patterns: List[str] = list(patterns)
+        # chat_id -> كلمات مخصصة (None للكلمات العامة)
+        self._custom_words: Dict[Optional[int], Set[str]] = {}
+
+        self._base_automaton: Optional[re.Pattern] = None
+        self._pattern_automaton: Optional[re.Pattern] = None
+        self._custom_automata: Dict[Optional[int], Optional[re.Pattern]] = {}
+        self._normalized_words: Dict[str, str] = {}
+
+        self.version = 0
+        self.stats = {
+            'checks': 0,
+            'hits': 0,
+            'rebuilds': 0,
+        }
+
+        self.set_base_words(base_words)
+        self._compile_patterns()
+
+    # ===== البناء =====
+
+    @staticmethod
+    def _compile_words(words: Iterable[str]) -> Optional[re.Pattern]:
+        """تجميع قائمة كلمات في تعبير واحد (الأطول أولاً)"""
+        normalized = sorted({normalize_arabic(word) for word in words if word}, key=len, reverse=True)
+        if not normalized:
+            return None
+        return re.compile('|'.join(re.escape(word) for word in normalized))
+
+    def _compile_patterns(self):
+        """تجميع جميع الأنماط المنتظمة في تعبير واحد
+
+        الأنماط المحاطة بحدود كلمات \\b(...)\\b تُدمج تحت حد كلمة مشترك واحد
+        حتى لا تُجرب البدائل إلا عند بدايات الكلمات.
+        """
+        word_bounded = []
+        others = []
+        for pattern in self._patterns:
+            pattern = _strip_inline_flags(pattern)
+            if pattern.startswith(r'\b(') and pattern.endswith(r')\b'):
+                word_bounded.append(pattern[3:-3])
+            else:
+                others.append(f'(?:{pattern})')
+
+        parts = []
+        if word_bounded:
+            parts.append(r'\b(?:' + '|'.join(word_bounded) + r')\b')
+        parts.extend(others)
+        self._pattern_automaton = re.compile('|'.join(parts), re.IGNORECASE) if parts else None
+
+    def set_base_words(self, words: Iterable[str]):
+        """استبدال الكلمات الأساسية وإعادة البناء"""
+        self._base_words = set(words)
+        self._normalized_words = {word: normalize_arabic(word) for word in self._base_words}
+        self._base_automaton = self._compile_words(self._base_words)
+        self._mark_rebuilt()
+
+    def load_custom_words(self, rows: Iterable[Tuple[Optional[int], str]]):
+        """تحميل جميع الكلمات المخصصة (chat_id, word) دفعة واحدة"""
+        self._custom_words = {}
+        for chat_id, word in rows:
+            if word:
+                self._custom_words.setdefault(chat_id, set()).add(word.strip().lower())
+        self._custom_automata = {
+            chat_id: self._compile_words(words) for chat_id, words in self._custom_words.items()
+        }
+        self._mark_rebuilt()
+
+    def add_custom_word(self, chat_id: Optional[int], word: str):
+        """إضافة كلمة مخصصة وإعادة بناء تعبير المجموعة فقط"""
+        words = self._custom_words.setdefault(chat_id, set())
+        words.add(word.strip().lower())
+        self._custom_automata[chat_id] = self._compile_words(words)
+        self._mark_rebuilt()
+
+    def remove_custom_word(self, chat_id: Optional[int], word: str):
+        """حذف كلمة مخصصة وإعادة بناء تعبير المجموعة فقط"""
+        words = self._custom_words.get(chat_id)
+        if not words:
+            return
+        words.discard(word.strip().lower())
+        self._custom_automata[chat_id] = self._compile_words(words)
+        self._mark_rebuilt()
+
+    def get_custom_words(self, chat_id: Optional[int]) -> List[str]:
+        """الكلمات المخصصة لمجموعة معينة"""
+        return sorted(self._custom_words.get(chat_id, ()))
+
+    def _mark_rebuilt(self):
+        self.version += 1
+        self.stats['rebuilds'] += 1
+
+    # ===== الفحص =====
+
+    def find(self, text: str, chat_id: Optional[int] = None) -> List[str]:
+        """إرجاع الكلمات المسيئة المكتشفة في النص"""
+        self.stats['checks'] += 1
+        if not text:
+            return []
+
+        normalized = normalize_arabic(text)
+        found: List[str] = []
+
+        # الكلمات الأساسية: مسح واحد، ثم جمع جميع الكلمات المتداخلة عند الإصابة فقط
+        if self._base_automaton is not None and self._base_automaton.search(normalized):
+            found.extend(word for word, norm in self._normalized_words.items() if norm in normalized)
+
+        # الكلمات المخصصة العامة وكلمات المجموعة
+        for scope in (None, chat_id) if chat_id is not None else (None,):
+            automaton = self._custom_automata.get(scope)
+            if automaton is not None:
+                found.extend(match.group(0) for match in automaton.finditer(normalized))
+
+        # الأنماط المنتظمة تعمل على النص الأصلي لأنها تتعامل مع التهجئات البديلة
+        if self._pattern_automaton is not None:
+            found.extend(match.group(0).strip() for match in self._pattern_automaton.finditer(text))
+
+        if found:
+            self.stats['hits'] += 1
+        return found
+
+    def contains(self, text: str, chat_id: Optional[int] = None) -> Tuple[bool, List[str]]:
+        """واجهة متوافقة مع contains_profanity"""
+        found = self.find(text, chat_id)
+        return bool(found), found
+
+
+# ===== قياس الأداء =====
+
+BENCHMARK_CORPUS = [
+    "السلام عليكم ورحمة الله وبركاته",
+    "هلا والله كيف حالكم يا شباب",
+    "مين يلعب معي اكس اوه؟",
+    "راتب",
+    "رصيدي",
+    "يوكي شو رأيك باللعبة الجديدة",
+    "والله اليوم كان يوم طويل بالدوام 😂😂",
+    "تحويل 5000 لأحمد",
+    "ههههههههههه لا تضحكني",
+    "الله يسعدكم جميعاً ويوفقكم",
+    "شباب في أحد عنده فكرة عن المزرعة؟ متى المحصول يجهز",
+    "انا رايح انام تصبحون على خير",
+    "يا شيخ ادعي لنا",
+    "لعبة الحظ",
+    "صباح الخير على أحلى جروب 🌹",
+    "انت كلب",
+    "يا حقير",
+    "كم سعر السهم اليوم؟",
+    "الرجاء احترام قوانين المجموعة وعدم نشر الروابط",
+    "ترتيبي",
+]
+
+
+def benchmark(engine: ProfanityEngine, corpus: List[str] = None, iterations: int = 2000) -> Dict[str, float]:
+    """قياس عدد الرسائل المفحوصة في الثانية على مدونة رسائل دردشة عربية"""
+    corpus = corpus or BENCHMARK_CORPUS
+    started = time.perf_counter()
+    hits = 0
+    for _ in range(iterations):
+        for line in corpus:
+            if engine.find(line, chat_id=-1001):
+                hits += 1
+    elapsed = time.perf_counter() - started
+    total = iterations * len(corpus)
+    return {
+        'messages': total,
+        'seconds': round(elapsed, 3),
+        'messages_per_second': round(total / elapsed) if elapsed else 0,
+        'hit_ratio': round(hits / total, 3) if total else 0,
+    }
+
+
+if __name__ == "__main__":
+    bench_engine = ProfanityEngine(DEFAULT_BAD_WORDS, DEFAULT_BAD_PATTERNS)
+    bench_engine.add_custom_word(-1001, "كلمة_مخصصة")
+    print(benchmark(bench_engine))
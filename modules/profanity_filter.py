@@ -15,6 +15,7 @@ from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
 
 from config.hierarchy import has_permission, AdminLevel, get_user_admin_level
 from database.operations import execute_query
+from modules.profanity_engine import ProfanityEngine, DEFAULT_BAD_PATTERNS, DEFAULT_BAD_WORDS
 
 
 class ProfanityFilter:
@@ -27,41 +28,13 @@ class ProfanityFilter:
         self.processing_lock: Set[str] = set()  # منع المعالجة المتكررة
         
         # تعابير منتظمة لاكتشاف الاختلافات في الكتابة
-        self.bad_patterns = [
-            # الكلمات الأكثر شيوعاً والأكثر إساءة
-            r'(?i)كس\s*(ام|امك|امها|اختك|اخوك)',  # كس امك، كس اختك، إلخ
-            r'(?i)(انيك|نيك|ناك)\s*(ام|امك|امها|اختك|اخوك)',  # انيك امك، نيك اختك، إلخ
-            r'(?i)(زب|عير)\s*(ابوك|اباك|امك)',  # زب ابوك، عير امك، إلخ
-            r'(?i)ابن\s*(الشرموط[هة]|القحب[هة]|الكلب[هة]|الزان[ي])',  # ابن الشرموطة، ابن القحبة، إلخ
-            
-            # كلمات عامة مع تنويع الأحرف
-            r'(?i)\b(س[ب٨])\b', r'(?i)\b(ش[ت٥]م)\b', r'(?i)\b(ق[ذ٨]ف)\b',
-            r'(?i)\b(ط[ع٥]ن)\b', r'(?i)\b(ك[ل٤]ب)\b',
-            
-            # كلمات مسيئة مع تهجئات مختلفة
-            r'(?i)\b(ع[اٲ]ه[ر٤])\b', r'(?i)\b(ز[اٲ]ن[ي٨])\b',
-            r'(?i)\b(ف[ح٨]ل)\b', r'(?i)\b(ش[ر٤]م[و٦]ط[هة]?)\b',
-            r'(?i)\b(ق[ح٨]ب[هة])\b', r'(?i)\b(م[ن٥][ي٨][و٦]ك[هة]?)\b',
-            
-            # كلمات أخرى
-            r'(?i)\b(خ[و٦]ل)\b', r'(?i)\b(خ[ن٥]ي[ث٨])\b',
-            r'(?i)\b(ن[ذ٨]ل)\b', r'(?i)\b(ل[ع٥]ي[ن٥])\b',
-            r'(?i)\b(ح[ق٥]ي[ر٤])\b', r'(?i)\b(و[س٥]خ)\b',
-            r'(?i)\b(ح[ث٨]ال[هة])\b', r'(?i)\b(ب[و٦]ي)\b',
-            r'(?i)\b(م[اٲ]د[ر٤])\b',
-            
-            # اختصارات وكتابات بديلة
-            r'(?i)\b(كسم)\b', r'(?i)\b(كسختك)\b', r'(?i)\b(عير)\b',
-            r'(?i)\b(ابن?\s*ال?\w{2,4})\b',  # لاكتشاف "ابن..." مع اختلافات
-        ]
+        self.bad_patterns = list(DEFAULT_BAD_PATTERNS)
         
         # قائمة الكلمات المسيئة الأساسية
-        self.base_bad_words = {
-            'كس', 'انيك', 'نيك', 'ناك', 'زب', 'عير', 'كسم', 'كسمك',
-            'سب', 'شتم', 'قذف', 'طعن', 'كلب', 'عاهر', 'زاني', 'فحل', 'شرموط',
-            'قحبه', 'منيوك', 'منيوكه', 'زباله', 'خول', 'خنيث', 'داعر', 'داعره',
-            'سافل', 'سافله', 'وسخ', 'قذر', 'حقير', 'حثاله', 'نذل', 'لعين'
-        }
+        self.base_bad_words = set(DEFAULT_BAD_WORDS)
+        
+        # المحرك المجمّع للفحص (يُعاد بناؤه عند تغير الكلمات فقط)
+        self.engine = ProfanityEngine(self.base_bad_words, self.bad_patterns)
         
         # صلاحيات المستخدم المقيد
         self.restricted_permissions = ChatPermissions(
@@ -120,8 +93,10 @@ class ProfanityFilter:
             
             logging.info("✅ تم تهيئة قاعدة بيانات فلتر الألفاظ المسيئة")
             
-            # تحميل الإعدادات الحالية
+            # تحميل الإعدادات الحالية والكلمات المخصصة
             await self.load_settings()
+            await self.load_custom_words()
+            self._database_initialized = True
             
         except Exception as e:
             logging.error(f"❌ خطأ في تهيئة قاعدة بيانات فلتر الألفاظ: {e}")
@@ -181,7 +156,8 @@ class ProfanityFilter:
     async def check_user_status(self, bot: Bot, chat_id: int, user_id: int) -> Dict[str, any]:
         """فحص حالة المستخدم الحقيقية في المجموعة"""
         try:
-            member = await bot.get_chat_member(chat_id, user_id)
+            from modules.chat_member_cache import chat_member_cache
+            member = await chat_member_cache.get_member(bot, chat_id, user_id)
             
             return {
                 'status': member.status,
@@ -194,34 +170,71 @@ class ProfanityFilter:
             logging.error(f"❌ خطأ في فحص حالة المستخدم: {e}")
             return {'status': 'unknown', 'can_send_messages': True, 'is_restricted': False}
     
-    def contains_profanity(self, text: str) -> Tuple[bool, List[str]]:
-        """فحص النص لوجود ألفاظ مسيئة"""
+    def contains_profanity(self, text: str, chat_id: Optional[int] = None) -> Tuple[bool, List[str]]:
+        """فحص النص لوجود ألفاظ مسيئة عبر المحرك المجمّع"""
         if not text:
             return False, []
         
-        text_lower = text.lower()
-        found_words = []
-        
-        logging.info(f"🔍 فحص النص: '{text}' (محول إلى صغير: '{text_lower}')")
-        
-        # فحص الكلمات الأساسية
-        for word in self.base_bad_words:
-            if word in text_lower:
-                found_words.append(word)
-                logging.info(f"⚠️ تم اكتشاف كلمة مسيئة أساسية: '{word}'")
-        
-        # فحص التعابير المنتظمة
-        for pattern in self.bad_patterns:
-            matches = re.findall(pattern, text)
-            if matches:
-                found_words.extend([match[0] if isinstance(match, tuple) else match for match in matches])
-                logging.info(f"⚠️ تم اكتشاف نمط مسيء: '{pattern}' - النتائج: {matches}")
-        
-        result = len(found_words) > 0
-        logging.info(f"🎯 نتيجة فحص الألفاظ المسيئة: {result} - كلمات مكتشفة: {found_words}")
+        result, found_words = self.engine.contains(text, chat_id)
+        if result:
+            logging.debug(f"🎯 نتيجة فحص الألفاظ المسيئة: {result} - كلمات مكتشفة: {found_words}")
         
         return result, found_words
     
+    async def load_custom_words(self):
+        """تحميل الكلمات المخصصة من قاعدة البيانات إلى المحرك"""
+        try:
+            rows = await execute_query(
+                "SELECT chat_id, word FROM custom_bad_words",
+                fetch_all=True
+            )
+            self.engine.load_custom_words(
+                (row['chat_id'], row['word']) for row in (rows or [])
+            )
+            logging.info(f"تم تحميل {len(rows or [])} كلمة مسيئة مخصصة")
+        except Exception as e:
+            logging.error(f"❌ خطأ في تحميل الكلمات المخصصة: {e}")
+    
+    async def add_custom_word(self, chat_id: Optional[int], word: str, added_by: int = None, severity: int = 1) -> bool:
+        """إضافة كلمة مسيئة مخصصة للمجموعة (أو لكل المجموعات إذا كان chat_id فارغاً)"""
+        try:
+            result = await execute_query(
+                "INSERT INTO custom_bad_words (chat_id, word, severity, added_by) VALUES (?, ?, ?, ?)",
+                (chat_id, word.strip().lower(), severity, added_by)
+            )
+            if result is False:
+                return False
+            self.engine.add_custom_word(chat_id, word)
+            return True
+        except Exception as e:
+            logging.error(f"❌ خطأ في إضافة الكلمة المخصصة: {e}")
+            return False
+    
+    async def remove_custom_word(self, chat_id: Optional[int], word: str) -> bool:
+        """حذف كلمة مسيئة مخصصة"""
+        try:
+            if chat_id is None:
+                result = await execute_query(
+                    "DELETE FROM custom_bad_words WHERE chat_id IS NULL AND word = ?",
+                    (word.strip().lower(),)
+                )
+            else:
+                result = await execute_query(
+                    "DELETE FROM custom_bad_words WHERE chat_id = ? AND word = ?",
+                    (chat_id, word.strip().lower())
+                )
+            if result is False:
+                return False
+            self.engine.remove_custom_word(chat_id, word)
+            return True
+        except Exception as e:
+            logging.error(f"❌ خطأ في حذف الكلمة المخصصة: {e}")
+            return False
+    
+    def get_custom_words(self, chat_id: Optional[int]) -> List[str]:
+        """الكلمات المسيئة المخصصة لمجموعة (None للكلمات العامة)"""
+        return self.engine.get_custom_words(chat_id)
+    
     async def get_user_warnings(self, user_id: int, chat_id: int) -> Dict[str, any]:
         """الحصول على معلومات تحذيرات المستخدم"""
         try:
@@ -304,6 +317,10 @@ class ProfanityFilter:
                 until_date=until_date
             )
             
+            # حالة العضو تغيرت - إلغاء النسخة المخزنة
+            from modules.chat_member_cache import chat_member_cache
+            chat_member_cache.invalidate(chat_id, user_id)
+            
             # تسجيل العقوبة في قاعدة البيانات
             await execute_query('''
                 UPDATE profanity_warnings 
@@ -383,7 +400,7 @@ class ProfanityFilter:
             chat_id = message.chat.id
             
             # فحص وجود ألفاظ مسيئة أولاً
-            has_profanity, found_words = self.contains_profanity(text)
+            has_profanity, found_words = self.contains_profanity(text, chat_id)
             
             # تجاهل رسائل المديرين ولكن أرسل رسالة تنبيهية
             user_level = get_user_admin_level(user_id, chat_id)
@@ -0,0 +1,178 @@
+"""
+مُجمّع سياق الذكاء الاصطناعي ضمن ميزانية الرموز
+Concurrent, Token-Budgeted Prompt Context Builder
+
+يجلب مصادر السياق (تاريخ المحادثة، معلومات المجموعة، الذاكرة المشتركة،
+بيانات اللاعب...) بالتوازي بدلاً من انتظارها واحداً تلو الآخر، ويخزن الأجزاء
+الثابتة نسبياً لكل محادثة/مستخدم لفترة قصيرة، ثم يقص السياق المجمّع ليناسب
+ميزانية الرموز بحذف الأجزاء الأقل أولوية أولاً.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# ميزانية رموز السياق (بدون تعليمات النظام والسؤال)
+CONTEXT_TOKEN_BUDGET = 3000
+
+# تقدير تقريبي لعدد الحروف في الرمز الواحد للنص العربي المختلط
+CHARS_PER_TOKEN = 3
+
+# الحد الأقصى لعدد الأجزاء المخزنة
+MAX_FRAGMENTS = 2000
+
+# علامة الاختصار عند قص جزء
+TRIM_MARKER = "…"
+
+
+def estimate_tokens(text: str) -> int:
+    """تقدير عدد الرموز في نص"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN if text else 0
+
+
+class ContextSection:
+    """جزء من السياق مع أولويته (الأقل يُقص أولاً) واتجاه القص"""
+
+    __slots__ = ('name', 'text', 'priority', 'keep_tail')
+
+    def __init__(self, name: str, text: str, priority: int, keep_tail: bool = False):
+        self.name = name
+        self.text = text or ""
+        self.priority = priority
+        # تاريخ المحادثة يحتفظ بالأحدث (النهاية) عند القص
+        self.keep_tail = keep_tail
+
+
+def fit_to_budget(sections: List[ContextSection], budget_tokens: int = CONTEXT_TOKEN_BUDGET) -> List[ContextSection]:
+    """قص الأجزاء الأقل أولوية حتى يناسب مجموع السياق الميزانية"""
+    budget_chars = budget_tokens * CHARS_PER_TOKEN
+    overflow = sum(len(section.text) for section in sections) - budget_chars
+    if overflow <= 0:
+        return sections
+
+    for section in sorted(sections, key=lambda s: s.priority):
+        if overflow <= 0:
+            break
+        if not section.text:
+            continue
+        keep = len(section.text) - overflow
+        if keep <= len(TRIM_MARKER) + 20:
+            overflow -= len(section.text)
+            section.text = ""
+            continue
+        if section.keep_tail:
+            cut = section.text[-keep:]
+            # البدء من سطر كامل
+            newline = cut.find("\n")
+            section.text = TRIM_MARKER + (cut[newline + 1:] if 0 <= newline < len(cut) // 2 else cut)
+        else:
+            cut = section.text[:keep]
+            newline = cut.rfind("\n")
+            section.text = (cut[:newline] if newline > len(cut) // 2 else cut) + TRIM_MARKER
+        overflow = sum(len(s.text) for s in sections) - budget_chars
+
+    return sections
+
+
+class PromptContextBuilder:
+    """جلب مصادر السياق بالتوازي مع ذاكرة مؤقتة للأجزاء"""
+
+    def __init__(self, max_fragments: int = MAX_FRAGMENTS):
+        self.max_fragments = max_fragments
+        # (نوع الجزء، المفتاح) -> (القيمة، وقت الانتهاء)
+        self._fragments: Dict[Tuple[str, Any], tuple] = {}
+        self.stats = {
+            'builds': 0,
+            'fragment_hits': 0,
+            'fragment_misses': 0,
+            'source_errors': 0,
+            'trimmed_builds': 0,
+            'total_build_ms': 0.0,
+        }
+
+    # ===== ذاكرة الأجزاء =====
+
+    def _get_fragment(self, kind: str, key: Any):
+        entry = self._fragments.get((kind, key))
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._fragments[(kind, key)]
+            return None
+        return value
+
+    def _put_fragment(self, kind: str, key: Any, value, ttl: float):
+        if len(self._fragments) >= self.max_fragments:
+            # حذف المنتهية أولاً ثم الأقدم إدراجاً
+            now = time.monotonic()
+            for fragment_key in [k for k, (_, exp) in self._fragments.items() if exp <= now]:
+                del self._fragments[fragment_key]
+            while len(self._fragments) >= self.max_fragments:
+                del self._fragments[next(iter(self._fragments))]
+        self._fragments[(kind, key)] = (value, time.monotonic() + ttl)
+
+    def invalidate(self, kind: Optional[str] = None, key: Any = None):
+        """إلغاء أجزاء مخزنة حسب النوع و/أو المفتاح"""
+        for fragment_key in list(self._fragments):
+            if (kind is None or fragment_key[0] == kind) and (key is None or fragment_key[1] == key):
+                del self._fragments[fragment_key]
+
+    # ===== الجلب المتوازي =====
+
+    async def fetch(self, name: str, loader: Callable[[], Awaitable[Any]],
+                    cache_key: Any, ttl: float, default):
+        """جلب مصدر واحد من الذاكرة أو من دالته (cache_key = None يعني بدون تخزين)"""
+        if cache_key is not None:
+            cached = self._get_fragment(name, cache_key)
+            if cached is not None:
+                self.stats['fragment_hits'] += 1
+                return cached
+            self.stats['fragment_misses'] += 1
+
+        try:
+            value = await loader()
+        except Exception as e:
+            self.stats['source_errors'] += 1
+            logging.error(f"خطأ في جلب سياق {name}: {e}")
+            return default
+
+        if cache_key is not None and value:
+            self._put_fragment(name, cache_key, value, ttl)
+        return value
+
+    async def gather(self, sources: Dict[str, tuple]) -> Dict[str, Any]:
+        """جلب جميع المصادر بالتوازي
+
+        كل مصدر: name -> (loader, cache_key, ttl, default) كما في fetch.
+        """
+        started = time.perf_counter()
+        names = list(sources)
+        results = await asyncio.gather(*(
+            self.fetch(name, *sources[name]) for name in names
+        ))
+        self.stats['builds'] += 1
+        self.stats['total_build_ms'] += (time.perf_counter() - started) * 1000
+        return dict(zip(names, results))
+
+    def assemble(self, sections: List[ContextSection], budget_tokens: int = CONTEXT_TOKEN_BUDGET) -> Dict[str, str]:
+        """قص الأجزاء لتناسب الميزانية وإرجاعها حسب الاسم"""
+        before = sum(len(section.text) for section in sections)
+        fit_to_budget(sections, budget_tokens)
+        if sum(len(section.text) for section in sections) < before:
+            self.stats['trimmed_builds'] += 1
+        return {section.name: section.text for section in sections}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """إحصائيات المُجمّع للمراقبة"""
+        builds = self.stats['builds']
+        return dict(
+            self.stats,
+            fragments=len(self._fragments),
+            avg_build_ms=round(self.stats['total_build_ms'] / builds, 2) if builds else 0.0,
+        )
+
+
+# النسخة العامة من المُجمّع
+prompt_context_builder = PromptContextBuilder()
@@ -12,6 +12,7 @@ from database.operations import get_or_create_user, update_user_balance, add_tra
 from modules.leveling import LevelingSystem
 from utils.helpers import format_number
 from modules.ai_player import quiz_ai, should_ai_participate
+from modules.scheduler import scheduler, game_payload, GAME_TIMEOUT_KIND
 
 # الألعاب النشطة {group_id: game_data}
 ACTIVE_QUIZ_GAMES: Dict[int, dict] = {}
@@ -365,8 +366,7 @@ async def start_quick_quiz_game(message: Message):
         logging.info(f"تم بدء مسابقة سؤال وجواب في المجموعة {group_id} بواسطة {creator_name} - AI: {game.ai_enabled}")
         
         # إعداد مؤقت السؤال
-        import asyncio
-        asyncio.create_task(question_timer(game, message))
+        schedule_question_timer(game, message)
         
     except Exception as e:
         logging.error(f"خطأ في بدء مسابقة سؤال وجواب: {e}")
@@ -444,11 +444,13 @@ async def move_to_next_question(game: QuickQuizGame, message):
             # توزيع الجوائز
             await distribute_prizes(game)
             
-            # إزالة اللعبة
+            # إزالة اللعبة وإلغاء مؤقتها
+            scheduler.cancel(_quiz_job_key(game))
             if game.group_id in ACTIVE_QUIZ_GAMES:
                 del ACTIVE_QUIZ_GAMES[game.group_id]
         else:
-            # عرض السؤال التالي
+            # عرض السؤال التالي مع مؤقت جديد كامل المدة
+            schedule_question_timer(game, message)
             question_text = game.get_question_display()
             keyboard = game.get_question_keyboard()
             
@@ -464,55 +466,59 @@ async def move_to_next_question(game: QuickQuizGame, message):
     except Exception as e:
         logging.error(f"خطأ في الانتقال للسؤال التالي: {e}")
 
+def _quiz_job_key(game: QuickQuizGame) -> str:
+    return f"quiz:{game.group_id}"
+
+
+def schedule_question_timer(game: QuickQuizGame, message: Message):
+    """جدولة انتهاء وقت السؤال الحالي (يستبدل مؤقت السؤال السابق)"""
+    scheduler.call_later(_quiz_job_key(game), game.answer_time_limit, question_timer, game, message,
+                         kind=GAME_TIMEOUT_KIND, payload=game_payload(game.group_id, "مسابقة سؤال وجواب"))
+
+
 async def question_timer(game: QuickQuizGame, message: Message):
-    """مؤقت السؤال"""
-    import asyncio
+    """مؤقت السؤال - يُستدعى من المجدول عند انتهاء وقت السؤال"""
+    if game.game_ended or ACTIVE_QUIZ_GAMES.get(game.group_id) is not game:
+        return
     
-    while not game.game_ended and game.group_id in ACTIVE_QUIZ_GAMES:
-        # انتظار انتهاء وقت السؤال
-        await asyncio.sleep(game.answer_time_limit)
-        
-        if game.game_ended:
-            break
-        
-        # عرض الإجابة الصحيحة والانتقال للسؤال التالي
-        correct_answer = game.current_question["options"][game.current_question["correct"]]
-        answered_count = len([p for p in game.participants.values() if p["answered"]])
-        
-        answer_text = (
-            f"⏰ **انتهى وقت السؤال {game.question_number}!**\n\n"
-            f"✅ **الإجابة الصحيحة:** {correct_answer}\n"
-            f"👥 **عدد من أجاب:** {answered_count}\n\n"
-        )
+    # عرض الإجابة الصحيحة والانتقال للسؤال التالي
+    correct_answer = game.current_question["options"][game.current_question["correct"]]
+    answered_count = len([p for p in game.participants.values() if p["answered"]])
+    
+    answer_text = (
+        f"⏰ **انتهى وقت السؤال {game.question_number}!**\n\n"
+        f"✅ **الإجابة الصحيحة:** {correct_answer}\n"
+        f"👥 **عدد من أجاب:** {answered_count}\n\n"
+    )
+    
+    # بدء السؤال التالي أو إنهاء اللعبة
+    game.start_new_question()
+    
+    if game.game_ended:
+        # عرض النتائج النهائية
+        final_results = game.get_final_results()
+        await message.reply(answer_text + final_results)
+        
+        # توزيع الجوائز
+        await distribute_prizes(game)
+        
+        # إزالة اللعبة
+        if game.group_id in ACTIVE_QUIZ_GAMES:
+            del ACTIVE_QUIZ_GAMES[game.group_id]
+    else:
+        # عرض السؤال التالي
+        schedule_question_timer(game, message)
+        question_text = game.get_question_display()
+        keyboard = game.get_question_keyboard()
         
-        # بدء السؤال التالي أو إنهاء اللعبة
-        game.start_new_question()
+        await message.reply(answer_text + "⬇️ **السؤال التالي:**")
+        await message.reply(question_text, reply_markup=keyboard)
         
-        if game.game_ended:
-            # عرض النتائج النهائية
-            final_results = game.get_final_results()
-            await message.reply(answer_text + final_results)
-            
-            # توزيع الجوائز
-            await distribute_prizes(game)
-            
-            # إزالة اللعبة
-            if game.group_id in ACTIVE_QUIZ_GAMES:
-                del ACTIVE_QUIZ_GAMES[game.group_id]
-            break
-        else:
-            # عرض السؤال التالي
-            question_text = game.get_question_display()
-            keyboard = game.get_question_keyboard()
-            
-            await message.reply(answer_text + "⬇️ **السؤال التالي:**")
-            await message.reply(question_text, reply_markup=keyboard)
-            
-            # رد AI على السؤال الجديد
-            if game.ai_enabled:
-                ai_response = await game.get_ai_response()
-                if ai_response:
-                    await message.reply(ai_response)
+        # رد AI على السؤال الجديد
+        if game.ai_enabled:
+            ai_response = await game.get_ai_response()
+            if ai_response:
+                await message.reply(ai_response)
 
 async def distribute_prizes(game: QuickQuizGame):
     """توزيع الجوائز على المشاركين"""
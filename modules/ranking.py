@@ -7,7 +7,8 @@ import logging
 from datetime import datetime, timedelta
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 
-from database.operations import get_user, execute_query
+from database.operations import get_user, execute_query, get_users_display_info
+from database.leaderboards import leaderboards, WEALTH, BANK, XP
 from utils.helpers import format_number
 
 
@@ -99,13 +100,14 @@ async def show_user_ranking(message: Message):
             bank_rank = await get_user_rank(message.from_user.id, 'bank')
             properties_rank = await get_user_rank(message.from_user.id, 'properties')
             investments_rank = await get_user_rank(message.from_user.id, 'investments')
+            xp_rank = await get_user_rank(message.from_user.id, XP)
             
             # حساب الإحصائيات
             total_wealth = user['balance'] + user['bank_balance']
             properties_count = await get_user_properties_count(message.from_user.id)
             investments_value = await get_user_investments_value(message.from_user.id)
         else:
-            wealth_rank = bank_rank = properties_rank = investments_rank = None
+            wealth_rank = bank_rank = properties_rank = investments_rank = xp_rank = None
             total_wealth = properties_count = investments_value = 0
         
         ranking_text = f"""
@@ -123,6 +125,7 @@ async def show_user_ranking(message: Message):
 🏦 الودائع المصرفية: #{bank_rank or 'غير مصنف'}
 🏠 العقارات: #{properties_rank or 'غير مصنف'}
 💼 الاستثمارات: #{investments_rank or 'غير مصنف'}
+✨ الخبرة (XP): #{xp_rank or 'غير مصنف'}
 
 💡 استمر في اللعب لتحسين ترتيبك!
         """
@@ -210,15 +213,17 @@ async def show_monthly_ranking(message: Message):
         await message.reply("❌ حدث خطأ في عرض ترتيب الشهر")
 
 
+async def _leaderboard_players(top: list) -> list:
+    """إرفاق أسماء اللاعبين وأرصدتهم بنتائج لوحة الترتيب مع الحفاظ على الترتيب"""
+    info = await get_users_display_info([user_id for user_id, _ in top])
+    return [dict(info[user_id], total_wealth=info[user_id]['balance'] + info[user_id]['bank_balance'])
+            for user_id, _ in top if user_id in info]
+
+
 async def get_top_players_by_wealth():
     """الحصول على أغنى اللاعبين"""
     try:
-        players = await execute_query(
-            "SELECT user_id, username, first_name, balance, bank_balance, (balance + bank_balance) as total_wealth FROM users ORDER BY total_wealth DESC LIMIT 20",
-            (),
-            fetch_all=True
-        )
-        return players if players else []
+        return await _leaderboard_players(await leaderboards.top(WEALTH, 20))
     except Exception as e:
         logging.error(f"خطأ في الحصول على أغنى اللاعبين: {e}")
         return []
@@ -227,12 +232,7 @@ async def get_top_players_by_wealth():
 async def get_top_players_by_bank():
     """الحصول على أكبر المودعين في البنك"""
     try:
-        players = await execute_query(
-            "SELECT user_id, username, first_name, bank_balance FROM users WHERE bank_balance > 0 ORDER BY bank_balance DESC LIMIT 20",
-            (),
-            fetch_all=True
-        )
-        return players if players else []
+        return await _leaderboard_players(await leaderboards.top(BANK, 20, min_score=0))
     except Exception as e:
         logging.error(f"خطأ في الحصول على أكبر المودعين: {e}")
         return []
@@ -287,26 +287,8 @@ async def get_top_investors():
 async def get_user_rank(user_id: int, category: str):
     """الحصول على ترتيب مستخدم محدد في فئة معينة"""
     try:
-        if category == 'wealth':
-            query = """
-            SELECT COUNT(*) + 1 as rank 
-            FROM users 
-            WHERE (balance + bank_balance) > (
-                SELECT (balance + bank_balance) 
-                FROM users 
-                WHERE user_id = ?
-            )
-            """
-        elif category == 'bank':
-            query = """
-            SELECT COUNT(*) + 1 as rank 
-            FROM users 
-            WHERE bank_balance > (
-                SELECT bank_balance 
-                FROM users 
-                WHERE user_id = ?
-            )
-            """
+        if category in (WEALTH, BANK, XP):
+            return await leaderboards.rank(category, user_id)
         elif category == 'properties':
             query = """
             SELECT COUNT(*) + 1 as rank 
@@ -30,35 +30,22 @@ async def check_money_limit_and_convert(user_id: int) -> bool:
     """
     فحص إذا وصل المستخدم للحد الأقصى من المال
     إذا وصل، يتم تحويل المال إلى نقاط ذهبية
+    (عمليات الدفتر وتحديثات الرصيد تجري هذا الفحص ضمن معاملتها تلقائياً)
     """
     try:
-        # الحصول على رصيد المستخدم
-        user_data = await execute_query(
-            "SELECT balance, bank_balance, gold_points FROM users WHERE user_id = ?",
-            (user_id,),
-            fetch_one=True
-        )
-        
-        if not user_data:
-            return False
-            
-        total_money = user_data.get('balance', 0) + user_data.get('bank_balance', 0)
-        current_gold_points = user_data.get('gold_points', 0)
-        
-        if total_money >= MAX_MONEY_LIMIT:
-            # تصفير الأموال وإضافة النقاط الذهبية
-            new_gold_points = current_gold_points + GOLD_POINTS_PER_RESET
-            
-            await execute_query(
-                """
-                UPDATE users 
-                SET balance = 1000, bank_balance = 0, gold_points = ?, updated_at = ?
-                WHERE user_id = ?
-                """,
-                (new_gold_points, datetime.now().isoformat(), user_id)
-            )
-            
-            logging.info(f"🏆 المستخدم {user_id} وصل للحد الأقصى! تم تحويل أمواله إلى {GOLD_POINTS_PER_RESET} نقطة ذهبية")
+        from database.connection_pool import db_pool
+        from database.ledger import convert_over_limit
+        from database.leaderboards import leaderboards
+        from database.user_cache import user_cache
+        
+        now = datetime.now().isoformat()
+        async with db_pool.writer() as db:
+            final = (await convert_over_limit(db, [user_id], now)).get(user_id)
+        
+        if final and final['converted']:
+            user_cache.update_fields(user_id, balance=final['balance'], bank_balance=final['bank_balance'],
+                                     gold_points=final['gold_points'], updated_at=now)
+            leaderboards.update_balances(user_id, final['balance'], final['bank_balance'], final['gold_points'])
             return True
             
     except Exception as e:
@@ -70,19 +57,12 @@ async def check_money_limit_and_convert(user_id: int) -> bool:
 async def get_ranking_list(limit: int = 30) -> list:
     """الحصول على قائمة التصنيف حسب النقاط الذهبية"""
     try:
-        result = await execute_query(
-            """
-            SELECT user_id, first_name, username, gold_points, balance, bank_balance
-            FROM users 
-            WHERE gold_points > 0
-            ORDER BY gold_points DESC, (balance + bank_balance) DESC
-            LIMIT ?
-            """,
-            (limit,),
-            fetch_all=True
-        )
+        from database.leaderboards import leaderboards, GOLD
+        from database.operations import get_users_display_info
         
-        return result if result else []
+        top = await leaderboards.top(GOLD, limit)
+        info = await get_users_display_info([user_id for user_id, _ in top])
+        return [info[user_id] for user_id, _ in top if user_id in info]
         
     except Exception as e:
         logging.error(f"خطأ في الحصول على قائمة التصنيف: {e}")
@@ -144,18 +124,9 @@ async def get_user_rank_info(user_id: int) -> dict:
                 "total_money": user_data.get('balance', 0) + user_data.get('bank_balance', 0)
             }
         
-        # الحصول على ترتيب المستخدم
-        rank_result = await execute_query(
-            """
-            SELECT COUNT(*) + 1 as user_rank
-            FROM users 
-            WHERE gold_points > ? OR (gold_points = ? AND (balance + bank_balance) > ?)
-            """,
-            (gold_points, gold_points, user_data.get('balance', 0) + user_data.get('bank_balance', 0)),
-            fetch_one=True
-        )
-        
-        user_rank = rank_result.get('user_rank', 0) if rank_result else 0
+        # الحصول على ترتيب المستخدم من لوحة النقاط الذهبية
+        from database.leaderboards import leaderboards, GOLD
+        user_rank = await leaderboards.rank(GOLD, user_id) or 0
         
         return {
             "name": user_data.get('first_name', 'غير معروف'),
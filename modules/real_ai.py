@@ -11,6 +11,8 @@ from typing import Dict, Any, Optional, List
 from aiogram.types import Message
 from datetime import datetime, date
 from modules.name_tracker import name_tracker
+from modules.gemini_gateway import gemini_gateway
+from modules.ai_response_cache import ai_response_cache, MAX_CACHEABLE_LENGTH
 
 try:
     import google.genai as genai
@@ -21,14 +23,64 @@ except ImportError:
     logging.warning("Google Gemini SDK not available, falling back to basic AI")
 
 
+# عبارات تدل على أن السؤال يحتاج الذاكرة المشتركة
+MEMORY_TRIGGERS = [
+    'ماذا تعرف عن', 'ماذا كنتم تتحدثون', 'تحدثتم عني', 'قال عني',
+    'من هو', 'من هي', 'ماذا قال', 'ماذا قالت', 'آخر مرة', 'أخر مرة',
+    'تتذكر', 'هل تذكر', 'تعرف', 'تعرفه', 'تعرفها', 'محادثة', 'كلام',
+    'حكى عن', 'ذكر', 'قال عن', 'تحدث عن', 'أخبرني عن'
+]
+
+# كلمات مفتاحية تدل على أن المستخدم يريد معرفة تقدمه
+PROGRESS_TRIGGERS = [
+    'تقدمي', 'تقدمك', 'احصائياتي', 'إحصائياتي', 'احصائياتك', 'إحصائياتك',
+    'مستواي', 'مستواك', 'رصيدي', 'رصيدك', 'فلوسي', 'فلوسك',
+    'قلعتي', 'قلعتك', 'مزرعتي', 'مزرعتك', 'اسهمي', 'أسهمي', 'أسهمك',
+    'استثماراتي', 'استثماراتك', 'محفظتي', 'محفظتك', 'ترتيبي', 'ترتيبك',
+    'نقاطي', 'نقاطك', 'كم عندي', 'كم عندك', 'وين وصلت', 'أين وصلت',
+    'شو عندي', 'ماذا عندي', 'ايش عندي', 'كيف تقدمي', 'كيف تقدمك',
+    'شوف تقدمي', 'شوف تقدمك', 'عرض تقدمي', 'اعرض تقدمي',
+    'معلوماتي', 'معلوماتك', 'بياناتي', 'بياناتك'
+]
+
+# كلمات مفتاحية تدل على أن المستخدم يريد معرفة معلومات المجموعة (بدون اللاعبين)
+GROUP_TRIGGERS = [
+    'كم اعضاء', 'كم عضو', 'عدد الاعضاء', 'عدد الأعضاء', 'اعضاء المجموعة', 'أعضاء المجموعة',
+    'احصائيات المجموعة', 'إحصائيات المجموعة', 'معلومات المجموعة', 'تفاصيل المجموعة',
+    'حالة المجموعة', 'تقرير المجموعة', 'الطاقم الاداري', 'الطاقم الإداري', 'الادارة', 'الإدارة',
+    'المدراء', 'الاسياد', 'الأسياد', 'المالكين', 'المنشئين', 'الادمنية', 'الإدمنية',
+    'كم مسجل', 'المسجلين', 'الثروة الاجمالية', 'الثروة الإجمالية', 'كم قلعة', 'عدد القلاع',
+    'المزارعين', 'النشاط', 'آخر نشاط', 'أخر نشاط', 'جدد المجموعة', 'الاعضاء الجدد',
+    'معدل التسجيل', 'نسبة المسجلين', 'المجموعة فيها كم', 'كم واحد في المجموعة',
+    'معرف المجموعة', 'اسم المجموعة', 'نوع المجموعة', 'رابط المجموعة',
+    'جميع الاعضاء مسجلين', 'جميع الأعضاء مسجلين', 'هل جميع', 'كلهم مسجلين', 'حساب بنكي',
+    'مسجلين بالبنك', 'مسجلين في البنك', 'بحساب بنكي', 'لديهم حساب', 'عندهم حساب'
+]
+
+# كلمات مفتاحية خاصة باللاعبين فقط
+PLAYERS_TRIGGERS = [
+    'اللاعبين المسجلين', 'اللاعبين المسجلون', 'جميع اللاعبين', 'كل اللاعبين', 'الاعبين',
+    'اذكر لي اللاعبين', 'اذكر اللاعبين', 'قائمة اللاعبين', 'قائمة الاعبين', 'المسجلين في النظام',
+    'من هم اللاعبين', 'من هم الاعبين', 'اللاعبين في النظام', 'الاعبين في النظام'
+]
+
+# المستخدمون المميزون الذين يحصلون على توجيه خاص في الرد
+SPECIAL_USER_IDS = {8278493069, 6629947448, 7155814194, 6524680126}
+
+# مدة تخزين أجزاء سياق الذكاء الاصطناعي (ثواني)
+GROUP_HEADER_TTL = 300
+USER_NAMES_TTL = 300
+SHARED_CONTEXT_TTL = 30
+PLAYER_DATA_TTL = 30
+GROUP_DATA_TTL = 120
+PLAYERS_LIST_TTL = 300
+
+
 class RealYukiAI:
     """نظام الذكاء الاصطناعي الحقيقي لبوت يوكي"""
     
     def __init__(self):
         self.gemini_client = None
-        self.current_key_index = 0
-        self.exhausted_keys: Dict[int, date] = {}
-        self.last_reset_date = date.today()
         self.setup_gemini()
         
         # النصوص الأساسية لتوجيه الذكاء الاصطناعي  
@@ -67,104 +119,46 @@ class RealYukiAI:
         ]
     
     def setup_gemini(self):
-        """إعداد Google Gemini مع نظام إدارة المفاتيح المتقدم"""
+        """إعداد Google Gemini عبر البوابة المشتركة (المفاتيح وحصصها مشتركة بين الأنظمة)"""
         try:
             if not GEMINI_AVAILABLE:
                 logging.error("Google Gemini SDK not available")
                 return
-                
-            from utils.api_loader import api_loader
-            self.api_loader = api_loader
-            all_keys = self.api_loader.get_all_ai_keys()
-            
-            if not all_keys:
-                logging.error("❌ لم يتم العثور على مفاتيح Gemini API")
-                return
             
-            # إعادة تعيين قائمة المفاتيح المستنزفة في يوم جديد
-            self._reset_daily_exhausted_keys()
+            if gemini_gateway.keys.select() is None and gemini_gateway.keys.total:
+                logging.warning("⚠️ جميع المفاتيح مستنزفة لليوم - سيتم المحاولة بالمفتاح الحالي")
+            self.gemini_client = gemini_gateway.keys.client()
             
-            # اختيار أفضل مفتاح متوفر
-            best_key_index = self._get_best_available_key(all_keys)
-            
-            if best_key_index is not None:
-                self.current_key_index = best_key_index
-                current_key = all_keys[self.current_key_index]
-                self.gemini_client = genai.Client(api_key=current_key)
-                
-                exhausted_count = len(self.exhausted_keys)
-                available_count = len(all_keys) - exhausted_count
-                logging.info(f"✅ تم تهيئة Gemini للذكاء الحقيقي - المفتاح {self.current_key_index + 1}/{len(all_keys)} (متوفر: {available_count}, مستنزف: {exhausted_count})")
-            else:
-                logging.warning("⚠️ جميع المفاتيح مستنزفة لليوم - سيتم المحاولة بالمفتاح الأول")
-                self.current_key_index = 0
-                current_key = all_keys[0]
-                self.gemini_client = genai.Client(api_key=current_key)
+            if self.gemini_client:
+                keys = gemini_gateway.keys
+                logging.info(f"✅ تم تهيئة Gemini للذكاء الحقيقي - المفتاح {keys.current_index + 1}/{keys.total} (متوفر: {keys.available_count()}, مستنزف: {len(keys.exhausted)})")
             
         except Exception as e:
             logging.error(f"خطأ في إعداد Gemini: {e}")
             self.gemini_client = None
     
-    def _reset_daily_exhausted_keys(self):
-        """إعادة تعيين قائمة المفاتيح المستنزفة في يوم جديد"""
-        today = date.today()
-        if today != self.last_reset_date:
-            logging.info(f"🔄 يوم جديد ({today}) - إعادة تعيين قائمة المفاتيح المستنزفة لنظام الذكاء الحقيقي")
-            self.exhausted_keys.clear()
-            self.last_reset_date = today
+    @property
+    def current_key_index(self) -> int:
+        return gemini_gateway.keys.current_index
     
-    def _get_best_available_key(self, all_keys: List[str]) -> Optional[int]:
-        """اختيار أفضل مفتاح متوفر (غير مستنزف)"""
-        available_keys = []
-        for i in range(len(all_keys)):
-            if i not in self.exhausted_keys:
-                available_keys.append(i)
-        
-        if available_keys:
-            return available_keys[0]  # أول مفتاح متوفر
-        return None  # جميع المفاتيح مستنزفة
+    @property
+    def exhausted_keys(self) -> Dict[int, date]:
+        return gemini_gateway.keys.exhausted
     
     def switch_to_next_key(self) -> bool:
         """التبديل للمفتاح التالي المتوفر (غير المستنزف)"""
-        try:
-            all_keys = self.api_loader.get_all_ai_keys()
-            
-            # تسجيل المفتاح الحالي كمستنزف
-            self._mark_key_exhausted(self.current_key_index)
-            
-            # البحث عن أفضل مفتاح متوفر
-            best_key_index = self._get_best_available_key(all_keys)
-            
-            if best_key_index is not None:
-                self.current_key_index = best_key_index
-                current_key = all_keys[self.current_key_index]
-                self.gemini_client = genai.Client(api_key=current_key)
-                
-                exhausted_count = len(self.exhausted_keys)
-                available_count = len(all_keys) - exhausted_count
-                logging.info(f"🔄 تم التبديل للمفتاح {self.current_key_index + 1}/{len(all_keys)} في النظام الذكي (متوفر: {available_count}, مستنزف: {exhausted_count})")
-                return True
-            else:
-                logging.warning("⚠️ تم استنزاف جميع مفاتيح الذكاء الحقيقي المتاحة لليوم")
-                return False
-                
-        except Exception as e:
-            logging.error(f"❌ خطأ في تبديل المفتاح: {e}")
-            return False
-    
-    def _mark_key_exhausted(self, key_index: int):
-        """تسجيل مفتاح كمستنزف لليوم"""
-        self.exhausted_keys[key_index] = date.today()
-        logging.warning(f"🚫 تم تسجيل المفتاح {key_index + 1} للذكاء الحقيقي كمستنزف لليوم")
+        switched = gemini_gateway.keys.switch_to_next_key()
+        if switched:
+            self.gemini_client = gemini_gateway.keys.client()
+        return switched
     
     def handle_quota_exceeded(self, error_message: str) -> bool:
-        """معالجة خطأ استنزاف الحصة والتبديل للمفتاح التالي"""
-        error_str = str(error_message)
-        # معالجة أخطاء الحصة وزحمة الخدمة
-        if any(code in error_str for code in ["429", "503", "RESOURCE_EXHAUSTED", "UNAVAILABLE", "overloaded"]):
-            logging.warning(f"⚠️ مشكلة في خدمة الذكاء الحقيقي: {error_str[:100]}... محاولة التبديل للمفتاح التالي")
-            return self.switch_to_next_key()
-        return False
+        """هل تبقى مفتاح متاح بعد خطأ حصة أو زحمة (البوابة بدّلت المفتاح تلقائياً)"""
+        from modules.gemini_gateway import classify_error
+        if classify_error(error_message) is None:
+            return False
+        logging.warning(f"⚠️ مشكلة في خدمة الذكاء الحقيقي: {str(error_message)[:100]}...")
+        return gemini_gateway.keys.available_count() > 0
     
     async def get_comprehensive_player_data(self, requester_user_id: int, target_user_id: int, chat_id: Optional[int] = None) -> str:
         """جمع معلومات اللاعب الشاملة مع ضوابط أمنية متدرجة"""
@@ -1126,47 +1120,28 @@ class RealYukiAI:
             # تحضير السياق والرسالة
             arabic_name = self.convert_name_to_arabic(user_name)
             
-            # جلب المحادثات السابقة للسياق - نسخة SQLite محسنة مع سياق المجموعة
-            conversation_context = ""
-            group_context = ""
+            # ذاكرة الردود للأسئلة المتكررة - قبل بناء السياق واستدعاء Gemini
+            cache_fingerprint = self._response_cache_fingerprint(user_message, user_id, chat_id)
+            if cache_fingerprint:
+                cached_response = ai_response_cache.get(user_message, cache_fingerprint, arabic_name)
+                if cached_response:
+                    await self._remember_conversation(user_id, chat_id, arabic_name, user_message, cached_response)
+                    return cached_response
             
-            if user_id:
-                from modules.conversation_memory_sqlite import conversation_memory_sqlite
-                history = await conversation_memory_sqlite.get_conversation_history(user_id, limit=15, chat_id=chat_id)
-                if history:
-                    conversation_context = f"\n\n{conversation_memory_sqlite.format_conversation_context(history)}\n"
+            # جلب مصادر السياق بالتوازي مع ذاكرة الأجزاء ثم قصها ضمن ميزانية الرموز
+            context = await self._build_prompt_context(user_message, user_id, chat_id, bot)
+            conversation_context = context['history']
+            group_context = context['group']
             
-            # إضافة سياق المجموعة الحالية
-            if chat_id and bot:
-                try:
-                    chat = await bot.get_chat(chat_id)
-                    group_name = chat.title or "مجموعة غير معروفة"
-                    
-                    # معلومات المجموعة
-                    from config.hierarchy import get_group_admins
-                    group_admins = get_group_admins(chat_id)
-                    owners_count = len(group_admins.get('owners', []))
-                    moderators_count = len(group_admins.get('moderators', []))
-                    
-                    group_context = f"\n🏘️ **سياق المجموعة الحالية:**\n"
-                    group_context += f"📋 اسم المجموعة: {group_name}\n"
-                    group_context += f"👑 المالكون: {owners_count}\n" 
-                    group_context += f"🛡 المشرفون: {moderators_count}\n"
-                    group_context += f"🆔 معرف المجموعة: {chat_id}\n"
-                    
-                    # إضافة معلومات إذا المستخدم كان في مجموعة أخرى من قبل
-                    if conversation_context and "📨 في المحادثة:" in conversation_context:
-                        group_context += f"\n💡 ملاحظة: {user_name} كان يتكلم معي في محادثات أخرى من قبل.\n"
-                        
-                except Exception as e:
-                    logging.error(f"خطأ في جلب سياق المجموعة: {e}")
-                    group_context = f"\n🏘️ **المجموعة الحالية:** معرف {chat_id}\n"
+            # إضافة معلومات إذا المستخدم كان في مجموعة أخرى من قبل
+            if group_context and conversation_context and "📨 في المحادثة:" in conversation_context:
+                group_context += f"\n💡 ملاحظة: {user_name} كان يتكلم معي في محادثات أخرى من قبل.\n"
             
             # معاملة خاصة للمستخدمين المميزين
             special_prompt = ""
             
             # تحسين تذكر الأشخاص - يوكي يتذكر أي شخص تكلم معه من قبل
-            if user_id and conversation_context:
+            if user_id and context['has_history']:
                 # إذا كان هناك تاريخ محادثات، يوكي يتذكر هذا الشخص
                 special_prompt = f" أتذكر {user_name} من محادثاتنا السابقة. تحدث معه بألفة كصديق قديم."
             
@@ -1180,70 +1155,10 @@ class RealYukiAI:
             elif user_id == 6524680126:
                 special_prompt = f" {user_name} صديقك الذكي القديم، رحب به كصديق مقرب."
             
-            # جلب السياق من الذاكرة المشتركة فقط عند الحاجة الفعلية
-            shared_context = ""
+            # إضافة سياق المستخدمين المميزين مع فحص مباشر
             if user_id and chat_id:
                 try:
                     from modules.shared_memory_sqlite import shared_group_memory_sqlite
-                    
-                    # فحص إذا كان السؤال يتطلب البحث في الذاكرة المشتركة بدقة أكثر
-                    memory_triggers = [
-                        'ماذا تعرف عن', 'ماذا كنتم تتحدثون', 'تحدثتم عني', 'قال عني',
-                        'من هو', 'من هي', 'ماذا قال', 'ماذا قالت', 'آخر مرة', 'أخر مرة',
-                        'تتذكر', 'هل تذكر', 'تعرف', 'تعرفه', 'تعرفها', 'محادثة', 'كلام',
-                        'حكى عن', 'ذكر', 'قال عن', 'تحدث عن', 'أخبرني عن'
-                    ]
-                    
-                    # جلب الذاكرة المشتركة فقط إذا كان السؤال فعلاً يحتاجها
-                    needs_memory = any(trigger in user_message.lower() for trigger in memory_triggers)
-                    
-                    # البحث عن جميع المستخدمين في الذاكرة (ليس فقط المميزين)
-                    # يوكي يتذكر أي شخص تكلم معه من قبل
-                    target_user_id = None
-                    # تحسين: البحث عن أي مستخدم في الذاكرة، وليس فقط المميزين
-                    if needs_memory:
-                        # البحث عن اسم المستخدم المذكور في الرسالة
-                        from database.operations import execute_query
-                        try:
-                            # البحث عن مستخدمين بأسمائهم المذكورة في الرسالة
-                            users_query = "SELECT user_id, first_name FROM users WHERE first_name IS NOT NULL"
-                            users = await execute_query(users_query, fetch_all=True)
-                            
-                            for user in users:
-                                user_first_name = user.get('first_name', '').lower()
-                                if user_first_name and user_first_name in user_message.lower():
-                                    target_user_id = user.get('user_id')
-                                    break
-                                    
-                        except Exception as search_error:
-                            logging.warning(f"خطأ في البحث عن المستخدم: {search_error}")
-                            
-                        # إذا لم نجد مستخدم محدد، استخدم المستخدم الحالي
-                        if not target_user_id:
-                            target_user_id = user_id
-                    
-                    if any(phrase in user_message.lower() for phrase in memory_triggers) or target_user_id:
-                        # استخدام chat_id الصحيح للمحادثة الحالية
-                        search_chat_id = chat_id if chat_id else -1002549788763
-                        
-                        if target_user_id:
-                            # البحث عن محادثات مستخدم محدد
-                            shared_context = await shared_group_memory_sqlite.get_shared_context_about_user(
-                                search_chat_id,
-                                target_user_id,
-                                user_id,
-                                limit=10
-                            )
-                        else:
-                            # البحث العام في الذاكرة المشتركة
-                            shared_context = await shared_group_memory_sqlite.get_shared_context_about_user(
-                                search_chat_id,
-                                user_id,
-                                user_id,
-                                limit=5
-                            )
-                    
-                    # إضافة سياق المستخدمين المميزين مع فحص مباشر
                     special_user_context = shared_group_memory_sqlite.get_special_user_context(user_id)
                     if special_user_context:
                         special_prompt += f" {special_user_context}"
@@ -1257,86 +1172,22 @@ class RealYukiAI:
                             special_prompt += " أنت تتحدث مع الشيخ حلال المشاكل وكاتب العقود. سماته: يحل مشاكل المجموعة، يكتب عقود الزواج، الحكيم. "
                         elif user_id == 6629947448:  # غيو
                             special_prompt += " أنت تتحدث مع غيو الأسطورة. سماته: محترف الألعاب، خبير التقنية، صاحب الحماس. "
-                    
                 except Exception as memory_error:
-                    logging.warning(f"خطأ في جلب الذاكرة المشتركة: {memory_error}")
-            
-            # جلب معلومات اللاعب إذا كان السؤال متعلق بالتقدم أو الإحصائيات
-            player_data_context = ""
-            if user_id:
-                # كلمات مفتاحية تدل على أن المستخدم يريد معرفة تقدمه
-                progress_triggers = [
-                    'تقدمي', 'تقدمك', 'احصائياتي', 'إحصائياتي', 'احصائياتك', 'إحصائياتك',
-                    'مستواي', 'مستواك', 'رصيدي', 'رصيدك', 'فلوسي', 'فلوسك',
-                    'قلعتي', 'قلعتك', 'مزرعتي', 'مزرعتك', 'اسهمي', 'أسهمي', 'أسهمك',
-                    'استثماراتي', 'استثماراتك', 'محفظتي', 'محفظتك', 'ترتيبي', 'ترتيبك',
-                    'نقاطي', 'نقاطك', 'كم عندي', 'كم عندك', 'وين وصلت', 'أين وصلت',
-                    'شو عندي', 'ماذا عندي', 'ايش عندي', 'كيف تقدمي', 'كيف تقدمك',
-                    'شوف تقدمي', 'شوف تقدمك', 'عرض تقدمي', 'اعرض تقدمي',
-                    'معلوماتي', 'معلوماتك', 'بياناتي', 'بياناتك'
-                ]
-                
-                if any(trigger in user_message.lower() for trigger in progress_triggers):
-                    try:
-                        player_data_context = await self.get_comprehensive_player_data(user_id, user_id, chat_id)
-                        logging.info(f"✅ تم جلب معلومات اللاعب للذكاء الاصطناعي للمستخدم {user_id}")
-                    except Exception as player_error:
-                        logging.error(f"خطأ في جلب معلومات اللاعب: {player_error}")
-            
-            # جلب معلومات المجموعة إذا كان السؤال متعلق بها
-            group_data_context = ""
-            if chat_id and bot:
-                # كلمات مفتاحية تدل على أن المستخدم يريد معرفة معلومات المجموعة (بدون اللاعبين)
-                group_triggers = [
-                    'كم اعضاء', 'كم عضو', 'عدد الاعضاء', 'عدد الأعضاء', 'اعضاء المجموعة', 'أعضاء المجموعة',
-                    'احصائيات المجموعة', 'إحصائيات المجموعة', 'معلومات المجموعة', 'تفاصيل المجموعة',
-                    'حالة المجموعة', 'تقرير المجموعة', 'الطاقم الاداري', 'الطاقم الإداري', 'الادارة', 'الإدارة',
-                    'المدراء', 'الاسياد', 'الأسياد', 'المالكين', 'المنشئين', 'الادمنية', 'الإدمنية',
-                    'كم مسجل', 'المسجلين', 'الثروة الاجمالية', 'الثروة الإجمالية', 'كم قلعة', 'عدد القلاع',
-                    'المزارعين', 'النشاط', 'آخر نشاط', 'أخر نشاط', 'جدد المجموعة', 'الاعضاء الجدد',
-                    'معدل التسجيل', 'نسبة المسجلين', 'المجموعة فيها كم', 'كم واحد في المجموعة',
-                    'معرف المجموعة', 'اسم المجموعة', 'نوع المجموعة', 'رابط المجموعة',
-                    'جميع الاعضاء مسجلين', 'جميع الأعضاء مسجلين', 'هل جميع', 'كلهم مسجلين', 'حساب بنكي',
-                    'مسجلين بالبنك', 'مسجلين في البنك', 'بحساب بنكي', 'لديهم حساب', 'عندهم حساب'
-                ]
-                
-                if any(trigger in user_message.lower() for trigger in group_triggers):
-                    try:
-                        group_data_context = await self.get_comprehensive_group_data(chat_id, bot)
-                        logging.info(f"✅ تم جلب معلومات المجموعة للذكاء الاصطناعي للمجموعة {chat_id}")
-                    except Exception as group_error:
-                        logging.error(f"خطأ في جلب معلومات المجموعة: {group_error}")
-            
-            # جلب قائمة جميع اللاعبين المسجلين إذا كان السؤال متعلق باللاعبين تحديداً
-            all_players_context = ""
-            if chat_id:
-                # كلمات مفتاحية خاصة باللاعبين فقط
-                players_specific_triggers = [
-                    'اللاعبين المسجلين', 'اللاعبين المسجلون', 'جميع اللاعبين', 'كل اللاعبين', 'الاعبين',
-                    'اذكر لي اللاعبين', 'اذكر اللاعبين', 'قائمة اللاعبين', 'قائمة الاعبين', 'المسجلين في النظام',
-                    'من هم اللاعبين', 'من هم الاعبين', 'اللاعبين في النظام', 'الاعبين في النظام'
-                ]
-                
-                if any(trigger in user_message.lower() for trigger in players_specific_triggers):
-                    try:
-                        all_players_context = await self.get_all_registered_players()
-                        logging.info(f"✅ تم جلب قائمة جميع اللاعبين للذكاء الاصطناعي")
-                    except Exception as players_error:
-                        logging.error(f"خطأ في جلب قائمة اللاعبين: {players_error}")
+                    logging.warning(f"خطأ في جلب سياق المستخدم المميز: {memory_error}")
             
             # دمج جميع السياقات
             full_context = conversation_context
-            if shared_context:
-                full_context += f"\n\nالسياق المشترك:\n{shared_context}\n"
+            if context['shared']:
+                full_context += f"\n\nالسياق المشترك:\n{context['shared']}\n"
             
-            if player_data_context:
-                full_context += f"\n\n{player_data_context}\n"
+            if context['player']:
+                full_context += f"\n\n{context['player']}\n"
             
-            if group_data_context:
-                full_context += f"\n\n{group_data_context}\n"
+            if context['group_data']:
+                full_context += f"\n\n{context['group_data']}\n"
             
-            if all_players_context:
-                full_context += f"\n\n{all_players_context}\n"
+            if context['players']:
+                full_context += f"\n\n{context['players']}\n"
             
             # إنشاء prompt محسن مع سياق المجموعة والتفريق بين المجموعات
             full_prompt = f"""{self.system_prompt}{special_prompt}
@@ -1361,13 +1212,14 @@ class RealYukiAI:
             while response is None and retry_count < max_retries:
                 if genai and self.gemini_client:
                     try:
-                        response = self.gemini_client.models.generate_content(
+                        response = await gemini_gateway.generate_content(
                             model="gemini-2.5-flash",
                             contents=full_prompt,
                             config=genai.types.GenerateContentConfig(
                                 temperature=0.7,
                                 max_output_tokens=2000
-                            )
+                            ),
+                            chat_id=chat_id
                         )
                         logging.info(f"✅ تم إرسال الطلب لـ Gemini بنجاح (محاولة {retry_count + 1})")
                     except Exception as gemini_error:
@@ -1384,10 +1236,12 @@ class RealYukiAI:
             
             # التحقق من وجود الرد بعدة طرق مع تسجيل مفصل
             ai_response = None
+            model_answered = False
             
             # طريقة 1: التحقق من response.text المباشر
             if response and response.text:
                 ai_response = response.text.strip()
+                model_answered = True
                 logging.info(f"✅ تم الحصول على رد مباشر من response.text")
             # طريقة 2: التحقق من candidates
             elif response and response.candidates and len(response.candidates) > 0:
@@ -1397,6 +1251,7 @@ class RealYukiAI:
                     part_text = candidate.content.parts[0].text
                     if part_text:
                         ai_response = part_text.strip()
+                        model_answered = True
                         logging.info(f"✅ تم الحصول على رد من candidate.content.parts")
                 else:
                     logging.warning(f"⚠️ لا يوجد محتوى في candidate.content.parts")
@@ -1410,6 +1265,10 @@ class RealYukiAI:
                 if len(ai_response) > 3000:
                     ai_response = ai_response[:2800] + "..."
                 
+                # تخزين رد النموذج (بدون الاقتراحات العشوائية) للأسئلة المتكررة
+                if cache_fingerprint and model_answered:
+                    ai_response_cache.put(user_message, cache_fingerprint, ai_response, arabic_name)
+                
                 # إضافة اقتراحات بسيطة أحياناً فقط عند المناسبة
                 if random.random() < 0.05:  # 5% احتمال فقط
                     extras = [
@@ -1420,25 +1279,7 @@ class RealYukiAI:
                     ai_response += random.choice(extras)
                 
                 # حفظ المحادثة في الذاكرة الفردية والمشتركة - نسخة SQLite محسنة
-                if user_id:
-                    try:
-                        # استخدام نظام الذاكرة SQLite المحسن
-                        from modules.conversation_memory_sqlite import conversation_memory_sqlite
-                        await conversation_memory_sqlite.save_conversation(user_id, user_message, ai_response, chat_id)
-                        
-                        # حفظ في الذاكرة المشتركة أيضاً
-                        from modules.shared_memory_sqlite import shared_group_memory_sqlite
-                        save_chat_id = chat_id if chat_id else -1002549788763  # استخدام chat_id الصحيح
-                        await shared_group_memory_sqlite.save_shared_conversation(
-                            save_chat_id,
-                            user_id,
-                            arabic_name,
-                            user_message,
-                            ai_response
-                        )
-                        logging.info(f"✅ تم حفظ المحادثة بنجاح للمستخدم {user_id} في الذاكرة SQLite")
-                    except Exception as memory_error:
-                        logging.error(f"خطأ في حفظ المحادثة: {memory_error}")
+                await self._remember_conversation(user_id, chat_id, arabic_name, user_message, ai_response)
                 
                 return ai_response
             else:
@@ -1452,6 +1293,147 @@ class RealYukiAI:
         logging.warning(f"لم يتم العثور على رد صالح من Gemini للمستخدم {user_name}")
         return self.get_fallback_response(user_name)
     
+    async def _build_prompt_context(self, user_message: str, user_id: Optional[int],
+                                    chat_id: Optional[int], bot) -> Dict[str, Any]:
+        """جلب مصادر السياق بالتوازي (مع تخزين الأجزاء) وقصها ضمن ميزانية الرموز"""
+        from modules.prompt_context import prompt_context_builder, ContextSection
+        text = user_message.lower()
+        sources = {}
+        
+        # تاريخ المحادثة (مخزن داخل ذاكرة المحادثات نفسها)
+        if user_id:
+            from modules.conversation_memory_sqlite import conversation_memory_sqlite
+            
+            async def load_history():
+                return await conversation_memory_sqlite.get_conversation_history(user_id, limit=15, chat_id=chat_id)
+            sources['history'] = (load_history, None, 0, [])
+        
+        # رأس سياق المجموعة الحالية (الاسم وعدد المالكين والمشرفين)
+        if chat_id and bot:
+            async def load_group_header():
+                chat = await bot.get_chat(chat_id)
+                group_name = chat.title or "مجموعة غير معروفة"
+                
+                from config.hierarchy import get_group_admins
+                group_admins = get_group_admins(chat_id)
+                owners_count = len(group_admins.get('owners', []))
+                moderators_count = len(group_admins.get('moderators', []))
+                
+                group_context = f"\n🏘️ **سياق المجموعة الحالية:**\n"
+                group_context += f"📋 اسم المجموعة: {group_name}\n"
+                group_context += f"👑 المالكون: {owners_count}\n" 
+                group_context += f"🛡 المشرفون: {moderators_count}\n"
+                group_context += f"🆔 معرف المجموعة: {chat_id}\n"
+                return group_context
+            sources['group'] = (load_group_header, chat_id, GROUP_HEADER_TTL,
+                                f"\n🏘️ **المجموعة الحالية:** معرف {chat_id}\n")
+        
+        # الذاكرة المشتركة فقط عند الحاجة الفعلية
+        if user_id and chat_id and any(trigger in text for trigger in MEMORY_TRIGGERS):
+            async def load_shared():
+                from modules.shared_memory_sqlite import shared_group_memory_sqlite
+                
+                # البحث عن اسم المستخدم المذكور في الرسالة (قائمة الأسماء مخزنة)
+                users = await prompt_context_builder.fetch('user_names', self._load_user_names, 'all', USER_NAMES_TTL, [])
+                target_user_id = user_id
+                for name, name_user_id in users:
+                    if name in text:
+                        target_user_id = name_user_id
+                        break
+                
+                async def load_about_target():
+                    return await shared_group_memory_sqlite.get_shared_context_about_user(
+                        chat_id, target_user_id, user_id, limit=10
+                    )
+                return await prompt_context_builder.fetch(
+                    'shared', load_about_target, (chat_id, target_user_id), SHARED_CONTEXT_TTL, ""
+                )
+            sources['shared'] = (load_shared, None, 0, "")
+        
+        # معلومات اللاعب إذا كان السؤال متعلق بالتقدم أو الإحصائيات
+        if user_id and any(trigger in text for trigger in PROGRESS_TRIGGERS):
+            async def load_player():
+                return await self.get_comprehensive_player_data(user_id, user_id, chat_id)
+            sources['player'] = (load_player, (user_id, chat_id), PLAYER_DATA_TTL, "")
+        
+        # معلومات المجموعة إذا كان السؤال متعلق بها
+        if chat_id and bot and any(trigger in text for trigger in GROUP_TRIGGERS):
+            async def load_group_data():
+                return await self.get_comprehensive_group_data(user_id, chat_id, bot)
+            sources['group_data'] = (load_group_data, (chat_id, user_id), GROUP_DATA_TTL, "")
+        
+        # قائمة جميع اللاعبين المسجلين إذا كان السؤال متعلق باللاعبين تحديداً
+        if chat_id and any(trigger in text for trigger in PLAYERS_TRIGGERS):
+            sources['players'] = (self.get_all_registered_players, 'all', PLAYERS_LIST_TTL, "")
+        
+        results = await prompt_context_builder.gather(sources)
+        
+        history = results.get('history') or []
+        history_text = ""
+        if history:
+            from modules.conversation_memory_sqlite import conversation_memory_sqlite
+            history_text = f"\n\n{conversation_memory_sqlite.format_conversation_context(history)}\n"
+        
+        # الأولوية الأقل تُقص أولاً، وتاريخ المحادثة يحتفظ بالأحدث
+        context = prompt_context_builder.assemble([
+            ContextSection('players', results.get('players', ""), priority=1),
+            ContextSection('group_data', results.get('group_data', ""), priority=2),
+            ContextSection('shared', results.get('shared', ""), priority=3),
+            ContextSection('history', history_text, priority=4, keep_tail=True),
+            ContextSection('player', results.get('player', ""), priority=5),
+            ContextSection('group', results.get('group', ""), priority=6),
+        ])
+        context['has_history'] = bool(history)
+        return context
+    
+    async def _load_user_names(self) -> List[tuple]:
+        """أسماء المستخدمين المسجلين (بحروف صغيرة) للبحث عن الشخص المذكور في السؤال"""
+        from database.operations import execute_query
+        users = await execute_query(
+            "SELECT user_id, first_name FROM users WHERE first_name IS NOT NULL", fetch_all=True
+        )
+        return [(user['first_name'].lower(), user['user_id']) for user in users or [] if user.get('first_name')]
+    
+    def _response_cache_fingerprint(self, user_message: str, user_id: Optional[int], chat_id: Optional[int]) -> Optional[str]:
+        """بصمة ذاكرة الردود، أو None إذا كان السؤال يعتمد على بيانات متغيرة أو شخصية"""
+        text = user_message.lower()
+        if len(text) > MAX_CACHEABLE_LENGTH or "📨" in text:
+            return None
+        for triggers in (MEMORY_TRIGGERS, PROGRESS_TRIGGERS, GROUP_TRIGGERS, PLAYERS_TRIGGERS):
+            if any(trigger in text for trigger in triggers):
+                return None
+        
+        if user_id in SPECIAL_USER_IDS:
+            tier = f"special_{user_id}"
+        else:
+            from config.hierarchy import MASTERS
+            tier = "master" if user_id in MASTERS else "member"
+        return ai_response_cache.fingerprint(chat_id, tier)
+    
+    async def _remember_conversation(self, user_id: Optional[int], chat_id: Optional[int], arabic_name: str,
+                                     user_message: str, ai_response: str):
+        """حفظ المحادثة في الذاكرة الفردية والمشتركة"""
+        if not user_id:
+            return
+        try:
+            # استخدام نظام الذاكرة SQLite المحسن
+            from modules.conversation_memory_sqlite import conversation_memory_sqlite
+            await conversation_memory_sqlite.save_conversation(user_id, user_message, ai_response, chat_id)
+            
+            # حفظ في الذاكرة المشتركة أيضاً
+            from modules.shared_memory_sqlite import shared_group_memory_sqlite
+            save_chat_id = chat_id if chat_id else -1002549788763  # استخدام chat_id الصحيح
+            await shared_group_memory_sqlite.save_shared_conversation(
+                save_chat_id,
+                user_id,
+                arabic_name,
+                user_message,
+                ai_response
+            )
+            logging.info(f"✅ تم حفظ المحادثة بنجاح للمستخدم {user_id} في الذاكرة SQLite")
+        except Exception as memory_error:
+            logging.error(f"خطأ في حفظ المحادثة: {memory_error}")
+    
     def convert_name_to_arabic(self, name: str) -> str:
         """تحويل الأسماء الإنجليزية الشائعة إلى عربية مع التعامل مع الأسماء الغريبة"""
         english_to_arabic = {
@@ -10,6 +10,8 @@ from typing import Dict, List, Optional
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
+from modules.outbound_queue import send_priority, PRIORITY_BACKGROUND
+from modules.scheduler import scheduler
 from datetime import datetime, timedelta
 
 # حالات اللعبة
@@ -83,8 +85,9 @@ async def start_royal_game(message: Message):
         
         game_data['message_id'] = game_message.message_id
         
-        # بدء العداد التنازلي
-        asyncio.create_task(royal_registration_countdown(message.bot, group_id, game_message))
+        # بدء العداد التنازلي (رسائله في مسار الأولوية المنخفضة لطابور الإرسال)
+        with send_priority(PRIORITY_BACKGROUND):
+            _schedule_royal(group_id, 60, royal_registration_countdown, message.bot, group_id, game_message.message_id, 2)
         
         logging.info(f"تم بدء لعبة رويال في المجموعة {group_id}")
         
@@ -92,47 +95,79 @@ async def start_royal_game(message: Message):
         logging.error(f"خطأ في بدء لعبة الرويال: {e}")
         await message.reply("❌ حدث خطأ أثناء بدء اللعبة")
 
-async def royal_registration_countdown(bot, group_id: int, game_message: Message):
-    """العداد التنازلي لفترة التسجيل"""
+def _royal_payload(group_id: int) -> Dict:
+    """بيانات استرداد الرويال: إرجاع المبالغ المدفوعة إذا أُعيد تشغيل البوت"""
+    game_data = ACTIVE_ROYAL_GAMES.get(group_id, {})
+    return {
+        'chat_id': group_id,
+        'message_id': game_data.get('message_id'),
+        'paid_players': sorted(game_data.get('confirmed_players', ())),
+        'fee': 1000000
+    }
+
+
+def _schedule_royal(group_id: int, delay: float, callback, *args):
+    """جدولة المرحلة التالية للرويال (مفتاح واحد لكل مجموعة)"""
+    scheduler.call_later(f"royal:{group_id}", delay, callback, *args,
+                         kind="royal", payload=_royal_payload(group_id))
+
+
+async def recover_royal_game(bot, payload: Dict):
+    """إرجاع رسوم الرويال لمن دفع إذا توقفت اللعبة بإعادة التشغيل"""
+    from database import ledger
+    for player_id in payload.get('paid_players', []):
+        # إضافة ذرية مع سجل المعاملة (بدلاً من قراءة الرصيد ثم كتابته)
+        result = await ledger.credit(player_id, payload['fee'], "refund", "استرداد رسوم لعبة الرويال")
+        if not result:
+            logging.error(f"فشل استرداد رسوم الرويال للاعب {player_id}: {result.reason}")
+    
+    await bot.send_message(
+        payload['chat_id'],
+        "🏆 **لعبة الرويال ملغية**\n\n"
+        "⚠️ توقفت اللعبة بسبب إعادة تشغيل البوت\n"
+        f"💰 تم إرجاع الأموال لـ {len(payload.get('paid_players', []))} لاعب دفعوا الرسوم"
+    )
+
+
+scheduler.register_recovery("royal", recover_royal_game)
+
+
+async def royal_registration_countdown(bot, group_id: int, message_id: int, remaining_minutes: int):
+    """العداد التنازلي لفترة التسجيل (دقيقة لكل استدعاء عبر المجدول)"""
     try:
-        # انتظار 3 دقائق (180 ثانية)
-        for remaining_minutes in [2, 1]:
-            await asyncio.sleep(60)  # انتظار دقيقة
-            
-            if group_id not in ACTIVE_ROYAL_GAMES:
-                return  # اللعبة ملغية
-            
-            game_data = ACTIVE_ROYAL_GAMES[group_id]
-            players_count = len(game_data['players'])
-            players_list = "\n".join([f"• {player['name']}" for player in game_data['players']]) or "_لا يوجد لاعبين بعد..._"
-            
-            await bot.edit_message_text(
-                chat_id=group_id,
-                message_id=game_message.message_id,
-                text=(
-                    f"🏆 **لعبة الرويال الملكية**\n\n"
-                    f"🎮 **التسجيل مستمر للعبة الرويال!**\n"
-                    f"👤 **منشئ اللعبة:** {game_data['creator_name']}\n\n"
-                    f"💰 **رسوم الدخول:** 1,000,000$ لكل لاعب\n"
-                    f"👥 **عدد اللاعبين:** 5-20 لاعب\n"
-                    f"⏰ **الوقت المتبقي:** {remaining_minutes} دقيقة\n\n"
-                    f"📊 **اللاعبين المسجلين ({players_count}/20):**\n"
-                    f"{players_list}\n\n"
-                    f"🔥 **انقر الزر أدناه للانضمام!**"
-                ),
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=[[
-                    InlineKeyboardButton(text="🎯 انضمام للرويال", callback_data=f"royal_join_{group_id}")
-                ]])
-            )
-        
-        # انتظار الدقيقة الأخيرة
-        await asyncio.sleep(60)
-        
         if group_id not in ACTIVE_ROYAL_GAMES:
+            return  # اللعبة ملغية
+        
+        if remaining_minutes <= 0:
+            # انتهاء وقت التسجيل
+            await finalize_royal_registration(bot, group_id)
             return
         
-        # انتهاء وقت التسجيل
-        await finalize_royal_registration(bot, group_id)
+        game_data = ACTIVE_ROYAL_GAMES[group_id]
+        players_count = len(game_data['players'])
+        players_list = "\n".join([f"• {player['name']}" for player in game_data['players']]) or "_لا يوجد لاعبين بعد..._"
+        
+        # جدولة الدقيقة التالية قبل التعديل حتى لا يوقف خطأ التعديل العداد
+        _schedule_royal(group_id, 60, royal_registration_countdown, bot, group_id, message_id, remaining_minutes - 1)
+        
+        await bot.edit_message_text(
+            chat_id=group_id,
+            message_id=message_id,
+            text=(
+                f"🏆 **لعبة الرويال الملكية**\n\n"
+                f"🎮 **التسجيل مستمر للعبة الرويال!**\n"
+                f"👤 **منشئ اللعبة:** {game_data['creator_name']}\n\n"
+                f"💰 **رسوم الدخول:** 1,000,000$ لكل لاعب\n"
+                f"👥 **عدد اللاعبين:** 5-20 لاعب\n"
+                f"⏰ **الوقت المتبقي:** {remaining_minutes} دقيقة\n\n"
+                f"📊 **اللاعبين المسجلين ({players_count}/20):**\n"
+                f"{players_list}\n\n"
+                f"🔥 **انقر الزر أدناه للانضمام!**"
+            ),
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[[
+                InlineKeyboardButton(text="🎯 انضمام للرويال", callback_data=f"royal_join_{group_id}")
+            ]])
+        )
         
     except Exception as e:
         logging.error(f"خطأ في العداد التنازلي للرويال: {e}")
@@ -276,8 +311,7 @@ async def finalize_royal_registration(bot, group_id: int):
         logging.info(f"بدأت مرحلة التأكيد للعبة الرويال في المجموعة {group_id}")
         
         # انتظار التأكيد لمدة دقيقتين
-        await asyncio.sleep(120)
-        await start_royal_battle(bot, group_id)
+        _schedule_royal(group_id, 120, start_royal_battle, bot, group_id)
         
     except Exception as e:
         logging.error(f"خطأ في إنهاء التسجيل للرويال: {e}")
@@ -319,6 +353,9 @@ async def handle_royal_confirmation(callback_query: CallbackQuery):
         game_data['confirmed_players'].add(user_id)
         game_data['total_pot'] += 1000000
         
+        # حفظ قائمة الدافعين لإرجاع أموالهم إذا توقف البوت قبل المعركة
+        scheduler.update_payload(f"royal:{group_id}", _royal_payload(group_id))
+        
         confirmed_count = len(game_data['confirmed_players'])
         total_players = len(game_data['players'])
         
@@ -0,0 +1,373 @@
+"""
+المجدول المركزي للمؤقتات والمهام الدورية
+Central Timer Scheduler for Game Timeouts and Periodic Jobs
+
+كومة مواعيد واحدة بدلاً من مهام asyncio.sleep المتفرقة في الألعاب:
+- مقابض قابلة للإلغاء بمفتاح ثابت (الجدولة بنفس المفتاح تستبدل الموعد السابق)
+- مهام دورية تُعاد جدولتها بعد كل تنفيذ حتى تُلغى
+- حفظ المواعيد المعلقة التي تحمل بيانات استرداد في قاعدة البيانات، فإذا أُعيد
+  تشغيل البوت قبل موعدها يُستدعى معالج الاسترداد الخاص بنوعها (إرجاع الرسوم
+  أو إبلاغ المجموعة) بدلاً من ترك اللعبة معلقة
+- إحصائيات لعدد المهام والتأخير عن الموعد
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from database.connection_pool import db_pool
+
+# تأخير تجميع كتابات المواعيد المحفوظة (ثواني)
+PERSIST_DELAY = 0.5
+
+# نوع مؤقتات الألعاب العامة (الاسترداد = إبلاغ المجموعة بتوقف اللعبة)
+GAME_TIMEOUT_KIND = "game"
+
+RecoveryHandler = Callable[[Any, Dict[str, Any]], Awaitable[None]]
+
+
+class JobHandle:
+    """مقبض مهمة مجدولة"""
+
+    __slots__ = ('key', 'callback', 'args', 'due', 'interval', 'kind', 'payload',
+                 'context', 'cancelled', 'seq', 'scheduler')
+
+    def __init__(self, scheduler: "Scheduler", key: str, callback, args, due: float,
+                 interval: Optional[float], kind: Optional[str], payload: Optional[Dict[str, Any]], seq: int):
+        self.scheduler = scheduler
+        self.key = key
+        self.callback = callback
+        self.args = args
+        self.due = due
+        self.interval = interval
+        self.kind = kind
+        self.payload = payload
+        # سياق المُجدوِل (مثل أولوية طابور الإرسال) يُطبق عند التنفيذ
+        self.context = contextvars.copy_context()
+        self.cancelled = False
+        self.seq = seq
+
+    @property
+    def persistent(self) -> bool:
+        return self.kind is not None and self.payload is not None
+
+    def cancel(self) -> bool:
+        """إلغاء المهمة (True إذا كانت لا تزال مجدولة)"""
+        return self.scheduler.cancel(self.key, handle=self)
+
+
+class Scheduler:
+    """كومة مواعيد مركزية مع حفظ المواعيد واسترداد الألعاب بعد إعادة التشغيل"""
+
+    def __init__(self):
+        self._heap: List[tuple] = []
+        self._jobs: Dict[str, JobHandle] = {}
+        self._running: set = set()
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # الاسترداد
+        self._recovery: Dict[str, RecoveryHandler] = {GAME_TIMEOUT_KIND: _notify_game_interrupted}
+        self._orphans: Dict[str, List[Dict[str, Any]]] = {}
+        self._bot = None
+
+        # الحفظ المؤجل: مفتاح -> صف أو None للحذف
+        self._dirty: Dict[str, Optional[tuple]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._table_ready = False
+
+        self.stats = {
+            'scheduled': 0,
+            'fired': 0,
+            'cancelled': 0,
+            'failed': 0,
+            'recovered': 0,
+            'total_lateness_ms': 0.0,
+            'max_lateness_ms': 0.0,
+        }
+
+    # ===== دورة الحياة =====
+
+    async def start(self, bot):
+        """إنشاء جدول المواعيد واسترداد ما بقي من التشغيل السابق ثم بدء الحلقة"""
+        self._bot = bot
+        try:
+            async with db_pool.writer() as db:
+                await db.execute('''
+                    CREATE TABLE IF NOT EXISTS scheduled_jobs (
+                        job_key TEXT PRIMARY KEY,
+                        kind TEXT NOT NULL,
+                        due_at REAL NOT NULL,
+                        payload TEXT NOT NULL,
+                        created_at REAL
+                    )
+                ''')
+            self._table_ready = True
+
+            rows = await db_pool.fetch_all(
+                "SELECT job_key, kind, due_at, payload FROM scheduled_jobs ORDER BY due_at"
+            )
+            leftover = [row for row in rows if row['job_key'] not in self._jobs]
+            if leftover:
+                await db_pool.execute_many(
+                    "DELETE FROM scheduled_jobs WHERE job_key = ?", [(row['job_key'],) for row in leftover]
+                )
+                for row in leftover:
+                    try:
+                        payload = json.loads(row['payload'])
+                    except (TypeError, ValueError):
+                        continue
+                    self._orphans.setdefault(row['kind'], []).append(payload)
+                logging.info(f"⏰ تم العثور على {len(leftover)} موعد معلق من التشغيل السابق")
+                for kind in list(self._orphans):
+                    if kind in self._recovery:
+                        self._recover(kind)
+        except Exception as e:
+            logging.error(f"خطأ في تحميل المواعيد المحفوظة: {e}")
+
+        self._ensure_worker()
+        if self._dirty:
+            self._schedule_flush()
+        logging.info("✅ تم تشغيل المجدول المركزي")
+
+    async def stop(self):
+        """إيقاف الحلقة مع إبقاء المواعيد المحفوظة للاسترداد بعد التشغيل"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._running):
+            task.cancel()
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+
+    def register_recovery(self, kind: str, handler: RecoveryHandler):
+        """تسجيل معالج استرداد لنوع مواعيد (يُستدعى بـ bot والبيانات المحفوظة)"""
+        self._recovery[kind] = handler
+        if self._bot is not None and kind in self._orphans:
+            self._recover(kind)
+
+    def _recover(self, kind: str):
+        handler = self._recovery[kind]
+        for payload in self._orphans.pop(kind, []):
+            self._spawn(self._run_recovery(kind, handler, payload))
+
+    async def _run_recovery(self, kind: str, handler: RecoveryHandler, payload: Dict[str, Any]):
+        try:
+            await handler(self._bot, payload)
+            self.stats['recovered'] += 1
+            logging.info(f"♻️ تم استرداد موعد {kind} معلق: {payload.get('chat_id')}")
+        except Exception as e:
+            logging.error(f"خطأ في استرداد موعد {kind}: {e}")
+
+    # ===== الجدولة =====
+
+    def call_later(self, key: str, delay: float, callback: Callable[..., Awaitable[Any]], *args,
+                   kind: Optional[str] = None, payload: Optional[Dict[str, Any]] = None) -> JobHandle:
+        """تنفيذ callback(*args) بعد delay ثانية (يستبدل أي موعد بنفس المفتاح)"""
+        return self._schedule(key, delay, callback, args, None, kind, payload)
+
+    def every(self, key: str, interval: float, callback: Callable[..., Awaitable[Any]], *args,
+              first_delay: Optional[float] = None, kind: Optional[str] = None,
+              payload: Optional[Dict[str, Any]] = None) -> JobHandle:
+        """تنفيذ callback(*args) كل interval ثانية حتى يُلغى"""
+        delay = interval if first_delay is None else first_delay
+        return self._schedule(key, delay, callback, args, interval, kind, payload)
+
+    def _schedule(self, key, delay, callback, args, interval, kind, payload) -> JobHandle:
+        previous = self._jobs.pop(key, None)
+        if previous is not None:
+            previous.cancelled = True
+
+        handle = JobHandle(self, key, callback, args, time.time() + max(0.0, delay),
+                           interval, kind, payload, next(self._seq))
+        self._jobs[key] = handle
+        heapq.heappush(self._heap, (handle.due, handle.seq, handle))
+        self.stats['scheduled'] += 1
+
+        if handle.persistent:
+            self._persist(handle)
+        elif previous is not None and previous.persistent:
+            self._mark_dirty(key, None)
+
+        self._ensure_worker()
+        self._wakeup.set()
+        return handle
+
+    def cancel(self, key: str, handle: Optional[JobHandle] = None) -> bool:
+        """إلغاء موعد بمفتاحه (أو مقبض محدد إن لم يُستبدل بعد)"""
+        current = self._jobs.get(key)
+        if current is None or (handle is not None and current is not handle):
+            return False
+        del self._jobs[key]
+        current.cancelled = True
+        self.stats['cancelled'] += 1
+        if current.persistent:
+            self._mark_dirty(key, None)
+        return True
+
+    def get(self, key: str) -> Optional[JobHandle]:
+        return self._jobs.get(key)
+
+    def update_payload(self, key: str, payload: Dict[str, Any]):
+        """تحديث بيانات الاسترداد لموعد قائم (مثل انضمام لاعب دفع الرسوم)"""
+        handle = self._jobs.get(key)
+        if handle is None or handle.kind is None:
+            return
+        handle.payload = payload
+        self._persist(handle)
+
+    # ===== التنفيذ =====
+
+    def _ensure_worker(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        """انتظار أقرب موعد وتنفيذ المستحق"""
+        while True:
+            while self._heap and self._heap[0][2].cancelled:
+                heapq.heappop(self._heap)
+
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            wait = self._heap[0][0] - time.time()
+            if wait > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, handle = heapq.heappop(self._heap)
+            if handle.cancelled:
+                continue
+
+            lateness_ms = max(0.0, (time.time() - handle.due) * 1000)
+            self.stats['fired'] += 1
+            self.stats['total_lateness_ms'] += lateness_ms
+            self.stats['max_lateness_ms'] = max(self.stats['max_lateness_ms'], lateness_ms)
+
+            if handle.interval is None:
+                # موعد لمرة واحدة - يُزال قبل التنفيذ حتى يمكن للمهمة جدولة موعد بنفس المفتاح
+                del self._jobs[handle.key]
+                if handle.persistent:
+                    self._mark_dirty(handle.key, None)
+            handle.context.run(self._spawn, self._execute(handle))
+
+    async def _execute(self, handle: JobHandle):
+        try:
+            await handle.callback(*handle.args)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats['failed'] += 1
+            logging.error(f"خطأ في تنفيذ المهمة المجدولة {handle.key}: {e}")
+
+        # المهام الدورية تُعاد جدولتها بعد انتهاء التنفيذ (لا تداخل بين الدورات)
+        if handle.interval is not None and not handle.cancelled and self._jobs.get(handle.key) is handle:
+            handle.due = time.time() + handle.interval
+            heapq.heappush(self._heap, (handle.due, handle.seq, handle))
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+        return task
+
+    # ===== الحفظ =====
+
+    def _persist(self, handle: JobHandle):
+        try:
+            payload = json.dumps(handle.payload, ensure_ascii=False)
+        except (TypeError, ValueError) as e:
+            logging.error(f"بيانات غير قابلة للحفظ للموعد {handle.key}: {e}")
+            return
+        self._mark_dirty(handle.key, (handle.key, handle.kind, handle.due, payload, time.time()))
+
+    def _mark_dirty(self, key: str, row: Optional[tuple]):
+        self._dirty[key] = row
+        if self._table_ready:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_soon())
+
+    async def _flush_soon(self):
+        await asyncio.sleep(PERSIST_DELAY)
+        await self.flush()
+
+    async def flush(self):
+        """كتابة تغييرات المواعيد المحفوظة في معاملة واحدة"""
+        if not self._dirty or not self._table_ready:
+            return
+        dirty, self._dirty = self._dirty, {}
+        try:
+            async with db_pool.writer() as db:
+                for key, row in dirty.items():
+                    if row is None:
+                        await db.execute("DELETE FROM scheduled_jobs WHERE job_key = ?", (key,))
+                    else:
+                        await db.execute('''
+                            INSERT OR REPLACE INTO scheduled_jobs (job_key, kind, due_at, payload, created_at)
+                            VALUES (?, ?, ?, ?, ?)
+                        ''', row)
+        except Exception as e:
+            # إعادة التغييرات غير المكتوبة للمحاولة التالية (الأحدث يبقى)
+            for key, row in dirty.items():
+                self._dirty.setdefault(key, row)
+            logging.error(f"خطأ في حفظ المواعيد المجدولة: {e}")
+
+    # ===== المراقبة =====
+
+    def get_stats(self) -> Dict[str, Any]:
+        """إحصائيات المجدول للمراقبة"""
+        by_kind: Dict[str, int] = {}
+        for handle in self._jobs.values():
+            kind = handle.kind or ("periodic" if handle.interval is not None else "timer")
+            by_kind[kind] = by_kind.get(kind, 0) + 1
+        fired = self.stats['fired']
+        return dict(
+            self.stats,
+            active=len(self._jobs),
+            running=len(self._running),
+            persistent=sum(1 for handle in self._jobs.values() if handle.persistent),
+            by_kind=by_kind,
+            avg_lateness_ms=round(self.stats['total_lateness_ms'] / fired, 2) if fired else 0.0,
+        )
+
+
+async def _notify_game_interrupted(bot, payload: Dict[str, Any]):
+    """إبلاغ المجموعة بأن لعبتها توقفت بسبب إعادة تشغيل البوت"""
+    await bot.send_message(
+        payload['chat_id'],
+        f"⚠️ **توقفت {payload.get('game', 'اللعبة')} بسبب إعادة تشغيل البوت**\n\n"
+        f"🔄 يمكنكم بدء لعبة جديدة الآن"
+    )
+
+
+def game_payload(chat_id: int, game_name: str) -> Dict[str, Any]:
+    """بيانات الاسترداد لمؤقت لعبة بدون رسوم"""
+    return {'chat_id': chat_id, 'game': game_name}
+
+
+# النسخة العامة من المجدول
+scheduler = Scheduler()
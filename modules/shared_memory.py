@@ -3,14 +3,13 @@
 Shared Memory and Topic Linking System with NLTK
 """
 
-import aiosqlite
 import logging
 import nltk
 import re
 from typing import List, Dict, Optional, Set, Tuple
 from datetime import datetime, timedelta
 from collections import defaultdict
-from config.settings import DATABASE_URL
+from database.connection_pool import db_pool
 
 # تحميل مكتبات NLTK المطلوبة
 try:
@@ -56,7 +55,7 @@ class SharedGroupMemory:
     async def init_shared_memory_db(self):
         """تهيئة قاعدة بيانات الذاكرة المشتركة"""
         try:
-            async with aiosqlite.connect(DATABASE_URL) as db:
+            async with db_pool.writer() as db:
                 # جدول المحادثات المشتركة
                 await db.execute('''
                     CREATE TABLE IF NOT EXISTS shared_conversations (
@@ -104,7 +103,6 @@ class SharedGroupMemory:
                     )
                 ''')
                 
-                await db.commit()
                 logging.info("✅ تم تهيئة قاعدة بيانات الذاكرة المشتركة")
                 
         except Exception as e:
@@ -171,7 +169,7 @@ class SharedGroupMemory:
             topics, mentions = self.extract_topics_and_mentions(message_text)
             sentiment = self.analyze_sentiment(message_text)
             
-            async with aiosqlite.connect(DATABASE_URL) as db:
+            async with db_pool.writer() as db:
                 # حفظ المحادثة
                 cursor = await db.execute('''
                     INSERT INTO shared_conversations 
@@ -194,7 +192,6 @@ class SharedGroupMemory:
                 # تحديث ملف المستخدم
                 await self.update_user_profile(db, chat_id, user_id, username, topics, mentions)
                 
-                await db.commit()
                 logging.info(f"✅ تم حفظ المحادثة المشتركة للمستخدم {user_id}")
                 
         except Exception as e:
@@ -242,7 +239,7 @@ class SharedGroupMemory:
                                           asking_user_id: int, limit: int = 5) -> str:
         """جلب السياق المشترك حول مستخدم معين"""
         try:
-            async with aiosqlite.connect(DATABASE_URL) as db:
+            async with db_pool.reader() as db:
                 # البحث عن المحادثات التي تذكر المستخدم المطلوب
                 cursor = await db.execute('''
                     SELECT sc.user_id, sc.username, sc.message_text, sc.ai_response, sc.topics, sc.timestamp
@@ -278,7 +275,7 @@ class SharedGroupMemory:
     async def get_topic_connections(self, chat_id: int, topic: str, limit: int = 3) -> str:
         """جلب الروابط بين المستخدمين حول موضوع معين"""
         try:
-            async with aiosqlite.connect(DATABASE_URL) as db:
+            async with db_pool.reader() as db:
                 cursor = await db.execute('''
                     SELECT sc.user_id, sc.username, sc.message_text, sc.timestamp
                     FROM shared_conversations sc
@@ -315,7 +312,7 @@ class SharedGroupMemory:
                                              user2_id: int, limit: int = 3) -> str:
         """البحث عن المحادثات بين مستخدمين محددين"""
         try:
-            async with aiosqlite.connect(DATABASE_URL) as db:
+            async with db_pool.reader() as db:
                 cursor = await db.execute('''
                     SELECT user_id, username, message_text, topics, timestamp
                     FROM shared_conversations 
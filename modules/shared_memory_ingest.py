@@ -0,0 +1,310 @@
+"""
+خط إدخال الذاكرة المشتركة المجمّع
+Batched Shared-Memory Ingestion Pipeline
+
+يجمع رسائل المجموعات في الذاكرة لكل محادثة ثم يكتبها دفعة واحدة في معاملة
+واحدة: إدراج المحادثات عبر executemany، وتحديث عدادات (موضوع ← مستخدم)
+المجمعة بدلاً من إضافة صف لكل كلمة، ودمج اهتمامات ملفات المستخدمين.
+"""
+
+import ast
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from database.connection_pool import db_pool
+
+# الفاصل الزمني بين عمليات التفريغ (بالثواني)
+FLUSH_INTERVAL = 1.0
+
+# عدد الرسائل المعلقة الذي يفرض تفريغاً فورياً
+MAX_PENDING_MESSAGES = 100
+
+# المهلة قبل إعادة المحاولة بعد فشل التفريغ (بالثواني)
+FLUSH_RETRY_DELAY = 5
+
+# الحد الأقصى للرسائل المحتفظ بها بعد فشل التفريغ (تُسقط الأقدم عند تجاوزه)
+MAX_REQUEUED_MESSAGES = 5000
+
+# الحد الأقصى لاهتمامات المستخدم المحفوظة في ملفه
+MAX_PROFILE_INTERESTS = 20
+
+
+def _load_interests(raw) -> list:
+    """قراءة قائمة الاهتمامات المخزنة (JSON أو تمثيل بايثون من النسخة القديمة)"""
+    if not raw:
+        return []
+    try:
+        value = json.loads(raw)
+    except (TypeError, ValueError):
+        try:
+            value = ast.literal_eval(raw)
+        except (ValueError, SyntaxError):
+            return []
+    return list(value) if isinstance(value, (list, tuple)) else []
+
+
+class SharedMemoryIngestor:
+    """طابور إدخال مجمّع لمحادثات الذاكرة المشتركة"""
+
+    def __init__(self, memory, flush_interval: float = FLUSH_INTERVAL,
+                 max_pending: int = MAX_PENDING_MESSAGES):
+        # نظام الذاكرة المالك (لاستخراج المواضيع وتحليل المشاعر)
+        self.memory = memory
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        # محادثة -> قائمة الرسائل المعلقة (الطابع الزمني بتوقيت UTC مثل CURRENT_TIMESTAMP)
+        self._pending: Dict[int, List[tuple]] = defaultdict(list)
+        self._pending_count = 0
+        self._schema_ready = False
+
+        self._flush_task = None
+        self._wakeup = None
+        self._stop = None
+        self._flush_lock = None
+        self._closed = False
+
+        self.stats = {
+            'messages': 0,
+            'flushes': 0,
+            'topic_upserts': 0,
+            'flush_errors': 0,
+            'requeued_messages': 0,
+            'dropped_messages': 0,
+        }
+
+    # ===== واجهة الإضافة =====
+
+    def enqueue(self, chat_id: int, user_id: int, username: str,
+                message_text: str, ai_response: str = None):
+        """إضافة رسالة إلى الطابور (بدون أي انتظار لقاعدة البيانات)"""
+        self._pending[chat_id].append(
+            (user_id, username, message_text, ai_response, datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'))
+        )
+        self._pending_count += 1
+        self.stats['messages'] += 1
+
+        if self._closed:
+            return
+
+        self._ensure_flush_loop()
+        if self._pending_count >= self.max_pending and self._wakeup:
+            self._wakeup.set()
+
+    def _ensure_flush_loop(self):
+        """تشغيل حلقة التفريغ في الخلفية عند أول رسالة"""
+        if self._flush_task and not self._flush_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._wakeup = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = loop.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        """حلقة التفريغ الدوري"""
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            if self._pending_count and not await self.flush():
+                # الدفعة أُعيدت إلى الطابور - مهلة قبل المحاولة التالية (يقطعها الإيقاف)
+                try:
+                    await asyncio.wait_for(self._stop.wait(), timeout=FLUSH_RETRY_DELAY)
+                except asyncio.TimeoutError:
+                    pass
+
+    # ===== التحضير =====
+
+    async def _ensure_schema(self, db):
+        """إنشاء جدول عدادات المواضيع ونقل روابط المواضيع القديمة إليه مرة واحدة"""
+        if self._schema_ready:
+            return
+
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS topic_user_stats (
+                chat_id INTEGER NOT NULL,
+                topic TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                mention_count INTEGER DEFAULT 0,
+                last_seen DATETIME,
+                PRIMARY KEY (chat_id, topic, user_id)
+            )
+        ''')
+
+        async with db.execute("SELECT 1 FROM topic_user_stats LIMIT 1") as cursor:
+            has_stats = await cursor.fetchone()
+        if not has_stats:
+            # تجميع الصفوف الملحقة سابقاً (صف لكل كلمة لكل رسالة) في عدادات
+            await db.execute('''
+                INSERT OR IGNORE INTO topic_user_stats (chat_id, topic, user_id, mention_count, last_seen)
+                SELECT tl.chat_id, tl.topic, CAST(users.value AS INTEGER), COUNT(*), MAX(tl.timestamp)
+                FROM topic_links tl, json_each(
+                    CASE WHEN json_valid(tl.user_ids) THEN tl.user_ids ELSE '[]' END
+                ) AS users
+                GROUP BY tl.chat_id, tl.topic, users.value
+            ''')
+
+        self._schema_ready = True
+
+    def _prepare_batch(self, pending: Dict[int, List[tuple]]):
+        """استخراج المواضيع للدفعة كاملة وتجميع العدادات والاهتمامات"""
+        conversations = []
+        topic_counts: Dict[Tuple[int, str, int], list] = {}
+        interests: Dict[Tuple[int, int], dict] = {}
+
+        for chat_id, messages in pending.items():
+            for user_id, username, message_text, ai_response, timestamp in messages:
+                topics, mentions = self.memory.extract_topics_and_mentions(message_text)
+                sentiment = self.memory.analyze_sentiment(message_text)
+
+                conversations.append((
+                    chat_id, user_id, username, message_text, ai_response,
+                    json.dumps(mentions), json.dumps(topics), sentiment, timestamp
+                ))
+
+                for topic in set(topics):
+                    entry = topic_counts.get((chat_id, topic, user_id))
+                    if entry:
+                        entry[0] += 1
+                        entry[1] = timestamp
+                    else:
+                        topic_counts[(chat_id, topic, user_id)] = [1, timestamp]
+
+                profile = interests.setdefault((user_id, chat_id), {'username': username, 'topics': []})
+                profile['username'] = username
+                profile['topics'].extend(topics)
+
+        return conversations, topic_counts, interests
+
+    async def _merge_profiles(self, db, interests: Dict[Tuple[int, int], dict]):
+        """دمج الاهتمامات الجديدة في ملفات المستخدمين بقراءة واحدة وكتابات مجمعة"""
+        user_ids = list({user_id for user_id, _ in interests})
+        placeholders = ",".join("?" * len(user_ids))
+        async with db.execute(
+            f"SELECT user_id, chat_id, interests FROM user_profiles WHERE user_id IN ({placeholders})",
+            user_ids
+        ) as cursor:
+            existing = {(row[0], row[1]): row[2] for row in await cursor.fetchall()}
+
+        updates = []
+        inserts = []
+        for (user_id, chat_id), profile in interests.items():
+            if (user_id, chat_id) in existing:
+                current = _load_interests(existing[(user_id, chat_id)])
+                # الاحتفاظ بأحدث الاهتمامات عند تجاوز الحد
+                merged = list(dict.fromkeys(current + profile['topics']))[-MAX_PROFILE_INTERESTS:]
+                updates.append((json.dumps(merged), user_id, chat_id))
+            else:
+                topics = list(dict.fromkeys(profile['topics']))[-MAX_PROFILE_INTERESTS:]
+                inserts.append((user_id, chat_id, profile['username'], profile['username'], json.dumps(topics)))
+
+        if updates:
+            await db.executemany('''
+                UPDATE user_profiles
+                SET interests = ?, last_active = CURRENT_TIMESTAMP
+                WHERE user_id = ? AND chat_id = ?
+            ''', updates)
+        if inserts:
+            await db.executemany('''
+                INSERT OR IGNORE INTO user_profiles
+                (user_id, chat_id, username, display_name, interests, last_active)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', inserts)
+
+    # ===== التفريغ =====
+
+    def _requeue(self, pending: Dict[int, List[tuple]]):
+        """إعادة دفعة فاشلة إلى مقدمة الطابور مع إسقاط الأقدم عند تجاوز الحد"""
+        for chat_id, messages in pending.items():
+            self._pending[chat_id] = messages + self._pending.get(chat_id, [])
+        self._pending_count = sum(len(messages) for messages in self._pending.values())
+        self.stats['requeued_messages'] += sum(len(messages) for messages in pending.values())
+
+        overflow = self._pending_count - MAX_REQUEUED_MESSAGES
+        if overflow <= 0:
+            return
+        # إسقاط الأقدم حسب الطابع الزمني عبر جميع المحادثات
+        oldest = sorted(
+            (message[4], chat_id) for chat_id, messages in self._pending.items() for message in messages
+        )[:overflow]
+        for _, chat_id in oldest:
+            self._pending[chat_id].pop(0)
+            if not self._pending[chat_id]:
+                del self._pending[chat_id]
+        self._pending_count -= overflow
+        self.stats['dropped_messages'] += overflow
+        logging.warning(f"⚠️ تجاوز طابور الذاكرة المشتركة الحد بعد فشل التفريغ، أُسقطت {overflow} رسالة قديمة")
+
+    async def flush(self) -> bool:
+        """كتابة جميع الرسائل المعلقة في معاملة واحدة (False عند الفشل)"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            if not self._pending_count:
+                return True
+
+            pending, self._pending = self._pending, defaultdict(list)
+            self._pending_count = 0
+
+            try:
+                conversations, topic_counts, interests = self._prepare_batch(pending)
+
+                async with db_pool.writer() as db:
+                    await self._ensure_schema(db)
+
+                    await db.executemany('''
+                        INSERT INTO shared_conversations
+                        (chat_id, user_id, username, message_text, ai_response,
+                         mentioned_users, topics, sentiment, timestamp)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', conversations)
+
+                    if topic_counts:
+                        await db.executemany('''
+                            INSERT INTO topic_user_stats (chat_id, topic, user_id, mention_count, last_seen)
+                            VALUES (?, ?, ?, ?, ?)
+                            ON CONFLICT(chat_id, topic, user_id) DO UPDATE SET
+                                mention_count = mention_count + excluded.mention_count,
+                                last_seen = excluded.last_seen
+                        ''', [(chat_id, topic, user_id, count, last_seen)
+                              for (chat_id, topic, user_id), (count, last_seen) in topic_counts.items()])
+
+                    if interests:
+                        await self._merge_profiles(db, interests)
+
+                self.stats['flushes'] += 1
+                self.stats['topic_upserts'] += len(topic_counts)
+                logging.debug(f"✅ تم حفظ {len(conversations)} رسالة في الذاكرة المشتركة")
+                return True
+
+            except Exception as e:
+                self.stats['flush_errors'] += 1
+                logging.error(f"خطأ في تفريغ طابور الذاكرة المشتركة، ستُعاد المحاولة: {e}")
+                self._requeue(pending)
+                return False
+
+    async def close(self):
+        """إيقاف حلقة التفريغ وكتابة ما تبقى"""
+        self._closed = True
+        if self._flush_task and not self._flush_task.done():
+            self._wakeup.set()
+            self._stop.set()
+            await self._flush_task
+        if not await self.flush():
+            logging.error(f"❌ فشل التفريغ النهائي للذاكرة المشتركة، فُقدت {self._pending_count} رسالة")
+
+    def get_stats(self) -> Dict[str, int]:
+        """إحصائيات الطابور للمراقبة"""
+        return dict(self.stats, pending=self._pending_count, chats=len(self._pending))
@@ -3,18 +3,20 @@
 Enhanced Shared Memory and Topic Linking System for SQLite
 """
 
-import aiosqlite
 import logging
 import json
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
 from collections import defaultdict
 
+from database.connection_pool import db_pool
+from modules.shared_memory_ingest import SharedMemoryIngestor
+
 class SharedGroupMemorySQLite:
     """نظام الذاكرة المشتركة للمجموعة مع ربط المواضيع والمستخدمين - SQLite"""
     
     def __init__(self):
-        self.db_path = "bot_database.db"
+        self.ingestor = SharedMemoryIngestor(self)
         self.arabic_stopwords = {
             'في', 'من', 'إلى', 'على', 'عن', 'مع', 'هذا', 'هذه', 'ذلك', 'تلك',
             'هو', 'هي', 'أن', 'أنا', 'أنت', 'نحن', 'هم', 'هن', 'كان', 'كانت',
@@ -52,14 +54,6 @@ class SharedGroupMemorySQLite:
             }
         }
     
-    async def get_db_connection(self):
-        """الحصول على اتصال SQLite"""
-        try:
-            return await aiosqlite.connect(self.db_path)
-        except Exception as e:
-            logging.error(f"خطأ في الاتصال بـ SQLite: {e}")
-            return None
-    
     def extract_topics_and_mentions(self, text: str) -> Tuple[List[str], List[str]]:
         """استخراج المواضيع والإشارات من النص"""
         import re
@@ -92,125 +86,69 @@ class SharedGroupMemorySQLite:
     
     async def save_shared_conversation(self, chat_id: int, user_id: int, username: str, 
                                      message_text: str, ai_response: str = None):
-        """حفظ محادثة في الذاكرة المشتركة"""
+        """حفظ محادثة في الذاكرة المشتركة (تُكتب دفعة واحدة عبر طابور الإدخال)"""
         try:
-            conn = await self.get_db_connection()
-            if not conn:
-                logging.error("لا يمكن الاتصال بقاعدة البيانات")
-                return
-                
-            try:
-                # استخراج المواضيع والإشارات
-                topics, mentions = self.extract_topics_and_mentions(message_text)
-                sentiment = self.analyze_sentiment(message_text)
-                
-                # حفظ المحادثة
-                await conn.execute('''
-                    INSERT INTO shared_conversations 
-                    (chat_id, user_id, username, message_text, ai_response, mentioned_users, topics, sentiment)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    chat_id, user_id, username, message_text, ai_response,
-                    json.dumps(mentions), json.dumps(topics), sentiment
-                ))
-                
-                # حفظ روابط المواضيع
-                for topic in topics:
-                    await conn.execute('''
-                        INSERT INTO topic_links (chat_id, topic, user_ids, relation_type)
-                        VALUES (?, ?, ?, ?)
-                    ''', (chat_id, topic, json.dumps([user_id]), 'discussion'))
-                
-                # تحديث ملف المستخدم
-                await self.update_user_profile(conn, chat_id, user_id, username, topics, mentions)
-                
-                await conn.commit()
-                logging.info(f"✅ تم حفظ المحادثة المشتركة للمستخدم {user_id}")
-                
-            finally:
-                await conn.close()
-                
+            self.ingestor.enqueue(chat_id, user_id, username, message_text, ai_response)
         except Exception as e:
             logging.error(f"خطأ في حفظ المحادثة المشتركة: {e}")
     
-    async def update_user_profile(self, conn, chat_id: int, user_id: int, username: str, 
-                                topics: List[str], mentions: List[str]):
-        """تحديث ملف المستخدم بناءً على نشاطه"""
-        try:
-            # جلب الملف الحالي
-            cursor = await conn.execute('''
-                SELECT personality_traits, interests, mentioned_by FROM user_profiles 
-                WHERE user_id = ? AND chat_id = ?
-            ''', (user_id, chat_id))
-            row = await cursor.fetchone()
-            
-            if row:
-                # تحديث البيانات الموجودة
-                current_traits = json.loads(row[0]) if row[0] else []
-                current_interests = json.loads(row[1]) if row[1] else []
-                mentioned_by = json.loads(row[2]) if row[2] else {}
-                
-                # إضافة مواضيع جديدة كاهتمامات
-                current_interests.extend(topics)
-                current_interests = list(set(current_interests))[:20]  # الحد الأقصى 20
-                
-                await conn.execute('''
-                    UPDATE user_profiles 
-                    SET interests = ?, last_active = CURRENT_TIMESTAMP
-                    WHERE user_id = ? AND chat_id = ?
-                ''', (json.dumps(current_interests), user_id, chat_id))
-            else:
-                # إنشاء ملف جديد
-                await conn.execute('''
-                    INSERT INTO user_profiles 
-                    (user_id, chat_id, username, display_name, interests, last_active)
-                    VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-                ''', (user_id, chat_id, username, username, json.dumps(topics)))
-                
-        except Exception as e:
-            logging.error(f"خطأ في تحديث ملف المستخدم: {e}")
-    
     async def get_shared_context_about_user(self, chat_id: int, target_user_id: int, 
                                           asking_user_id: int, limit: int = 5) -> str:
         """جلب السياق المشترك حول مستخدم معين"""
         try:
-            conn = await self.get_db_connection()
-            if not conn:
-                return ""
-                
-            try:
-                # البحث عن المحادثات التي تذكر المستخدم المطلوب أو التي كتبها
+            async with db_pool.reader() as conn:
+                # البحث عن المحادثات التي كتبها المستخدم أو التي تذكره - كل جزء محدود
+                # بـ LIMIT على الفهرس (chat_id, user_id, timestamp) / (chat_id, timestamp)
                 cursor = await conn.execute('''
-                    SELECT user_id, username, message_text, ai_response, topics, timestamp
-                    FROM shared_conversations
-                    WHERE chat_id = ? 
-                    AND (mentioned_users LIKE ? OR user_id = ?)
+                    SELECT user_id, username, message_text, ai_response, topics, timestamp FROM (
+                        SELECT * FROM (
+                            SELECT id, user_id, username, message_text, ai_response, topics, timestamp
+                            FROM shared_conversations
+                            WHERE chat_id = ? AND user_id = ?
+                            ORDER BY timestamp DESC
+                            LIMIT ?
+                        )
+                        UNION
+                        SELECT * FROM (
+                            SELECT id, user_id, username, message_text, ai_response, topics, timestamp
+                            FROM shared_conversations
+                            WHERE chat_id = ? AND mentioned_users LIKE ?
+                            ORDER BY timestamp DESC
+                            LIMIT ?
+                        )
+                    )
                     ORDER BY timestamp DESC
                     LIMIT ?
-                ''', (chat_id, f'%{target_user_id}%', target_user_id, limit))
+                ''', (chat_id, target_user_id, limit, chat_id, f'%{target_user_id}%', limit, limit))
                 
                 rows = await cursor.fetchall()
-                
-                if not rows:
-                    return ""
-                
-                context_parts = []
-                for row in rows:
-                    user_id, username, message_text, ai_response, topics, timestamp = row
-                    # تحويل JSON strings إلى lists
-                    try:
-                        topics_list = json.loads(topics) if topics else []
-                    except:
-                        topics_list = []
-                    
-                    context_parts.append(f"[{timestamp}] {username}: {message_text[:100]}")
-                    if topics_list:
-                        context_parts.append(f"المواضيع: {', '.join(topics_list[:3])}")
-                
-                return "\n".join(context_parts)
-                
-            finally:
-                await conn.close()
+            
+            # ملخص المواضيع المؤرشفة من الرسائل الأقدم (صف واحد)
+            from database.retention import retention_engine
+            summary = await retention_engine.get_user_topic_summary(chat_id, target_user_id)
+            
+            if not rows and not summary:
+                return ""
+            
+            context_parts = []
+            if summary and summary['top_topics']:
+                context_parts.append(
+                    f"اهتمامات سابقة ({summary['archived_messages']} رسالة مؤرشفة): "
+                    f"{', '.join(summary['top_topics'][:5])}"
+                )
+            for row in rows:
+                user_id, username, message_text, ai_response, topics, timestamp = row
+                # تحويل JSON strings إلى lists
+                try:
+                    topics_list = json.loads(topics) if topics else []
+                except:
+                    topics_list = []
+                
+                context_parts.append(f"[{timestamp}] {username}: {message_text[:100]}")
+                if topics_list:
+                    context_parts.append(f"المواضيع: {', '.join(topics_list[:3])}")
+            
+            return "\n".join(context_parts)
                 
         except Exception as e:
             logging.error(f"خطأ في جلب السياق المشترك: {e}")
@@ -219,11 +157,7 @@ class SharedGroupMemorySQLite:
     async def get_group_conversation_context(self, chat_id: int, limit: int = 10) -> str:
         """جلب سياق المحادثة العامة للمجموعة"""
         try:
-            conn = await self.get_db_connection()
-            if not conn:
-                return ""
-                
-            try:
+            async with db_pool.reader() as conn:
                 cursor = await conn.execute('''
                     SELECT username, message_text, sentiment, timestamp
                     FROM shared_conversations
@@ -245,9 +179,6 @@ class SharedGroupMemorySQLite:
                 
                 return "\n".join(reversed(context_parts[-5:]))  # آخر 5 رسائل
                 
-            finally:
-                await conn.close()
-                
         except Exception as e:
             logging.error(f"خطأ في جلب سياق المجموعة: {e}")
             return ""
@@ -269,11 +200,7 @@ class SharedGroupMemorySQLite:
                 return self.special_users[6524680126]
             
             # البحث في قاعدة البيانات
-            conn = await self.get_db_connection()
-            if not conn:
-                return {}
-                
-            try:
+            async with db_pool.reader() as conn:
                 cursor = await conn.execute('''
                     SELECT message_text, ai_response FROM shared_conversations 
                     WHERE user_id = 6524680126 AND (message_text LIKE '%عمري%' OR message_text LIKE '%براندون%')
@@ -289,9 +216,6 @@ class SharedGroupMemorySQLite:
                         'message': row[0],
                         'response': row[1]
                     }
-                    
-            finally:
-                await conn.close()
                 
         except Exception as e:
             logging.error(f"خطأ في جلب معلومات براندون: {e}")
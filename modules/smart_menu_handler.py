@@ -312,6 +312,13 @@ class SmartMenuHandler:
             status_text += f"   🎮 ألعاب متاحة: {games_status.get('games_loaded', 0)}\n"
             status_text += f"   📖 قصص تفاعلية: {games_status.get('stories_loaded', 0)}\n"
             
+            # ذاكرة ردود الذكاء الاصطناعي
+            cache_status = status.get('response_cache', {})
+            if cache_status:
+                status_text += f"\n💾 ذاكرة الردود\n"
+                status_text += f"   🎯 نسبة الإصابة: {cache_status.get('hit_ratio', 0) * 100:.1f}%\n"
+                status_text += f"   🔋 طلبات Gemini الموفرة: {cache_status.get('saved_requests', 0)}\n"
+            
             status_text += f"\n⚡ جميع الأنظمة تعمل بكامل طاقتها!"
             
             await loading_msg.edit_text(status_text)
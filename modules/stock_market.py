@@ -0,0 +1,232 @@
+"""
+محرك سوق الأسهم المحاكى
+Simulated Stock Market Engine
+
+يحرك أسعار جميع أسهم اللعبة معاً كل نبضة بمسار عشوائي هندسي (GBM) متجه عبر
+NumPy باستخدام تقلب كل سهم، مع ارتداد خفيف نحو السعر الأساسي حتى لا تنفلت
+الأسعار على المدى الطويل. كل القراءات من الذاكرة فيرى جميع اللاعبين السعر
+نفسه في اللحظة نفسها، ويُحفظ سجل مضغوط لكل سهم في حلقة دائرية مع لقطات
+دورية في جدول stock_prices.
+"""
+
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from database.connection_pool import db_pool
+
+# الفاصل بين نبضات السوق (بالثواني)
+TICK_INTERVAL = 60
+
+# الفاصل بين لقطات الأسعار المحفوظة في stock_prices
+SNAPSHOT_INTERVAL = 300
+
+# طول سجل النبضات لكل سهم (24 ساعة بنبضة كل دقيقة)
+HISTORY_SIZE = 1440
+
+# تقلب الأسهم في GAME_STOCKS تقلب يومي
+SECONDS_PER_DAY = 86400
+
+# قوة الارتداد اليومية نحو السعر الأساسي
+MEAN_REVERSION = 0.1
+
+# حدود السعر نسبة إلى السعر الأساسي
+MIN_PRICE_RATIO = 0.05
+MAX_PRICE_RATIO = 20.0
+
+# سعر افتراضي لرموز غير معروفة في المحافظ القديمة
+DEFAULT_PRICE = 100
+
+
+class StockMarketEngine:
+    """محرك أسعار مشترك لكل الأسهم مع سجل نبضات دائري"""
+
+    def __init__(self, stocks: Dict[str, Dict[str, Any]], tick_interval: float = TICK_INTERVAL,
+                 history_size: int = HISTORY_SIZE, seed: Optional[int] = None):
+        self.symbols: List[str] = list(stocks)
+        self._index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.tick_interval = tick_interval
+        self._rng = np.random.default_rng(seed)
+
+        self._base = np.array([float(stocks[s]['base_price']) for s in self.symbols])
+        self._sigma = np.array([float(stocks[s]['volatility']) for s in self.symbols])
+        self._log_base = np.log(self._base)
+        self._log_min = np.log(self._base * MIN_PRICE_RATIO)
+        self._log_max = np.log(self._base * MAX_PRICE_RATIO)
+
+        # العنصر الأخير سعر افتراضي للرموز غير المعروفة عند التقييم
+        self._prices = np.append(self._base, DEFAULT_PRICE)
+
+        # الحلقة الدائرية: عمود لكل نبضة
+        self._history = np.empty((len(self.symbols), history_size))
+        self._history_times = np.empty(history_size)
+        self._head = 0
+        self._count = 0
+        self._record(time.time())
+
+        self.stats = {'ticks': 0, 'snapshots': 0, 'pruned_rows': 0, 'restored_points': 0}
+
+    # ===== النبضات =====
+
+    def _record(self, timestamp: float):
+        """إضافة الأسعار الحالية إلى السجل الدائري"""
+        self._history[:, self._head] = self._prices[:-1]
+        self._history_times[self._head] = timestamp
+        self._head = (self._head + 1) % self._history_times.size
+        self._count = min(self._count + 1, self._history_times.size)
+
+    def advance(self, timestamp: Optional[float] = None):
+        """تحريك كل الأسعار نبضة واحدة (GBM مع ارتداد نحو السعر الأساسي)"""
+        dt = self.tick_interval / SECONDS_PER_DAY
+        log_prices = np.log(self._prices[:-1])
+        drift = MEAN_REVERSION * (self._log_base - log_prices) - 0.5 * self._sigma ** 2
+        shocks = self._rng.standard_normal(len(self.symbols))
+        log_prices = np.clip(log_prices + drift * dt + self._sigma * np.sqrt(dt) * shocks,
+                             self._log_min, self._log_max)
+        self._prices[:-1] = np.exp(log_prices)
+        self._record(time.time() if timestamp is None else timestamp)
+        self.stats['ticks'] += 1
+
+    async def tick(self):
+        """مهمة المجدول الدورية"""
+        self.advance()
+
+    # ===== القراءة =====
+
+    def prices(self) -> Dict[str, float]:
+        """أسعار جميع الأسهم الحالية"""
+        return {symbol: round(float(price), 2) for symbol, price in zip(self.symbols, self._prices)}
+
+    def price(self, symbol: str) -> Optional[float]:
+        """السعر الحالي لسهم (None لرمز غير معروف)"""
+        index = self._index.get(symbol)
+        return None if index is None else round(float(self._prices[index]), 2)
+
+    def _ordered_slots(self, limit: Optional[int] = None) -> np.ndarray:
+        """مواقع السجل مرتبة من الأقدم للأحدث"""
+        count = self._count if limit is None else min(limit, self._count)
+        return (self._head - count + np.arange(count)) % self._history_times.size
+
+    def change_percents(self) -> Dict[str, float]:
+        """نسبة التغيير لكل سهم منذ أقدم نقطة في السجل (حتى 24 ساعة)"""
+        oldest = self._history[:, self._ordered_slots()[0]]
+        changes = (self._prices[:-1] / oldest - 1) * 100
+        return {symbol: round(float(change), 2) for symbol, change in zip(self.symbols, changes)}
+
+    def change_percent(self, symbol: str) -> float:
+        """نسبة تغيير سهم واحد"""
+        return self.change_percents().get(symbol, 0.0)
+
+    def history(self, symbol: str, limit: Optional[int] = None) -> List[Tuple[float, float]]:
+        """سجل (الوقت، السعر) لسهم من الأقدم للأحدث"""
+        index = self._index.get(symbol)
+        if index is None:
+            return []
+        slots = self._ordered_slots(limit)
+        return list(zip(self._history_times[slots].tolist(), self._history[index, slots].tolist()))
+
+    def valuate(self, holdings: Iterable) -> Dict[str, Any]:
+        """
+        تقييم محفظة كاملة بعملية متجهة واحدة
+        holdings: صفوف تحتوي symbol و quantity و purchase_price
+        """
+        holdings = list(holdings)
+        count = len(holdings)
+        unknown = len(self.symbols)
+        indexes = np.fromiter((self._index.get(row['symbol'], unknown) for row in holdings),
+                              dtype=np.intp, count=count)
+        quantities = np.fromiter((row['quantity'] or 0 for row in holdings), dtype=float, count=count)
+        costs = np.fromiter((row['purchase_price'] or 0 for row in holdings), dtype=float, count=count)
+
+        prices = np.round(self._prices[indexes], 2)
+        values = prices * quantities
+        invested = costs * quantities
+        return {
+            'prices': prices.tolist(),
+            'values': values.tolist(),
+            'invested': invested.tolist(),
+            'total_value': float(values.sum()),
+            'total_invested': float(invested.sum()),
+        }
+
+    # ===== الحفظ والاستعادة =====
+
+    def _window_seconds(self) -> int:
+        """مدة السجل المستعاد (24 ساعة افتراضياً)"""
+        return int(self.tick_interval * self._history_times.size)
+
+    async def snapshot(self):
+        """حفظ لقطة من الأسعار الحالية في stock_prices وحذف ما خرج من نافذة السجل"""
+        try:
+            changes = self.change_percents()
+            async with db_pool.writer() as db:
+                await db.executemany(
+                    "INSERT INTO stock_prices (symbol, price, change_percent) VALUES (?, ?, ?)",
+                    [(symbol, price, changes[symbol]) for symbol, price in self.prices().items()]
+                )
+                # الإبقاء على آخر سعر لكل سهم حتى لو كان أقدم من النافذة (احتياط الاستعادة)
+                cursor = await db.execute(
+                    """
+                    DELETE FROM stock_prices WHERE timestamp < datetime('now', ?)
+                    AND id NOT IN (SELECT MAX(id) FROM stock_prices GROUP BY symbol)
+                    """,
+                    (f"-{self._window_seconds()} seconds",)
+                )
+                pruned = cursor.rowcount
+            self.stats['snapshots'] += 1
+            self.stats['pruned_rows'] += max(pruned, 0)
+        except Exception as e:
+            logging.error(f"خطأ في حفظ لقطة أسعار الأسهم: {e}")
+
+    async def load(self):
+        """استعادة الأسعار وسجل آخر 24 ساعة من اللقطات المحفوظة"""
+        try:
+            window = self._window_seconds()
+            rows = await db_pool.fetch_all(
+                """
+                SELECT symbol, price, CAST(strftime('%s', timestamp) AS INTEGER)
+                FROM stock_prices WHERE timestamp >= datetime('now', ?) ORDER BY id
+                """,
+                (f"-{window} seconds",)
+            )
+            if not rows:
+                # لا لقطات حديثة: آخر سعر محفوظ لكل سهم
+                rows = await db_pool.fetch_all(
+                    """
+                    SELECT symbol, price, CAST(strftime('%s', timestamp) AS INTEGER)
+                    FROM stock_prices WHERE id IN (SELECT MAX(id) FROM stock_prices GROUP BY symbol)
+                    ORDER BY id
+                    """
+                )
+            if not rows:
+                return
+
+            # اللقطة الواحدة تُحفظ لكل الأسهم بنفس الوقت
+            self._count = 0
+            self._head = 0
+            restored = 0
+            current_time = None
+            for symbol, price, timestamp in rows:
+                index = self._index.get(symbol)
+                if index is None or not price or price <= 0:
+                    continue
+                if current_time is not None and timestamp != current_time:
+                    self._record(current_time)
+                    restored += 1
+                current_time = timestamp
+                self._prices[index] = price
+            if current_time is not None:
+                self._record(current_time)
+                restored += 1
+
+            self.stats['restored_points'] = restored
+            logging.info(f"📈 تم استعادة أسعار الأسهم من {restored} لقطة محفوظة")
+
+        except Exception as e:
+            logging.error(f"خطأ في استعادة أسعار الأسهم: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """إحصائيات المحرك للمراقبة"""
+        return dict(self.stats, history_points=self._count)
@@ -4,7 +4,6 @@ Stocks Module
 """
 
 import logging
-import random
 from datetime import datetime, timedelta
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
@@ -12,7 +11,7 @@ from aiogram.fsm.context import FSMContext
 from database.operations import get_user, update_user_balance, execute_query, add_transaction
 from utils.states import StocksStates
 from utils.helpers import format_number, is_valid_amount
-from services.api_client import get_stock_prices
+from modules.stock_market import StockMarketEngine
 
 # أسهم عربية للعبة
 GAME_STOCKS = {
@@ -26,6 +25,9 @@ GAME_STOCKS = {
     "بنك_الرياض": {"name": "بنك الرياض", "base_price": 400, "volatility": 0.05, "emoji": "🏛️", "category": "البنوك", "arabic_names": ["بنك_الرياض", "الرياض", "ريان"]}
 }
 
+# محرك السوق المشترك (الأسعار تتحرك في نبضات دورية عبر المجدول)
+stock_market = StockMarketEngine(GAME_STOCKS)
+
 def get_stock_symbol_from_name(name):
     """الحصول على رمز السهم من الاسم العربي أو الإنجليزي"""
     name_lower = name.lower()
@@ -90,6 +92,7 @@ async def list_available_stocks(message: Message):
     """عرض قائمة الأسهم المتاحة"""
     try:
         current_prices = await get_current_stock_prices()
+        changes = stock_market.change_percents()
         
         stocks_text = """
 📈 **الأسهم المتاحة للتداول:**
@@ -97,7 +100,7 @@ async def list_available_stocks(message: Message):
 """
         for symbol, stock_info in GAME_STOCKS.items():
             current_price = current_prices.get(symbol, stock_info['base_price'])
-            change = random.uniform(-5, 5)
+            change = changes.get(symbol, 0.0)
             change_emoji = "📈" if change >= 0 else "📉"
             
             stocks_text += f"{stock_info['emoji']} **{symbol}** - {stock_info['name']}\n"
@@ -353,23 +356,19 @@ async def show_portfolio(message: Message):
             await message.reply("📊 محفظتك فارغة\n\nابدأ الاستثمار باستخدام 'اسهم'")
             return
             
-        current_prices = await get_current_stock_prices()
+        user_stocks = [stock for stock in user_stocks if isinstance(stock, dict)]
+        valuation = stock_market.valuate(user_stocks)
         portfolio_text = "💼 **محفظة الأسهم:**\n\n"
-        total_value = 0
-        total_profit = 0
+        total_value = valuation['total_value']
+        total_profit = total_value - valuation['total_invested']
         
-        for stock in user_stocks:
-            if not isinstance(stock, dict):
-                continue
-                
+        for stock, current_price, stock_value, invested in zip(
+                user_stocks, valuation['prices'], valuation['values'], valuation['invested']):
             symbol = stock.get('symbol', '')
             quantity = stock.get('quantity', 0)
-            purchase_price = stock.get('purchase_price', 0)
             
             stock_info = GAME_STOCKS.get(symbol, {})
-            current_price = current_prices.get(symbol, stock_info.get('base_price', 100))
-            stock_value = current_price * quantity
-            profit = (current_price - purchase_price) * quantity
+            profit = stock_value - invested
             
             profit_emoji = "📈" if profit >= 0 else "📉"
             
@@ -377,9 +376,6 @@ async def show_portfolio(message: Message):
             portfolio_text += f"   💰 السعر الحالي: ${current_price:.2f}\n"
             portfolio_text += f"   💵 القيمة: ${stock_value:.2f}\n"
             portfolio_text += f"   {profit_emoji} الربح/الخسارة: ${profit:+.2f}\n\n"
-            
-            total_value += stock_value
-            total_profit += profit
         
         portfolio_text += f"💎 **إجمالي قيمة المحفظة:** ${total_value:.2f}\n"
         portfolio_text += f"📊 **إجمالي الربح/الخسارة:** ${total_profit:+.2f}"
@@ -403,26 +399,22 @@ async def show_simple_portfolio(message: Message):
             await message.reply("📊 لا تملك أي أسهم حالياً\n\n💡 اكتب 'اسهم' للبدء في الاستثمار")
             return
             
-        current_prices = await get_current_stock_prices()
+        user_stocks = [stock for stock in user_stocks if isinstance(stock, dict)]
+        valuation = stock_market.valuate(user_stocks)
         portfolio_text = "📈 **أسهمي:**\n\n"
         
-        total_current_value = 0
-        total_invested = 0
+        total_current_value = valuation['total_value']
+        total_invested = valuation['total_invested']
         
-        for stock in user_stocks:
-            if not isinstance(stock, dict):
-                continue
-                
+        for stock, current_price, stock_current_value, stock_invested_value in zip(
+                user_stocks, valuation['prices'], valuation['values'], valuation['invested']):
             symbol = stock.get('symbol', '')
             quantity = stock.get('quantity', 0)
             purchase_price = stock.get('purchase_price', 0)
             
             stock_info = GAME_STOCKS.get(symbol, {})
-            current_price = current_prices.get(symbol, stock_info.get('base_price', 100))
             
             # حساب القيم
-            stock_current_value = current_price * quantity
-            stock_invested_value = purchase_price * quantity
             profit_loss = stock_current_value - stock_invested_value
             profit_percentage = ((current_price - purchase_price) / purchase_price * 100) if purchase_price > 0 else 0
             
@@ -443,9 +435,6 @@ async def show_simple_portfolio(message: Message):
             portfolio_text += f"{stock_info.get('emoji', '📊')} **{symbol}** | الكمية: {quantity}\n"
             portfolio_text += f"💰 السعر الحالي: ${current_price:.2f}\n"
             portfolio_text += f"{status_emoji} {status_text}: {profit_text} ({profit_percentage:+.1f}%)\n\n"
-            
-            total_current_value += stock_current_value
-            total_invested += stock_invested_value
         
         # حساب الإجمالي
         total_profit_loss = total_current_value - total_invested
@@ -472,12 +461,13 @@ async def show_stock_prices(message: Message):
     """عرض أسعار الأسهم الحالية"""
     try:
         current_prices = await get_current_stock_prices()
+        changes = stock_market.change_percents()
         
         prices_text = "📊 **أسعار السوق الحالية:**\n\n"
         
         for symbol, stock_info in GAME_STOCKS.items():
             current_price = current_prices.get(symbol, stock_info['base_price'])
-            change = random.uniform(-5, 5)
+            change = changes.get(symbol, 0.0)
             change_emoji = "📈" if change >= 0 else "📉"
             
             prices_text += f"{stock_info['emoji']} **{symbol}** - ${current_price:.2f} "
@@ -500,13 +490,14 @@ async def show_buy_stocks(message: Message):
             return
         
         current_prices = await get_current_stock_prices()
+        changes = stock_market.change_percents()
         
         # الأسهم المتاحة للشراء مع الأسعار الحالية
         
         stocks_text = "📈 **الأسهم المتاحة للشراء:**\n\n"
         for symbol, stock_info in GAME_STOCKS.items():
             current_price = current_prices.get(symbol, stock_info['base_price'])
-            change = random.uniform(-5, 5)  # تغيير وهمي للعرض
+            change = changes.get(symbol, 0.0)
             change_emoji = "📈" if change >= 0 else "📉"
             affordable = "✅" if user['balance'] >= current_price else "❌"
             
@@ -808,19 +799,17 @@ async def show_user_portfolio(message: Message):
             await message.reply("📊 **محفظتك فارغة**\n\nاستخدم /stocks لشراء أسهم")
             return
         
-        current_prices = await get_current_stock_prices()
+        valuation = stock_market.valuate(user_stocks)
         portfolio_text = "💼 **محفظة الأسهم**\n\n"
         
-        total_investment = 0
-        total_current_value = 0
+        total_investment = valuation['total_invested']
+        total_current_value = valuation['total_value']
         
-        for stock in user_stocks:
+        for stock, current_price, current_value, investment in zip(
+                user_stocks, valuation['prices'], valuation['values'], valuation['invested']):
             symbol = stock['symbol']
             stock_info = GAME_STOCKS.get(symbol, {})
-            current_price = current_prices.get(symbol, stock_info.get('base_price', 100))
             
-            investment = stock['purchase_price'] * stock['quantity']
-            current_value = current_price * stock['quantity']
             profit_loss = current_value - investment
             profit_percentage = (profit_loss / investment) * 100 if investment > 0 else 0
             
@@ -832,9 +821,6 @@ async def show_user_portfolio(message: Message):
             portfolio_text += f"   📊 الاستثمار: ${investment:.2f}\n"
             portfolio_text += f"   💎 القيمة الحالية: ${current_value:.2f}\n"
             portfolio_text += f"   {profit_emoji} الربح/الخسارة: ${profit_loss:+.2f} ({profit_percentage:+.1f}%)\n\n"
-            
-            total_investment += investment
-            total_current_value += current_value
         
         total_profit_loss = total_current_value - total_investment
         total_profit_percentage = (total_profit_loss / total_investment) * 100 if total_investment > 0 else 0
@@ -853,24 +839,9 @@ async def show_user_portfolio(message: Message):
 
 
 async def get_current_stock_prices():
-    """الحصول على أسعار الأسهم الحالية"""
+    """الحصول على أسعار الأسهم الحالية (من محرك السوق في الذاكرة)"""
     try:
-        # محاولة الحصول على الأسعار الحقيقية من API
-        real_prices = await get_stock_prices(list(GAME_STOCKS.keys()))
-        
-        if real_prices:
-            return real_prices
-        
-        # في حالة فشل API، استخدام أسعار وهمية متقلبة
-        current_prices = {}
-        for symbol, stock_info in GAME_STOCKS.items():
-            base_price = stock_info['base_price']
-            volatility = stock_info['volatility']
-            # تغيير عشوائي يعتمد على التقلبات
-            change_factor = 1 + random.uniform(-volatility, volatility)
-            current_prices[symbol] = base_price * change_factor
-        
-        return current_prices
+        return stock_market.prices()
         
     except Exception as e:
         logging.error(f"خطأ في الحصول على أسعار الأسهم: {e}")
@@ -969,16 +940,7 @@ async def calculate_portfolio_value(portfolio):
         if not portfolio:
             return 0
         
-        current_prices = await get_current_stock_prices()
-        total_value = 0
-        
-        for stock in portfolio:
-            symbol = stock['symbol']
-            stock_info = GAME_STOCKS.get(symbol, {})
-            current_price = current_prices.get(symbol, stock_info.get('base_price', 100))
-            total_value += current_price * stock['quantity']
-        
-        return total_value
+        return stock_market.valuate(portfolio)['total_value']
         
     except Exception as e:
         logging.error(f"خطأ في حساب قيمة المحفظة: {e}")
@@ -8,6 +8,7 @@ import time
 import random
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from database.operations import get_or_create_user, update_user_balance, add_transaction
+from database.connection_pool import db_pool
 
 # الألعاب النشطة - مؤقت في الذاكرة
 ACTIVE_SYMBOLS_GAMES = {}
@@ -372,26 +373,28 @@ async def handle_symbols_guess(message: Message):
                 await update_user_balance(user_id, new_balance)
                 
                 # تحديث XP للفائز
-                import aiosqlite
-                from config.database import DATABASE_URL
-                async with aiosqlite.connect(DATABASE_URL) as conn:
+                async with db_pool.writer() as conn:
                     await conn.execute(
                         "UPDATE users SET xp = ? WHERE user_id = ?",
                         (new_xp, user_id)
                     )
-                    await conn.commit()
+                from database.user_cache import user_cache
+                from database.leaderboards import leaderboards
+                user_cache.invalidate(user_id)
+                leaderboards.update_xp(user_id, new_xp)
                 
                 await add_transaction(user_id, "فوز في لعبة الرموز", game.prize_pool, "symbols_game_win")
                 
                 # إعطاء 50 XP لمنشئ اللعبة
                 if creator_data and game.creator_id != user_id:
                     creator_new_xp = creator_data.get('xp', 0) + 50
-                    async with aiosqlite.connect(DATABASE_URL) as conn:
+                    async with db_pool.writer() as conn:
                         await conn.execute(
                             "UPDATE users SET xp = ? WHERE user_id = ?",
                             (creator_new_xp, game.creator_id)
                         )
-                        await conn.commit()
+                    user_cache.invalidate(game.creator_id)
+                    leaderboards.update_xp(game.creator_id, creator_new_xp)
                 
                 winner_text = (
                     f"🏆 **تهانينا {user_name}!**\n\n"
@@ -8,7 +8,8 @@ import random
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 
-from database.operations import get_user, update_user_balance, execute_query, add_transaction
+from database.operations import get_user, execute_query
+from database import ledger
 from utils.states import TheftStates
 from utils.helpers import format_number, parse_user_mention
 from config.settings import GAME_SETTINGS
@@ -162,21 +163,19 @@ async def handle_successful_theft(message: Message, thief: dict, target: dict, t
         stolen_amount = random.randint(int(max_steal * 0.1), int(max_steal * 0.3))
         stolen_amount = max(1, stolen_amount)  # على الأقل 1$
         
-        # تحديث الأرصدة
-        new_thief_balance = thief['balance'] + stolen_amount
-        new_target_balance = target['balance'] - stolen_amount
-        
-        await update_user_balance(message.from_user.id, new_thief_balance)
-        await update_user_balance(target_user_id, new_target_balance)
-        
-        # إضافة معاملة
-        await add_transaction(
-            from_user_id=target_user_id,
-            to_user_id=message.from_user.id,
-            transaction_type="theft_success",
-            amount=stolen_amount,
-            description=f"سرقة ناجحة من {target.get('username', 'مجهول')}"
+        # نقل المبلغ وتسجيله في معاملة واحدة (تُرفض إذا صرف الهدف أمواله قبلها)
+        result = await ledger.transfer(
+            target_user_id, message.from_user.id, stolen_amount,
+            sender_description=f"سرقة بواسطة {message.from_user.username or 'لص مجهول'}",
+            receiver_description=f"سرقة ناجحة من {target.get('username', 'مجهول')}",
+            transaction_type="theft_success"
         )
+        if not result:
+            await message.reply("😅 الهدف لم يعد يملك أموالاً نقدية كافية للسرقة!")
+            return
+        
+        new_thief_balance = result.balance(message.from_user.id)
+        new_target_balance = result.balance(target_user_id)
         
         # رسائل التهنئة المتنوعة
         success_messages = [
@@ -226,18 +225,13 @@ async def handle_failed_theft(message: Message, thief: dict, target: dict, targe
         penalty = min(penalty, thief['balance'])  # لا تتجاوز الرصيد المتاح
         penalty = max(10, penalty)  # على الأقل 10$
         
-        new_thief_balance = thief['balance'] - penalty
-        
-        await update_user_balance(message.from_user.id, new_thief_balance)
-        
-        # إضافة معاملة
-        await add_transaction(
-            from_user_id=message.from_user.id,
-            to_user_id=0,  # النظام
-            transaction_type="theft_failed",
-            amount=penalty,
-            description="غرامة فشل السرقة"
-        )
+        # خصم الغرامة وتسجيلها في معاملة واحدة (الحد الأدنى 10$ قد يتجاوز الرصيد)
+        result = await ledger.apply(ledger.LedgerEntry(
+            message.from_user.id, balance_delta=-penalty, allow_negative=True,
+            transaction_type="theft_failed", description="غرامة فشل السرقة", amount=penalty,
+            from_user_id=message.from_user.id, to_user_id=0  # النظام
+        ))
+        new_thief_balance = result.balance(message.from_user.id) if result else thief['balance']
         
         # رسائل الفشل المتنوعة
         failure_messages = [
@@ -305,15 +299,19 @@ async def upgrade_security(message: Message, new_level: int):
             )
             return
         
-        # تنفيذ الترقية
-        new_balance = user['balance'] - upgrade_cost
-        await update_user_balance(message.from_user.id, new_balance)
-        
-        # تحديث مستوى الأمان
-        await execute_query(
-            "UPDATE users SET security_level = ? WHERE user_id = ?",
-            (new_level, message.from_user.id)
+        # خصم التكلفة وتحديث مستوى الأمان في معاملة واحدة
+        result = await ledger.debit(
+            message.from_user.id, upgrade_cost, "security_upgrade",
+            f"ترقية الأمان إلى {SECURITY_LEVELS[new_level]['name']}",
+            set_fields={'security_level': new_level},
+            condition="COALESCE(security_level, 1) < ?", condition_params=(new_level,)
         )
+        if not result:
+            await message.reply("❌ رصيد غير كافٍ!" if result.reason == ledger.REASON_INSUFFICIENT
+                                else "❌ لديك هذا المستوى أو أعلى بالفعل")
+            return
+        
+        new_balance = result.balance(message.from_user.id)
         
         security_info = SECURITY_LEVELS[new_level]
         
@@ -506,21 +504,19 @@ async def upgrade_security_level(message: Message):
             )
             return
         
-        # تنفيذ الترقية
-        new_balance = user['balance'] - upgrade_cost
-        
-        await execute_query(
-            "UPDATE users SET security_level = ?, balance = ? WHERE user_id = ?",
-            (next_level, new_balance, message.from_user.id)
-        )
-        
-        # إضافة معاملة
-        await add_transaction(
-            message.from_user.id,
+        # خصم التكلفة وتحديث المستوى وتسجيل المعاملة في معاملة واحدة
+        result = await ledger.debit(
+            message.from_user.id, upgrade_cost, "security_upgrade",
             f"ترقية الأمان إلى {upgrade_info['name']}",
-            -upgrade_cost,
-            "security_upgrade"
+            set_fields={'security_level': next_level},
+            condition="COALESCE(security_level, 1) = ?", condition_params=(current_level,)
         )
+        if not result:
+            await message.reply("❌ رصيد غير كافٍ لترقية الأمان!" if result.reason == ledger.REASON_INSUFFICIENT
+                                else "❌ تم تغيير مستوى أمانك للتو، حاول مرة أخرى")
+            return
+        
+        new_balance = result.balance(message.from_user.id)
         
         await message.reply(
             f"🎉 **تم ترقية الأمان بنجاح!**\n\n"
@@ -5,6 +5,7 @@ Topic Search and Shared Memory Query System
 
 import logging
 from typing import List, Dict, Optional
+from database.connection_pool import db_pool
 from modules.shared_memory_sqlite import shared_group_memory_sqlite
 
 class TopicSearchEngine:
@@ -64,45 +65,37 @@ class TopicSearchEngine:
         # البحث في الذاكرة المشتركة
         # البحث عن المستخدم بالاسم في قاعدة البيانات
         try:
-            conn = await shared_group_memory_sqlite.get_db_connection()
-            if not conn:
-                return f"لم أتمكن من الاتصال بقاعدة البيانات للبحث عن {target_username}."
+            # البحث عن المحادثات التي تحتوي على الاسم المطلوب
+            rows = await db_pool.fetch_all('''
+                SELECT user_id, username, message_text, ai_response, topics, timestamp
+                FROM shared_conversations
+                WHERE chat_id = ? 
+                AND (message_text LIKE ? OR username LIKE ? OR topics LIKE ?)
+                ORDER BY timestamp DESC
+                LIMIT 10
+            ''', (chat_id, f'%{target_username}%', f'%{target_username}%', f'%{target_username}%'))
             
-            try:
-                # البحث عن المحادثات التي تحتوي على الاسم المطلوب
-                rows = await conn.fetch('''
-                    SELECT user_id, username, message_text, ai_response, topics, timestamp
-                    FROM shared_conversations
-                    WHERE chat_id = $1 
-                    AND (message_text ILIKE $2 OR username ILIKE $3 OR topics ILIKE $4)
-                    ORDER BY timestamp DESC
-                    LIMIT 10
-                ''', chat_id, f'%{target_username}%', f'%{target_username}%', f'%{target_username}%')
-                
-                if rows:
-                    context = f"معلومات عن {target_username}:\n"
-                    for row in rows:
-                        user_id_found, username, message, ai_response, topics, timestamp = row
-                        # استخراج المعلومات المهمة من الرسالة
-                        if 'عمري' in message or 'عمر' in message:
-                            context += f"• العمر: {message}\n"
-                        if 'اسمي' in message:
-                            context += f"• الاسم: {message}\n"
-                        if 'احب' in message or 'أحب' in message:
-                            context += f"• الاهتمامات: {message}\n"
-                        
-                        # إضافة جزء من الرسالة
-                        context += f"• قال: {message[:100]}{'...' if len(message) > 100 else ''}\n"
-                        if ai_response:
-                            context += f"  → ورد يوكي: {ai_response[:80]}{'...' if len(ai_response) > 80 else ''}\n"
-                        context += "\n"
-                    
-                    return context
-                else:
-                    return f"لم أجد معلومات مسجلة عن {target_username} في ذاكرتي المشتركة."
+            if rows:
+                context = f"معلومات عن {target_username}:\n"
+                for row in rows:
+                    user_id_found, username, message, ai_response, topics, timestamp = row
+                    # استخراج المعلومات المهمة من الرسالة
+                    if 'عمري' in message or 'عمر' in message:
+                        context += f"• العمر: {message}\n"
+                    if 'اسمي' in message:
+                        context += f"• الاسم: {message}\n"
+                    if 'احب' in message or 'أحب' in message:
+                        context += f"• الاهتمامات: {message}\n"
                     
-            finally:
-                await conn.close()
+                    # إضافة جزء من الرسالة
+                    context += f"• قال: {message[:100]}{'...' if len(message) > 100 else ''}\n"
+                    if ai_response:
+                        context += f"  → ورد يوكي: {ai_response[:80]}{'...' if len(ai_response) > 80 else ''}\n"
+                    context += "\n"
+                
+                return context
+            else:
+                return f"لم أجد معلومات مسجلة عن {target_username} في ذاكرتي المشتركة."
                 
         except Exception as e:
             logging.error(f"خطأ في البحث عن المستخدم: {e}")
@@ -135,33 +128,25 @@ class TopicSearchEngine:
         
         # البحث عن المحادثات المتعلقة بالموضوع
         try:
-            conn = await shared_group_memory_sqlite.get_db_connection()
-            if not conn:
-                return f"لم أتمكن من الاتصال بقاعدة البيانات للبحث عن الموضوع {topic}."
+            rows = await db_pool.fetch_all('''
+                SELECT user_id, username, message_text, ai_response, timestamp
+                FROM shared_conversations
+                WHERE chat_id = ? AND (message_text LIKE ? OR topics LIKE ?)
+                ORDER BY timestamp DESC
+                LIMIT 5
+            ''', (chat_id, f'%{topic}%', f'%{topic}%'))
             
-            try:
-                rows = await conn.fetch('''
-                    SELECT user_id, username, message_text, ai_response, timestamp
-                    FROM shared_conversations
-                    WHERE chat_id = $1 AND (message_text ILIKE $2 OR topics ILIKE $3)
-                    ORDER BY timestamp DESC
-                    LIMIT 5
-                ''', chat_id, f'%{topic}%', f'%{topic}%')
-                
-                if rows:
-                    context = f"المحادثات حول موضوع '{topic}':\n"
-                    for row in rows:
-                        user_id_found, username, message, ai_response, timestamp = row
-                        context += f"• {username}: {message[:100]}{'...' if len(message) > 100 else ''}\n"
-                        if ai_response:
-                            context += f"  → يوكي رد: {ai_response[:80]}{'...' if len(ai_response) > 80 else ''}\n"
-                        context += "\n"
-                    return context
-                else:
-                    return f"لم أجد محادثات مسجلة حول موضوع '{topic}'."
-                    
-            finally:
-                await conn.close()
+            if rows:
+                context = f"المحادثات حول موضوع '{topic}':\n"
+                for row in rows:
+                    user_id_found, username, message, ai_response, timestamp = row
+                    context += f"• {username}: {message[:100]}{'...' if len(message) > 100 else ''}\n"
+                    if ai_response:
+                        context += f"  → يوكي رد: {ai_response[:80]}{'...' if len(ai_response) > 80 else ''}\n"
+                    context += "\n"
+                return context
+            else:
+                return f"لم أجد محادثات مسجلة حول موضوع '{topic}'."
                 
         except Exception as e:
             logging.error(f"خطأ في البحث عن الموضوع: {e}")
@@ -171,30 +156,22 @@ class TopicSearchEngine:
     async def _search_user_connections(self, query: str, user_id: int, chat_id: int) -> str:
         """البحث عن الروابط بين المستخدمين"""
         try:
-            conn = await shared_group_memory_sqlite.get_db_connection()
-            if not conn:
-                return "لم أتمكن من الاتصال بقاعدة البيانات."
+            rows = await db_pool.fetch_all('''
+                SELECT user_id, username, message_text, mentioned_users, timestamp
+                FROM shared_conversations
+                WHERE chat_id = ? AND (user_id = ? OR mentioned_users LIKE ?)
+                ORDER BY timestamp DESC
+                LIMIT 5
+            ''', (chat_id, user_id, f'%{user_id}%'))
             
-            try:
-                rows = await conn.fetch('''
-                    SELECT user_id, username, message_text, mentioned_users, timestamp
-                    FROM shared_conversations
-                    WHERE chat_id = $1 AND (user_id = $2 OR mentioned_users LIKE $3)
-                    ORDER BY timestamp DESC
-                    LIMIT 5
-                ''', chat_id, user_id, f'%{user_id}%')
-                
-                if rows:
-                    context = "الروابط والمحادثات:\n"
-                    for row in rows:
-                        user_id_found, username, message, mentioned_users, timestamp = row
-                        context += f"• {username}: {message[:100]}{'...' if len(message) > 100 else ''}\n"
-                    return context
-                else:
-                    return "لم أجد روابط محادثات مسجلة."
-                    
-            finally:
-                await conn.close()
+            if rows:
+                context = "الروابط والمحادثات:\n"
+                for row in rows:
+                    user_id_found, username, message, mentioned_users, timestamp = row
+                    context += f"• {username}: {message[:100]}{'...' if len(message) > 100 else ''}\n"
+                return context
+            else:
+                return "لم أجد روابط محادثات مسجلة."
                 
         except Exception as e:
             logging.error(f"خطأ في البحث عن الروابط: {e}")
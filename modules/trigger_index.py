@@ -0,0 +1,133 @@
+"""
+فهرس الكلمات المفتاحية للردود والأوامر المخصصة
+In-Memory Trigger Index for Custom Replies and Commands
+
+فهرس لكل محادثة يُحمّل عند بدء التشغيل: قاموس للمطابقة التامة وتعبير منتظم
+مجمّع واحد لكلمات "الاحتواء" يمسح النص مرة واحدة بدلاً من المرور على كل كلمة.
+يُحدّث الفهرس عند الإضافة أو الحذف، ويُعاد بناء التعبير المجمّع للمحادثة
+المتغيرة فقط عند أول بحث بعد التغيير، فلا تكلف الرسالة غير المطابقة أي وصول
+لقاعدة البيانات.
+"""
+
+import re
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+def normalize_trigger(text: str) -> str:
+    """توحيد الكلمة المفتاحية أو نص الرسالة قبل المطابقة"""
+    return text.lower().strip() if text else ""
+
+
+class _ChatTriggers:
+    """كلمات محادثة واحدة مع التعبير المجمّع لكلمات الاحتواء"""
+
+    __slots__ = ('exact', 'contains', '_pattern', '_dirty')
+
+    def __init__(self):
+        # الكلمة الموحدة -> القيمة (نص الرد أو قائمة الردود)
+        self.exact: Dict[str, Any] = {}
+        self.contains: Dict[str, Any] = {}
+        self._pattern: Optional[re.Pattern] = None
+        self._dirty = False
+
+    def pattern(self) -> Optional[re.Pattern]:
+        """التعبير المجمّع لكلمات الاحتواء (يُبنى عند الحاجة بعد التغيير)"""
+        if self._dirty:
+            # الأطول أولاً حتى تُفضّل الكلمة الأطول عند نفس الموضع
+            keywords = sorted(self.contains, key=len, reverse=True)
+            self._pattern = re.compile('|'.join(map(re.escape, keywords))) if keywords else None
+            self._dirty = False
+        return self._pattern
+
+
+class TriggerIndex:
+    """فهرس كلمات مفتاحية لكل محادثة (chat_id = None للكلمات العامة)"""
+
+    def __init__(self, contains: bool = False):
+        # هل تُطابق الكلمات داخل النص أيضاً أم مطابقة تامة فقط
+        self.match_contains = contains
+        self._chats: Dict[Optional[int], _ChatTriggers] = {}
+        self.loaded = False
+        self.stats = {'lookups': 0, 'hits': 0, 'rebuilds': 0}
+
+    def load(self, entries: Iterable[Tuple[Optional[int], str, Any]]):
+        """استبدال الفهرس بالكامل من صفوف (chat_id, keyword, value)"""
+        self._chats.clear()
+        for chat_id, keyword, value in entries:
+            self.add(chat_id, keyword, value)
+        self.loaded = True
+
+    def add(self, chat_id: Optional[int], keyword: str, value: Any):
+        """إضافة كلمة أو تحديث قيمتها"""
+        key = normalize_trigger(keyword)
+        if not key:
+            return
+        triggers = self._chats.setdefault(chat_id, _ChatTriggers())
+        triggers.exact[key] = value
+        if self.match_contains:
+            triggers.contains[key] = value
+            triggers._dirty = True
+
+    def remove(self, chat_id: Optional[int], keyword: str):
+        """حذف كلمة من محادثة"""
+        triggers = self._chats.get(chat_id)
+        if triggers is None:
+            return
+        key = normalize_trigger(keyword)
+        triggers.exact.pop(key, None)
+        if triggers.contains.pop(key, None) is not None:
+            triggers._dirty = True
+        if not triggers.exact:
+            del self._chats[chat_id]
+
+    def remove_everywhere(self, keyword: str):
+        """حذف كلمة من جميع المحادثات"""
+        for chat_id in list(self._chats):
+            self.remove(chat_id, keyword)
+
+    def clear_chat(self, chat_id: Optional[int]):
+        """حذف جميع كلمات محادثة"""
+        self._chats.pop(chat_id, None)
+
+    def match(self, chat_id: Optional[int], text: str, normalized: bool = False) -> Optional[Any]:
+        """البحث عن قيمة الكلمة المطابقة للنص في محادثة واحدة"""
+        self.stats['lookups'] += 1
+        triggers = self._chats.get(chat_id)
+        if triggers is None:
+            return None
+
+        key = text if normalized else normalize_trigger(text)
+        value = triggers.exact.get(key)
+        if value is None and self.match_contains:
+            if triggers._dirty:
+                self.stats['rebuilds'] += 1
+            pattern = triggers.pattern()
+            if pattern is not None:
+                found = pattern.search(key)
+                if found:
+                    value = triggers.contains.get(found.group(0))
+
+        if value is not None:
+            self.stats['hits'] += 1
+        return value
+
+    def keywords(self, chat_id: Optional[int]) -> int:
+        """عدد الكلمات المفهرسة لمحادثة"""
+        triggers = self._chats.get(chat_id)
+        return len(triggers.exact) if triggers else 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """إحصائيات الفهرس للمراقبة"""
+        return dict(
+            self.stats,
+            chats=len(self._chats),
+            keywords=sum(len(t.exact) for t in self._chats.values()),
+            loaded=self.loaded,
+        )
+
+
+# فهرس الردود المخصصة (مطابقة تامة، مع ردود عامة تحت chat_id = None)
+custom_reply_index = TriggerIndex()
+
+# فهرس الأوامر المخصصة (مطابقة تامة أو احتواء)
+custom_command_index = TriggerIndex(contains=True)
@@ -2,7 +2,6 @@
 🔒 أوامر التحكم بنظام تحليل المستخدمين والخصوصية
 """
 
-import aiosqlite
 import logging
 from datetime import datetime
 from typing import Dict, List, Optional, Any
@@ -10,10 +9,10 @@ from typing import Dict, List, Optional, Any
 from aiogram import Bot, types
 from aiogram.types import Message, CallbackQuery
 
-from config.database import DATABASE_URL
 from database.user_analysis_operations import UserAnalysisOperations
 from modules.user_analysis_manager import user_analysis_manager
 from utils.decorators import admin_required
+from database.connection_pool import db_pool
 
 
 class UserAnalysisCommands:
@@ -86,8 +85,7 @@ class UserAnalysisCommands:
             chat_id = message.chat.id
             
             # الحصول على إعدادات المجموعة
-            async with aiosqlite.connect(DATABASE_URL) as db:
-                db.row_factory = aiosqlite.Row
+            async with db_pool.reader() as db:
                 cursor = await db.execute(
                     "SELECT * FROM group_analysis_settings WHERE chat_id = ?",
                     (chat_id,)
@@ -306,7 +304,7 @@ class UserAnalysisCommands:
             chat_id = message.chat.id
             
             # الحصول على إحصائيات شاملة
-            async with aiosqlite.connect(DATABASE_URL) as db:
+            async with db_pool.reader() as db:
                 # إحصائيات عامة
                 cursor = await db.execute("""
                     SELECT 
@@ -466,10 +464,9 @@ async def handle_delete_confirmation(message: Message) -> bool:
             user_id = message.from_user.id
             
             # حذف جميع البيانات المرتبطة بالمجموعة
-            async with aiosqlite.connect(DATABASE_URL) as db:
+            async with db_pool.writer() as db:
                 await db.execute("DELETE FROM analysis_statistics WHERE chat_id = ?", (chat_id,))
                 await db.execute("DELETE FROM group_analysis_settings WHERE chat_id = ?", (chat_id,))
-                await db.commit()
             
             user_name = message.from_user.first_name or "الإدارة"
             
@@ -3,15 +3,14 @@
 """
 
 import asyncio
-import aiosqlite
 import json
 import logging
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
 
-from config.database import DATABASE_URL
 from database.user_analysis_operations import UserAnalysisOperations
 from modules.user_analysis_engine import UserAnalysisEngine, AdvancedUserAnalyzer
+from database.connection_pool import db_pool
 
 
 class UserAnalysisManager:
@@ -164,8 +163,7 @@ class UserAnalysisManager:
                 user1_id, user2_id = user2_id, user1_id
             
             # الحصول على بيانات العلاقة
-            async with aiosqlite.connect(DATABASE_URL) as db:
-                db.row_factory = aiosqlite.Row
+            async with db_pool.reader() as db:
                 cursor = await db.execute("""
                     SELECT * FROM user_relationships 
                     WHERE user1_id = ? AND user2_id = ?
@@ -326,10 +324,8 @@ class UserAnalysisManager:
         """حساب مستوى التفاعل الاجتماعي"""
         # عدد التفاعلات والعلاقات
         try:
-            from config.database import DATABASE_URL
-            import aiosqlite
             
-            async with aiosqlite.connect(DATABASE_URL) as db:
+            async with db_pool.reader() as db:
                 # عدد العلاقات
                 cursor = await db.execute("""
                     SELECT COUNT(*) FROM user_relationships 
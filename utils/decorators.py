@@ -206,11 +206,31 @@ def premium_required(func: Callable) -> Callable:
     return wrapper
 
 
-def rate_limit(seconds: int = 5):
-    """ديكوريتر لتحديد معدل الاستخدام"""  
+def rate_limit(action: str = "default"):
+    """ديكوريتر لتحديد معدل الاستخدام حسب فئة الأوامر (RATE_LIMITS في الإعدادات)"""
     def decorator(func: Callable) -> Callable:
         @wraps(func)
         async def wrapper(message_or_query: Union[Message, CallbackQuery], *args, **kwargs):
+            try:
+                from utils.rate_limiter import rate_limiter, format_retry_message
+                from config.hierarchy import MASTERS
+                
+                user_id = message_or_query.from_user.id
+                if isinstance(message_or_query, CallbackQuery):
+                    chat_id = message_or_query.message.chat.id if message_or_query.message else None
+                else:
+                    chat_id = message_or_query.chat.id
+                
+                if user_id not in MASTERS and not rate_limiter.check(user_id, chat_id, action):
+                    retry_text = format_retry_message(rate_limiter.retry_after(user_id, chat_id, action))
+                    if isinstance(message_or_query, CallbackQuery):
+                        await message_or_query.answer(retry_text, show_alert=False)
+                    elif rate_limiter.should_notify(user_id, chat_id, action):
+                        await message_or_query.reply(retry_text)
+                    return
+            except Exception as e:
+                logging.error(f"خطأ في ديكوريتر rate_limit: {e}")
+            
             return await func(message_or_query, *args, **kwargs)
         return wrapper
     return decorator
@@ -561,10 +561,9 @@ def parse_duration(duration_str: str) -> Optional[timedelta]:
 
 
 async def rate_limit(user_id: int, action: str, limit: int = 5, window: int = 60) -> bool:
-    """تحديد معدل الاستخدام"""
-    # هذه دالة بسيطة، يمكن تطويرها باستخدام Redis أو قاعدة بيانات
-    # مؤقتاً نعيد True دائماً
-    return True
+    """تحديد معدل الاستخدام: limit طلب كل window ثانية لكل مستخدم وإجراء"""
+    from utils.rate_limiter import rate_limiter
+    return rate_limiter.check(user_id, None, action, capacity=limit, rate=limit / max(window, 1))
 
 
 def generate_unique_id() -> str:
@@ -0,0 +1,211 @@
+"""
+محدد معدل الاستخدام بدلاء الرموز
+Token-Bucket Rate Limiter
+
+دلو رموز لكل (مستخدم، مجموعة، فئة أوامر) بذاكرة ثابتة لكل مفتاح نشط، ويُحذف
+الدلو الخامل بعد امتلائه (لأنه يساوي دلواً جديداً). يُستخدم عبر وسيط aiogram
+يصنّف الرسالة ويرفض الطلبات الزائدة قبل وصولها لقاعدة البيانات أو الذكاء
+الاصطناعي، وعبر ديكوريتر rate_limit في utils/decorators.py.
+
+الوسائط لا تمر عبر الوسيط حتى لا تتخطى فحص المحتوى؛ تُحدّ خطوة تحليل Gemini
+فقط داخل المعالج الموحد عبر check_media_analysis.
+"""
+
+import logging
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message
+
+from config.settings import RATE_LIMITS
+
+# الفاصل بين عمليات حذف الدلاء الخاملة (ثواني)
+SWEEP_INTERVAL = 60.0
+
+# بادئات أوامر التحميل والبحث عن الموسيقى
+_DOWNLOAD_PREFIXES = re.compile(
+    r'^(?:تحميل|تيك |تويتر |ساوند |بحث |ابحث عن [اأ]غنية|ابحث [اأ]غنية|شغل [اأ]غنية|تشغيل [اأ]غنية)'
+)
+_THEFT_PREFIXES = re.compile(r'^(?:سرقة|زرر?ف)')
+_BATTLE_WORDS = re.compile(r'ساحة الموت|ساحة المعركة|معركة|battle')
+_AI_WORDS = re.compile(r'يوكي|يوكى|yuki')
+
+
+class _Bucket:
+    """دلو رموز واحد"""
+
+    __slots__ = ('tokens', 'updated', 'capacity', 'rate', 'notified')
+
+    def __init__(self, capacity: float, rate: float, now: float):
+        self.tokens = capacity
+        self.updated = now
+        self.capacity = capacity
+        self.rate = rate
+        # هل أُرسل تنبيه منذ آخر امتلاء (تنبيه واحد لكل موجة رفض)
+        self.notified = False
+
+
+def _limits_for(action: str) -> Tuple[float, float]:
+    """السعة ومعدل الاستعادة (رمز/ثانية) لفئة أوامر"""
+    limits = RATE_LIMITS.get(action) or RATE_LIMITS["default"]
+    return float(limits["capacity"]), 1.0 / max(float(limits["refill_seconds"]), 0.001)
+
+
+class RateLimiter:
+    """دلاء رموز بمفاتيح (user_id, chat_id, action) مع حذف الخاملة"""
+
+    def __init__(self):
+        self._buckets: Dict[Tuple[int, Optional[int], str], _Bucket] = {}
+        self._last_sweep = time.monotonic()
+        self.stats = {'allowed': 0, 'rejected': 0, 'evicted': 0}
+        self.rejected_by_action: Dict[str, int] = {}
+
+    def _refill(self, bucket: _Bucket, now: float):
+        bucket.tokens = min(bucket.capacity, bucket.tokens + (now - bucket.updated) * bucket.rate)
+        bucket.updated = now
+        if bucket.tokens >= 1:
+            bucket.notified = False
+
+    def check(self, user_id: int, chat_id: Optional[int], action: str = "default", cost: float = 1.0,
+              capacity: Optional[float] = None, rate: Optional[float] = None) -> bool:
+        """استهلاك رمز إن توفر، وإرجاع False إذا تجاوز المستخدم الحد"""
+        now = time.monotonic()
+        if now - self._last_sweep >= SWEEP_INTERVAL:
+            self._sweep(now)
+
+        key = (user_id, chat_id, action)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if capacity is None or rate is None:
+                capacity, rate = _limits_for(action)
+            bucket = self._buckets[key] = _Bucket(capacity, rate, now)
+        else:
+            self._refill(bucket, now)
+
+        if bucket.tokens >= cost:
+            bucket.tokens -= cost
+            self.stats['allowed'] += 1
+            return True
+
+        self.stats['rejected'] += 1
+        self.rejected_by_action[action] = self.rejected_by_action.get(action, 0) + 1
+        return False
+
+    def retry_after(self, user_id: int, chat_id: Optional[int], action: str = "default") -> float:
+        """الثواني المتبقية حتى يتوفر رمز"""
+        bucket = self._buckets.get((user_id, chat_id, action))
+        if bucket is None:
+            return 0.0
+        self._refill(bucket, time.monotonic())
+        return max(0.0, (1 - bucket.tokens) / bucket.rate)
+
+    def should_notify(self, user_id: int, chat_id: Optional[int], action: str = "default") -> bool:
+        """تنبيه واحد فقط لكل موجة رفض حتى لا يتحول التنبيه نفسه إلى إغراق"""
+        bucket = self._buckets.get((user_id, chat_id, action))
+        if bucket is None or bucket.notified:
+            return False
+        bucket.notified = True
+        return True
+
+    def _sweep(self, now: float):
+        """حذف الدلاء الممتلئة (الخاملة) لأنها تساوي دلواً جديداً"""
+        self._last_sweep = now
+        idle = [key for key, bucket in self._buckets.items()
+                if bucket.tokens + (now - bucket.updated) * bucket.rate >= bucket.capacity]
+        for key in idle:
+            del self._buckets[key]
+        self.stats['evicted'] += len(idle)
+
+    def reset(self, user_id: int, chat_id: Optional[int] = None):
+        """إعادة تعيين حدود مستخدم (في مجموعة محددة أو في كل مكان)"""
+        for key in [k for k in self._buckets if k[0] == user_id and (chat_id is None or k[1] == chat_id)]:
+            del self._buckets[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """إحصائيات المحدد للمراقبة"""
+        return dict(self.stats, active_buckets=len(self._buckets),
+                    rejected_by_action=dict(self.rejected_by_action))
+
+
+def classify_message(message: Message, bot_id: Optional[int] = None) -> Optional[str]:
+    """تحديد فئة الأوامر المكلفة التي تنتمي لها الرسالة (None = غير محدودة)"""
+    if message.photo or message.video or message.animation or message.sticker or message.document:
+        # الوسائط يجب أن تصل لفحص المحتوى دائماً، ويُحد تحليلها داخل المعالج
+        return None
+
+    text = (message.text or "").strip().lower()
+    if not text:
+        return None
+    if _DOWNLOAD_PREFIXES.match(text):
+        return "download"
+    if message.reply_to_message and _THEFT_PREFIXES.match(text):
+        return "theft"
+    if _BATTLE_WORDS.search(text):
+        return "battle"
+    replied_to = message.reply_to_message.from_user if message.reply_to_message else None
+    if _AI_WORDS.search(text) or (replied_to is not None and bot_id and replied_to.id == bot_id):
+        return "ai"
+    return None
+
+
+def format_retry_message(seconds: float) -> str:
+    """نص تنبيه تجاوز الحد"""
+    return f"⏳ تمهل قليلاً! حاول مرة أخرى بعد {max(1, int(seconds + 0.999))} ثانية"
+
+
+class RateLimitMiddleware(BaseMiddleware):
+    """وسيط يرفض الرسائل المكلفة الزائدة عن الحد قبل وصولها للمعالجات"""
+
+    def __init__(self, limiter: Optional["RateLimiter"] = None):
+        self.limiter = limiter or rate_limiter
+
+    async def __call__(self, handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+                       event: Message, data: Dict[str, Any]) -> Any:
+        user = getattr(event, 'from_user', None)
+        if not isinstance(event, Message) or user is None:
+            return await handler(event, data)
+
+        bot = data.get('bot')
+        action = classify_message(event, bot.id if bot else None)
+        if action is None:
+            return await handler(event, data)
+
+        from config.hierarchy import MASTERS
+        if user.id in MASTERS:
+            return await handler(event, data)
+
+        chat_id = event.chat.id
+        if self.limiter.check(user.id, chat_id, action):
+            return await handler(event, data)
+
+        # الرسائل المسيئة تمر دائماً ليتعامل معها فلتر الألفاظ
+        text = event.text or event.caption
+        if text:
+            try:
+                from modules.profanity_filter import profanity_filter
+                if profanity_filter.is_enabled(chat_id) and profanity_filter.contains_profanity(text, chat_id)[0]:
+                    return await handler(event, data)
+            except Exception as e:
+                logging.error(f"خطأ في فحص الألفاظ داخل محدد المعدل: {e}")
+
+        logging.info(f"🚦 تم رفض طلب {action} من المستخدم {user.id} في {chat_id} (تجاوز الحد)")
+        if self.limiter.should_notify(user.id, chat_id, action):
+            try:
+                await event.reply(format_retry_message(self.limiter.retry_after(user.id, chat_id, action)))
+            except Exception as e:
+                logging.error(f"خطأ في إرسال تنبيه تجاوز الحد: {e}")
+        return None
+
+
+# النسخة العامة من المحدد
+rate_limiter = RateLimiter()
+
+
+def check_media_analysis(user_id: int, chat_id: int) -> bool:
+    """استهلاك رمز من حد تحليل الوسائط (False = تجاوز الحد ولا يجوز تمرير الملف دون فحص)"""
+    from config.hierarchy import MASTERS
+    if user_id in MASTERS:
+        return True
+    return rate_limiter.check(user_id, chat_id, "media")